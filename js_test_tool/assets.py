@@ -0,0 +1,280 @@
+"""
+Content-hashed URLs for files shared between suites.
+
+Libraries and runner assets (e.g. jasmine.js) are usually the same
+in every suite, but are served at a different URL for each suite,
+so a browser running many suites downloads and parses them again
+for each one.  Instead, runner pages load them from:
+
+    /asset/DIGEST/PATH
+
+where `DIGEST` is a hash of the file's contents and `PATH` is the
+file's path (relative to the suite's root directory, or to the
+runner directory for runner assets).  The URL changes whenever the
+contents change, so browsers can cache assets indefinitely.
+
+Sources are always served from their suite's URLs, since they
+may be instrumented for coverage differently in each suite.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os.path
+import threading
+import pkg_resources
+from StringIO import StringIO
+
+
+# URL path under which assets are served
+ASSET_URL_PREFIX = '/asset/'
+
+# The contents at an asset URL never change
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Number of hex digits of the SHA-1 hash used in asset URLs
+DIGEST_LENGTH = 16
+
+# Number of bytes to read at a time when hashing a file
+_READ_SIZE = 64 * 1024
+
+# Digests of files, keyed by path: `(mtime, size, digest)` tuples
+_FILE_DIGEST_DICT = {}
+
+# `RunnerAsset` instances, keyed by path in the runner directory
+# Loaded by `runner_assets()`
+_RUNNER_ASSET_DICT = None
+
+_DIGEST_LOCK = threading.Lock()
+
+
+def asset_url(digest, rel_path):
+    """
+    Return the URL of the asset at `rel_path` with contents
+    hashed to `digest`.
+    """
+    return u'{}{}/{}'.format(ASSET_URL_PREFIX, digest, rel_path)
+
+
+def is_asset_url(url_path):
+    """
+    Return True if `url_path` is the path of an asset URL.
+    """
+    return url_path is not None and url_path.startswith(ASSET_URL_PREFIX)
+
+
+def lib_asset_url(suite_name, root_dir, rel_path):
+    """
+    Return the URL of the library at `rel_path` (relative to `root_dir`)
+    in the suite named `suite_name`.  If the library cannot be read,
+    return its URL in the suite instead, so it is reported missing
+    the same way as other dependencies.
+    """
+    try:
+        digest = file_digest(os.path.join(root_dir, rel_path))
+
+    except (IOError, OSError):
+        return u'/suite/{}/include/{}'.format(suite_name, rel_path)
+
+    else:
+        return asset_url(digest, rel_path)
+
+
+def runner_asset_url(rel_path):
+    """
+    Return the URL of the runner asset at `rel_path`
+    (relative to the runner directory, e.g. "jasmine/jasmine.js").
+    """
+    asset = runner_assets().get(rel_path)
+
+    if asset is None:
+        return u'/runner/{}'.format(rel_path)
+
+    return asset.url
+
+
+def file_digest(path):
+    """
+    Return the digest of the contents of the file at `path`.
+    Digests are cached until the file's size or modification time changes.
+
+    Raises an `IOError` or `OSError` if the file cannot be read.
+    """
+    stat = os.stat(path)
+
+    with _DIGEST_LOCK:
+        cached = _FILE_DIGEST_DICT.get(path)
+
+    if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2]
+
+    sha = hashlib.sha1()
+
+    with open(path, 'rb') as asset_file:
+        for chunk in iter(lambda: asset_file.read(_READ_SIZE), ''):
+            sha.update(chunk)
+
+    digest = sha.hexdigest()[:DIGEST_LENGTH]
+
+    with _DIGEST_LOCK:
+        _FILE_DIGEST_DICT[path] = (stat.st_mtime, stat.st_size, digest)
+
+    return digest
+
+
+def runner_digest(rel_path):
+    """
+    Return the digest of the contents of the runner asset at `rel_path`.
+
+    Raises an `IOError` if there is no such runner asset.
+    """
+    asset = runner_assets().get(rel_path)
+
+    if asset is None:
+        raise IOError("No runner asset '{}'".format(rel_path))
+
+    return asset.digest
+
+
+def runner_assets():
+    """
+    Return a dict mapping the paths of the runner assets (relative
+    to the runner directory, e.g. "jasmine/jasmine.js") to `RunnerAsset`
+    instances.  The assets are loaded from this package the first time
+    this is called; the page server calls it when it starts.
+    """
+    global _RUNNER_ASSET_DICT
+
+    with _DIGEST_LOCK:
+
+        if _RUNNER_ASSET_DICT is None:
+            _RUNNER_ASSET_DICT = dict(
+                (rel_path, RunnerAsset(rel_path, contents))
+                for rel_path, contents in _load_runner_files()
+            )
+
+        return _RUNNER_ASSET_DICT
+
+
+def runner_module_paths(runner_dir):
+    """
+    Return a dict mapping the names of the JavaScript modules in
+    `runner_dir` (a directory of runner assets, e.g. "jasmine_requirejs")
+    to their asset URLs without the ".js" extension, as RequireJS expects.
+    """
+    prefix = runner_dir + '/'
+
+    return dict(
+        (rel_path[len(prefix):-len('.js')], asset.url[:-len('.js')])
+        for rel_path, asset in runner_assets().items()
+        if rel_path.startswith(prefix) and rel_path.endswith('.js')
+        and '/' not in rel_path[len(prefix):]
+    )
+
+
+class RunnerAsset(object):
+    """
+    A runner asset (e.g. jasmine.js) loaded into memory, along with
+    everything needed to send it: its MIME type, length, ETag
+    and (if it compresses) a gzipped copy.
+
+    Instances are never modified, so they can be shared by threads
+    and forked processes.
+    """
+
+    # Assets smaller than this are not worth compressing
+    MIN_GZIP_LENGTH = 256
+
+    def __init__(self, rel_path, contents):
+        """
+        Create the asset at `rel_path` (relative to the runner
+        directory) with `contents` (a byte string).
+        """
+        self.rel_path = rel_path
+        self.contents = contents
+        self.length = len(contents)
+        self.digest = hashlib.sha1(contents).hexdigest()[:DIGEST_LENGTH]
+        self.url = asset_url(self.digest, rel_path)
+        self.etag = '"{}"'.format(self.digest)
+
+        self.mime_type, _ = mimetypes.guess_type(rel_path)
+        if self.mime_type is None:
+            self.mime_type = 'text/plain'
+
+        self.gzip_contents = None
+        if self.length >= self.MIN_GZIP_LENGTH:
+            compressed = _gzip(contents)
+
+            if len(compressed) < self.length:
+                self.gzip_contents = compressed
+
+    def content_file(self, gzip=False):
+        """
+        Return a file-like object to send the asset from,
+        compressed if `gzip` is True and the asset has a gzipped copy.
+        """
+        if gzip and self.gzip_contents is not None:
+            return AssetContent(self, self.gzip_contents, content_encoding='gzip')
+
+        return AssetContent(self, self.contents)
+
+    def not_modified_file(self):
+        """
+        Return an empty file-like object to send
+        when the client already has the asset.
+        """
+        return AssetContent(self, '')
+
+
+class AssetContent(StringIO):
+    """
+    File-like object for sending a `RunnerAsset`, which tells the
+    page server the headers to send along with it.
+    """
+
+    def __init__(self, asset, contents, content_encoding=None):
+        """
+        Send `contents` (a byte string) of `asset` (a `RunnerAsset`),
+        encoded with `content_encoding` (e.g. "gzip", or None).
+        """
+        StringIO.__init__(self, contents)
+        self.asset = asset
+        self.etag = asset.etag
+        self.content_encoding = content_encoding
+
+
+def _load_runner_files():
+    """
+    Return a list of `(rel_path, contents)` tuples for
+    the files in this package's runner directory.
+    """
+    runner_files = []
+    pending = ['runner']
+
+    while pending:
+        resource_dir = pending.pop()
+
+        for name in pkg_resources.resource_listdir('js_test_tool', resource_dir):
+            resource_path = resource_dir + '/' + name
+
+            if pkg_resources.resource_isdir('js_test_tool', resource_path):
+                pending.append(resource_path)
+
+            else:
+                contents = pkg_resources.resource_string('js_test_tool', resource_path)
+                runner_files.append((resource_path[len('runner/'):], contents))
+
+    return runner_files
+
+
+def _gzip(contents):
+    """
+    Return `contents` (a byte string) compressed with gzip.
+    The output does not depend on the time it was compressed.
+    """
+    buf = StringIO()
+
+    with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as gzip_file:
+        gzip_file.write(contents)
+
+    return buf.getvalue()
@@ -4,7 +4,11 @@ Load suite runner pages in a browser and parse the results.
 
 from splinter.exceptions import DriverNotFoundError
 from splinter.browser import Browser as SplinterBrowser
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver import ChromeOptions
+from collections import deque
 import json
+import time
 from urllib import unquote
 from js_test_tool.util import retry
 import httplib
@@ -55,7 +59,26 @@ class Browser(object):
     # Max time to wait between restarts in seconds
     RESTART_WAIT_SEC = 1
 
-    def __init__(self, browser_name, timeout_sec=None):
+    # Browsers that can report precise coverage through WebDriver
+    NATIVE_COVERAGE_BROWSERS = ['chrome']
+
+    # Browsers that can load pages in several tabs of one session
+    TABBED_BROWSERS = ['chrome', 'firefox']
+
+    # Time to wait between checks of the open tabs, in seconds
+    TAB_POLL_SEC = 0.2
+
+    # Browsers slow down timers in tabs that are not in front,
+    # which would stall the pages loading in the other tabs
+    TABBED_CHROME_ARGS = [
+        '--disable-background-timer-throttling',
+        '--disable-renderer-backgrounding',
+        '--disable-backgrounding-occluded-windows',
+    ]
+    TABBED_FIREFOX_PREFS = {'dom.min_background_timeout_value': 0}
+
+    def __init__(self, browser_name, timeout_sec=None, native_coverage=False,
+                 max_tabs=1):
         """
         Initialize the browser to use `browser_name` (e.g. chrome).
         Valid browser names are those defined by the Splinter API:
@@ -64,12 +87,31 @@ class Browser(object):
         `timeout_sec` is the amount of time to wait for the DOM
         to load.  It could take a long time, so default to a high
         value.
+
+        If `native_coverage` is True, record the browser's precise
+        coverage for each page (see `take_script_coverage()`).
+        Only browsers in `NATIVE_COVERAGE_BROWSERS` support this.
+
+        `max_tabs` is the number of pages `get_pages_results()`
+        loads at once, each in its own tab.  Only browsers in
+        `TABBED_BROWSERS` support more than one.
         """
         if timeout_sec is None:
             timeout_sec = self.DEFAULT_TIMEOUT
 
+        if native_coverage and browser_name not in self.NATIVE_COVERAGE_BROWSERS:
+            msg = "{} cannot collect native coverage.".format(browser_name)
+            raise BrowserError(msg)
+
+        if max_tabs > 1 and browser_name not in self.TABBED_BROWSERS:
+            msg = "{} cannot load pages in several tabs.".format(browser_name)
+            raise BrowserError(msg)
+
         self._name = browser_name
         self._timeout_sec = timeout_sec
+        self._native_coverage = native_coverage
+        self._max_tabs = max_tabs
+        self._script_coverage_list = []
         self._splinter_browser = None
 
         # Start the browser (raises an exception if the browser name is invalid)
@@ -86,6 +128,9 @@ class Browser(object):
              'test_name': TEST_NAME,
              'status': pass | fail | error | skip,
              'detail': DETAILS}
+
+        Results the runner page timed also have a
+        'duration' key (the number of seconds the test took).
         """
         return retry(
             lambda: self._get_page_results(url),
@@ -96,12 +141,45 @@ class Browser(object):
             name="Get test results from browser {0}".format(self._name)
         )
 
+    def get_pages_results(self, url_list):
+        """
+        Load the test suite page at each URL in `url_list`,
+        returning a list of the results on each page
+        (as returned by `get_page_results()`), in the same order.
+
+        If the browser was created with `max_tabs` greater than 1,
+        up to that many pages load at once, each in its own tab.
+        A page that fails is retried in a new tab while the others
+        keep running; if the browser crashes, it is restarted and
+        the pages that were open are retried.  Each page is tried
+        at most `MAX_RESTARTS` times.
+        """
+        # The profiler records only the current tab,
+        # so load one page at a time to collect native coverage
+        if self._max_tabs < 2 or self._native_coverage or len(url_list) < 2:
+            return [self.get_page_results(url) for url in url_list]
+
+        return self._get_tabbed_results(url_list)
+
     def name(self):
         """
         Return the name of the browser (e.g. 'chrome')
         """
         return self._name
 
+    def take_script_coverage(self):
+        """
+        Return the list of script coverage dicts recorded for the
+        pages loaded since the last call (see the Chrome DevTools
+        `Profiler.takePreciseCoverage` command), and clear the list.
+
+        Returns an empty list unless the browser was created
+        with `native_coverage` enabled.
+        """
+        script_coverage_list = self._script_coverage_list
+        self._script_coverage_list = []
+        return script_coverage_list
+
     def quit(self):
         """
         Quit the browser.  This should be called to clean up
@@ -130,8 +208,20 @@ class Browser(object):
         if self._splinter_browser is not None:
             self.quit()
 
+        # Keep pages in background tabs running at full speed
+        kwargs = {}
+
+        if self._max_tabs > 1 and self._name == 'chrome':
+            options = ChromeOptions()
+            for arg in self.TABBED_CHROME_ARGS:
+                options.add_argument(arg)
+            kwargs['options'] = options
+
+        elif self._max_tabs > 1 and self._name == 'firefox':
+            kwargs['profile_preferences'] = dict(self.TABBED_FIREFOX_PREFS)
+
         try:
-            self._splinter_browser = SplinterBrowser(self._name)
+            self._splinter_browser = SplinterBrowser(self._name, **kwargs)
 
         except DriverNotFoundError:
             if self._name == 'chrome':
@@ -167,6 +257,10 @@ class Browser(object):
         Version of `get_page_results` with no retry logic.
         Raises a `BrowserError` is any browser operation fails.
         """
+        # Start the profiler before the page loads its scripts
+        if self._native_coverage:
+            self._start_precise_coverage()
+
         # Load the URL in the browser
         try:
             self._splinter_browser.visit(url)
@@ -203,7 +297,223 @@ class Browser(object):
             # Raise an exception if JavaScript errors reported
             # (the test runner writes these to the DOM)
             self._raise_js_errors()
-            return self._get_results_from_dom()
+            results = self._get_results_from_dom()
+
+            # Record coverage only for pages that ran successfully,
+            # so a retried page is not counted twice.
+            if self._native_coverage:
+                self._script_coverage_list.extend(self._take_precise_coverage())
+
+            return results
+
+    def _get_tabbed_results(self, url_list):
+        """
+        Version of `get_pages_results` that loads
+        the pages in up to `max_tabs` tabs at once.
+        """
+        results_list = [None] * len(url_list)
+        attempt_list = [0] * len(url_list)
+        pending = deque(range(len(url_list)))
+
+        # Map the window handle of each open tab to the index
+        # of the URL it loaded and the time it was opened
+        open_tabs = {}
+
+        def _retry_page(index, err):
+            # Fail the whole run once a page runs out of attempts
+            if attempt_list[index] >= self.MAX_RESTARTS:
+                raise err
+
+            LOGGER.debug("Retrying '{}' in a new tab after error: {}".format(url_list[index], err))
+            pending.append(index)
+
+        def _restart(err):
+            # Pages open when the browser crashed are lost with it
+            for index, _ in open_tabs.values():
+                _retry_page(index, err)
+
+            open_tabs.clear()
+            time.sleep(self.RESTART_WAIT_SEC)
+            self._start_browser()
+
+        try:
+            while pending or open_tabs:
+
+                # Open a tab for each pending page, up to the limit
+                while pending and len(open_tabs) < self._max_tabs:
+                    index = pending.popleft()
+                    attempt_list[index] += 1
+
+                    try:
+                        handle = self._open_tab(url_list[index])
+
+                    except BrowserError as err:
+                        _retry_page(index, err)
+                        _restart(err)
+
+                    else:
+                        open_tabs[handle] = (index, time.time())
+
+                # Check each open tab for results
+                for handle, (index, start_time) in open_tabs.items():
+
+                    try:
+                        results = self._get_tab_results(handle, start_time)
+
+                    except BrowserError as err:
+                        del open_tabs[handle]
+                        is_running = self._close_tab(handle)
+                        _retry_page(index, err)
+
+                        # If we cannot get back to another tab,
+                        # the browser itself crashed
+                        if not is_running:
+                            _restart(err)
+                            break
+
+                    else:
+                        if results is not None:
+                            results_list[index] = results
+                            del open_tabs[handle]
+                            self._close_tab(handle)
+
+                if open_tabs:
+                    time.sleep(self.TAB_POLL_SEC)
+
+        # Do not leave pages running if we give up
+        finally:
+            for handle in open_tabs:
+                self._close_tab(handle)
+
+        return results_list
+
+    def _open_tab(self, url):
+        """
+        Start loading `url` in a new tab and
+        return the window handle of the tab.
+
+        Raises a `BrowserError` if the tab could not be opened.
+        """
+        driver = self._splinter_browser.driver
+
+        def _open():
+            old_handles = set(driver.window_handles)
+            driver.execute_script("window.open(arguments[0]);", url)
+            new_handles = [handle for handle in driver.window_handles
+                           if handle not in old_handles]
+
+            if len(new_handles) != 1:
+                raise BrowserError("Could not open a tab for '{}'".format(url))
+
+            return new_handles[0]
+
+        try:
+            return self._safe_browser_call(_open, name="open tab")
+
+        except WebDriverException as err:
+            msg = "Could not open a tab for '{}': {}".format(url, err)
+            raise BrowserError(msg)
+
+    def _get_tab_results(self, handle, start_time):
+        """
+        Return the results on the page in the tab with window `handle`,
+        or None if its tests are still running.
+
+        `start_time` is the time the tab was opened.  Raises a
+        `BrowserError` if the tab crashed or timed out.
+        """
+        driver = self._splinter_browser.driver
+        css_sel = "#{}.{}".format(self.RESULTS_DIV_ID, self.DONE_DIV_CLASS)
+
+        def _check():
+            driver.switch_to.window(handle)
+            is_done = driver.execute_script(
+                "return document.querySelector(arguments[0]) !== null;", css_sel
+            )
+
+            if is_done:
+                self._raise_js_errors()
+                return self._get_results_from_dom()
+
+            elif time.time() - start_time > self._timeout_sec:
+                self._raise_js_errors()
+                raise BrowserError("Timed out waiting for test results.")
+
+            else:
+                return None
+
+        try:
+            return self._safe_browser_call(_check, name="check if tests finished")
+
+        except WebDriverException as err:
+            raise BrowserError("Could not check tab for results: {}".format(err))
+
+    def _close_tab(self, handle):
+        """
+        Close the tab with window `handle` (if it is still open)
+        and switch to one of the remaining tabs.
+
+        Returns False if the browser could not be reached.
+        """
+        driver = self._splinter_browser.driver
+
+        # A crashed tab may not close cleanly; the browser
+        # can carry on without it.
+        try:
+            driver.switch_to.window(handle)
+            driver.close()
+
+        except (WebDriverException, httplib.BadStatusLine, IOError):
+            LOGGER.debug("Could not close tab.")
+
+        # The tab the browser started with is never closed,
+        # so there is always one to switch to.
+        try:
+            driver.switch_to.window(driver.window_handles[0])
+
+        except (WebDriverException, httplib.BadStatusLine, IOError, IndexError):
+            return False
+
+        else:
+            return True
+
+    def _start_precise_coverage(self):
+        """
+        Start recording precise (block-level) coverage
+        for the scripts loaded by the next page.
+        """
+        self._devtools_command('Profiler.enable')
+        self._devtools_command('Profiler.startPreciseCoverage',
+                               callCount=True, detailed=True)
+
+    def _take_precise_coverage(self):
+        """
+        Stop recording precise coverage and return
+        the list of script coverage dicts.
+        """
+        result = self._devtools_command('Profiler.takePreciseCoverage')
+        self._devtools_command('Profiler.stopPreciseCoverage')
+        self._devtools_command('Profiler.disable')
+        return result.get('result', [])
+
+    def _devtools_command(self, command, **params):
+        """
+        Send a Chrome DevTools Protocol `command` with `params`
+        through the WebDriver session and return the result dict.
+
+        Raises a `BrowserError` if the command fails.
+        """
+        driver = self._splinter_browser.driver
+
+        try:
+            return self._safe_browser_call(
+                lambda: driver.execute_cdp_cmd(command, params),
+                name=command
+            )
+
+        except (WebDriverException, AttributeError) as err:
+            msg = "Could not execute DevTools command {}: {}".format(command, err)
+            raise BrowserError(msg)
 
     def _raise_js_errors(self):
         """
@@ -266,10 +576,12 @@ class Browser(object):
 
         Expect `output` to be a JSON-encoded string representing
         a list of dictionaries with keys
-        'testGroup', 'testName', 'testStatus', and 'testDetail'
+        'testGroup', 'testName', 'testStatus', and 'testDetail',
+        and optionally 'testDuration' (in milliseconds).
 
         Returns a list of dictonaries with keys `test_group`, `test_name`,
-        `status` and `detail`.
+        `status` and `detail`, and `duration` (in seconds) if the
+        test was timed.
 
         If the test runner output does not have the expected keys,
         raises a `BrowserError`.
@@ -300,6 +612,11 @@ class Browser(object):
                     unescaped = unquote(value)
                     modified_dict[key] = unescaped
 
+            # Durations are optional, and not escaped
+            duration = result_dict.get('testDuration')
+            if isinstance(duration, (int, float)):
+                modified_dict['duration'] = duration / 1000.0
+
             # Add the modified dict to the list
             final_list.append(modified_dict)
 
@@ -0,0 +1,160 @@
+"""
+Combine coverage snapshots written by separate (e.g. sharded) test runs.
+"""
+
+import multiprocessing
+from js_test_tool.coverage import CoverageData
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+def combine_snapshots(snapshot_paths, num_processes=None,
+                      pool_class=multiprocessing.Pool):
+    """
+    Load the coverage snapshots at `snapshot_paths` (written by
+    `CoverageData.write_snapshot()`) and merge them into a single
+    `CoverageData` instance.
+
+    Snapshots are loaded and merged by a pool of `num_processes`
+    worker processes (default is one per CPU).  Each worker merges
+    a contiguous chunk of the snapshots, then the partial results
+    are merged pairwise until one remains.
+
+    `pool_class` defaults to `multiprocessing.Pool`, but can be
+    overridden for testing.
+
+    Raises an `IOError` if a snapshot could not be read and
+    a `ValueError` if a snapshot is invalid.
+    """
+    if len(snapshot_paths) == 0:
+        return CoverageData()
+
+    if num_processes is None:
+        num_processes = multiprocessing.cpu_count()
+
+    num_processes = max(1, min(num_processes, len(snapshot_paths)))
+    chunks = _split_list(snapshot_paths, num_processes)
+
+    # Don't bother starting processes for a single chunk
+    if num_processes == 1:
+        return CoverageData.from_snapshot_dict(load_and_merge(chunks[0]))
+
+    pool = pool_class(num_processes)
+
+    try:
+        partial_list = pool.map(load_and_merge, chunks)
+
+        # Tree-reduce the partial results
+        while len(partial_list) > 1:
+            pairs = [partial_list[index:index + 2]
+                     for index in range(0, len(partial_list), 2)]
+            partial_list = pool.map(merge_pair, pairs)
+
+    finally:
+        pool.close()
+        pool.join()
+
+    return CoverageData.from_snapshot_dict(partial_list[0])
+
+
+def load_and_merge(snapshot_paths):
+    """
+    Load each snapshot in `snapshot_paths` and return
+    the merged snapshot dict.
+
+    Module-level so that it can be sent to worker processes.
+    """
+    merged = None
+
+    for path in snapshot_paths:
+        LOGGER.debug("Loading coverage snapshot '{}'".format(path))
+        snapshot_dict = CoverageData.read_snapshot_dict(path)
+
+        if not isinstance(snapshot_dict, dict) or \
+                snapshot_dict.get('version') != CoverageData.SNAPSHOT_VERSION:
+            msg = "'{}' is not a valid coverage snapshot".format(path)
+            raise ValueError(msg)
+
+        merged = snapshot_dict if merged is None else merge_snapshot_dicts(merged, snapshot_dict)
+
+    return merged
+
+
+def merge_pair(snapshot_dict_list):
+    """
+    Merge a list of one or two snapshot dicts.
+
+    Module-level so that it can be sent to worker processes.
+    """
+    if len(snapshot_dict_list) == 1:
+        return snapshot_dict_list[0]
+    else:
+        return merge_snapshot_dicts(*snapshot_dict_list)
+
+
+def merge_snapshot_dicts(first, second):
+    """
+    Return a snapshot dict combining `first` and `second`
+    (dicts created by `CoverageData.to_snapshot_dict()`).
+    A line is covered if it is covered in either snapshot.
+
+    `first` may be modified.
+    """
+    sources = first['sources']
+
+    for full_path, src_info in second['sources'].iteritems():
+        existing = sources.get(full_path)
+
+        if existing is None:
+            sources[full_path] = src_info
+
+        else:
+            existing['lines'] = _merge_line_lists(existing['lines'], src_info['lines'])
+
+            if existing.get('rel_path') is None:
+                existing['rel_path'] = src_info.get('rel_path')
+
+    first['suites'] = sorted(set(first['suites']) | set(second['suites']))
+    return first
+
+
+def _merge_line_lists(first, second):
+    """
+    Combine two lists of line data (None, 0 or 1 for each line).
+    Either list may be None, indicating no coverage information.
+    """
+    if first is None:
+        return second
+
+    if second is None:
+        return first
+
+    # Merge the shorter list into a copy of the longer one
+    if len(first) < len(second):
+        first, second = second, first
+
+    merged = list(first)
+
+    for line_num, value in enumerate(second):
+        if value is not None:
+            merged[line_num] = value if merged[line_num] is None else max(merged[line_num], value)
+
+    return merged
+
+
+def _split_list(items, num_chunks):
+    """
+    Split `items` into `num_chunks` contiguous, non-empty lists
+    of roughly equal size.
+    """
+    chunk_size, remainder = divmod(len(items), num_chunks)
+    chunks = []
+    start = 0
+
+    for index in range(num_chunks):
+        end = start + chunk_size + (1 if index < remainder else 0)
+        chunks.append(items[start:end])
+        start = end
+
+    return chunks
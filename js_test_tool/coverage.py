@@ -6,9 +6,16 @@ import subprocess
 import requests
 import logging
 import random
+import os
 import os.path
+import signal
 import threading
+import time
+import json
+import gzip
 from js_test_tool.util import retry
+from js_test_tool.source_store import SOURCE_STORE
+from js_test_tool.jscover_supervisor import write_pidfile, remove_pidfile, rss_bytes
 
 LOGGER = logging.getLogger(__name__)
 
@@ -37,10 +44,14 @@ class SrcInstrumenter(object):
     # Wait time between attempts
     WAIT_BETWEEN_ATTEMPTS = 0.4
 
+    # Number of seconds to wait for JSCover to exit
+    # after asking it to terminate, before killing it
+    STOP_TIMEOUT = 5
+
     # Keep track of used ports across classes
     used_ports = []
 
-    def __init__(self, root_dir, tool_path=None,
+    def __init__(self, root_dir, tool_path=None, jvm_options=None,
                  subprocess_module=subprocess, requests_module=requests):
         """
         Initialize the instrumenter to use the tool (JSCover) at
@@ -48,6 +59,9 @@ class SrcInstrumenter(object):
 
         `root_url` is the URL from which to interpret relative paths.
 
+        `jvm_options` is a list of options passed to the Java
+        virtual machine, such as the maximum heap size ("-Xmx1g").
+
         Makes the call to the tool using `subprocess_module`, which defaults
         to Python's `subprocess` module.  This can be overridden for testing.
 
@@ -56,12 +70,21 @@ class SrcInstrumenter(object):
         """
         self._root_dir = root_dir
         self._tool_path = tool_path
+        self._jvm_options = list(jvm_options or [])
         self._subprocess = subprocess_module
         self._requests = requests_module
 
         # Create a variables to store JSCover information
         self._port_num = None
         self._jscover = None
+        self._pidfile_path = None
+
+        # Port to try first when JSCover is restarted
+        self._preferred_port = None
+
+        # Serialize starting and stopping, which can happen
+        # concurrently when the supervisor restarts JSCover
+        self._lock = threading.RLock()
 
     def start(self):
         """
@@ -73,43 +96,97 @@ class SrcInstrumenter(object):
         number of trieds, it raises a `SrcInstrumenterError`.
         """
 
-        if self._jscover is None:
+        with self._lock:
 
-            try:
-                self._port_num, self._jscover = retry(
-                    self._start_jscover,
-                    self.MAX_START_ATTEMPTS,
-                    self.WAIT_BETWEEN_ATTEMPTS,
-                    fail_fast_errors=[OSError],
-                    name="Start JSCover"
-                )
-            except OSError:
-                msg = "Could not find JSCover JAR file at '{}'".format(self._tool_path)
-                raise SrcInstrumenterError(msg)
+            if self._jscover is None:
+
+                try:
+                    self._port_num, self._jscover = retry(
+                        self._start_jscover,
+                        self.MAX_START_ATTEMPTS,
+                        self.WAIT_BETWEEN_ATTEMPTS,
+                        fail_fast_errors=[OSError],
+                        name="Start JSCover"
+                    )
+                except OSError:
+                    msg = "Could not find JSCover JAR file at '{}'".format(self._tool_path)
+                    raise SrcInstrumenterError(msg)
+
+                except SrcInstrumenterError:
+                    msg = "Could not start JSCover, most likely due to port conflicts."
+                    raise SrcInstrumenterError(msg)
 
-            except SrcInstrumenterError:
-                msg = "Could not start JSCover, most likely due to port conflicts."
-                raise SrcInstrumenterError(msg)
+                # Record the process so it can be cleaned up
+                # if we are killed before we can stop it
+                self._pidfile_path = write_pidfile(self._jscover.pid)
 
     def stop(self):
         """
-        Stop the service.
+        Stop the service, waiting for the JSCover process
+        (and any processes it started) to exit.
         """
+        with self._lock:
 
-        # Terminate the JSCover service
-        if self._jscover is not None:
-            try:
-                self._jscover.terminate()
+            # Terminate the JSCover service
+            if self._jscover is not None:
+                try:
+                    self._terminate(self._jscover)
 
-            except OSError:
-                LOGGER.debug("Could not terminate JSCover instance.")
+                except OSError:
+                    LOGGER.debug("Could not terminate JSCover instance.")
 
-            finally:
-                self._jscover = None
+                finally:
+                    self._jscover = None
+                    remove_pidfile(self._pidfile_path)
+                    self._pidfile_path = None
 
-        else:
-            msg = "stop() called with no instance of JSCover running."
-            LOGGER.warning(msg)
+            else:
+                msg = "stop() called with no instance of JSCover running."
+                LOGGER.warning(msg)
+
+    def restart(self):
+        """
+        Stop the service (if it is running) and start it again.
+
+        We try to restart JSCover on the same port, since forked
+        page server processes have their own copy of the port.
+        """
+        with self._lock:
+            if self._jscover is not None:
+                self.stop()
+
+            self._preferred_port = self._port_num
+            self.start()
+
+    def is_running(self):
+        """
+        Return True if the JSCover process has been started
+        and has not exited.
+        """
+        process = self._jscover
+        return process is not None and process.poll() is None
+
+    def port(self):
+        """
+        Return the local port JSCover is listening on,
+        or None if it has not been started.
+        """
+        return self._port_num
+
+    def pid(self):
+        """
+        Return the process ID of JSCover, or None if it is not running.
+        """
+        process = self._jscover
+        return process.pid if process is not None else None
+
+    def rss_bytes(self):
+        """
+        Return the resident memory of the JSCover process in bytes,
+        or None if it is not running or the value is unavailable.
+        """
+        pid = self.pid()
+        return rss_bytes(pid) if pid is not None else None
 
     def instrumented_src(self, rel_path):
         """
@@ -172,17 +249,22 @@ class SrcInstrumenter(object):
         the `JSCover` server process.
         """
 
-        # Choose a random port.  If we get a conflict, we'll raise
-        # an exception and retry.
-        port_num = self._random_unused_port()
+        # Choose a random port (unless we are restarting).
+        # If we get a conflict, we'll raise an exception and retry.
+        port_num = self._preferred_port or self._random_unused_port()
+        self._preferred_port = None
 
         # Start JSCover
-        call = ['java', '-jar', self._tool_path, '-ws',
-                '--port={}'.format(port_num),
-                '--document-root={}'.format(self._root_dir)]
+        call = (['java'] + self._jvm_options +
+                ['-jar', self._tool_path, '-ws',
+                 '--port={}'.format(port_num),
+                 '--document-root={}'.format(self._root_dir)])
 
+        # Start JSCover in its own process group, so that stopping it
+        # also stops any processes it starts.
         process = self._subprocess.Popen(call, stdout=None,
-                                         stderr=self._subprocess.PIPE)
+                                         stderr=self._subprocess.PIPE,
+                                         preexec_fn=_new_process_group)
 
         # If JSCover has a port conflict, it will exit immediately
         # Check that this hasn't happened
@@ -199,6 +281,45 @@ class SrcInstrumenter(object):
         # Return the process information
         return (port_num, process)
 
+    def _terminate(self, process):
+        """
+        Ask the process group led by `process` to terminate, killing it
+        if it has not exited within `STOP_TIMEOUT` seconds, and reap it.
+        """
+        self._signal_group(process, signal.SIGTERM)
+
+        deadline = time.time() + self.STOP_TIMEOUT
+        while process.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
+
+        if process.poll() is None:
+            LOGGER.warning("JSCover did not exit; killing it.")
+            self._signal_group(process, getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+        # Reap the process so it does not linger as a zombie
+        process.wait()
+
+    @staticmethod
+    def _signal_group(process, sig):
+        """
+        Send `sig` to the process group led by `process`,
+        or to `process` alone if process groups are not supported.
+        """
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(process.pid, sig)
+                return
+
+            except OSError:
+                # The group may already be gone, or JSCover
+                # may not lead its own group
+                pass
+
+        if sig == signal.SIGTERM:
+            process.terminate()
+        else:
+            process.kill()
+
     def _get_src_from_jscover(self, rel_path):
         """
         Retrieve the instrumented JS source file at `rel_path`
@@ -223,10 +344,23 @@ class SrcInstrumenter(object):
             return response.text.decode('utf-8')
 
 
+def _new_process_group():
+    """
+    Make the calling (child) process the leader of a new process
+    group.  Used as the `preexec_fn` when starting JSCover.
+    """
+    if hasattr(os, 'setsid'):
+        os.setsid()
+
+
 class CoverageData(object):
     """
     Load coverage data from JSON.
     """
+
+    # Version of the snapshot format written by `write_snapshot()`
+    SNAPSHOT_VERSION = 1
+
     def __init__(self):
         """
         Initialize the coverage data instance.
@@ -245,6 +379,10 @@ class CoverageData(object):
         # Create a set to store the suite names we encounter
         self._suite_name_set = set()
 
+        # Cache the number of lines in expected sources
+        # that did not report coverage, so each is read at most once
+        self._num_lines_dict = dict()
+
     def add_suite_name(self, suite_name):
         """
         Record that we received information from the suite
@@ -368,6 +506,144 @@ class CoverageData(object):
                     else:
                         self._src_dict[full_path] = cover_dict
 
+    def merge(self, other):
+        """
+        Combine the coverage information in `other` (a `CoverageData`
+        instance) into this instance.  A line is considered covered
+        if it is covered in either instance.
+
+        This call is thread safe.
+        """
+        with self.LOAD_LOCK:
+
+            for full_path, other_dict in other._src_dict.iteritems():
+                self._rel_path_dict.setdefault(full_path, other._rel_path_dict.get(full_path))
+                existing_dict = self._src_dict.get(full_path)
+
+                if other_dict is None:
+                    self._src_dict.setdefault(full_path, None)
+
+                elif existing_dict is None:
+                    self._src_dict[full_path] = dict(other_dict)
+
+                else:
+                    for line_num, is_covered in other_dict.iteritems():
+                        existing_dict[line_num] = is_covered or existing_dict.get(line_num, False)
+
+            self._suite_name_set.update(other._suite_name_set)
+
+    def to_snapshot_dict(self):
+        """
+        Return a JSON-serializable dict representing this coverage data:
+
+            {
+                'version': SNAPSHOT_VERSION,
+                'suites': [SUITE_NAME, ...],
+                'sources': {
+                    FULL_PATH: {
+                        'rel_path': REL_PATH,
+                        'lines': [LINE_DATA, ...] | None
+                    }
+                }
+            }
+
+        `LINE_DATA` is None for lines with no coverage information,
+        1 for covered lines and 0 for uncovered lines (indexed by line number).
+        `lines` is None for expected sources with no coverage information.
+        """
+        sources = {}
+
+        for full_path, line_dict in self._src_dict.iteritems():
+
+            if line_dict is None:
+                line_list = None
+
+            else:
+                line_list = [None] * (max(line_dict.keys()) + 1 if line_dict else 0)
+                for line_num, is_covered in line_dict.iteritems():
+                    line_list[line_num] = 1 if is_covered else 0
+
+            sources[full_path] = {
+                'rel_path': self._rel_path_dict.get(full_path),
+                'lines': line_list
+            }
+
+        return {
+            'version': self.SNAPSHOT_VERSION,
+            'suites': self.suite_name_list(),
+            'sources': sources
+        }
+
+    @classmethod
+    def from_snapshot_dict(cls, snapshot_dict):
+        """
+        Create a `CoverageData` instance from a dict
+        created by `to_snapshot_dict()`.
+
+        Raises a `ValueError` if the dict is not a valid snapshot.
+        """
+        if not isinstance(snapshot_dict, dict):
+            raise ValueError("Coverage snapshot must be a dictionary")
+
+        if snapshot_dict.get('version') != cls.SNAPSHOT_VERSION:
+            msg = "Unsupported coverage snapshot version: {}".format(snapshot_dict.get('version'))
+            raise ValueError(msg)
+
+        data = cls()
+
+        for full_path, src_info in snapshot_dict.get('sources', {}).iteritems():
+            line_list = src_info.get('lines')
+
+            if line_list is None:
+                data._src_dict[full_path] = None
+            else:
+                data._src_dict[full_path] = {
+                    line_num: value > 0
+                    for line_num, value in enumerate(line_list)
+                    if value is not None
+                }
+
+            data._rel_path_dict[full_path] = src_info.get('rel_path')
+
+        data._suite_name_set.update(snapshot_dict.get('suites', []))
+        return data
+
+    def write_snapshot(self, path):
+        """
+        Write a gzip-compressed JSON snapshot of the coverage data
+        to `path`.  Load it again using `load_snapshot()`.
+        """
+        snapshot_file = gzip.open(path, 'wb')
+
+        try:
+            json.dump(self.to_snapshot_dict(), snapshot_file, separators=(',', ':'))
+        finally:
+            snapshot_file.close()
+
+    @classmethod
+    def load_snapshot(cls, path):
+        """
+        Load a `CoverageData` instance from the snapshot
+        written by `write_snapshot()` at `path`.
+
+        Raises an `IOError` if the file could not be read,
+        and a `ValueError` if it is not a valid snapshot.
+        """
+        return cls.from_snapshot_dict(cls.read_snapshot_dict(path))
+
+    @staticmethod
+    def read_snapshot_dict(path):
+        """
+        Read the snapshot at `path` and return the decoded
+        (but not validated) dict.
+        """
+        snapshot_file = gzip.open(path, 'rb')
+
+        try:
+            return json.load(snapshot_file)
+        finally:
+            snapshot_file.close()
+
     def src_list(self):
         """
         Return the list of source files for which we have coverage
@@ -404,11 +680,11 @@ class CoverageData(object):
             # Report the source as completely uncovered.
             if coverage_data is None:
 
-                # self.num_file_lines() is guaranteed to return an integer
-                # If the file isn't found, it returns 0, so coverage_data
+                # The number of lines is guaranteed to be an integer
+                # If the file isn't found, it is 0, so coverage_data
                 # will be an empty dict.
                 coverage_data = {line_num: False for line_num
-                                 in range(self.num_file_lines(full_src_path))}
+                                 in range(self._expected_num_lines(full_src_path))}
 
             return coverage_data
 
@@ -427,6 +703,27 @@ class CoverageData(object):
         """
         return self._rel_path_dict.get(full_src_path)
 
+    def line_counts_for_src(self, full_src_path):
+        """
+        Return a tuple `(lines_covered, lines_measured)` for the
+        source file at `full_src_path`, counted from the in-memory
+        line data (without reading the source file, unless it is
+        an expected source that reported no coverage).
+
+        Returns `None` if the source is not in our source list.
+        """
+        if full_src_path not in self._src_dict:
+            return None
+
+        line_dict = self._src_dict[full_src_path]
+
+        if line_dict is None:
+            return (0, self._expected_num_lines(full_src_path))
+
+        else:
+            lines_covered = sum(1 for is_covered in line_dict.itervalues() if is_covered)
+            return (lines_covered, len(line_dict))
+
     def total_coverage(self):
         """
         Return a decimal in the range [0.0, 1.0] indicating
@@ -438,20 +735,11 @@ class CoverageData(object):
         lines_measured = 0
 
         for src_path in self.src_list():
+            src_covered, src_measured = self.line_counts_for_src(src_path)
+            lines_covered += src_covered
+            lines_measured += src_measured
 
-            # `line_dict` has keys that are line numbers
-            # and values that are True/False indicating
-            # whether that line is covered.
-            line_dict = self.line_dict_for_src(src_path)
-            lines_covered += sum([1 if is_covered else 0
-                                  for is_covered in line_dict.values()])
-            lines_measured += len(line_dict.items())
-
-        if lines_measured > 0:
-            return float(lines_covered) / lines_measured
-
-        else:
-            return None
+        return self._ratio(lines_covered, lines_measured)
 
     def coverage_for_src(self, full_src_path):
         """
@@ -461,16 +749,54 @@ class CoverageData(object):
         Returns `None` if no coverage information available
         for `full_src_path`.
         """
-        line_dict = self.line_dict_for_src(full_src_path)
+        line_counts = self.line_counts_for_src(full_src_path)
 
-        if line_dict is None:
+        if line_counts is None:
             return None
 
         else:
-            lines_covered = sum([1 if is_covered else 0
-                                 for is_covered in line_dict.values()])
-
-            return float(lines_covered) / len(line_dict)
+            return self._ratio(*line_counts)
+
+    def summary_dict(self):
+        """
+        Return a JSON-serializable dict summarizing coverage,
+        computed from the line counts (no source text is read
+        or rendered):
+
+            {
+                'total_coverage': TOTAL_COVERAGE (decimal or None),
+                'lines_covered': LINES_COVERED,
+                'lines_measured': LINES_MEASURED,
+                'files': {
+                    REL_PATH: {
+                        'src_coverage': SRC_COVERAGE (decimal or None),
+                        'lines_covered': LINES_COVERED,
+                        'lines_measured': LINES_MEASURED
+                    }
+                }
+            }
+        """
+        file_dict = {}
+        total_covered = 0
+        total_measured = 0
+
+        for full_path in self.src_list():
+            lines_covered, lines_measured = self.line_counts_for_src(full_path)
+            total_covered += lines_covered
+            total_measured += lines_measured
+
+            file_dict[self.rel_src_path(full_path)] = {
+                'src_coverage': self._ratio(lines_covered, lines_measured),
+                'lines_covered': lines_covered,
+                'lines_measured': lines_measured,
+            }
+
+        return {
+            'total_coverage': self._ratio(total_covered, total_measured),
+            'lines_covered': total_covered,
+            'lines_measured': total_measured,
+            'files': file_dict,
+        }
 
     def suite_name_list(self):
         """
@@ -479,19 +805,35 @@ class CoverageData(object):
         """
         return sorted([name for name in self._suite_name_set])
 
+    def _expected_num_lines(self, full_src_path):
+        """
+        Return the number of lines in the expected source
+        at `full_src_path`, reading the file only the first time.
+        """
+        if full_src_path not in self._num_lines_dict:
+            self._num_lines_dict[full_src_path] = self.num_file_lines(full_src_path)
+
+        return self._num_lines_dict[full_src_path]
+
+    @staticmethod
+    def _ratio(lines_covered, lines_measured):
+        """
+        Return `lines_covered / lines_measured` as a decimal,
+        or None if no lines were measured.
+        """
+        if lines_measured > 0:
+            return float(lines_covered) / lines_measured
+        else:
+            return None
+
     @staticmethod
     def num_file_lines(file_path):
         """
         Returns the number of lines in the file
         at `file_path`.  If the file does not exist,
         returns 0.
+
+        The file is read through the shared source store,
+        so reporters can reuse its contents.
         """
-        try:
-            with open(file_path) as file_handle:
-                lines = file_handle.readlines()
-                return len(lines)
-
-        # If the file could not be accessed, treat
-        # it as a file with 0 lines.
-        except IOError:
-            return 0
+        return SOURCE_STORE.num_lines(file_path)
@@ -0,0 +1,394 @@
+"""
+Store coverage information from each run in a SQLite database,
+so that coverage trends can be queried without re-parsing reports.
+"""
+
+import sqlite3
+import json
+import time
+from array import array
+from js_test_tool.coverage_report import BaseCoverageReporter
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+class CoverageDatabase(object):
+    """
+    Persistent store of coverage data, one row per test run.
+
+    Line coverage for each source file is stored as a blob
+    containing one byte per line:
+
+        * 0: No coverage information (e.g. a comment)
+        * 1: The line is not covered
+        * 2: The line is covered
+    """
+
+    LINE_NOT_MEASURED = 0
+    LINE_UNCOVERED = 1
+    LINE_COVERED = 2
+
+    # Maximum number of parameters to bind in one query,
+    # below SQLite's default limit of 999
+    MAX_QUERY_PARAMS = 500
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp REAL NOT NULL,
+            total_coverage REAL,
+            lines_covered INTEGER NOT NULL,
+            lines_measured INTEGER NOT NULL,
+            metadata TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS file_coverage (
+            run_id INTEGER NOT NULL REFERENCES runs(id),
+            file_id INTEGER NOT NULL REFERENCES files(id),
+            lines_covered INTEGER NOT NULL,
+            lines_measured INTEGER NOT NULL,
+            line_data BLOB NOT NULL,
+            PRIMARY KEY (run_id, file_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS suites (
+            run_id INTEGER NOT NULL REFERENCES runs(id),
+            name TEXT NOT NULL,
+            PRIMARY KEY (run_id, name)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS browsers (
+            run_id INTEGER NOT NULL REFERENCES runs(id),
+            name TEXT NOT NULL,
+            PRIMARY KEY (run_id, name)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS runs_timestamp_idx ON runs (timestamp)",
+        "CREATE INDEX IF NOT EXISTS file_coverage_file_idx ON file_coverage (file_id, run_id)",
+    ]
+
+    def __init__(self, db_path, sqlite_module=sqlite3):
+        """
+        Open (or create) the coverage database at `db_path`.
+
+        `sqlite_module` defaults to Python's `sqlite3` module,
+        but can be overridden for testing.
+        """
+        self._sqlite = sqlite_module
+        self._conn = self._sqlite.connect(db_path)
+        self._conn.row_factory = self._sqlite.Row
+        self._create_schema()
+
+    def close(self):
+        """
+        Close the connection to the database.
+        """
+        self._conn.close()
+
+    def record_run(self, coverage_data, browser_names=None,
+                   metadata=None, timestamp=None):
+        """
+        Store `coverage_data` (a `CoverageData` instance) as a new run.
+
+        `browser_names` is the list of browsers the tests ran under.
+        `metadata` is an optional JSON-serializable dict stored with the run.
+        `timestamp` defaults to the current time (seconds since the epoch).
+
+        All rows are written in a single transaction.
+        Returns the ID of the new run.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        # Build the per-file rows before touching the database,
+        # so the transaction is as short as possible.
+        file_rows = []
+        total_covered = 0
+        total_measured = 0
+
+        for full_path in coverage_data.src_list():
+            line_dict = coverage_data.line_dict_for_src(full_path)
+            num_covered = sum(1 for is_covered in line_dict.values() if is_covered)
+            num_measured = len(line_dict)
+
+            total_covered += num_covered
+            total_measured += num_measured
+
+            file_rows.append((
+                coverage_data.rel_src_path(full_path),
+                num_covered, num_measured,
+                self._encode_line_data(line_dict)
+            ))
+
+        if total_measured > 0:
+            total_coverage = float(total_covered) / total_measured
+        else:
+            total_coverage = None
+
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO runs (timestamp, total_coverage, lines_covered, "
+                "lines_measured, metadata) VALUES (?, ?, ?, ?, ?)",
+                (timestamp, total_coverage, total_covered, total_measured,
+                 json.dumps(metadata) if metadata is not None else None)
+            )
+            run_id = cursor.lastrowid
+
+            # Make sure every source path has a row in the files table
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO files (path) VALUES (?)",
+                [(path,) for path, _, _, _ in file_rows]
+            )
+            file_ids = self._file_ids([path for path, _, _, _ in file_rows])
+
+            self._conn.executemany(
+                "INSERT INTO file_coverage (run_id, file_id, lines_covered, "
+                "lines_measured, line_data) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, file_ids[path], num_covered, num_measured, blob)
+                 for path, num_covered, num_measured, blob in file_rows]
+            )
+
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO suites (run_id, name) VALUES (?, ?)",
+                [(run_id, name) for name in coverage_data.suite_name_list()]
+            )
+
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO browsers (run_id, name) VALUES (?, ?)",
+                [(run_id, name) for name in (browser_names or [])]
+            )
+
+        return run_id
+
+    def coverage_trend(self, limit=None):
+        """
+        Return a list of dicts describing total coverage for each run,
+        oldest first:
+
+            {
+                'run_id': RUN_ID,
+                'timestamp': TIMESTAMP,
+                'total_coverage': TOTAL_COVERAGE (decimal or None),
+                'lines_covered': LINES_COVERED,
+                'lines_measured': LINES_MEASURED
+            }
+
+        If `limit` is specified, return only the most recent `limit` runs.
+        """
+        query = ("SELECT id, timestamp, total_coverage, lines_covered, "
+                 "lines_measured FROM runs ORDER BY timestamp DESC, id DESC")
+        rows = self._conn.execute(*self._limit_query(query, limit)).fetchall()
+
+        return [{
+            'run_id': row['id'],
+            'timestamp': row['timestamp'],
+            'total_coverage': row['total_coverage'],
+            'lines_covered': row['lines_covered'],
+            'lines_measured': row['lines_measured'],
+        } for row in reversed(rows)]
+
+    def file_history(self, rel_path, limit=None):
+        """
+        Return a list of dicts describing the coverage of the source
+        file reported as `rel_path` in each run that included it,
+        oldest first:
+
+            {
+                'run_id': RUN_ID,
+                'timestamp': TIMESTAMP,
+                'src_coverage': SRC_COVERAGE (decimal or None),
+                'lines_covered': LINES_COVERED,
+                'lines_measured': LINES_MEASURED
+            }
+
+        If `limit` is specified, return only the most recent `limit` runs.
+        """
+        query = ("SELECT runs.id, runs.timestamp, file_coverage.lines_covered, "
+                 "file_coverage.lines_measured "
+                 "FROM file_coverage "
+                 "JOIN files ON files.id = file_coverage.file_id "
+                 "JOIN runs ON runs.id = file_coverage.run_id "
+                 "WHERE files.path = ? "
+                 "ORDER BY runs.timestamp DESC, runs.id DESC")
+        rows = self._conn.execute(
+            *self._limit_query(query, limit, (rel_path,))
+        ).fetchall()
+
+        return [{
+            'run_id': row['id'],
+            'timestamp': row['timestamp'],
+            'src_coverage': self._ratio(row['lines_covered'], row['lines_measured']),
+            'lines_covered': row['lines_covered'],
+            'lines_measured': row['lines_measured'],
+        } for row in reversed(rows)]
+
+    def line_dict_for_run(self, run_id, rel_path):
+        """
+        Return the line coverage dict (line numbers mapped to True/False)
+        for the source reported as `rel_path` in the run with `run_id`.
+
+        Returns None if the run did not include the source.
+        """
+        row = self._conn.execute(
+            "SELECT file_coverage.line_data FROM file_coverage "
+            "JOIN files ON files.id = file_coverage.file_id "
+            "WHERE file_coverage.run_id = ? AND files.path = ?",
+            (run_id, rel_path)
+        ).fetchone()
+
+        if row is None:
+            return None
+        else:
+            return self._decode_line_data(row['line_data'])
+
+    def suite_names_for_run(self, run_id):
+        """
+        Return the sorted list of suite names that reported coverage
+        in the run with `run_id`.
+        """
+        rows = self._conn.execute(
+            "SELECT name FROM suites WHERE run_id = ? ORDER BY name", (run_id,)
+        ).fetchall()
+        return [row['name'] for row in rows]
+
+    def browser_names_for_run(self, run_id):
+        """
+        Return the sorted list of browser names used in the run with `run_id`.
+        """
+        rows = self._conn.execute(
+            "SELECT name FROM browsers WHERE run_id = ? ORDER BY name", (run_id,)
+        ).fetchall()
+        return [row['name'] for row in rows]
+
+    def _create_schema(self):
+        """
+        Create the tables and indices if they do not already exist.
+        """
+        with self._conn:
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def _file_ids(self, path_list):
+        """
+        Return a dict mapping each path in `path_list` to its ID
+        in the files table.
+
+        Looks up only those paths (using the unique index on paths),
+        in batches of at most `MAX_QUERY_PARAMS`, so the cost does not
+        grow with the number of files recorded in earlier runs.
+        """
+        path_list = sorted(set(path_list))
+        file_ids = {}
+
+        for start in range(0, len(path_list), self.MAX_QUERY_PARAMS):
+            batch = path_list[start:start + self.MAX_QUERY_PARAMS]
+            rows = self._conn.execute(
+                "SELECT id, path FROM files WHERE path IN ({})".format(
+                    ", ".join("?" * len(batch))
+                ),
+                batch
+            ).fetchall()
+            file_ids.update((row['path'], row['id']) for row in rows)
+
+        return file_ids
+
+    @staticmethod
+    def _limit_query(query, limit, params=()):
+        """
+        Return a `(query, params)` tuple, adding a LIMIT clause
+        to `query` if `limit` is not None.
+        """
+        if limit is not None:
+            return (query + " LIMIT ?", tuple(params) + (limit,))
+        else:
+            return (query, tuple(params))
+
+    @staticmethod
+    def _ratio(num_covered, num_measured):
+        """
+        Return `num_covered / num_measured` as a decimal,
+        or None if no lines were measured.
+        """
+        if num_measured > 0:
+            return float(num_covered) / num_measured
+        else:
+            return None
+
+    @classmethod
+    def _encode_line_data(cls, line_dict):
+        """
+        Encode `line_dict` (line numbers mapped to True/False)
+        as a blob with one byte per line.
+        """
+        num_lines = max(line_dict.keys()) + 1 if line_dict else 0
+        line_array = array('B', [cls.LINE_NOT_MEASURED]) * num_lines
+
+        for line_num, is_covered in line_dict.iteritems():
+            line_array[line_num] = cls.LINE_COVERED if is_covered else cls.LINE_UNCOVERED
+
+        return sqlite3.Binary(line_array.tostring())
+
+    @classmethod
+    def _decode_line_data(cls, blob):
+        """
+        Decode a blob created by `_encode_line_data()` back into
+        a dict mapping line numbers to True/False.
+        """
+        line_array = array('B')
+        line_array.fromstring(str(blob))
+
+        return {line_num: value == cls.LINE_COVERED
+                for line_num, value in enumerate(line_array)
+                if value != cls.LINE_NOT_MEASURED}
+
+
+class DatabaseCoverageReporter(BaseCoverageReporter):
+    """
+    Record coverage data in a `CoverageDatabase`
+    instead of rendering a report.
+    """
+
+    def __init__(self, output_path, browser_names=None, metadata=None):
+        """
+        Initialize the reporter to record runs in the SQLite
+        database at `output_path`.
+
+        `browser_names` and `metadata` are stored with each run
+        (see `CoverageDatabase.record_run()`).
+        """
+        super(DatabaseCoverageReporter, self).__init__(output_path)
+        self._browser_names = browser_names
+        self._metadata = metadata
+
+    def write_report(self, coverage_data):
+        """
+        Record `coverage_data` (a `CoverageData` instance) as a new run.
+        """
+        database = CoverageDatabase(self._output_path)
+
+        try:
+            run_id = database.record_run(coverage_data,
+                                         browser_names=self._browser_names,
+                                         metadata=self._metadata)
+            LOGGER.debug("Recorded coverage run {} in '{}'".format(run_id, self._output_path))
+
+        finally:
+            database.close()
+
+    def generate_report(self, coverage_data):
+        """
+        The database reporter writes rows rather than a text report,
+        so there is nothing to render.
+        """
+        return u""
@@ -3,7 +3,21 @@ Report coverage information in different formats.
 """
 
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from io import BytesIO
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
 from jinja2 import Environment, PackageLoader
+from lxml import etree
+from js_test_tool.source_store import SOURCE_STORE
+
+import logging
+LOGGER = logging.getLogger(__name__)
 
 # Set up the template environment
 TEMPLATE_LOADER = PackageLoader(__package__)
@@ -119,19 +133,45 @@ class TemplateCoverageReporter(BaseCoverageReporter):
 
         Returns the lines as UTF-8 unicode strings.
         """
+        return SOURCE_STORE.lines(path)
 
-        try:
-            with open(path) as file_handle:
-                lines = file_handle.readlines()
 
-        except IOError:
-            return None
+class SnapshotCoverageReporter(BaseCoverageReporter):
+    """
+    Write a coverage snapshot that can later be combined
+    with snapshots from other runs.
+    """
+
+    def write_report(self, coverage_data):
+        """
+        Write a snapshot of `coverage_data` (a `CoverageData` instance)
+        to the path specified in the constructor.
+        """
+        coverage_data.write_snapshot(self._output_path)
+
+    def generate_report(self, coverage_data):
+        """
+        Snapshots are written directly by `CoverageData`,
+        so there is nothing to render.
+        """
+        return u""
+
 
-        # Strip the lines of newline chars
-        lines = [line.strip('\n') for line in lines]
+class SummaryCoverageReporter(BaseCoverageReporter):
+    """
+    Write a JSON summary of total and per-file coverage.
 
-        # Decode the unicode lines
-        return [line.decode('utf8') for line in lines]
+    The summary is computed from the in-memory line counts,
+    without reading source files or rendering templates.
+    """
+
+    def generate_report(self, coverage_data):
+        """
+        Return the summary (see `CoverageData.summary_dict()`)
+        as a JSON unicode string.
+        """
+        return unicode(json.dumps(coverage_data.summary_dict(),
+                                  indent=4, sort_keys=True))
 
 
 class HtmlCoverageReporter(TemplateCoverageReporter):
@@ -142,9 +182,573 @@ class HtmlCoverageReporter(TemplateCoverageReporter):
     TEMPLATE_NAME = "coverage_html_report.html"
 
 
-class XmlCoverageReporter(TemplateCoverageReporter):
+class HtmlDirCoverageReporter(BaseCoverageReporter):
+    """
+    Generate a directory-style HTML coverage report:
+    an index page summarizing each source file,
+    plus one page per source file.
+
+    Source pages are rendered in parallel by a pool of processes.
+
+    A manifest in the output directory records a hash of each
+    page's source text and coverage, so that subsequent reports
+    only re-render the pages that changed (plus the index).
+    """
+
+    INDEX_TEMPLATE_NAME = "coverage_html_index.html"
+    SRC_TEMPLATE_NAME = "coverage_html_src.html"
+    INDEX_NAME = "index.html"
+    MANIFEST_NAME = "manifest.json"
+    MANIFEST_VERSION = 1
+
+    def __init__(self, output_path, num_processes=None,
+                 pool_class=multiprocessing.Pool):
+        """
+        Initialize the reporter to write the report
+        to the directory at `output_path`.
+
+        Source pages are rendered by `num_processes` worker
+        processes (default is one per CPU).
+
+        `pool_class` defaults to `multiprocessing.Pool`, but can be
+        overridden for testing.
+        """
+        super(HtmlDirCoverageReporter, self).__init__(output_path)
+        self._num_processes = num_processes
+        self._pool_class = pool_class
+
+    def write_report(self, coverage_data):
+        """
+        Write the index and source pages for `coverage_data`
+        (a `CoverageData` instance) to the output directory,
+        creating it if necessary.
+
+        Source pages whose source text and coverage are unchanged
+        since the last report (according to the manifest) are kept;
+        pages for sources no longer in the report are deleted.
+        """
+        start_time = time.time()
+
+        if not os.path.isdir(self._output_path):
+            os.makedirs(self._output_path)
+
+        old_manifest = self._load_manifest()
+        new_manifest = {}
+
+        src_list = sorted(coverage_data.src_list(), key=coverage_data.rel_src_path)
+        page_names = self._page_names([coverage_data.rel_src_path(path)
+                                       for path in src_list])
+
+        summaries = []
+        tasks = []
+        src_text_dict = {}
+
+        for full_path, page_name in zip(src_list, page_names):
+            line_dict = coverage_data.line_dict_for_src(full_path)
+            num_covered = sum(1 for is_covered in line_dict.values() if is_covered)
+            num_measured = len(line_dict)
+
+            summary = {
+                'rel_path': coverage_data.rel_src_path(full_path),
+                'page_name': page_name,
+                'lines_covered': num_covered,
+                'lines_measured': num_measured,
+                'src_coverage': (float(num_covered) / num_measured
+                                 if num_measured > 0 else None),
+            }
+            summaries.append(summary)
+
+            # Decide whether the page needs to be rendered again
+            old_entry = old_manifest.get(page_name, {})
+            entry = self._src_fingerprint(full_path, old_entry, src_text_dict)
+            entry['coverage_hash'] = self._coverage_hash(summary['rel_path'], line_dict)
+            new_manifest[page_name] = entry
+
+            is_unchanged = (
+                entry['src_hash'] == old_entry.get('src_hash') and
+                entry['coverage_hash'] == old_entry.get('coverage_hash') and
+                os.path.exists(os.path.join(self._output_path, page_name))
+            )
+
+            if not is_unchanged:
+                tasks.append((full_path, summary, line_dict))
+
+        # Read the sources we still need (those whose fingerprint
+        # could be reused without reading the file)
+        for full_path, _, _ in tasks:
+            if full_path not in src_text_dict:
+                src_text_dict[full_path] = _read_src_text(full_path)
+
+        self._render_src_pages(tasks, src_text_dict)
+        self._delete_stale_pages(old_manifest, new_manifest)
+        self._write_manifest(new_manifest)
+
+        LOGGER.debug("Rendered {} of {} coverage source pages".format(
+            len(tasks), len(src_list)))
+
+        self._write_page(self.INDEX_NAME, self.INDEX_TEMPLATE_NAME, {
+            'sources': summaries,
+            'total_coverage': coverage_data.total_coverage(),
+            'generation_sec': time.time() - start_time,
+        })
+
+    def generate_report(self, coverage_data):
+        """
+        The report is a directory of pages rather than
+        a single document, so there is nothing to render.
+        """
+        return u""
+
+    def _render_src_pages(self, tasks, src_text_dict):
+        """
+        Render a page for each `(full_path, summary, line_dict)` tuple
+        in `tasks`.
+
+        `src_text_dict` maps source paths to their pre-loaded text.
+        It is shared with the worker processes when the pool starts,
+        so that each task only needs to carry the coverage
+        for its own file.
+        """
+        if len(tasks) == 0:
+            return
+
+        init_args = (src_text_dict, self._output_path)
+
+        num_processes = self._num_processes
+        if num_processes is None:
+            num_processes = multiprocessing.cpu_count()
+
+        # Don't bother starting processes for a single worker
+        if num_processes <= 1 or len(tasks) <= 1:
+            _init_src_page_worker(*init_args)
+
+            try:
+                for task in tasks:
+                    _write_src_page(task)
+            finally:
+                _init_src_page_worker({}, None)
+
+        else:
+            pool = self._pool_class(min(num_processes, len(tasks)),
+                                    _init_src_page_worker, init_args)
+            try:
+                pool.map(_write_src_page, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+        LOGGER.debug("Wrote {} coverage source pages to '{}'".format(
+            len(tasks), self._output_path))
+
+    def _load_manifest(self):
+        """
+        Return the page entries from the manifest written by the
+        previous report, or an empty dict if there is no usable manifest.
+        """
+        manifest_path = os.path.join(self._output_path, self.MANIFEST_NAME)
+
+        try:
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+
+        except (IOError, ValueError):
+            return {}
+
+        # Pages rendered with a different template must be re-rendered
+        if not isinstance(manifest, dict) or \
+                manifest.get('version') != self.MANIFEST_VERSION or \
+                manifest.get('template_hash') != self._template_hash():
+            return {}
+
+        return manifest.get('pages', {})
+
+    def _write_manifest(self, page_dict):
+        """
+        Write the manifest describing the pages in `page_dict`.
+        """
+        manifest_path = os.path.join(self._output_path, self.MANIFEST_NAME)
+
+        with open(manifest_path, 'w') as manifest_file:
+            json.dump({
+                'version': self.MANIFEST_VERSION,
+                'template_hash': self._template_hash(),
+                'pages': page_dict,
+            }, manifest_file, sort_keys=True)
+
+    def _delete_stale_pages(self, old_manifest, new_manifest):
+        """
+        Delete pages listed in `old_manifest` but not in `new_manifest`.
+        """
+        for page_name in set(old_manifest) - set(new_manifest):
+            try:
+                os.remove(os.path.join(self._output_path, page_name))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _src_fingerprint(full_path, old_entry, src_text_dict):
+        """
+        Return a manifest entry with the size, modification time and
+        hash of the source at `full_path`.
+
+        If the size and modification time match `old_entry`, the
+        previous hash is reused without reading the file.  Otherwise
+        the file is read, and its text is added to `src_text_dict`
+        so it does not need to be read again for rendering.
+        """
+        try:
+            stat = os.stat(full_path)
+            stat_key = [stat.st_size, stat.st_mtime]
+
+        except OSError:
+            return {'stat': None, 'src_hash': None}
+
+        if old_entry.get('stat') == stat_key and old_entry.get('src_hash'):
+            return {'stat': stat_key, 'src_hash': old_entry['src_hash']}
+
+        src_text = _read_src_text(full_path)
+        src_text_dict[full_path] = src_text
+
+        if src_text is None:
+            src_hash = None
+        else:
+            src_hash = hashlib.sha1(src_text.encode('utf8')).hexdigest()
+
+        return {'stat': stat_key, 'src_hash': src_hash}
+
+    @staticmethod
+    def _coverage_hash(rel_path, line_dict):
+        """
+        Return a hash of the coverage shown on a source page.
+        """
+        line_list = sorted(line_dict.iteritems())
+        return hashlib.sha1(json.dumps([rel_path, line_list])).hexdigest()
+
+    @classmethod
+    def _template_hash(cls):
+        """
+        Return a hash of the source page template.
+        """
+        template_src, _, _ = TEMPLATE_LOADER.get_source(TEMPLATE_ENV, cls.SRC_TEMPLATE_NAME)
+        return hashlib.sha1(template_src.encode('utf8')).hexdigest()
+
+    def _write_page(self, page_name, template_name, context):
+        """
+        Render `template_name` with `context` and write the result
+        to `page_name` in the output directory.
+        """
+        _write_template(os.path.join(self._output_path, page_name),
+                        template_name, context)
+
+    @classmethod
+    def _page_names(cls, rel_path_list):
+        """
+        Return a unique page file name for each path in `rel_path_list`.
+        """
+        page_names = []
+        used_names = set([cls.INDEX_NAME])
+
+        for rel_path in rel_path_list:
+            base_name = re.sub(r'[^\w.-]', '_', rel_path)
+            page_name = base_name + '.html'
+            suffix = 1
+
+            while page_name in used_names:
+                page_name = '{}_{}.html'.format(base_name, suffix)
+                suffix += 1
+
+            used_names.add(page_name)
+            page_names.append(page_name)
+
+        return page_names
+
+
+class LcovCoverageReporter(BaseCoverageReporter):
+    """
+    Generate an LCOV tracefile.
+
+    Records are streamed to the output file one source
+    file at a time, so memory use does not grow with
+    the number of source files.
+    """
+
+    def write_report(self, coverage_data):
+        """
+        Stream the report for `coverage_data` (a `CoverageData` instance)
+        to the path specified in the constructor.
+        Overwrites the file if it already exists.
+        """
+        with open(self._output_path, 'w') as output_file:
+            self.stream_report(coverage_data, output_file)
+
+    def generate_report(self, coverage_data):
+        """
+        Return the report as a unicode string.
+
+        This holds the whole report in memory;
+        `write_report()` streams it instead.
+        """
+        output = BytesIO()
+        self.stream_report(coverage_data, output)
+        return output.getvalue().decode('utf8')
+
+    def stream_report(self, coverage_data, output_file):
+        """
+        Write an `SF`/`DA`/`LF`/`LH` record for each source
+        in `coverage_data` to `output_file` (a file-like object
+        opened for writing bytes).
+
+        Line numbers are reported as in the Cobertura XML report.
+        """
+        src_list = sorted(coverage_data.src_list(), key=coverage_data.rel_src_path)
+
+        for full_path in src_list:
+            rel_path = coverage_data.rel_src_path(full_path)
+            line_list = sorted(coverage_data.line_dict_for_src(full_path).iteritems())
+            num_covered = 0
+
+            record = [u"TN:\n", u"SF:{}\n".format(rel_path)]
+
+            for line_num, is_covered in line_list:
+                record.append(u"DA:{},{}\n".format(line_num, 1 if is_covered else 0))
+                num_covered += 1 if is_covered else 0
+
+            record.append(u"LF:{}\n".format(len(line_list)))
+            record.append(u"LH:{}\n".format(num_covered))
+            record.append(u"end_of_record\n")
+
+            output_file.write(u"".join(record).encode('utf8'))
+
+
+class XmlCoverageReporter(BaseCoverageReporter):
     """
-    Generate an XML coverage report.
+    Generate a Cobertura XML coverage report.
+
+    The report is streamed to the output file one `<class>`
+    element at a time, so memory use does not grow with
+    the number of source files.
     """
 
-    TEMPLATE_NAME = "coverage_xml_report.xml"
+    DOCTYPE = ("<!DOCTYPE coverage\n"
+               "  SYSTEM 'http://cobertura.sourceforge.net/xml/coverage-03.dtd'>")
+
+    def __init__(self, output_path, compress=None):
+        """
+        Initialize the reporter to write reports to `output_path`.
+
+        If `compress` is True, gzip the report as it is written.
+        By default, the report is compressed if `output_path`
+        ends with ".gz".
+        """
+        super(XmlCoverageReporter, self).__init__(output_path)
+
+        if compress is None:
+            compress = output_path.endswith('.gz')
+
+        self._compress = compress
+
+    def write_report(self, coverage_data):
+        """
+        Stream the report for `coverage_data` (a `CoverageData` instance)
+        to the path specified in the constructor.
+        Overwrites the file if it already exists.
+        """
+        if self._compress:
+            output_file = gzip.open(self._output_path, 'wb')
+        else:
+            output_file = open(self._output_path, 'wb')
+
+        try:
+            self.stream_report(coverage_data, output_file)
+        finally:
+            output_file.close()
+
+    def generate_report(self, coverage_data):
+        """
+        Return the report as a unicode string.
+
+        This holds the whole report in memory;
+        `write_report()` streams it instead.
+        """
+        output = BytesIO()
+        self.stream_report(coverage_data, output)
+        return output.getvalue().decode('utf8')
+
+    def stream_report(self, coverage_data, output_file):
+        """
+        Write the report for `coverage_data` to `output_file`
+        (a file-like object opened for writing bytes).
+        """
+        src_list = sorted(coverage_data.src_list(), key=coverage_data.rel_src_path)
+        total_rate = self._rate(coverage_data.total_coverage()) if src_list else "0"
+
+        with etree.xmlfile(output_file, encoding='utf-8') as xml_file:
+            xml_file.write_declaration()
+            xml_file.write_doctype(self.DOCTYPE)
+
+            with xml_file.element('coverage', self._attrs(
+                    ('branch-rate', '0'), ('line-rate', total_rate),
+                    ('timestamp', ''), ('version', ''))):
+
+                xml_file.write('\n    ')
+
+                with xml_file.element('packages'):
+                    if src_list:
+                        xml_file.write('\n        ')
+                        self._write_package(xml_file, coverage_data, src_list, total_rate)
+                        xml_file.write('\n    ')
+
+                xml_file.write('\n')
+
+    def _write_package(self, xml_file, coverage_data, src_list, total_rate):
+        """
+        Write a single `<package>` containing one `<class>`
+        for each source file in `src_list`.
+        """
+        with xml_file.element('package', self._attrs(
+                ('branch-rate', '0'), ('complexity', '0'),
+                ('line-rate', total_rate), ('name', 'javascript'))):
+
+            xml_file.write('\n            ')
+
+            with xml_file.element('classes'):
+                for full_path in src_list:
+                    xml_file.write('\n                ')
+                    self._write_class(xml_file, coverage_data, full_path)
+
+                xml_file.write('\n            ')
+
+            xml_file.write('\n        ')
+
+    def _write_class(self, xml_file, coverage_data, full_path):
+        """
+        Write the `<class>` element for the source at `full_path`,
+        then flush it so it does not accumulate in memory.
+        """
+        rel_path = coverage_data.rel_src_path(full_path)
+        line_list = sorted(coverage_data.line_dict_for_src(full_path).iteritems())
+        num_covered = sum(1 for _, is_covered in line_list if is_covered)
+
+        if line_list:
+            src_rate = self._rate(float(num_covered) / len(line_list))
+        else:
+            src_rate = "0"
+
+        class_elem = etree.Element('class', self._attrs(
+            ('branch-rate', '0'), ('complexity', '0'),
+            ('filename', rel_path), ('line-rate', src_rate),
+            ('name', rel_path)))
+        class_elem.text = '\n                    '
+
+        methods_elem = etree.SubElement(class_elem, 'methods')
+        methods_elem.tail = '\n                    '
+
+        lines_elem = etree.SubElement(class_elem, 'lines')
+        lines_elem.tail = '\n                '
+
+        if line_list:
+            lines_elem.text = '\n                        '
+
+            for line_num, is_covered in line_list:
+                line_elem = etree.SubElement(lines_elem, 'line', self._attrs(
+                    ('hits', '1' if is_covered else '0'),
+                    ('number', str(line_num))))
+                line_elem.tail = '\n                        '
+
+            line_elem.tail = '\n                    '
+
+        xml_file.write(class_elem)
+        xml_file.flush()
+
+    @staticmethod
+    def _attrs(*pairs):
+        """
+        Return an ordered attribute dict, so that attributes
+        are written in a stable order.
+        """
+        return OrderedDict(pairs)
+
+    @staticmethod
+    def _rate(coverage):
+        """
+        Format `coverage` (a decimal or None) as a rate attribute value.
+        """
+        if coverage is None:
+            return "0"
+        else:
+            return str(round(coverage, 4))
+
+
+# Source text and output directory shared with the processes
+# that render source pages for `HtmlDirCoverageReporter`.
+_SRC_PAGE_WORKER_STATE = {'src_text': {}, 'output_dir': None}
+
+
+def _init_src_page_worker(src_text_dict, output_dir):
+    """
+    Store the pre-loaded source text and output directory
+    used by `_write_src_page()`.
+
+    Runs once in each worker process when the pool starts.
+    """
+    _SRC_PAGE_WORKER_STATE['src_text'] = src_text_dict
+    _SRC_PAGE_WORKER_STATE['output_dir'] = output_dir
+
+
+def _write_src_page(task):
+    """
+    Render and write the page for the source described
+    by `task`, a `(full_path, summary, line_dict)` tuple.
+
+    Module-level so that it can be sent to worker processes.
+    """
+    full_path, summary, line_dict = task
+    src_text = _SRC_PAGE_WORKER_STATE['src_text'].get(full_path)
+
+    _write_template(
+        os.path.join(_SRC_PAGE_WORKER_STATE['output_dir'], summary['page_name']),
+        HtmlDirCoverageReporter.SRC_TEMPLATE_NAME, {
+            'rel_path': summary['rel_path'],
+            'src_coverage': summary['src_coverage'],
+            'lines': line_dict,
+            'src_lines': _split_lines(src_text),
+        }
+    )
+
+
+def _split_lines(src_text):
+    """
+    Split `src_text` into a list of lines, or return None
+    if `src_text` is None (the source could not be read).
+    """
+    if src_text is None:
+        return None
+    elif src_text == u"":
+        return []
+    else:
+        return src_text.split('\n')
+
+
+def _write_template(path, template_name, context):
+    """
+    Render `template_name` with `context` and write
+    the result (encoded as UTF-8) to `path`.
+    """
+    template = TEMPLATE_ENV.get_template(template_name)
+
+    with open(path, 'w') as output_file:
+        output_file.write(template.render(context).encode('utf8'))
+
+
+def _read_src_text(path):
+    """
+    Return the contents of the file at `path` as unicode,
+    without the final newline.  If the file could not be read,
+    returns None.
+    """
+    text = SOURCE_STORE.text(path)
+
+    if text is None:
+        return None
+
+    return text[:-1] if text.endswith('\n') else text
@@ -0,0 +1,422 @@
+"""
+Keep suite descriptions, page servers (with their JSCover
+instrumenters) and browsers running between test runs.
+
+`js-test-tool daemon` serves runs submitted by `js-test-tool run --daemon`
+over a local (Unix domain) socket, streaming the console output
+back to the client, so repeated runs do not pay to start them again.
+"""
+
+import errno
+import json
+import logging
+import os
+import os.path
+import socket
+import sys
+import tempfile
+from collections import OrderedDict
+from SocketServer import UnixStreamServer, StreamRequestHandler
+from StringIO import StringIO
+from js_test_tool.suite import SuiteDescription
+from js_test_tool.suite_server import SuitePageServer
+from js_test_tool.browser import Browser
+from js_test_tool.runner import SuiteRunnerFactory
+
+LOGGER = logging.getLogger(__name__)
+
+
+# Socket on which the daemon listens, unique to each user
+DEFAULT_SOCKET_PATH = os.path.join(
+    tempfile.gettempdir(), 'js-test-tool-{}.sock'.format(os.getuid())
+)
+
+# Arguments that are paths, which the client makes absolute
+# because the daemon may be running in a different directory
+PATH_ARGS = ['xunit_report', 'coverage_xml', 'coverage_html',
+             'coverage_html_dir', 'coverage_lcov', 'coverage_summary_json',
+             'coverage_db', 'coverage_snapshot', 'compiled']
+
+
+class DaemonError(Exception):
+    """
+    Could not start or connect to the daemon.
+    """
+    pass
+
+
+class SuiteDaemon(UnixStreamServer):
+    """
+    Serve test runs, reusing suite descriptions, page servers
+    and browsers from previous runs.
+
+    Runs are handled one at a time, in the order they are received.
+    """
+
+    # Maximum number of page servers to keep running.
+    # Each one may have a JSCover JVM per suite.
+    MAX_SERVERS = 4
+
+    def __init__(self, run_func, socket_path=None,
+                 desc_class=SuiteDescription,
+                 server_class=SuitePageServer,
+                 browser_class=Browser):
+        """
+        Listen on `socket_path` (defaults to `DEFAULT_SOCKET_PATH`).
+
+        `run_func` runs the tests for a client.  It is called as
+
+            run_func(args_dict, factory=FACTORY, stream=STREAM, keep_alive=True)
+
+        where `args_dict` is the client's arguments (see `tool.parse_args()`),
+        `FACTORY` is a `SuiteRunnerFactory` that reuses the daemon's
+        descriptions, servers and browsers, and `STREAM` writes to the client.
+        It returns a boolean indicating whether the run passed.
+
+        The other classes should be overridden only when testing.
+
+        Raises a `DaemonError` if another daemon is already listening.
+        """
+        self._run_func = run_func
+        self._socket_path = socket_path or DEFAULT_SOCKET_PATH
+        self._desc_class = desc_class
+        self._server_class = server_class
+        self._browser_class = browser_class
+
+        # Descriptions, keyed by root directory and file contents
+        self._desc_dict = {}
+
+        # Running page servers, least recently used first
+        self._page_server_dict = OrderedDict()
+
+        # Lists of browsers, keyed by name and configuration
+        self._browser_dict = {}
+
+        self._remove_stale_socket(self._socket_path)
+
+        # Only the current user may submit runs
+        old_umask = os.umask(0077)
+        try:
+            UnixStreamServer.__init__(self, self._socket_path, DaemonRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def serve(self):
+        """
+        Serve runs until interrupted, then stop the
+        servers and browsers we started.
+        """
+        try:
+            self.serve_forever()
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            self.stop()
+
+    def socket_path(self):
+        """
+        Return the path to the socket on which we listen.
+        """
+        return self._socket_path
+
+    def stop(self):
+        """
+        Stop the page servers, quit the browsers
+        and remove the socket.
+        """
+        for page_server in self._page_server_dict.values():
+            page_server.stop()
+        self._page_server_dict.clear()
+
+        self._quit_browsers()
+
+        self.socket.close()
+
+        try:
+            os.remove(self._socket_path)
+
+        except OSError:
+            pass
+
+    def run(self, args_dict, stream):
+        """
+        Run the tests configured by `args_dict`, writing
+        output to `stream`.  Log messages are also
+        written to `stream`.
+
+        Returns the exit code for the client.
+        """
+        # Each browser is used at most once per run, so runs that
+        # need several with the same configuration (e.g. one for
+        # each shard) get browsers of their own
+        used_browsers = set()
+
+        factory = SuiteRunnerFactory(
+            desc_class=self.description,
+            server_class=self.page_server,
+            browser_class=lambda *args, **kwargs: self.browser(
+                *args, exclude=used_browsers, **kwargs
+            )
+        )
+
+        # Send our log messages to the client
+        handler = logging.StreamHandler(stream)
+        handler.setLevel(logging.WARNING)
+        handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+        package_logger = logging.getLogger('js_test_tool')
+        package_logger.addHandler(handler)
+
+        try:
+            passed = self._run_func(args_dict, factory=factory,
+                                    stream=stream, keep_alive=True)
+
+        except Exception as err:
+            LOGGER.exception(err)
+
+            # The browsers may be left in a bad state, so start again
+            self._quit_browsers()
+            passed = False
+
+        finally:
+            package_logger.removeHandler(handler)
+
+        return 0 if passed else 1
+
+    def description(self, file_handle, root_dir):
+        """
+        Return a `SuiteDescription` for the file `file_handle`,
+        reusing the description loaded from the same file
+        contents in `root_dir` if there is one.
+        """
+        contents = file_handle.read()
+        key = (root_dir, contents)
+
+        if key not in self._desc_dict:
+            self._desc_dict[key] = self._desc_class(StringIO(contents), root_dir)
+
+        return self._desc_dict[key]
+
+    def page_server(self, suite_desc_list, suite_renderer,
+                    jscover_path=None, jvm_options=None, workers=None,
+                    processes=None, compiled=None):
+        """
+        Return a running `SuitePageServer` for `suite_desc_list`,
+        reusing one we started for an earlier run if possible.
+        """
+        key = (tuple(id(desc) for desc in suite_desc_list),
+               jscover_path, tuple(jvm_options or []), workers, processes,
+               compiled.output_dir() if compiled is not None else None)
+
+        page_server = self._page_server_dict.pop(key, None)
+
+        if page_server is None:
+            page_server = self._server_class(suite_desc_list, suite_renderer,
+                                             jscover_path=jscover_path,
+                                             jvm_options=jvm_options,
+                                             workers=workers,
+                                             processes=processes,
+                                             compiled=compiled)
+            page_server.start()
+
+            # Stop the servers that were used least recently
+            while len(self._page_server_dict) >= self.MAX_SERVERS:
+                _, old_server = self._page_server_dict.popitem(last=False)
+                old_server.stop()
+
+        self._page_server_dict[key] = page_server
+        return page_server
+
+    def browser(self, browser_name, timeout_sec=None, native_coverage=False,
+                max_tabs=1, exclude=None):
+        """
+        Return a `Browser` named `browser_name`, reusing one
+        with the same configuration from an earlier run if possible.
+
+        Browsers in `exclude` (a set) are not reused,
+        and the browser returned is added to it.
+        """
+        key = (browser_name, timeout_sec, native_coverage, max_tabs)
+        browser_list = self._browser_dict.setdefault(key, [])
+        exclude = exclude if exclude is not None else set()
+
+        for browser in browser_list:
+            if browser not in exclude:
+                break
+
+        else:
+            browser = self._browser_class(
+                browser_name, timeout_sec=timeout_sec,
+                native_coverage=native_coverage, max_tabs=max_tabs
+            )
+            browser_list.append(browser)
+
+        exclude.add(browser)
+        return browser
+
+    def _quit_browsers(self):
+        """
+        Quit all the browsers we started.
+        """
+        for browser_list in self._browser_dict.values():
+            for browser in browser_list:
+                try:
+                    browser.quit()
+
+                except Exception as err:
+                    LOGGER.debug("Could not quit browser: {}".format(err))
+
+        self._browser_dict.clear()
+
+    @staticmethod
+    def _remove_stale_socket(socket_path):
+        """
+        Remove the socket at `socket_path` left behind by a daemon
+        that is no longer running.
+
+        Raises a `DaemonError` if a daemon is listening on it.
+        """
+        if not os.path.exists(socket_path):
+            return
+
+        try:
+            _connect(socket_path).close()
+
+        except DaemonError:
+            os.remove(socket_path)
+
+        else:
+            msg = "A daemon is already listening on '{}'".format(socket_path)
+            raise DaemonError(msg)
+
+
+class DaemonRequestHandler(StreamRequestHandler):
+    """
+    Run the tests requested by a client.
+
+    The client sends its arguments as a line of JSON.  We reply with
+    a line of JSON for each piece of output:
+
+        {"output": TEXT}
+
+    followed by a final line with the exit code:
+
+        {"exit_code": CODE}
+    """
+
+    def handle(self):
+        """
+        Run the tests and stream the output to the client.
+        """
+        try:
+            args_dict = json.loads(self.rfile.readline())
+
+        except ValueError:
+            self._send({'exit_code': 2})
+            return
+
+        exit_code = self.server.run(args_dict, _ClientStream(self._send))
+        self._send({'exit_code': exit_code})
+
+    def _send(self, msg_dict):
+        """
+        Send `msg_dict` to the client as a line of JSON.
+        If the client has gone away, the message is dropped.
+        """
+        try:
+            self.wfile.write(json.dumps(msg_dict) + '\n')
+            self.wfile.flush()
+
+        except socket.error as err:
+            if err.errno != errno.EPIPE:
+                raise
+
+
+class _ClientStream(object):
+    """
+    File-like object that sends what is written to the client.
+    """
+
+    def __init__(self, send_func):
+        """
+        Send output using `send_func`, which accepts a message dict.
+        """
+        self._send_func = send_func
+
+    def write(self, text):
+        """
+        Send `text` (a byte or unicode string) to the client.
+        """
+        if isinstance(text, str):
+            text = text.decode('utf8', 'replace')
+
+        if text:
+            self._send_func({'output': text})
+
+    def flush(self):
+        """
+        Output is sent as soon as it is written, so there is nothing to do.
+        """
+        pass
+
+
+def run_with_daemon(args_dict, socket_path=None, output_stream=None):
+    """
+    Submit the run configured by `args_dict` (see `tool.parse_args()`)
+    to the daemon listening on `socket_path`, writing its output
+    to `output_stream` (defaults to stdout).
+
+    Returns a boolean indicating whether the run passed.
+
+    Raises a `DaemonError` if no daemon is listening.
+    """
+    output_stream = output_stream or sys.stdout
+
+    # The daemon may be running in another directory
+    args_dict = dict(args_dict)
+    args_dict['test_suite_paths'] = [os.path.abspath(path) for path
+                                     in args_dict.get('test_suite_paths', [])]
+
+    for key in PATH_ARGS:
+        if args_dict.get(key) is not None:
+            args_dict[key] = os.path.abspath(args_dict[key])
+
+    conn = _connect(socket_path or DEFAULT_SOCKET_PATH)
+
+    try:
+        conn.sendall(json.dumps(args_dict) + '\n')
+        conn_file = conn.makefile('rb')
+
+        for line in conn_file:
+            msg_dict = json.loads(line)
+
+            if 'exit_code' in msg_dict:
+                return msg_dict['exit_code'] == 0
+
+            output_stream.write(msg_dict.get('output', u'').encode('utf8'))
+            output_stream.flush()
+
+    finally:
+        conn.close()
+
+    raise DaemonError("The daemon closed the connection before the run finished.")
+
+
+def _connect(socket_path):
+    """
+    Return a socket connected to the daemon at `socket_path`.
+    Raises a `DaemonError` if no daemon is listening.
+    """
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        conn.connect(socket_path)
+
+    except socket.error as err:
+        conn.close()
+        msg = ("Could not connect to a daemon on '{}' ({}). "
+               "Start one using `js-test-tool daemon`.".format(socket_path, err))
+        raise DaemonError(msg)
+
+    return conn
@@ -0,0 +1,304 @@
+"""
+Report coverage of the lines changed by a diff,
+using a coverage snapshot as the baseline.
+"""
+
+import os.path
+import re
+import subprocess
+from bisect import bisect_right
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+class DiffCoverageError(Exception):
+    """
+    The diff could not be read or parsed.
+    """
+    pass
+
+
+# Matches the header of each hunk in a unified diff, e.g. "@@ -10,2 +12,3 @@"
+HUNK_REGEX = re.compile(r'^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+
+class ChangedLines(object):
+    """
+    Index of the line ranges added or modified in each file by a diff.
+    """
+
+    def __init__(self):
+        """
+        Create an empty index.
+        """
+        # Maps paths to sorted lists of (first, last) line ranges (inclusive)
+        self._range_dict = {}
+
+    @classmethod
+    def from_unified_diff(cls, diff_text):
+        """
+        Build an index from `diff_text`, a unified diff
+        (e.g. the output of `git diff`).
+
+        Line numbers refer to the new version of each file.
+        Deleted files are ignored.
+        """
+        changed = cls()
+        path = None
+        line_num = None
+
+        # Number of lines of the new file left in the current hunk.
+        # Added lines can look like headers (e.g. "++ i;" is added
+        # as "+++ i;"), so headers are only read between hunks.
+        new_count = 0
+
+        for line in diff_text.splitlines():
+
+            if new_count > 0:
+                if line.startswith('+'):
+                    if path is not None:
+                        changed.add_line(path, line_num)
+                    line_num += 1
+                    new_count -= 1
+
+                elif line.startswith(' '):
+                    line_num += 1
+                    new_count -= 1
+
+            elif line.startswith('+++ '):
+                path = cls._diff_path(line[4:])
+
+            elif line.startswith('@@'):
+                match = HUNK_REGEX.match(line)
+                if match is None:
+                    raise DiffCoverageError("Invalid hunk header: '{}'".format(line))
+
+                line_num = int(match.group(1))
+                new_count = int(match.group(2)) if match.group(2) is not None else 1
+
+        return changed
+
+    def add_line(self, path, line_num):
+        """
+        Mark `line_num` (1-based) in the file at `path` as changed.
+        Lines must be added in increasing order for each path.
+        """
+        range_list = self._range_dict.setdefault(path, [])
+
+        if range_list and range_list[-1][1] == line_num - 1:
+            range_list[-1] = (range_list[-1][0], line_num)
+        else:
+            range_list.append((line_num, line_num))
+
+    def path_list(self):
+        """
+        Return the sorted list of paths with changed lines.
+        """
+        return sorted(self._range_dict.keys())
+
+    def range_list(self, path):
+        """
+        Return the sorted list of `(first, last)` changed line
+        ranges for `path`.
+        """
+        return list(self._range_dict.get(path, []))
+
+    def is_changed(self, path, line_num):
+        """
+        Return True if `line_num` in the file at `path` was changed.
+        """
+        range_list = self._range_dict.get(path, [])
+        index = bisect_right(range_list, (line_num, float('inf'))) - 1
+        return index >= 0 and range_list[index][1] >= line_num
+
+    @staticmethod
+    def _diff_path(header_path):
+        """
+        Return the path from a "+++" header line, removing the
+        "b/" prefix that git adds.  Returns None for deleted files.
+        """
+        header_path = header_path.split('\t')[0].strip()
+
+        if header_path == '/dev/null':
+            return None
+        elif header_path.startswith('b/'):
+            return header_path[2:]
+        else:
+            return header_path
+
+
+def git_diff(git_range, repo_dir=None, subprocess_module=subprocess):
+    """
+    Return the unified diff for `git_range` (e.g. "origin/master...HEAD")
+    in the git repository containing `repo_dir` (default is the
+    current directory), along with the repository's root directory,
+    as a tuple `(diff_text, root_dir)`.
+
+    Raises a `DiffCoverageError` if git fails.
+    """
+    root_dir = _run_git(['rev-parse', '--show-toplevel'], repo_dir,
+                        subprocess_module).strip()
+    diff_text = _run_git(['diff', '--no-color', '--no-ext-diff', '--unified=0', git_range],
+                         repo_dir, subprocess_module)
+    return diff_text, root_dir
+
+
+def diff_coverage(coverage_data, changed_lines, root_dir):
+    """
+    Intersect the lines in `changed_lines` (a `ChangedLines` instance)
+    with `coverage_data` (a `CoverageData` instance).
+
+    Paths in the diff are relative to `root_dir`.  A diff path that
+    does not match a full source path under `root_dir` is matched
+    against the end of the source paths, so that a snapshot written
+    in another checkout can be used as the baseline.
+
+    Returns a dict of the form:
+
+        {
+            'diff_coverage': DIFF_COVERAGE (decimal or None),
+            'lines_covered': LINES_COVERED,
+            'lines_measured': LINES_MEASURED,
+            'files': [
+                {
+                    'path': DIFF_PATH,
+                    'covered_lines': [LINE_NUM, ...],
+                    'uncovered_lines': [LINE_NUM, ...]
+                }, ...
+            ]
+        }
+
+    Only files that have changed lines with coverage
+    information are included in the list.
+    """
+    src_list = coverage_data.src_list()
+    src_set = set(src_list)
+    file_list = []
+    total_covered = 0
+    total_measured = 0
+
+    for path in changed_lines.path_list():
+        full_path = _match_src_path(path, root_dir, src_set, src_list)
+
+        if full_path is None:
+            continue
+
+        line_dict = coverage_data.line_dict_for_src(full_path)
+        covered = []
+        uncovered = []
+
+        for first, last in changed_lines.range_list(path):
+            for line_num in range(first, last + 1):
+                is_covered = line_dict.get(line_num)
+
+                if is_covered is True:
+                    covered.append(line_num)
+                elif is_covered is False:
+                    uncovered.append(line_num)
+
+        if covered or uncovered:
+            file_list.append({
+                'path': path,
+                'covered_lines': covered,
+                'uncovered_lines': uncovered,
+            })
+            total_covered += len(covered)
+            total_measured += len(covered) + len(uncovered)
+
+    return {
+        'diff_coverage': (float(total_covered) / total_measured
+                          if total_measured > 0 else None),
+        'lines_covered': total_covered,
+        'lines_measured': total_measured,
+        'files': file_list,
+    }
+
+
+def format_diff_coverage(report_dict):
+    """
+    Return a short, human-readable summary of `report_dict`
+    (see `diff_coverage()`).
+    """
+    if report_dict['diff_coverage'] is None:
+        return u"Diff coverage: no changed lines with coverage information."
+
+    lines = [u"Diff coverage: {:.1f}% ({} of {} changed lines covered)".format(
+        report_dict['diff_coverage'] * 100,
+        report_dict['lines_covered'], report_dict['lines_measured']
+    )]
+
+    for file_dict in report_dict['files']:
+        num_covered = len(file_dict['covered_lines'])
+        num_measured = num_covered + len(file_dict['uncovered_lines'])
+        line = u"{}: {:.1f}%".format(file_dict['path'],
+                                     100.0 * num_covered / num_measured)
+
+        if file_dict['uncovered_lines']:
+            line += u" (missing lines {})".format(
+                _format_line_ranges(file_dict['uncovered_lines']))
+
+        lines.append(line)
+
+    return u"\n".join(lines)
+
+
+def _match_src_path(diff_path, root_dir, src_set, src_list):
+    """
+    Return the full source path in `src_set` corresponding to
+    `diff_path`, or None if there is no unambiguous match.
+    """
+    full_path = os.path.normpath(os.path.join(os.path.abspath(root_dir), diff_path))
+
+    if full_path in src_set:
+        return full_path
+
+    suffix = '/' + diff_path.lstrip('/')
+    matches = [src_path for src_path in src_list if src_path.endswith(suffix)]
+
+    if len(matches) == 1:
+        return matches[0]
+
+    if len(matches) > 1:
+        LOGGER.warning("'{}' matches several sources in the snapshot".format(diff_path))
+
+    return None
+
+
+def _format_line_ranges(line_list):
+    """
+    Format a sorted list of line numbers as ranges, e.g. "1-3, 7".
+    """
+    ranges = []
+
+    for line_num in line_list:
+        if ranges and ranges[-1][1] == line_num - 1:
+            ranges[-1][1] = line_num
+        else:
+            ranges.append([line_num, line_num])
+
+    return u", ".join(
+        u"{}".format(first) if first == last else u"{}-{}".format(first, last)
+        for first, last in ranges
+    )
+
+
+def _run_git(args, repo_dir, subprocess_module):
+    """
+    Run git with `args` in `repo_dir` and return its output.
+    Raises a `DiffCoverageError` if git fails.
+    """
+    try:
+        process = subprocess_module.Popen(['git'] + args, cwd=repo_dir,
+                                          stdout=subprocess_module.PIPE,
+                                          stderr=subprocess_module.PIPE)
+    except OSError as err:
+        raise DiffCoverageError("Could not run git: {}".format(err))
+
+    stdout, stderr = process.communicate()
+
+    if process.returncode != 0:
+        msg = "git {} failed: {}".format(' '.join(args), stderr.strip())
+        raise DiffCoverageError(msg)
+
+    return stdout
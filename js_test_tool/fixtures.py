@@ -0,0 +1,118 @@
+"""
+Preload a suite's fixtures in a single request.
+
+jasmine-jquery loads each fixture with a synchronous request the
+first time a spec uses it.  Suites that set `preload_fixtures` in
+their description instead load all their fixtures at page start,
+as one JSON object served from:
+
+    /suite/SUITE_NAME/fixtures.json
+
+which maps fixture paths (relative to the suite's root directory,
+as specs pass them to `loadFixtures()`) to the fixtures' contents.
+The runner page copies it into jasmine-jquery's fixture cache.
+"""
+
+import os.path
+import json
+import threading
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+# Name of the fixture bundle, under the suite's URL
+FIXTURE_BUNDLE_NAME = 'fixtures.json'
+
+
+def fixture_bundle_url(suite_name):
+    """
+    Return the URL of the fixture bundle for the suite named `suite_name`.
+    """
+    return u'/suite/{}/{}'.format(suite_name, FIXTURE_BUNDLE_NAME)
+
+
+def fixture_bundle(root_dir, rel_path_list):
+    """
+    Return the fixture bundle (JSON, as a byte string) for the fixtures
+    at `rel_path_list` (paths relative to `root_dir`).
+
+    Fixtures that are not UTF-8 text (e.g. images) are left out;
+    jasmine-jquery loads them from the server as usual.
+    """
+    fixture_dict = {}
+
+    for rel_path in rel_path_list:
+
+        try:
+            with open(os.path.join(root_dir, rel_path), 'rb') as fixture_file:
+                fixture_dict[rel_path] = fixture_file.read().decode('utf-8')
+
+        except IOError as err:
+            LOGGER.warning("Could not preload fixture '{}': {}".format(rel_path, err))
+
+        except UnicodeDecodeError:
+            LOGGER.debug("Not preloading fixture '{}': not UTF-8 text".format(rel_path))
+
+    return json.dumps(fixture_dict, sort_keys=True)
+
+
+class FixtureCache(object):
+    """
+    Fixture bundles for the suites that preload their fixtures,
+    built when first requested and again only when a fixture changes.
+
+    This class is thread safe.
+    """
+
+    def __init__(self, desc_dict):
+        """
+        Build bundles for the suites in `desc_dict` (a dict
+        mapping suite names to `SuiteDescription` instances).
+        """
+        self._desc_dict = desc_dict
+        self._bundle_dict = {}
+        self._lock = threading.Lock()
+
+    def bundle(self, suite_name):
+        """
+        Return the fixture bundle (a byte string) for the suite named
+        `suite_name`, or None if there is no such suite or it does
+        not preload its fixtures.
+        """
+        desc = self._desc_dict.get(suite_name)
+
+        if desc is None or not desc.preload_fixtures():
+            return None
+
+        rel_path_list = desc.fixture_paths()
+        signature = [self._file_signature(desc.root_dir(), rel_path)
+                     for rel_path in rel_path_list]
+
+        with self._lock:
+            cached = self._bundle_dict.get(suite_name)
+
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        bundle = fixture_bundle(desc.root_dir(), rel_path_list)
+
+        with self._lock:
+            self._bundle_dict[suite_name] = (signature, bundle)
+
+        return bundle
+
+    @staticmethod
+    def _file_signature(root_dir, rel_path):
+        """
+        Return a tuple that changes when the file at `rel_path`
+        (relative to `root_dir`) changes.
+        """
+        try:
+            stat = os.stat(os.path.join(root_dir, rel_path))
+
+        except OSError:
+            return (rel_path, None, None)
+
+        else:
+            return (rel_path, stat.st_mtime, stat.st_size)
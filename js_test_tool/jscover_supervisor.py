@@ -0,0 +1,303 @@
+"""
+Supervise the JSCover processes started by `SrcInstrumenter` instances:
+restart instances that die or stop accepting connections, track
+their memory use, and clean up processes left behind by runs
+that were killed before they could stop JSCover.
+"""
+
+import errno
+import os
+import os.path
+import signal
+import socket
+import tempfile
+import threading
+import time
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+# Directory in which each running JSCover process is recorded,
+# so that later runs can find processes whose owner has died
+PIDFILE_DIR = os.path.join(tempfile.gettempdir(), 'js-test-tool-jscover')
+
+
+def write_pidfile(pid, pidfile_dir=None):
+    """
+    Record that the JSCover process `pid` (which leads its own
+    process group) is owned by the current process.
+
+    Returns the path to the pidfile, or None if it could not be written.
+    """
+    pidfile_dir = pidfile_dir or PIDFILE_DIR
+    path = os.path.join(pidfile_dir, '{}.pid'.format(pid))
+
+    try:
+        if not os.path.isdir(pidfile_dir):
+            os.makedirs(pidfile_dir)
+
+        with open(path, 'w') as pidfile:
+            pidfile.write('{}\n'.format(os.getpid()))
+
+    except (IOError, OSError) as err:
+        LOGGER.debug("Could not write JSCover pidfile '{}': {}".format(path, err))
+        return None
+
+    return path
+
+
+def remove_pidfile(path):
+    """
+    Remove the pidfile at `path`, if it exists.
+    """
+    if path is None:
+        return
+
+    try:
+        os.remove(path)
+
+    except OSError:
+        pass
+
+
+def reap_orphans(pidfile_dir=None):
+    """
+    Kill the process group of each recorded JSCover process
+    whose owner is no longer running, and remove its pidfile.
+
+    Returns the list of process IDs that were killed.
+    """
+    pidfile_dir = pidfile_dir or PIDFILE_DIR
+    killed = []
+
+    try:
+        file_names = os.listdir(pidfile_dir)
+
+    except OSError:
+        return killed
+
+    for file_name in file_names:
+
+        if not file_name.endswith('.pid'):
+            continue
+
+        path = os.path.join(pidfile_dir, file_name)
+
+        try:
+            pid = int(file_name[:-len('.pid')])
+            with open(path) as pidfile:
+                owner_pid = int(pidfile.read().strip())
+
+        except (IOError, ValueError):
+            continue
+
+        # The owner is still running, so the process is not orphaned
+        if _is_running(owner_pid):
+            continue
+
+        # Check that the pid has not been reused by another program
+        if _is_running(pid) and _is_jscover(pid):
+            try:
+                os.killpg(pid, signal.SIGKILL)
+                killed.append(pid)
+                LOGGER.warning("Killed orphaned JSCover process {}".format(pid))
+
+            except OSError as err:
+                LOGGER.debug("Could not kill JSCover process {}: {}".format(pid, err))
+
+        remove_pidfile(path)
+
+    return killed
+
+
+def rss_bytes(pid):
+    """
+    Return the resident set size of process `pid` in bytes,
+    or None if it is not available (e.g. not on Linux).
+    """
+    try:
+        with open('/proc/{}/status'.format(pid)) as status_file:
+            for line in status_file:
+                if line.startswith('VmRSS:'):
+                    # The value is reported in kB
+                    return int(line.split()[1]) * 1024
+
+    except (IOError, ValueError, IndexError):
+        pass
+
+    return None
+
+
+class InstrumenterSupervisor(object):
+    """
+    Periodically check that each `SrcInstrumenter` is healthy,
+    restarting those that are not, and record their memory use.
+    """
+
+    # Number of seconds between health checks
+    DEFAULT_CHECK_INTERVAL = 5
+
+    # Number of seconds to wait when connecting to JSCover
+    CONNECT_TIMEOUT = 2
+
+    def __init__(self, check_interval=None):
+        """
+        Check the instrumenters every `check_interval` seconds.
+        """
+        if check_interval is None:
+            check_interval = self.DEFAULT_CHECK_INTERVAL
+
+        self._check_interval = check_interval
+        self._instr_dict = {}
+        self._stats_dict = {}
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def add(self, name, instrumenter):
+        """
+        Supervise `instrumenter` (a started `SrcInstrumenter`),
+        identified as `name` in log messages and reports.
+        """
+        self._instr_dict[name] = instrumenter
+        self._stats_dict[name] = {'rss_bytes': None, 'peak_rss_bytes': None, 'restarts': 0}
+
+    def start(self):
+        """
+        Start checking the instrumenters in a background thread.
+        """
+        self._stopped = False
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """
+        Stop checking the instrumenters and log the memory report.
+        """
+        # Wait for any check in progress, so that no instrumenter
+        # is restarted after we return
+        with self._lock:
+            self._stopped = True
+
+        # Take a final measurement before the instrumenters are stopped
+        for name, instr in self._instr_dict.items():
+            self._record_rss(name, instr)
+
+        for line in self.format_report():
+            LOGGER.info(line)
+
+    def check(self):
+        """
+        Check each instrumenter once, restarting any that
+        have exited or are not accepting connections.
+        """
+        for name, instr in self._instr_dict.items():
+
+            if not self._is_healthy(instr):
+                LOGGER.warning("JSCover for '{}' is not responding; restarting it.".format(name))
+
+                try:
+                    instr.restart()
+                    self._stats_dict[name]['restarts'] += 1
+
+                except Exception as err:
+                    LOGGER.warning("Could not restart JSCover for '{}': {}".format(name, err))
+
+            self._record_rss(name, instr)
+
+    def report(self):
+        """
+        Return a dict mapping instrumenter names to dicts with
+        keys 'rss_bytes' (last measurement), 'peak_rss_bytes'
+        and 'restarts'.  Memory values are None if unavailable.
+        """
+        return {name: dict(stats) for name, stats in self._stats_dict.items()}
+
+    def format_report(self):
+        """
+        Return a list of human-readable lines describing
+        the memory use and restarts of each instrumenter.
+        """
+        lines = []
+
+        for name, stats in sorted(self._stats_dict.items()):
+            peak = stats['peak_rss_bytes']
+            peak_str = ('{:.1f} MB'.format(peak / (1024.0 * 1024.0))
+                        if peak is not None else 'unknown')
+            lines.append("JSCover for '{}': peak RSS {}, {} restart(s)".format(
+                name, peak_str, stats['restarts']))
+
+        return lines
+
+    def _run(self):
+        """
+        Check the instrumenters until stopped.
+
+        We sleep rather than waiting on an `Event` with a timeout,
+        which in Python 2 polls and slows down the server threads.
+        """
+        while True:
+            time.sleep(self._check_interval)
+
+            with self._lock:
+                if self._stopped:
+                    return
+                self.check()
+
+    def _is_healthy(self, instr):
+        """
+        Return True if `instr` is running and accepting connections.
+        """
+        if not instr.is_running():
+            return False
+
+        try:
+            conn = socket.create_connection(('127.0.0.1', instr.port()),
+                                            timeout=self.CONNECT_TIMEOUT)
+            conn.close()
+
+        except (socket.error, TypeError):
+            return False
+
+        return True
+
+    def _record_rss(self, name, instr):
+        """
+        Record the current memory use of `instr`.
+        """
+        rss = instr.rss_bytes()
+
+        if rss is not None:
+            stats = self._stats_dict[name]
+            stats['rss_bytes'] = rss
+            stats['peak_rss_bytes'] = max(rss, stats['peak_rss_bytes'] or 0)
+
+
+def _is_running(pid):
+    """
+    Return True if a process with ID `pid` exists.
+    """
+    try:
+        os.kill(pid, 0)
+
+    except OSError as err:
+        return err.errno == errno.EPERM
+
+    return True
+
+
+def _is_jscover(pid):
+    """
+    Return True if process `pid` is a JSCover server.
+    If the command line is unavailable, we cannot tell,
+    so assume that it is not.
+    """
+    try:
+        with open('/proc/{}/cmdline'.format(pid)) as cmdline_file:
+            cmdline = cmdline_file.read()
+
+    except IOError:
+        return False
+
+    return '-ws' in cmdline.split('\0') and 'java' in cmdline
@@ -0,0 +1,182 @@
+"""
+Collect coverage using the browser's built-in JavaScript profiler,
+so that sources can be served without JSCover instrumentation.
+
+Chrome reports "precise coverage" as execution counts for ranges of
+character offsets in each script.  We convert the ranges to the line
+data format used by JSCover and load it into a `CoverageData` instance.
+"""
+
+import os.path
+import re
+from bisect import bisect_right
+from urllib import unquote
+from urlparse import urlparse
+from js_test_tool.coverage import CoverageData
+from js_test_tool.source_store import SOURCE_STORE
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+# Matches the URL paths of suite dependencies
+INCLUDE_PATH_REGEX = re.compile(r'^/suite/([^/]+)/include/(.+)$')
+
+# String literals and comments; comments are blanked out
+# before looking for executable code.  Block comments
+# that are not closed run to the end of the file.
+_COMMENT_REGEX = re.compile(
+    r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`)'
+    r'|(/\*.*?(?:\*/|$)|//[^\n]*)',
+    re.DOTALL
+)
+
+# Lines with no executable code once comments are removed:
+# blank lines, and lines that only close a block (e.g. "});")
+NON_EXECUTABLE_REGEX = re.compile(r'^[\s})\];,]*$')
+
+
+class NativeCoverageCollector(object):
+    """
+    Convert precise coverage reported by browsers into `CoverageData`.
+    """
+
+    def __init__(self, suite_desc_list):
+        """
+        Collect coverage for the sources in `suite_desc_list`
+        (a list of `SuiteDescription` instances).
+
+        Only sources that the suite instruments for coverage
+        are included.
+        """
+        self._desc_dict = {desc.suite_name(): desc for desc in suite_desc_list}
+        self._coverage_data = CoverageData()
+
+        # Report sources as uncovered if the browser never loads them
+        for desc in suite_desc_list:
+            for rel_path in desc.src_paths():
+                if desc.should_instrument(rel_path):
+                    self._coverage_data.add_expected_src(desc.root_dir(), rel_path)
+
+    def coverage_data(self):
+        """
+        Return the `CoverageData` collected so far.
+        """
+        return self._coverage_data
+
+    def add_script_coverage(self, script_coverage_list):
+        """
+        Load `script_coverage_list`, the list of script coverage dicts
+        returned by the Chrome DevTools `Profiler.takePreciseCoverage`
+        command:
+
+            [{"url": URL,
+              "functions": [{"ranges": [{"startOffset": START,
+                                         "endOffset": END,
+                                         "count": COUNT}, ...]}, ...]}, ...]
+
+        Scripts that are not sources of a known suite are ignored.
+        """
+        for script_dict in script_coverage_list:
+
+            src = self._suite_src(script_dict.get('url', ''))
+            if src is None:
+                continue
+
+            desc, rel_path = src
+            full_path = os.path.join(desc.root_dir(), rel_path)
+            line_data = line_data_from_ranges(full_path, script_dict.get('functions', []))
+
+            if line_data is None:
+                LOGGER.warning("Could not read source file '{}'".format(full_path))
+                continue
+
+            self._coverage_data.add_suite_name(desc.suite_name())
+            self._coverage_data.load_from_dict(
+                desc.root_dir(), desc.prepend_path(),
+                {rel_path: {'lineData': line_data}}
+            )
+
+    def _suite_src(self, url):
+        """
+        Return a `(suite_desc, rel_path)` tuple for the source file
+        served at `url`, or None if `url` is not a source we cover.
+        """
+        match = INCLUDE_PATH_REGEX.match(urlparse(url).path)
+
+        if match is None:
+            return None
+
+        suite_name, rel_path = [unquote(group) for group in match.groups()]
+        desc = self._desc_dict.get(suite_name)
+
+        if desc is None:
+            return None
+
+        if rel_path not in desc.src_paths() or not desc.should_instrument(rel_path):
+            return None
+
+        return (desc, rel_path)
+
+
+def line_data_from_ranges(full_path, function_list):
+    """
+    Convert the precise coverage `function_list` for the source
+    file at `full_path` into a JSCover line data list, in which the
+    item at each (1-based) line number is the execution count for
+    the line, or None if the line is not executable.
+
+    A line takes the count of the innermost range that contains
+    all of its code.  Returns None if the file could not be read.
+    """
+    lines = SOURCE_STORE.lines(full_path)
+    offsets = SOURCE_STORE.line_offsets(full_path)
+
+    if lines is None:
+        return None
+
+    if not lines:
+        return [None]
+
+    counts = [None] * len(lines)
+
+    # Sort outer ranges before the ranges nested inside them,
+    # so that inner ranges override the counts of outer ranges.
+    range_list = sorted(
+        (range_dict['startOffset'], -range_dict['endOffset'], range_dict['count'])
+        for function_dict in function_list
+        for range_dict in function_dict.get('ranges', [])
+    )
+
+    for start, neg_end, count in range_list:
+        end = -neg_end
+        first = max(bisect_right(offsets, start) - 1, 0)
+        last = bisect_right(offsets, max(end - 1, start)) - 1
+
+        for index in range(first, last + 1):
+            line = lines[index]
+            code_start = offsets[index] + len(line) - len(line.lstrip())
+            code_end = offsets[index] + len(line.rstrip())
+
+            if start <= code_start and code_end <= end:
+                counts[index] = count
+
+    line_data = [None]
+    for line, count in zip(_strip_comments(lines), counts):
+        line_data.append(None if NON_EXECUTABLE_REGEX.match(line) else count)
+
+    return line_data
+
+
+def _strip_comments(lines):
+    """
+    Return the list of `lines` (JavaScript, without newline characters)
+    with the comments replaced by spaces, so that code before or after
+    a comment (even one spanning several lines) is still found.
+    """
+    def _blank(match):
+        if match.group(1) is not None:
+            return match.group(1)
+        return re.sub(r'[^\n]', ' ', match.group(2))
+
+    return _COMMENT_REGEX.sub(_blank, u'\n'.join(lines)).split(u'\n')
@@ -0,0 +1,112 @@
+"""
+Run several small suites in one page load.
+
+Loading a runner page costs the same however few specs a suite has:
+the browser navigates, loads Jasmine and the libraries again, and
+waits for the page to finish.  Suites that use the `jasmine` runner
+and include the same libraries can instead be packed into one page:
+
+    /pack/SUITE_NAME,SUITE_NAME,...
+
+which loads the libraries once, then each suite's sources and specs
+from the suite's own URLs.  Specs load fixtures from their own suite,
+and each suite reports its coverage separately.
+
+Suites that preload their fixtures are never packed, since
+jasmine-jquery has a single fixture cache per page.  Suites that
+have a source at the same relative path are never packed together,
+since JSCover records the coverage of both under the same path.
+"""
+
+import os.path
+
+
+# URL path under which packed pages are served
+PACK_URL_PREFIX = '/pack/'
+
+# Separates suite names in a packed page URL.
+# Suite names are URL-encoded, so they cannot contain it.
+PACK_SEPARATOR = ','
+
+# Test runners whose suites can be packed
+PACK_TEST_RUNNERS = ['jasmine']
+
+
+def pack_url(suite_name_list):
+    """
+    Return the URL path of the page running
+    the suites named in `suite_name_list` together.
+    """
+    return PACK_URL_PREFIX + PACK_SEPARATOR.join(suite_name_list)
+
+
+def pack_key(suite_desc):
+    """
+    Return a key shared by the suites that can be packed together
+    with the suite described by `suite_desc`, or None if the
+    suite cannot be packed.
+
+    Suites can be packed if they use the same test runner and
+    include the same libraries (in the same order) in the page.
+    """
+    test_runner = suite_desc.test_runner()
+
+    if test_runner not in PACK_TEST_RUNNERS or suite_desc.preload_fixtures():
+        return None
+
+    lib_paths = tuple(
+        os.path.realpath(os.path.join(suite_desc.root_dir(), rel_path))
+        for rel_path in suite_desc.lib_paths(only_in_page=True)
+    )
+
+    return (test_runner, lib_paths)
+
+
+def pack_suites(desc_dict, max_pack_size):
+    """
+    Group the suites in `desc_dict` (a dict mapping suite names to
+    `SuiteDescription` instances) into packs of at most `max_pack_size`
+    suites that can share a page and have no source paths in common.
+
+    Returns a list of lists of suite names, sorted by the name
+    of the first suite in each pack.  Suites that cannot be packed
+    are in lists of their own.
+    """
+    pack_list = []
+
+    # Map pack keys to lists of `(suite_names, src_paths)` tuples
+    # for the packs that are not full yet
+    open_packs = {}
+
+    for suite_name in sorted(desc_dict):
+        desc = desc_dict[suite_name]
+        key = pack_key(desc)
+        src_paths = set(desc.src_paths())
+
+        pack = None
+
+        if key is not None:
+            for open_names, open_src_paths in open_packs.get(key, []):
+                if open_src_paths.isdisjoint(src_paths):
+                    pack = open_names
+                    open_src_paths.update(src_paths)
+                    break
+
+        if pack is None:
+            pack = []
+            pack_list.append(pack)
+
+            if key is not None:
+                open_packs.setdefault(key, []).append((pack, src_paths))
+
+        pack.append(suite_name)
+
+        # Stop adding suites to full packs
+        if key is not None and len(pack) >= max_pack_size:
+            open_packs[key] = [
+                (open_names, open_src_paths)
+                for open_names, open_src_paths in open_packs[key]
+                if open_names is not pack
+            ]
+
+    return pack_list
@@ -0,0 +1,100 @@
+"""
+Support for running the page server in several processes.
+
+Worker processes cannot share a `CoverageData` instance with the
+parent, so they send the coverage they receive to the parent over a
+pipe, where it is merged into a single `CoverageData` instance.
+"""
+
+import marshal
+import struct
+import threading
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+# Each message is prefixed by its length, as a 4-byte unsigned int
+_LENGTH_FORMAT = '!I'
+_LENGTH_SIZE = struct.calcsize(_LENGTH_FORMAT)
+
+
+class CoverageForwarder(object):
+    """
+    Stands in for `CoverageData` in a worker process,
+    sending coverage to the parent process instead of storing it.
+    Provides the methods used to store coverage POSTed by test pages.
+
+    This class is thread safe.
+    """
+
+    def __init__(self, pipe_file):
+        """
+        Send coverage to the parent by writing to `pipe_file`
+        (the write end of a pipe, opened in binary mode).
+        """
+        self._pipe_file = pipe_file
+        self._lock = threading.Lock()
+
+    def add_suite_name(self, suite_name):
+        """
+        Record that coverage was reported for the suite named `suite_name`.
+        """
+        self._send(('add_suite_name', (suite_name,)))
+
+    def load_from_dict(self, root_dir, prepend_path, coverage_dict):
+        """
+        Load coverage in `coverage_dict` (parsed from the JSON
+        POSTed by JSCover) for sources relative to `root_dir`.
+        See `CoverageData.load_from_dict()`.
+        """
+        self._send(('load_from_dict', (root_dir, prepend_path, coverage_dict)))
+
+    def _send(self, msg):
+        """
+        Write `msg` to the pipe, prefixed by its length.
+        `marshal` is much faster than `pickle` for the plain
+        dicts and lists that coverage reports contain.
+        """
+        data = marshal.dumps(msg)
+
+        with self._lock:
+            self._pipe_file.write(struct.pack(_LENGTH_FORMAT, len(data)) + data)
+            self._pipe_file.flush()
+
+
+def apply_coverage_messages(pipe_file, coverage_data_func):
+    """
+    Read the messages sent by a `CoverageForwarder` from `pipe_file`
+    (the read end of the pipe, opened in binary mode) until the
+    worker process closes it.
+
+    Each message is applied to the `CoverageData` instance
+    returned by `coverage_data_func()` when it is received.
+    Messages from each worker are applied in the order they were sent.
+    """
+    while True:
+        header = pipe_file.read(_LENGTH_SIZE)
+
+        if len(header) < _LENGTH_SIZE:
+            return
+
+        length, = struct.unpack(_LENGTH_FORMAT, header)
+        data = pipe_file.read(length)
+
+        if len(data) < length:
+            return
+
+        try:
+            method_name, args = marshal.loads(data)
+
+            if method_name not in ('add_suite_name', 'load_from_dict'):
+                raise ValueError("Unknown method '{}'".format(method_name))
+
+            coverage_data = coverage_data_func()
+
+            if coverage_data is not None:
+                getattr(coverage_data, method_name)(*args)
+
+        except (ValueError, EOFError, TypeError) as err:
+            LOGGER.warning("Could not apply coverage from worker process: {}".format(err))
@@ -0,0 +1,391 @@
+"""
+Find the RequireJS modules a `jasmine_requirejs` suite uses.
+
+The runner page loads the suite's `main` module, which loads the
+specs, which load the sources they test, and so on.  Scanning each
+file for the dependency lists passed to `define()` and `require()`
+gives the modules reachable from `main`, and so the suite files that
+the page never loads.  The results for a suite are served as its
+module manifest:
+
+    /suite/SUITE_NAME/modules.json
+
+The scan is static: modules required using names computed at run
+time are not found.  Suites can set `prune_unreachable` in the
+`requirejs` section of their description to leave unreachable
+modules out of the runner page.  Only files that define a module
+are left out: other scripts (jQuery plugins, shims and other
+libraries that set globals) are used without being required,
+so they always stay in the page.
+"""
+
+import json
+import posixpath
+import re
+import threading
+from js_test_tool.assets import file_digest
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+# Name of the module manifest, under the suite's URL
+MODULE_MANIFEST_NAME = 'modules.json'
+
+# The module the runner page requires to start the specs
+ENTRY_MODULE = 'main'
+
+# Dependencies provided by RequireJS itself
+SPECIAL_MODULES = frozenset(['require', 'exports', 'module'])
+
+# Plugins whose resources are files loaded as they are (e.g. "text!tmpl.html")
+FILE_PLUGINS = frozenset(['text'])
+
+# String literals and comments; comments are removed before scanning
+_COMMENT_REGEX = re.compile(
+    r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/|//[^\n]*)',
+    re.DOTALL
+)
+
+# `define([...], ...)` and `define("name", [...], ...)`
+_DEFINE_REGEX = re.compile(
+    r'(?<![\w$.])define\s*\(\s*(?:(["\'])[^"\']*\1\s*,\s*)?\[([^\]]*)\]'
+)
+
+# `require([...], ...)` and `requirejs([...], ...)`
+_REQUIRE_LIST_REGEX = re.compile(r'(?<![\w$.])require(?:js)?\s*\(\s*\[([^\]]*)\]')
+
+# `require("name")`, as used by simplified CommonJS wrappers
+_REQUIRE_NAME_REGEX = re.compile(r'(?<![\w$.])require\s*\(\s*(["\'])([^"\']+)\1\s*\)')
+
+# String literals in a dependency list
+_STRING_REGEX = re.compile(r'(["\'])([^"\']*)\1')
+
+# Any call to `define()`
+_DEFINE_CALL_REGEX = re.compile(r'(?<![\w$.])define\s*\(')
+
+# Check for an AMD loader, as made by libraries that
+# also work without one (e.g. by setting a global)
+_AMD_CHECK_REGEX = re.compile(r'(?<![\w$.])define\.amd\b')
+
+
+def module_manifest_url(suite_name):
+    """
+    Return the URL of the module manifest for the suite named `suite_name`.
+    """
+    return u'/suite/{}/{}'.format(suite_name, MODULE_MANIFEST_NAME)
+
+
+def _strip_comments(contents):
+    """
+    Return `contents` (JavaScript) with the comments removed.
+    """
+    return _COMMENT_REGEX.sub(
+        lambda match: match.group(1) if match.group(1) is not None else ' ',
+        contents
+    )
+
+
+def defines_module(contents):
+    """
+    Return True if the JavaScript in `contents` (a unicode or
+    byte string) is a module: it calls `define()`, and does not
+    check for an AMD loader first, as libraries that can also
+    be loaded as plain scripts do.
+    """
+    contents = _strip_comments(contents)
+    return (_DEFINE_CALL_REGEX.search(contents) is not None and
+            _AMD_CHECK_REGEX.search(contents) is None)
+
+
+def scan_dependencies(contents):
+    """
+    Return the list of module names that the JavaScript in `contents`
+    (a unicode or byte string) passes to `define()` or `require()`,
+    in the order they first appear.
+    """
+    contents = _strip_comments(contents)
+
+    dependency_list = []
+
+    def _add(name):
+        if name and name not in dependency_list:
+            dependency_list.append(name)
+
+    for match in _DEFINE_REGEX.finditer(contents):
+        for _, name in _STRING_REGEX.findall(match.group(2)):
+            _add(name)
+
+    for match in _REQUIRE_LIST_REGEX.finditer(contents):
+        for _, name in _STRING_REGEX.findall(match.group(1)):
+            _add(name)
+
+    for match in _REQUIRE_NAME_REGEX.finditer(contents):
+        _add(match.group(2))
+
+    return dependency_list
+
+
+class DependencyScanner(object):
+    """
+    Scan files for their dependencies, caching the results
+    by the files' contents, so a file is scanned again
+    only when it changes.
+
+    This class is thread safe.
+    """
+
+    def __init__(self):
+        self._scan_dict = {}
+        self._lock = threading.Lock()
+
+    def dependencies(self, path):
+        """
+        Return the list of module names that the JavaScript file at
+        `path` depends on (see `scan_dependencies()`).
+
+        Raises an `IOError` or `OSError` if the file cannot be read.
+        """
+        dependency_list, _ = self._scan(path)
+        return list(dependency_list)
+
+    def is_module(self, path):
+        """
+        Return True if the JavaScript file at `path`
+        defines a module (see `defines_module()`).
+
+        Raises an `IOError` or `OSError` if the file cannot be read.
+        """
+        _, is_module = self._scan(path)
+        return is_module
+
+    def _scan(self, path):
+        """
+        Return a `(dependency_list, is_module)` tuple
+        for the JavaScript file at `path`.
+        """
+        digest = file_digest(path)
+
+        with self._lock:
+            scan = self._scan_dict.get(digest)
+
+        if scan is None:
+            with open(path, 'rb') as js_file:
+                contents = js_file.read()
+
+            scan = (scan_dependencies(contents), defines_module(contents))
+
+            with self._lock:
+                self._scan_dict[digest] = scan
+
+        return scan
+
+
+class ModuleGraph(object):
+    """
+    The RequireJS modules of a suite, resolved to files
+    as the runner page's RequireJS configuration would.
+    """
+
+    def __init__(self, suite_name, root_dir, base_url, path_map, scanner):
+        """
+        Resolve modules for the suite named `suite_name`, whose files
+        are relative to `root_dir`.  `base_url` and `path_map` are the
+        suite's RequireJS `baseUrl` (relative to the suite's files)
+        and `paths` configuration.  Files are scanned using `scanner`
+        (a `DependencyScanner`).
+        """
+        self._root_dir = root_dir
+        self._base_dir = base_url.strip('/')
+        self._path_map = path_map or {}
+        self._scanner = scanner
+        self._include_url = u'/suite/{}/include/'.format(suite_name)
+
+    def reachable(self, entry_module=ENTRY_MODULE):
+        """
+        Find the modules reachable from `entry_module`.
+
+        Returns a `(module_dict, resource_list, missing_list)` tuple,
+        where `module_dict` maps module names to file paths (relative
+        to the root directory), `resource_list` lists the files loaded
+        by plugins (e.g. "text!"), and `missing_list` lists modules
+        whose files could not be read.
+        """
+        module_dict = {}
+        resource_list = []
+        missing_list = []
+        pending = [(entry_module, None)]
+
+        while pending:
+            name, parent = pending.pop(0)
+            name = self._normalize(name, parent)
+
+            if name is None or name in module_dict or name in missing_list:
+                continue
+
+            # Plugin resources are loaded by the plugin module
+            if '!' in name:
+                plugin, resource = name.split('!', 1)
+                pending.append((plugin, parent))
+
+                if plugin.split('/')[-1] in FILE_PLUGINS:
+                    resource_path = self._file_path(self._normalize(resource, parent), '')
+
+                    if resource_path is not None and resource_path not in resource_list:
+                        resource_list.append(resource_path)
+
+                continue
+
+            rel_path = self._file_path(name, '.js')
+
+            # Modules loaded from other servers are not part of the suite
+            if rel_path is None:
+                continue
+
+            try:
+                dependency_list = self._scanner.dependencies(
+                    posixpath.join(self._root_dir, rel_path)
+                )
+
+            except (IOError, OSError):
+                missing_list.append(name)
+                continue
+
+            module_dict[name] = rel_path
+            pending.extend((dependency, name) for dependency in dependency_list)
+
+        return module_dict, resource_list, missing_list
+
+    def _normalize(self, name, parent):
+        """
+        Resolve `name` relative to the module named `parent`
+        (or None), returning None for modules RequireJS provides.
+        """
+        if name is None or name in SPECIAL_MODULES:
+            return None
+
+        if name.startswith('./') or name.startswith('../'):
+            parent_dir = posixpath.dirname(parent) if parent is not None else ''
+            name = posixpath.normpath(posixpath.join(parent_dir, name))
+
+        return name
+
+    def _file_path(self, name, extension):
+        """
+        Return the path (relative to the root directory) of the file
+        for the module named `name`, appending `extension` (e.g. ".js")
+        where RequireJS would.  Returns None if the file is not
+        served as part of the suite.
+        """
+        if name is None:
+            return None
+
+        # Names that look like URLs are loaded as they are
+        if name.endswith('.js') or name.startswith('/') or ':' in name:
+            url = name
+
+        else:
+            url = self._apply_path_map(name) + extension
+
+        if ':' in url:
+            return None
+
+        if url.startswith('/'):
+            if not url.startswith(self._include_url):
+                return None
+
+            rel_path = url[len(self._include_url):]
+
+        else:
+            rel_path = posixpath.join(self._base_dir, url)
+
+        rel_path = posixpath.normpath(rel_path)
+
+        if rel_path.startswith('..'):
+            return None
+
+        return rel_path
+
+    def _apply_path_map(self, name):
+        """
+        Replace the longest prefix of `name` that
+        has an entry in the `paths` configuration.
+        """
+        parts = name.split('/')
+
+        for num_parts in range(len(parts), 0, -1):
+            prefix = '/'.join(parts[:num_parts])
+            mapped = self._path_map.get(prefix)
+
+            # RequireJS tries a list of paths in order
+            if isinstance(mapped, list):
+                mapped = mapped[0] if mapped else None
+
+            if mapped is not None:
+                return '/'.join([mapped.rstrip('/')] + parts[num_parts:])
+
+        return name
+
+
+def suite_modules(suite_name, suite_desc, scanner):
+    """
+    Return the module manifest (a dict) for the suite named
+    `suite_name` described by `suite_desc`, scanning files
+    with `scanner` (a `DependencyScanner`):
+
+        * `entry`: the module the runner page requires
+        * `modules`: dict mapping reachable modules to file paths
+        * `resources`: files loaded by plugins (e.g. "text!")
+        * `missing`: reachable modules whose files could not be read
+        * `unreachable`: the suite's JavaScript files that
+          are not reachable from the entry module
+        * `unreachable_modules`: the unreachable files that define
+          modules, which can be left out of the runner page
+
+    File paths are relative to the suite's root directory.
+    """
+    graph = ModuleGraph(suite_name, suite_desc.root_dir(),
+                        suite_desc.requirejs_baseUrl(),
+                        suite_desc.requirejs_path_map(), scanner)
+
+    module_dict, resource_list, missing_list = graph.reachable()
+    reachable_paths = set(module_dict.values())
+
+    suite_paths = (suite_desc.lib_paths() + suite_desc.src_paths() +
+                   suite_desc.spec_paths())
+
+    unreachable_list = [path for path in suite_paths if path not in reachable_paths]
+
+    return {
+        'entry': ENTRY_MODULE,
+        'modules': module_dict,
+        'resources': resource_list,
+        'missing': missing_list,
+        'unreachable': unreachable_list,
+        'unreachable_modules': [
+            path for path in unreachable_list
+            if _is_module(scanner, posixpath.join(suite_desc.root_dir(), path))
+        ],
+    }
+
+
+def _is_module(scanner, path):
+    """
+    Return True if the file at `path` defines a module,
+    scanning it with `scanner` (a `DependencyScanner`).
+    Files that cannot be read are not modules.
+    """
+    try:
+        return scanner.is_module(path)
+
+    except (IOError, OSError):
+        return False
+
+
+def module_manifest(suite_name, suite_desc, scanner):
+    """
+    Return the module manifest (see `suite_modules()`)
+    as JSON (a byte string).
+    """
+    return json.dumps(suite_modules(suite_name, suite_desc, scanner),
+                      indent=4, sort_keys=True)
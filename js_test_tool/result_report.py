@@ -48,6 +48,8 @@ class ResultData(object):
                 'status': pass | fail | error | skip,
                 'detail': DETAILS
             }
+
+        Results may also have a 'duration' (in seconds).
         """
         self._result_dict[browser_name].extend(test_results)
 
@@ -3,13 +3,22 @@ Run test suites and generate coverage reports.
 """
 from js_test_tool.suite import SuiteDescription, SuiteRenderer
 from js_test_tool.suite_server import SuitePageServer, TimeoutError
-from js_test_tool.coverage_report import HtmlCoverageReporter, XmlCoverageReporter
+from js_test_tool.suite_compiler import SuiteCompiler, CompiledSuites, CompileError
+from js_test_tool.coverage_report import HtmlCoverageReporter, XmlCoverageReporter, \
+    HtmlDirCoverageReporter, LcovCoverageReporter, \
+    SnapshotCoverageReporter, SummaryCoverageReporter
+from js_test_tool.coverage_db import DatabaseCoverageReporter
+from js_test_tool.native_coverage import NativeCoverageCollector
 from js_test_tool.browser import Browser
 from js_test_tool.result_report import ResultData, \
     ConsoleResultReporter, XUnitResultReporter
+from js_test_tool.sharding import shard_url, load_durations, update_durations
+from collections import OrderedDict
 from textwrap import dedent
 import os.path
+import shlex
 import sys
+import threading
 from jinja2 import Environment, PackageLoader
 
 import logging
@@ -34,7 +43,10 @@ class SuiteRunner(object):
     """
 
     def __init__(self, browser_list, suite_page_server,
-                 result_reporters, coverage_reporters):
+                 result_reporters, coverage_reporters,
+                 coverage_browser=None, native_coverage=None,
+                 keep_server=False, pack_size=None, shard_count=None,
+                 shard_durations_path=None, tab_count=None):
         """
         Configure the suite runner to retrieve test suite pages
         from `suite_page_server` (`SuitePageServer` instance)
@@ -47,6 +59,36 @@ class SuiteRunner(object):
 
         Uses each `Browser` instance in `browser_list` to load the test
         suite pages.
+
+        If `coverage_browser` (a browser name) is specified, only that
+        browser loads instrumented sources; the other browsers load
+        the sources without instrumentation.
+
+        If `native_coverage` (a `NativeCoverageCollector`) is specified,
+        coverage is collected from the browsers' own profilers
+        instead of from the suite page server.
+
+        If `keep_server` is True, `suite_page_server` must already
+        be running; it is reused rather than started and stopped.
+
+        If `pack_size` is specified, run up to that many compatible
+        suites in each page load (see `packing`).
+
+        If `shard_count` is specified, `browser_list` has that many
+        browsers of each name.  They run one shard of each suite
+        page each, all at once, and their results are merged
+        (see `sharding`).
+
+        If `shard_durations_path` is specified, the durations of the
+        test groups are read from that JSON file to balance the shards,
+        and updated with the durations measured in each run.
+
+        If `tab_count` is specified, each browser loads the suite
+        pages in up to that many tabs at once
+        (see `Browser.get_pages_results()`).
+
+        Raises a `ValueError` if `browser_list` does not have
+        `shard_count` browsers of each name.
         """
 
         # Store dependencies
@@ -54,6 +96,29 @@ class SuiteRunner(object):
         self._suite_page_server = suite_page_server
         self._result_reporters = result_reporters
         self._coverage_reporters = coverage_reporters
+        self._coverage_browser = coverage_browser
+        self._native_coverage = native_coverage
+        self._keep_server = keep_server
+        self._pack_size = pack_size
+        self._shard_count = shard_count
+        self._shard_durations_path = shard_durations_path
+        self._tab_count = tab_count
+
+        # Browsers of the same name run the shards of each page together
+        self._browser_groups = OrderedDict()
+
+        for browser in browser_list:
+            self._browser_groups.setdefault(browser.name(), []).append(browser)
+
+        if shard_count is not None:
+            for browser_name, browser_group in self._browser_groups.items():
+                if len(browser_group) != shard_count:
+                    msg = "Expected {} '{}' browsers to run {} shards, not {}".format(
+                        shard_count, browser_name, shard_count, len(browser_group))
+                    raise ValueError(msg)
+
+        # Browsers may record coverage at the same time
+        self._native_coverage_lock = threading.Lock()
 
         # Will store the coverage data we get from the suite server
         self._report_coverage_data = None
@@ -66,23 +131,45 @@ class SuiteRunner(object):
         If configured, will write test results using reporters.
 
         Returns a `ResultData` object containing the test results.
+
+        Raises a `ValueError` if the shard durations file is invalid.
         """
 
+        # Serve the durations from earlier runs, to balance the shards
+        if self._shard_durations_path is not None:
+            self._suite_page_server.set_shard_durations(
+                load_durations(self._shard_durations_path)
+            )
+
         # Start the suite page server running on a local port
-        self._suite_page_server.start()
+        # (or discard the coverage from the server's last run)
+        if self._keep_server:
+            self._suite_page_server.reset_coverage()
+        else:
+            self._suite_page_server.start()
 
         # Create an object to hold results data for all browsers
         results_data = ResultData()
 
         try:
 
-            for browser in self._browser_list:
+            if self._shard_count is None:
+                for browser in self._browser_list:
 
-                # Run the test suite with one of our browsers
-                results_data.add_results(
-                    browser.name(),
-                    self._run_with_browser(browser)
-                )
+                    # Run the test suite with one of our browsers
+                    results_data.add_results(
+                        browser.name(),
+                        self._run_with_browser(browser)
+                    )
+
+            else:
+                for browser_name, browser_group in self._browser_groups.items():
+
+                    # Run the shards of the test suite at once
+                    results_data.add_results(
+                        browser_name,
+                        self._run_shards(browser_group)
+                    )
 
             # After all browsers have loaded their pages,
             # Block until all coverage data received
@@ -91,11 +178,15 @@ class SuiteRunner(object):
             try:
                 self._report_coverage_data = self._suite_page_server.all_coverage_data()
 
+                if self._native_coverage is not None:
+                    self._report_coverage_data = self._native_coverage.coverage_data()
+
             # If we timed out, log it, but don't exit with failure
             except TimeoutError:
                 msg = dedent("""
                 Did not receive all coverage data.  No coverage reports will be written.
-                (This sometimes occurs when JSCover does not have enough memory to run.)
+                (This sometimes occurs when JSCover does not have enough memory to run;
+                try increasing its heap size using --jscover-heap.)
                 """).strip()
                 LOGGER.warning(msg)
 
@@ -105,12 +196,17 @@ class SuiteRunner(object):
 
         # Stop the suite page server, freeing up the port
         finally:
-            self._suite_page_server.stop()
+            if not self._keep_server:
+                self._suite_page_server.stop()
 
         # Generate test result reports
         for reporter in self._result_reporters:
             reporter.write_report(results_data)
 
+        # Record how long the test groups took, to balance the next run's shards
+        if self._shard_durations_path is not None:
+            update_durations(self._shard_durations_path, results_data)
+
         return results_data
 
     def write_coverage_reports(self):
@@ -126,6 +222,13 @@ class SuiteRunner(object):
             for reporter in self._coverage_reporters:
                 reporter.write_report(self._report_coverage_data)
 
+    def coverage_data(self):
+        """
+        Return the `CoverageData` collected by the last `run()`,
+        or None if coverage was not collected.
+        """
+        return self._report_coverage_data
+
     def result_reporters(self):
         """
         Return the list of test result reporters for this runner.
@@ -138,25 +241,98 @@ class SuiteRunner(object):
         """
         return self._coverage_reporters
 
-    def _run_with_browser(self, browser):
+    def _run_shards(self, browser_list):
+        """
+        Load shard N of every test suite page in browser N of
+        `browser_list` (a list of `Browser` instances with the same name),
+        using a thread for each browser.
+
+        Returns the list of results of all the shards.
+
+        If an error occurs in any of the browsers,
+        raises the first one (e.g. a `BrowserError`).
+        """
+        shard_count = len(browser_list)
+        result_lists = [[] for _ in range(shard_count)]
+        error_list = [None] * shard_count
+
+        def _run_shard(index):
+            try:
+                result_lists[index] = self._run_with_browser(
+                    browser_list[index], shard_index=index + 1, shard_count=shard_count
+                )
+
+            except Exception:
+                error_list[index] = sys.exc_info()
+
+        thread_list = [threading.Thread(target=_run_shard, args=(index,))
+                       for index in range(shard_count)]
+
+        for thread in thread_list:
+            thread.start()
+
+        for thread in thread_list:
+            thread.join()
+
+        for exc_info in error_list:
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+
+        return [result for result_list in result_lists for result in result_list]
+
+    def _run_with_browser(self, browser, shard_index=None, shard_count=None):
         """
         Load all test suite pages in `browser` (a `Browser` instance)
         and returns a `ResultData` instance.
 
+        If `shard_index` and `shard_count` are specified, the pages
+        run only that shard (numbered from 1) of their specs.
+
         If an error occurs when retrieving or parsing the page,
         raises a `BrowserError`.
         """
 
         all_results = []
 
+        # Only the coverage browser (if any) loads instrumented sources
+        raw_src = (self._coverage_browser is not None and
+                   browser.name() != self._coverage_browser)
+
+        if self._pack_size is not None:
+            url_list = self._suite_page_server.packed_suite_url_list(self._pack_size,
+                                                                     raw_src=raw_src)
+        else:
+            url_list = self._suite_page_server.suite_url_list(raw_src=raw_src)
+
+        if shard_count is not None:
+            url_list = [shard_url(url, shard_index, shard_count) for url in url_list]
+
+        # Load the suite pages in several tabs at once
+        if self._tab_count is not None:
+            for results in browser.get_pages_results(url_list):
+                all_results.extend(results)
+
+            self._add_script_coverage(browser)
+
         # Load each suite page URL
-        for url in self._suite_page_server.suite_url_list():
+        else:
+            for url in url_list:
 
-            # Use the browser to load the page and parse the results
-            all_results.extend(browser.get_page_results(url))
+                # Use the browser to load the page and parse the results
+                all_results.extend(browser.get_page_results(url))
+                self._add_script_coverage(browser)
 
         return all_results
 
+    def _add_script_coverage(self, browser):
+        """
+        Convert any coverage recorded by the profiler of `browser`
+        (a `Browser` instance) if collecting native coverage.
+        """
+        if self._native_coverage is not None:
+            with self._native_coverage_lock:
+                self._native_coverage.add_script_coverage(browser.take_script_coverage())
+
 
 class SuiteRunnerFactory(object):
     """
@@ -166,6 +342,10 @@ class SuiteRunnerFactory(object):
     # Supported browser names
     SUPPORTED_BROWSERS = ['chrome', 'firefox', 'phantomjs']
 
+    # Ways to collect coverage: instrument sources using JSCover,
+    # or use the browser's built-in profiler
+    COVERAGE_BACKENDS = ['jscover', 'native']
+
     def __init__(
         self, desc_class=SuiteDescription,
         renderer_class=SuiteRenderer,
@@ -173,8 +353,16 @@ class SuiteRunnerFactory(object):
         console_result_class=ConsoleResultReporter,
         xunit_result_class=XUnitResultReporter,
         html_coverage_class=HtmlCoverageReporter,
+        html_dir_coverage_class=HtmlDirCoverageReporter,
         xml_coverage_class=XmlCoverageReporter,
-        browser_class=Browser
+        lcov_coverage_class=LcovCoverageReporter,
+        db_coverage_class=DatabaseCoverageReporter,
+        snapshot_coverage_class=SnapshotCoverageReporter,
+        summary_coverage_class=SummaryCoverageReporter,
+        native_coverage_class=NativeCoverageCollector,
+        browser_class=Browser,
+        compiler_class=SuiteCompiler,
+        compiled_class=CompiledSuites
     ):
         """
         Configure the factory to use the provided classes.
@@ -186,13 +374,29 @@ class SuiteRunnerFactory(object):
         self._console_result_class = console_result_class
         self._xunit_result_class = xunit_result_class
         self._html_coverage_class = html_coverage_class
+        self._html_dir_coverage_class = html_dir_coverage_class
         self._xml_coverage_class = xml_coverage_class
+        self._lcov_coverage_class = lcov_coverage_class
+        self._db_coverage_class = db_coverage_class
+        self._snapshot_coverage_class = snapshot_coverage_class
+        self._summary_coverage_class = summary_coverage_class
+        self._native_coverage_class = native_coverage_class
         self._browser_class = browser_class
+        self._compiler_class = compiler_class
+        self._compiled_class = compiled_class
 
     def build_runner(
         self, suite_path_list, browser_names,
         xunit_path, coverage_xml_path,
-        coverage_html_path, timeout_sec
+        coverage_html_path, timeout_sec,
+        coverage_db_path=None, coverage_snapshot_path=None,
+        coverage_html_dir_path=None, coverage_lcov_path=None,
+        coverage_summary_path=None, collect_coverage=False,
+        coverage_browser=None, coverage_backend='jscover',
+        jscover_heap=None, console_stream=None, keep_server=False,
+        server_workers=None, server_processes=None, compiled_dir=None,
+        pack_size=None, shard_count=None, shard_durations_path=None,
+        tab_count=None
     ):
         """
         Configure `SuiteRunner` instances for each suite description.
@@ -208,10 +412,63 @@ class SuiteRunnerFactory(object):
         * Generate a console and XUnit report of test results.
         The XUnit report will be written to `xunit_path` if specified.
 
-        * Write coverage reports to `coverage_xml_path` (Cobertura XML format)
-          and `coverage_html_path` (HTML).
+        * Write coverage reports to `coverage_xml_path` (Cobertura XML format),
+          `coverage_html_path` (HTML), `coverage_html_dir_path`
+          (a directory with an HTML page per source file)
+          and `coverage_lcov_path` (LCOV tracefile).
+
+        * Record coverage for the run in the SQLite database
+          at `coverage_db_path`.
+
+        * Write a coverage snapshot (for `js-test-tool combine`)
+          to `coverage_snapshot_path`.
+
+        * Write a JSON coverage summary to `coverage_summary_path`.
 
         If the coverage paths are `None`, that report will not be generated.
+        If `collect_coverage` is True, coverage is collected even if
+        no report will be generated (e.g. to check a coverage threshold).
+
+        If `coverage_browser` (one of `browser_names`) is specified,
+        coverage is collected only from that browser.
+
+        `coverage_backend` is either "jscover" (instrument sources
+        using JSCover) or "native" (use the precise coverage reported
+        by Chrome, serving the sources unmodified).
+
+        `jscover_heap` is the maximum heap size of the JSCover JVMs
+        (e.g. "1g"), or None to use the JVM's default.
+
+        The console report is written to `console_stream`
+        (defaults to stdout).
+
+        If `keep_server` is True, the server returned by `server_class`
+        must already be running, and the runner will leave it running.
+
+        If `server_workers` is specified, the server handles requests
+        using a pool of that many threads rather than a thread per connection.
+        If `server_processes` is specified, the server forks that
+        many worker processes to handle requests.
+
+        If `compiled_dir` is specified, run the suites written there by
+        `js-test-tool compile` instead of those in `suite_path_list`,
+        serving them read-only.  Coverage can be collected using JSCover
+        only if the sources were instrumented when they were compiled.
+
+        If `pack_size` is specified, up to that many suites that use the
+        `jasmine` runner and include the same libraries are run in each
+        page load (see `packing`).  Compiled suites are never packed.
+
+        If `shard_count` is specified, start that many instances of each
+        browser, and split the specs of each suite page between them
+        (see `sharding`).  The durations of the test groups are recorded
+        in the JSON file at `shard_durations_path` (if specified), and
+        used to balance the shards of the next run.
+
+        If `tab_count` is specified, each browser that supports tabs
+        (see `Browser.TABBED_BROWSERS`) loads up to that many suite
+        pages at once, each in its own tab; other browsers load
+        one page at a time.
 
         Returns a tuple `(suite_runners, browsers)`
 
@@ -224,17 +481,40 @@ class SuiteRunnerFactory(object):
         Uses the environment variable `JSCOVER_JAR` to configure
         the server to instrument JavaScript sources for coverage.
         `JSCOVER_JAR` should be a path to the JSCover JAR file.
+        Additional JVM options can be set using `JSCOVER_JVM_OPTS`.
 
-        Raises an `UnknownBrowserError` if an invalid browser name is provided.
-        Raises a `ValueError` if no browser names are provided.
+        Raises an `UnknownBrowserError` if an invalid browser name is provided,
+        or if `coverage_browser` is not in `browser_names`.
+        Raises a `ValueError` if no browser names are provided,
+        or if the coverage backend is invalid.
+        Raises a `CompileError` if the compiled suites cannot be loaded.
         """
 
         # Validate the list of browser names
         # Can raise an exception if the list is invalid
         self._validate_browser_names(browser_names)
 
+        if coverage_browser is not None and coverage_browser not in browser_names:
+            msg = "Coverage browser '{}' is not one of the browsers used.".format(coverage_browser)
+            raise UnknownBrowserError(msg)
+
+        if coverage_backend not in self.COVERAGE_BACKENDS:
+            raise ValueError("Unknown coverage backend '{}'".format(coverage_backend))
+
         # Load the suite descriptions
-        suite_desc_list = self._build_suite_descriptions(suite_path_list)
+        compiled = None
+
+        if compiled_dir is not None:
+            compiled = self._compiled_class(compiled_dir)
+            suite_desc_list = compiled.descriptions()
+
+            if compiled.instrumented() and coverage_backend == 'native':
+                msg = ("The compiled sources are instrumented for JSCover; "
+                       "compile them without --instrument to use native coverage.")
+                raise CompileError(msg)
+
+        else:
+            suite_desc_list = self._build_suite_descriptions(suite_path_list)
 
         # Create a renderer
         renderer = self._renderer_class()
@@ -242,14 +522,143 @@ class SuiteRunnerFactory(object):
         # Create the test result reporters
         # Always create a console reporter
         # Create the XUnit reporter only if a path is specified
-        result_reporters = [self._console_result_class(sys.stdout)]
+        result_reporters = [self._console_result_class(console_stream or sys.stdout)]
         if xunit_path is not None:
             xunit_file = open(xunit_path, 'w')
             xunit_reporter = self._xunit_result_class(xunit_file)
             result_reporters.append(xunit_reporter)
 
         # Create the coverage reporters
+        coverage_reporters = self.build_coverage_reporters(
+            coverage_xml_path=coverage_xml_path,
+            coverage_html_path=coverage_html_path,
+            coverage_db_path=coverage_db_path,
+            coverage_snapshot_path=coverage_snapshot_path,
+            coverage_html_dir_path=coverage_html_dir_path,
+            coverage_lcov_path=coverage_lcov_path,
+            coverage_summary_path=coverage_summary_path,
+            browser_names=browser_names,
+            metadata={'suite_paths': suite_path_list}
+        )
+
+        # Names of the browsers that record native coverage
+        native_browser_names = []
+        native_coverage = None
+        jscover_path = None
+        jvm_options = None
+
+        # Configure to use coverage only if we expect a report
+        # (or the caller needs the coverage data)
+        if len(coverage_reporters) > 0 or collect_coverage:
+
+            # Use the browser's profiler instead of JSCover
+            if coverage_backend == 'native':
+                native_browser_names = [
+                    name for name in browser_names
+                    if name in Browser.NATIVE_COVERAGE_BROWSERS
+                    and coverage_browser in (None, name)
+                ]
+
+                if len(native_browser_names) == 0:
+                    msg = "Native coverage requires one of: {}".format(
+                        ', '.join(Browser.NATIVE_COVERAGE_BROWSERS))
+                    raise UnknownBrowserError(msg)
+
+                native_coverage = self._native_coverage_class(suite_desc_list)
+
+            # Compiled sources are instrumented in advance (if at all)
+            elif compiled is not None:
+                if not compiled.instrumented():
+                    LOGGER.warning("The compiled sources were not instrumented: "
+                                   "no coverage reports will be generated.")
+
+            else:
+                jscover_path = self._jscover_path()
+                jvm_options = self._jvm_options(jscover_heap)
+
+        # Create the suite page server
+        # We re-use the same server across test suites
+        server = self._server_class(suite_desc_list, renderer,
+                                    jscover_path=jscover_path,
+                                    jvm_options=jvm_options,
+                                    workers=server_workers,
+                                    processes=server_processes,
+                                    compiled=compiled)
+
+        # Create a list of all browsers we will need,
+        # with an instance of each browser for each shard
+        browsers = [self._browser_class(name, timeout_sec=timeout_sec,
+                                        native_coverage=(name in native_browser_names),
+                                        max_tabs=self._max_tabs(name, tab_count))
+                    for name in browser_names
+                    for _ in range(shard_count or 1)]
+
+        # Create a suite runner for each description
+        runner = SuiteRunner(
+            browsers, server,
+            result_reporters, coverage_reporters,
+            coverage_browser=coverage_browser,
+            native_coverage=native_coverage,
+            keep_server=keep_server,
+            pack_size=pack_size,
+            shard_count=shard_count,
+            shard_durations_path=shard_durations_path,
+            tab_count=tab_count
+        )
+
+        # Return the list of suite runner and browsers
+        return runner, browsers
+
+    def compile_suites(self, suite_path_list, output_dir,
+                       instrument=False, jscover_heap=None, hardlink=False):
+        """
+        Write the pages and dependencies of the suites described by
+        the files in `suite_path_list` to `output_dir`, so that they
+        can be served without rendering or searching for files
+        (see `SuiteCompiler`).
+
+        If `instrument` is True, instrument the sources using JSCover
+        (configured as for `build_runner()`), with the maximum JVM heap
+        size `jscover_heap`.  If `hardlink` is True, hard-link
+        dependencies rather than copying them where possible.
+
+        Returns the `CompiledSuites` written.
+
+        Raises a `CompileError` if the suites could not be compiled.
+        """
+        suite_desc_list = self._build_suite_descriptions(suite_path_list)
+        jscover_path = None
+        jvm_options = None
+
+        if instrument:
+            jscover_path = self._jscover_path()
+
+            if jscover_path is None:
+                raise CompileError("JSCover is required to instrument the sources.")
+
+            jvm_options = self._jvm_options(jscover_heap)
+
+        compiler = self._compiler_class(self._renderer_class(),
+                                        jscover_path=jscover_path,
+                                        jvm_options=jvm_options)
+
+        return compiler.compile(suite_desc_list, output_dir, hardlink=hardlink)
+
+    def build_coverage_reporters(
+        self, coverage_xml_path=None, coverage_html_path=None,
+        coverage_db_path=None, coverage_snapshot_path=None,
+        coverage_html_dir_path=None, coverage_lcov_path=None,
+        coverage_summary_path=None, browser_names=None, metadata=None
+    ):
+        """
+        Return a list of coverage reporters, one for each
+        report path that is not `None`.
+
+        `browser_names` and `metadata` are recorded with
+        the run in the coverage database.
+        """
         coverage_reporters = []
+
         if coverage_xml_path is not None:
             xml_coverage = self._xml_coverage_class(coverage_xml_path)
             coverage_reporters.append(xml_coverage)
@@ -258,45 +667,78 @@ class SuiteRunnerFactory(object):
             html_coverage = self._html_coverage_class(coverage_html_path)
             coverage_reporters.append(html_coverage)
 
-        # Configure to use coverage only if we expect a report
-        if len(coverage_reporters) > 0:
+        if coverage_html_dir_path is not None:
+            html_dir_coverage = self._html_dir_coverage_class(coverage_html_dir_path)
+            coverage_reporters.append(html_dir_coverage)
 
-            # Get the path to the JSCover JAR file from an env variable
-            jscover_path = os.environ.get('JSCOVER_JAR')
+        if coverage_lcov_path is not None:
+            lcov_coverage = self._lcov_coverage_class(coverage_lcov_path)
+            coverage_reporters.append(lcov_coverage)
 
-            # Print a warning if the path isn't set
-            if jscover_path is None:
-                msg = dedent("""
-                JSCover is not configured: no coverage reports will be generated.
+        if coverage_db_path is not None:
+            db_coverage = self._db_coverage_class(
+                coverage_db_path, browser_names=browser_names,
+                metadata=metadata
+            )
+            coverage_reporters.append(db_coverage)
 
-                To configure JSCover:
+        if coverage_snapshot_path is not None:
+            snapshot_coverage = self._snapshot_coverage_class(coverage_snapshot_path)
+            coverage_reporters.append(snapshot_coverage)
 
-                1) Download the latest version from http://tntim96.github.io/JSCover/
-                2) Set the JSCOVER_JAR environment variable as the path to JSCover-all.jar
-                """).strip()
+        if coverage_summary_path is not None:
+            summary_coverage = self._summary_coverage_class(coverage_summary_path)
+            coverage_reporters.append(summary_coverage)
 
-                LOGGER.warning(msg)
+        return coverage_reporters
 
-        else:
-            jscover_path = None
+    @staticmethod
+    def _jscover_path():
+        """
+        Return the path to the JSCover JAR file, configured using
+        the `JSCOVER_JAR` environment variable, or None if it is not set.
+        """
+        jscover_path = os.environ.get('JSCOVER_JAR')
 
-        # Create the suite page server
-        # We re-use the same server across test suites
-        server = self._server_class(suite_desc_list, renderer,
-                                    jscover_path=jscover_path)
+        # Print a warning if the path isn't set
+        if jscover_path is None:
+            msg = dedent("""
+            JSCover is not configured: no coverage reports will be generated.
 
-        # Create a list of all browsers we will need
-        browsers = [self._browser_class(name, timeout_sec=timeout_sec)
-                    for name in browser_names]
+            To configure JSCover:
 
-        # Create a suite runner for each description
-        runner = SuiteRunner(
-            browsers, server,
-            result_reporters, coverage_reporters
-        )
+            1) Download the latest version from http://tntim96.github.io/JSCover/
+            2) Set the JSCOVER_JAR environment variable as the path to JSCover-all.jar
+            """).strip()
 
-        # Return the list of suite runner and browsers
-        return runner, browsers
+            LOGGER.warning(msg)
+
+        return jscover_path
+
+    @staticmethod
+    def _jvm_options(jscover_heap):
+        """
+        Return the list of options for the JSCover JVMs:
+        those in the `JSCOVER_JVM_OPTS` environment variable,
+        followed by the maximum heap size `jscover_heap` (if not None).
+        """
+        jvm_options = shlex.split(os.environ.get('JSCOVER_JVM_OPTS', ''))
+
+        if jscover_heap is not None:
+            jvm_options.append('-Xmx{}'.format(jscover_heap))
+
+        return jvm_options
+
+    @staticmethod
+    def _max_tabs(browser_name, tab_count):
+        """
+        Return the number of tabs the browser named `browser_name`
+        should load pages in, given the `tab_count` requested (or None).
+        """
+        if tab_count is not None and browser_name in Browser.TABBED_BROWSERS:
+            return tab_count
+        else:
+            return 1
 
     def _build_suite_descriptions(self, suite_path_list):
         """
@@ -13,17 +13,55 @@ jasmine.JsonReporter = function(divId, suiteName) {
     // test results.
     // `suiteName` is the unique suite name, used to report back
     // coverage information to the server (if JSCover is configured).
+    // Pages running several suites pass a list of their names,
+    // and report coverage for each suite separately.
     this._divId = divId;
     this._suiteName = suiteName;
+    this._packed = (suiteName instanceof Array);
+
+    // Pages loaded with "?shard=INDEX/COUNT" run only the test
+    // groups assigned to that shard (see `_assignShards()`)
+    this._shard = jasmine.JsonReporter.parseShard(window.location.search);
+    this._groupShards = null;
 
     // Create a list to hold test results
     this._testResultList = [];
 };
 
+jasmine.JsonReporter.parseShard = function(search) {
+    // Parse the "shard=INDEX/COUNT" GET parameter in `search`
+    // (the query string of the page's URL).
+    // Returns an object with the zero-based shard `index` and
+    // the shard `count`, or null if the page runs every spec.
+    var match = /[?&]shard=(\d+)(?:\/|%2F)(\d+)/i.exec(search || "");
+
+    if (match) {
+        var index = parseInt(match[1], 10);
+        var count = parseInt(match[2], 10);
+
+        if (count >= 1 && index >= 1 && index <= count) {
+            return {index: index - 1, count: count};
+        }
+    }
+
+    return null;
+};
+
+jasmine.JsonReporter.prototype.reportSpecStarting = function(spec) {
+    // Record when `spec` (a Jasmine spec) started,
+    // so we can report how long it took
+    spec.jsTestToolStartTime = new Date().getTime();
+};
+
 jasmine.JsonReporter.prototype.reportSpecResults = function(spec) {
     // Record the test result for a test spec
     // `spec` is the Jasmine spec
-    
+
+    // Specs in other shards are run by other pages
+    if (!this.specFilter(spec)) {
+        return;
+    }
+
     // Retrieve information from the spec
     var testGroup = spec.suite.getFullName();
     var testName = spec.description;
@@ -34,6 +72,10 @@ jasmine.JsonReporter.prototype.reportSpecResults = function(spec) {
     var result = new jasmine.JsonReporter.Result(testGroup, testName,
                                                  testStatus, testDetail);
 
+    if (spec.jsTestToolStartTime) {
+        result.testDuration = new Date().getTime() - spec.jsTestToolStartTime;
+    }
+
     // Add the test result to our list of results
     this._testResultList.push(result);
 };
@@ -49,9 +91,18 @@ jasmine.JsonReporter.prototype.reportRunnerResults = function(runner) {
         // Trigger JSCover to POST coverage data to server
         // at /jscoverage-store/{suite_num}
         // where {suite_num} is the argument to jscoverage_report.
+        // Packed suites POST to /jscoverage-store/{suite_num}/pack,
+        // so the server keeps only the coverage of that suite's sources.
         if (window.jscoverage_report) {
             try {
-                jscoverage_report(this._suiteName)
+                if (this._packed) {
+                    for (var i = 0; i < this._suiteName.length; i++) {
+                        jscoverage_report(this._suiteName[i] + "/pack")
+                    }
+                }
+                else {
+                    jscoverage_report(this._suiteName)
+                }
             }
             catch(err) {
                 window.js_test_tool.reportError(err)
@@ -74,14 +125,113 @@ jasmine.JsonReporter.prototype.reportRunnerResults = function(runner) {
 };
 
 jasmine.JsonReporter.prototype.specFilter = function(spec) {
-    // Do not filter specs -- instead, always show everything
-    return true;
+    // Run every spec, unless the page runs one shard of the suite
+    if (!this._shard) {
+        return true;
+    }
+
+    if (!this._groupShards) {
+        this._groupShards = this._assignShards();
+    }
+
+    return this._groupShards[spec.suite.getFullName()] === this._shard.index;
 };
 
 
 /*
  * Private helper methods.
  */
+jasmine.JsonReporter.prototype._assignShards = function() {
+    // Return an object mapping the name of each test group
+    // (the full name of a Jasmine suite) to the zero-based
+    // index of the shard that runs its specs.
+    //
+    // Groups are balanced across the shards by the time they
+    // took in earlier runs, estimating the time of groups
+    // that were not timed from their number of specs.
+    // Every shard of the page assigns the groups in the same way.
+    var specs = jasmine.getEnv().currentRunner().specs();
+    var durations = this._loadDurations();
+    var groupList = [];
+    var groupDict = {};
+    var i;
+
+    for (i = 0; i < specs.length; i++) {
+        var name = specs[i].suite.getFullName();
+
+        if (!groupDict.hasOwnProperty(name)) {
+            groupDict[name] = {name: name, index: groupList.length, numSpecs: 0};
+            groupList.push(groupDict[name]);
+        }
+
+        groupDict[name].numSpecs += 1;
+    }
+
+    // Average time per spec of the groups that were timed
+    var timedSeconds = 0;
+    var timedSpecs = 0;
+
+    for (i = 0; i < groupList.length; i++) {
+        if (durations.hasOwnProperty(groupList[i].name)) {
+            timedSeconds += durations[groupList[i].name];
+            timedSpecs += groupList[i].numSpecs;
+        }
+    }
+
+    var secondsPerSpec = (timedSeconds > 0) ? timedSeconds / timedSpecs : 1;
+
+    for (i = 0; i < groupList.length; i++) {
+        var group = groupList[i];
+        group.weight = durations.hasOwnProperty(group.name) ?
+            durations[group.name] : group.numSpecs * secondsPerSpec;
+    }
+
+    // Give the longest groups first to the shard with the least to do
+    groupList.sort(function(a, b) {
+        return (b.weight - a.weight) || (a.index - b.index);
+    });
+
+    var loads = [];
+    for (i = 0; i < this._shard.count; i++) {
+        loads.push(0);
+    }
+
+    var groupShards = {};
+
+    for (i = 0; i < groupList.length; i++) {
+        var shard = 0;
+
+        for (var j = 1; j < loads.length; j++) {
+            if (loads[j] < loads[shard]) {
+                shard = j;
+            }
+        }
+
+        groupShards[groupList[i].name] = shard;
+        loads[shard] += groupList[i].weight;
+    }
+
+    return groupShards;
+};
+
+jasmine.JsonReporter.prototype._loadDurations = function() {
+    // Return an object mapping test group names to the
+    // number of seconds they took in earlier runs,
+    // or an empty object if they were not recorded.
+    try {
+        var request = new XMLHttpRequest();
+        request.open("GET", "/shard-durations.json", false);
+        request.send(null);
+
+        if (request.status === 200) {
+            return JSON.parse(request.responseText) || {};
+        }
+    }
+    catch(err) {}
+
+    return {};
+};
+
 jasmine.JsonReporter.prototype._getTestStatus = function(spec) {
     // Given `spec` (a Jasmine spec), return a string
     // indicating the result of the test.
@@ -143,7 +293,6 @@ jasmine.JsonReporter.prototype._jsonResults = function() {
 
 /* We do not use most of the reporter functions Jasmine defines. */
 jasmine.JsonReporter.prototype.reportRunnerStarting = function() {};
-jasmine.JsonReporter.prototype.reportSpectStarting = function() {};
 jasmine.JsonReporter.prototype.reportSuiteResults = function(suite) {};
 
 
@@ -157,6 +306,8 @@ jasmine.JsonReporter.Result = function(testGroup, testName,
     // `testName` is the name of the specific test case
     // `testStatus` is either "pass", "fail", "error", or "skip"
     // `testDetail` is a string describing the test result
+    // The reporter adds `testDuration` (in milliseconds)
+    // for specs it timed.
     this.testGroup = escape(testGroup);
     this.testName = escape(testName);
     this.testStatus = escape(testStatus);
@@ -0,0 +1,111 @@
+"""
+Split the specs of a suite across several pages, so that
+more than one browser can run them at once.
+
+A runner page loaded with the GET parameter
+
+    ?shard=INDEX/COUNT
+
+(e.g. "?shard=2/4") runs only the specs in shard INDEX of COUNT,
+numbered from 1.  Specs are assigned to shards by test group
+(the Jasmine suite that defines them), so the specs of a group
+always run together.  The groups are balanced across the shards
+by the time they took in earlier runs, which pages load from
+
+    /shard-durations.json
+
+and, for groups that have not been timed, by their number of specs.
+Every shard loads the same scripts and durations, so every shard
+assigns the groups in the same way.
+"""
+
+from collections import defaultdict
+import json
+import os.path
+
+
+# GET parameter selecting the shard a page runs
+SHARD_PARAM = 'shard'
+
+# URL path from which pages load the durations of the test groups
+SHARD_DURATIONS_URL = '/shard-durations.json'
+
+
+def shard_url(url, shard_index, shard_count):
+    """
+    Return `url` (the URL of a runner page) with the GET parameter
+    selecting shard `shard_index` (numbered from 1) of `shard_count`.
+    """
+    separator = u'&' if u'?' in url else u'?'
+    return u'{}{}{}={}/{}'.format(url, separator, SHARD_PARAM,
+                                  shard_index, shard_count)
+
+
+def group_durations(result_data):
+    """
+    Return a dict mapping test group names to the number of seconds
+    their specs took in `result_data` (a `ResultData` instance),
+    averaged over the browsers that ran them.
+
+    Results without a duration are ignored.
+    """
+    total_dict = defaultdict(float)
+    count_dict = defaultdict(int)
+
+    for browser_name in result_data.browsers():
+        browser_dict = defaultdict(float)
+
+        for result in result_data.test_results(browser_name):
+            duration = result.get('duration')
+
+            if duration is not None:
+                browser_dict[result['test_group']] += duration
+
+        for group_name, duration in browser_dict.items():
+            total_dict[group_name] += duration
+            count_dict[group_name] += 1
+
+    return {
+        group_name: total_dict[group_name] / count_dict[group_name]
+        for group_name in total_dict
+    }
+
+
+def load_durations(path):
+    """
+    Load the dict mapping test group names to durations (in seconds)
+    from the JSON file at `path`.  Returns an empty dict if the file
+    does not exist yet.
+
+    Raises a `ValueError` if the file does not contain durations.
+    """
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as durations_file:
+        durations = json.load(durations_file)
+
+    if not isinstance(durations, dict) or not all(
+            isinstance(duration, (int, float)) for duration in durations.values()):
+        raise ValueError("'{}' is not a shard durations file".format(path))
+
+    return durations
+
+
+def update_durations(path, result_data):
+    """
+    Record the test group durations measured in `result_data`
+    (a `ResultData` instance) in the JSON file at `path`,
+    keeping the durations of groups that did not run.
+
+    Returns the updated dict of durations.
+
+    Raises a `ValueError` if the file exists but does not contain durations.
+    """
+    durations = load_durations(path)
+    durations.update(group_durations(result_data))
+
+    with open(path, 'w') as durations_file:
+        json.dump(durations, durations_file, indent=4, sort_keys=True)
+
+    return durations
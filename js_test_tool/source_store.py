@@ -0,0 +1,196 @@
+"""
+Process-wide cache of JavaScript source files, shared by
+`CoverageData` and the coverage reporters so that each
+source file is read from disk once.
+"""
+
+import os
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+class _SourceEntry(object):
+    """
+    Cached contents of a single source file.
+    The decoded text, lines and line offsets are computed on demand.
+    """
+
+    def __init__(self, stat_key, contents):
+        """
+        Store `contents` (a byte string) read from a file
+        whose size and modification time are `stat_key`.
+        """
+        self.stat_key = stat_key
+        self.contents = contents
+
+        # Count the lines the way `file.readlines()` would:
+        # a final line without a newline still counts.
+        # `str.count()` scans the whole buffer in C.
+        self.num_lines = contents.count('\n')
+        if contents and not contents.endswith('\n'):
+            self.num_lines += 1
+
+        self.text = None
+        self.lines = None
+        self.line_offsets = None
+
+
+class SourceStore(object):
+    """
+    Least-recently-used cache of source file contents.
+
+    Entries are checked against the file's size and modification
+    time on each access, so changed files are read again.
+
+    This class is thread safe.
+    """
+
+    # Maximum number of files to keep in memory
+    DEFAULT_MAX_ENTRIES = 512
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Create an empty store holding at most `max_entries` files.
+        """
+        self._max_entries = max_entries
+        self._entry_dict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def num_lines(self, path):
+        """
+        Return the number of lines in the file at `path`.
+        If the file could not be read, returns 0.
+        """
+        entry = self._entry(path)
+        return entry.num_lines if entry is not None else 0
+
+    def text(self, path):
+        """
+        Return the contents of the file at `path` decoded as UTF-8.
+        If the file could not be read, returns None.
+        """
+        entry = self._entry(path)
+
+        if entry is None:
+            return None
+
+        if entry.text is None:
+            entry.text = entry.contents.decode('utf8')
+
+        return entry.text
+
+    def lines(self, path):
+        """
+        Return a list of the lines in the file at `path`
+        as unicode strings, without newline characters.
+        If the file could not be read, returns None.
+        """
+        entry = self._entry(path)
+
+        if entry is None:
+            return None
+
+        if entry.lines is None:
+            text = self.text(path)
+            lines = text.split(u'\n') if text else []
+
+            # A trailing newline ends the last line
+            # rather than starting a new one
+            if lines and lines[-1] == u'':
+                lines.pop()
+
+            entry.lines = lines
+
+        return entry.lines
+
+    def line_offsets(self, path):
+        """
+        Return a list of the character offsets (in the decoded text)
+        at which each line of the file at `path` starts.
+        If the file could not be read, returns None.
+        """
+        entry = self._entry(path)
+
+        if entry is None:
+            return None
+
+        if entry.line_offsets is None:
+            offsets = [0]
+            for line in self.lines(path)[:-1]:
+                offsets.append(offsets[-1] + len(line) + 1)
+            entry.line_offsets = offsets
+
+        return entry.line_offsets
+
+    def line_for_offset(self, path, offset):
+        """
+        Return the (1-based) line number containing the character
+        `offset` in the file at `path`, or None if the file
+        could not be read.
+        """
+        offsets = self.line_offsets(path)
+
+        if offsets is None:
+            return None
+
+        return bisect_right(offsets, offset)
+
+    def clear(self):
+        """
+        Remove all cached files.
+        """
+        with self._lock:
+            self._entry_dict.clear()
+
+    def _entry(self, path):
+        """
+        Return the up-to-date `_SourceEntry` for `path`,
+        reading the file if necessary.  Returns None
+        if the file could not be read.
+        """
+        path = os.path.abspath(path)
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._evict(path)
+            return None
+
+        stat_key = (stat.st_size, stat.st_mtime)
+
+        with self._lock:
+            entry = self._entry_dict.pop(path, None)
+
+            if entry is not None and entry.stat_key == stat_key:
+                self._entry_dict[path] = entry
+                return entry
+
+        try:
+            with open(path, 'rb') as src_file:
+                entry = _SourceEntry(stat_key, src_file.read())
+
+        except IOError:
+            return None
+
+        with self._lock:
+            self._entry_dict[path] = entry
+
+            while len(self._entry_dict) > self._max_entries:
+                self._entry_dict.popitem(last=False)
+
+        return entry
+
+    def _evict(self, path):
+        """
+        Remove `path` from the cache, if present.
+        """
+        with self._lock:
+            self._entry_dict.pop(path, None)
+
+
+# Store shared by everything in this process
+SOURCE_STORE = SourceStore()
@@ -9,6 +9,10 @@ import re
 import json
 from jinja2 import Environment, PackageLoader
 import urllib
+from js_test_tool.assets import lib_asset_url, runner_asset_url, runner_module_paths
+from js_test_tool.fixtures import fixture_bundle_url
+from js_test_tool.requirejs import DependencyScanner, suite_modules
+from js_test_tool.packing import pack_key
 
 import logging
 LOGGER = logging.getLogger(__name__)
@@ -86,6 +90,13 @@ class SuiteDescription(object):
         rules = self._desc_dict.get('exclude_from_page', [])
         self._exclude_regex_list = [re.compile(r) for r in rules]
 
+        # Compile the rules for instrumenting sources for coverage
+        rules = self._desc_dict.get('instrument_include', [])
+        self._instr_include_regex_list = [re.compile(r) for r in rules]
+
+        rules = self._desc_dict.get('instrument_exclude', [])
+        self._instr_exclude_regex_list = [re.compile(r) for r in rules]
+
         # Try to find all paths once, with warnings enabled
         # This way, we print warnings for missing files to the
         # console only one time.
@@ -194,6 +205,23 @@ class SuiteDescription(object):
         else:
             return []
 
+    def preload_fixtures(self):
+        """
+        Return True if the runner page should load all the fixtures
+        in one request at page start, rather than one at a time
+        as specs use them (see `fixtures`).
+        """
+        return self._desc_dict.get('preload_fixtures', False)
+
+    def asset_urls(self):
+        """
+        Return True if the runner page should load the libraries from
+        their asset URLs (shared by every suite, and cached by browsers),
+        or False to load them from the suite's own URLs, next to the
+        files they load relative to their own URL.
+        """
+        return self._desc_dict.get('asset_urls', True)
+
     def requirejs_path_map(self):
         """
         Returns a map of aliases to paths, used by requirejs in loading files.
@@ -210,6 +238,16 @@ class SuiteDescription(object):
             return ""
         return self._desc_dict["requirejs"].get("baseUrl", "")
 
+    def requirejs_prune_unreachable(self):
+        """
+        Return True if scripts included in the runner page that are not
+        reachable from the suite's `main` module should be left out of
+        the page (see `requirejs`).
+        """
+        if not "requirejs" in self._desc_dict:
+            return False
+        return self._desc_dict["requirejs"].get("prune_unreachable", False)
+
     def test_runner(self):
         """
         Return the name of the test runner to use (e.g. "Jasmine")
@@ -219,6 +257,32 @@ class SuiteDescription(object):
         # so the key is guaranteed to exist
         return self._desc_dict['test_runner']
 
+    def should_instrument(self, src_path):
+        """
+        Return True if and only if the source file at `src_path`
+        (relative to the root directory) should be instrumented
+        to collect coverage information.
+
+        If there are `instrument_include` rules in the YAML description,
+        a source is instrumented only if it matches one of them.
+        A source that matches an `instrument_exclude` rule is
+        never instrumented.
+        """
+
+        # If include rules are specified, the source must match one
+        if self._instr_include_regex_list:
+            if not any(regex.match(src_path) is not None
+                       for regex in self._instr_include_regex_list):
+                return False
+
+        # Exclude rules take precedence over include rules
+        for exclude_regex in self._instr_exclude_regex_list:
+            if exclude_regex.match(src_path) is not None:
+                return False
+
+        # Default is to instrument it
+        return True
+
     def _include_in_page(self, script_path):
         """
         Return True if and only if the script should be
@@ -411,10 +475,20 @@ class SuiteDescription(object):
         # Convert keys that can have multiple values to lists
         for key in ['lib_paths', 'src_paths',
                     'spec_paths', 'fixture_paths',
-                    'include_in_page', 'exclude_from_page']:
+                    'include_in_page', 'exclude_from_page',
+                    'instrument_include', 'instrument_exclude']:
             if key in desc_dict and not isinstance(desc_dict[key], list):
                 desc_dict[key] = [desc_dict[key]]
 
+        # Check that the instrumentation rules are valid regular expressions
+        for key in ['instrument_include', 'instrument_exclude']:
+            for rule in desc_dict.get(key, []):
+                try:
+                    re.compile(rule)
+                except (re.error, TypeError):
+                    msg = "'{}' in '{}' is not a valid regular expression.".format(rule, key)
+                    raise SuiteDescriptionError(msg)
+
         # Check that we are using a valid test runner
         test_runner = desc_dict['test_runner']
         if not test_runner in cls.TEST_RUNNERS:
@@ -428,6 +502,23 @@ class SuiteDescription(object):
                       "Try using a symbolic link instead.")
                 raise SuiteDescriptionError(msg)
 
+        # Check that the preload_fixtures key is a boolean
+        if not isinstance(desc_dict.get('preload_fixtures', False), bool):
+            msg = "preload_fixtures must be true or false."
+            raise SuiteDescriptionError(msg)
+
+        # Check that the asset_urls key is a boolean
+        if not isinstance(desc_dict.get('asset_urls', True), bool):
+            msg = "asset_urls must be true or false."
+            raise SuiteDescriptionError(msg)
+
+        # Check that the requirejs prune_unreachable key is a boolean
+        requirejs_dict = desc_dict.get('requirejs', {})
+        if (not isinstance(requirejs_dict, dict) or
+                not isinstance(requirejs_dict.get('prune_unreachable', False), bool)):
+            msg = "requirejs prune_unreachable must be true or false."
+            raise SuiteDescriptionError(msg)
+
         # Check that the prepend_path key is a string
         prepend_path = desc_dict.get('prepend_path', '')
         if not (isinstance(prepend_path, str) or
@@ -495,6 +586,9 @@ class SuiteRenderer(object):
         'jasmine_requirejs': 'jasmine_requirejs_test_runner.html',
     }
 
+    # Template used to render pages running several suites (see `packing`)
+    PACK_TEMPLATE_NAME = 'jasmine_pack_test_runner.html'
+
     # The CSS ID of the <div> that will contain the output test results
     RESULTS_DIV_ID = 'js_test_tool_results'
 
@@ -502,14 +596,23 @@ class SuiteRenderer(object):
     # with this ID to report JavaScript exceptions
     ERROR_DIV_ID = 'js_test_tool_error'
 
-    def __init__(self, dev_mode=False):
+    def __init__(self, dev_mode=False, asset_urls=True):
         """
         If `dev_mode` is `True`, then display results in the browser
         in a human-readable form.
+
+        If `asset_urls` is `True`, load libraries and runner assets
+        from content-hashed URLs shared by all suites (see `assets`),
+        so that browsers cache them across suites.
         """
         self._dev_mode = dev_mode
+        self._asset_urls = asset_urls
 
-    def render_to_string(self, suite_name, suite_desc):
+        # Dependencies of RequireJS modules, for suites
+        # that leave unreachable scripts out of the page
+        self._module_scanner = DependencyScanner()
+
+    def render_to_string(self, suite_name, suite_desc, src_url_args=u''):
         """
         Given a `test_suite_desc` (`TestSuiteDescription` instance),
         render a test runner page.  When loaded, this page will
@@ -518,6 +621,10 @@ class SuiteRenderer(object):
         `suite_name` is the unique name of the suite, used to generate
         links to that suite's dependencies.
 
+        `src_url_args` is a query string (without the leading '?')
+        appended to the URLs of source files, e.g. to request
+        sources without coverage instrumentation.
+
         Returns a unicode string.
 
         Raises an `SuiteRendererError` if the page could not be rendered.
@@ -532,14 +639,41 @@ class SuiteRenderer(object):
             msg = "No template defined for test runner '{}'".format(test_runner)
             raise SuiteRendererError(msg)
 
+        lib_path_list = suite_desc.lib_paths(only_in_page=True)
+        src_path_list = suite_desc.src_paths(only_in_page=True)
+
+        # Leave out modules that no module reachable from `main` requires.
+        # Other scripts may set globals that modules use, so they stay.
+        if test_runner == 'jasmine_requirejs' and suite_desc.requirejs_prune_unreachable():
+            unreachable = set(
+                suite_modules(suite_name, suite_desc,
+                              self._module_scanner)['unreachable_modules']
+            )
+
+            pruned_list = [path for path in lib_path_list + src_path_list
+                           if path in unreachable]
+
+            if len(pruned_list) > 0:
+                LOGGER.info("Leaving {} unreachable modules out of the page "
+                            "for suite '{}'".format(len(pruned_list), suite_name))
+
+            lib_path_list = [path for path in lib_path_list if path not in unreachable]
+            src_path_list = [path for path in src_path_list if path not in unreachable]
+
         # Create the context for the template
         template_context = {
             'suite_name': suite_name,
-            'lib_path_list': suite_desc.lib_paths(only_in_page=True),
-            'src_path_list': suite_desc.src_paths(only_in_page=True),
+            'lib_path_list': lib_path_list,
+            'lib_url_list': self._lib_urls(suite_name, suite_desc, lib_path_list),
+            'runner_url': self._runner_url_func(),
+            'runner_paths': runner_module_paths(test_runner) if self._asset_urls else {},
+            'src_path_list': src_path_list,
             'spec_path_list': suite_desc.spec_paths(only_in_page=True),
+            'fixtures_url': (fixture_bundle_url(suite_name)
+                             if suite_desc.preload_fixtures() else None),
             'requirejs_path_map': suite_desc.requirejs_path_map(),
             'requirejs_baseUrl': suite_desc.requirejs_baseUrl(),
+            'src_url_args': src_url_args,
             'results_div_id': self.RESULTS_DIV_ID,
             'error_div_id': self.ERROR_DIV_ID,
             'dev_mode': self._dev_mode,
@@ -554,6 +688,88 @@ class SuiteRenderer(object):
 
         return html
 
+    def render_pack_to_string(self, suite_list, src_url_args=u''):
+        """
+        Render a test runner page that executes the JavaScript tests
+        of several suites (see `packing`).
+
+        `suite_list` is a list of `(suite_name, suite_desc)` tuples
+        for suites that can be packed together: each loads its
+        sources, specs and fixtures from its own URLs, and
+        reports its own coverage.
+
+        `src_url_args` is as for `render_to_string()`.
+
+        Returns a unicode string.
+
+        Raises an `SuiteRendererError` if the suites cannot be
+        packed or the page could not be rendered.
+        """
+        if len(suite_list) == 0:
+            raise SuiteRendererError("No suites to pack")
+
+        key_set = set(pack_key(suite_desc) for _, suite_desc in suite_list)
+
+        if None in key_set or len(key_set) > 1:
+            msg = "Suites {} cannot be packed together".format(
+                ', '.join(suite_name for suite_name, _ in suite_list))
+            raise SuiteRendererError(msg)
+
+        # The suites include the same libraries, so load the first suite's
+        first_name, first_desc = suite_list[0]
+        lib_path_list = first_desc.lib_paths(only_in_page=True)
+
+        template_context = {
+            'suite_names': [suite_name for suite_name, _ in suite_list],
+            'suite_list': [
+                {
+                    'name': suite_name,
+                    'src_path_list': suite_desc.src_paths(only_in_page=True),
+                    'spec_path_list': suite_desc.spec_paths(only_in_page=True),
+                }
+                for suite_name, suite_desc in suite_list
+            ],
+            'lib_url_list': self._lib_urls(first_name, first_desc, lib_path_list),
+            'runner_url': self._runner_url_func(),
+            'src_url_args': src_url_args,
+            'results_div_id': self.RESULTS_DIV_ID,
+            'error_div_id': self.ERROR_DIV_ID,
+            'dev_mode': self._dev_mode,
+        }
+
+        try:
+            html = self.render_template(self.PACK_TEMPLATE_NAME, template_context)
+        except Exception as ex:
+            msg = "Error occurred while rendering test runner page: {}".format(ex)
+            raise SuiteRendererError(msg)
+
+        return html
+
+    def _lib_urls(self, suite_name, suite_desc, lib_path_list):
+        """
+        Return the list of URLs from which the page for the suite named
+        `suite_name` (described by `suite_desc`) loads the libraries
+        at `lib_path_list`.
+        """
+        if self._asset_urls and suite_desc.asset_urls():
+            return [lib_asset_url(suite_name, suite_desc.root_dir(), path)
+                    for path in lib_path_list]
+
+        else:
+            return [u'/suite/{}/include/{}'.format(suite_name, path)
+                    for path in lib_path_list]
+
+    def _runner_url_func(self):
+        """
+        Return a function mapping paths of runner assets
+        (e.g. "jasmine/jasmine.js") to the URLs pages load them from.
+        """
+        if self._asset_urls:
+            return runner_asset_url
+
+        else:
+            return lambda path: u'/runner/{}'.format(path)
+
     @staticmethod
     def render_template(template_name, context):
         """
@@ -0,0 +1,517 @@
+"""
+Build suite pages once, so they can be served many times.
+
+`js-test-tool compile` renders each suite's runner page, copies its
+dependencies (and the runner assets) into a directory laid out like
+the page server's URLs, and writes a manifest describing the output:
+
+    OUTPUT_DIR/manifest.json
+    OUTPUT_DIR/runner/...                     Runner assets (e.g. jasmine.js)
+    OUTPUT_DIR/asset/DIGEST/...               Libraries and runner assets
+                                              at their content-hashed URLs
+    OUTPUT_DIR/suite/SUITE_NAME/index.html    Suite runner page
+    OUTPUT_DIR/suite/SUITE_NAME/include/...   Suite dependencies
+    OUTPUT_DIR/suite/SUITE_NAME/fixtures.json Fixture bundle (if preloaded)
+    OUTPUT_DIR/suite/SUITE_NAME/modules.json  Module manifest (if using RequireJS)
+
+Suite pages load libraries and runner assets from their
+content-hashed asset URLs (see `assets`), so each is written
+once under `asset/` for all the suites that share it.
+If the sources are instrumented for coverage, `include/` holds the
+instrumented sources, and the page loading the uninstrumented sources
+(`raw.html`) and those sources (`raw_src/`) are kept alongside.
+
+Any static file server can serve the output, as can `SuitePageServer`
+in its read-only mode (`js-test-tool run --compiled OUTPUT_DIR`),
+which also stores the coverage reported by instrumented sources.
+"""
+
+import os
+import os.path
+import json
+import shutil
+from js_test_tool.coverage import SrcInstrumenter
+from js_test_tool.assets import file_digest, runner_assets
+from js_test_tool.fixtures import fixture_bundle, FIXTURE_BUNDLE_NAME
+from js_test_tool.requirejs import DependencyScanner, module_manifest, MODULE_MANIFEST_NAME
+from js_test_tool.suite_server import suite_dict_from_list, RAW_SRC_PARAM
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+# Name of the manifest in the output directory
+MANIFEST_NAME = 'manifest.json'
+
+# Incremented when the manifest format changes
+MANIFEST_VERSION = 1
+
+
+class CompileError(Exception):
+    """
+    The suites could not be compiled, or
+    the compiled suites could not be loaded.
+    """
+    pass
+
+
+class SuiteCompiler(object):
+    """
+    Write the pages and dependencies for test suites to a directory.
+    """
+
+    def __init__(self, renderer, jscover_path=None, jvm_options=None,
+                 instrumenter_class=SrcInstrumenter):
+        """
+        Render suite runner pages using `renderer` (a `SuiteRenderer`).
+
+        If `jscover_path` (the path to the JSCover JAR file) is
+        specified, sources are instrumented for coverage, running
+        JSCover with `jvm_options` (a list of JVM options).
+
+        `instrumenter_class` should be overridden only when testing.
+        """
+        self._renderer = renderer
+        self._jscover_path = jscover_path
+        self._jvm_options = jvm_options
+        self._instrumenter_class = instrumenter_class
+
+    def compile(self, suite_desc_list, output_dir, hardlink=False):
+        """
+        Write the pages and dependencies for `suite_desc_list`
+        (a list of `SuiteDescription` instances) to `output_dir`,
+        replacing the output of an earlier compile.
+
+        If `hardlink` is True, dependencies are hard-linked
+        rather than copied where possible.
+
+        Returns the `CompiledSuites` written.
+
+        Raises a `CompileError` if `output_dir` is not empty
+        and does not contain the output of an earlier compile.
+        """
+        desc_dict = suite_dict_from_list(suite_desc_list)
+        self._prepare_output_dir(output_dir)
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'instrumented': self._jscover_path is not None,
+            'suites': [],
+            'files': {},
+            'raw_files': {},
+        }
+
+        self._write_runner_assets(output_dir, manifest)
+
+        for suite_name, desc in sorted(desc_dict.items()):
+            self._write_suite(suite_name, desc, output_dir, manifest, hardlink)
+
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'w') as manifest_file:
+            json.dump(manifest, manifest_file, indent=4, sort_keys=True)
+
+        return CompiledSuites(output_dir)
+
+    def _write_suite(self, suite_name, desc, output_dir, manifest, hardlink):
+        """
+        Write the page and dependencies for the suite named `suite_name`
+        (described by `desc`), recording them in `manifest`.
+        """
+        suite_url = 'suite/{}'.format(suite_name)
+        include_url = suite_url + '/include/'
+
+        instrumented_paths = []
+        if self._jscover_path is not None:
+            instrumented_paths = [path for path in desc.src_paths()
+                                  if desc.should_instrument(path)]
+
+        # Render the runner page
+        page_path = suite_url + '/index.html'
+        page = self._renderer.render_to_string(suite_name, desc)
+        _write_file(output_dir, page_path, page)
+        manifest['files'][suite_url] = page_path
+
+        # Copy the dependencies as they are
+        dependency_paths = (desc.lib_paths() + desc.src_paths() +
+                            desc.spec_paths() + desc.fixture_paths())
+
+        for rel_path in dependency_paths:
+            if rel_path in instrumented_paths:
+                continue
+
+            _copy_file(os.path.join(desc.root_dir(), rel_path),
+                       os.path.join(output_dir, include_url + rel_path),
+                       hardlink)
+            manifest['files'][include_url + rel_path] = include_url + rel_path
+
+        # Bundle the fixtures, if the suite preloads them
+        preload_fixtures = bool(desc.preload_fixtures())
+
+        if preload_fixtures:
+            bundle_path = '{}/{}'.format(suite_url, FIXTURE_BUNDLE_NAME)
+            _write_file(output_dir, bundle_path,
+                        fixture_bundle(desc.root_dir(), desc.fixture_paths()))
+            manifest['files'][bundle_path] = bundle_path
+
+        # Record the modules reachable from a RequireJS suite's main module
+        if desc.test_runner() == 'jasmine_requirejs':
+            modules_path = '{}/{}'.format(suite_url, MODULE_MANIFEST_NAME)
+            _write_file(output_dir, modules_path,
+                        module_manifest(suite_name, desc, DependencyScanner()))
+            manifest['files'][modules_path] = modules_path
+
+        # Write the libraries at their asset URLs too,
+        # once for all the suites that include them
+        asset_urls = bool(desc.asset_urls())
+
+        for rel_path in (desc.lib_paths() if asset_urls else []):
+            lib_path = os.path.join(desc.root_dir(), rel_path)
+            asset_path = 'asset/{}/{}'.format(file_digest(lib_path), rel_path)
+
+            if asset_path not in manifest['files']:
+                _copy_file(lib_path, os.path.join(output_dir, asset_path), hardlink)
+                manifest['files'][asset_path] = asset_path
+
+        # Write the instrumented sources, keeping the originals
+        # (and a page that loads them) for runs without coverage
+        if len(instrumented_paths) > 0:
+            raw_page_path = suite_url + '/raw.html'
+            raw_page = self._renderer.render_to_string(
+                suite_name, desc, src_url_args=u'{}=1'.format(RAW_SRC_PARAM)
+            )
+            _write_file(output_dir, raw_page_path, raw_page)
+            manifest['raw_files'][suite_url] = raw_page_path
+
+            for rel_path, contents in self._instrument(desc, instrumented_paths):
+                _write_file(output_dir, include_url + rel_path, contents)
+                manifest['files'][include_url + rel_path] = include_url + rel_path
+
+                raw_path = suite_url + '/raw_src/' + rel_path
+                _copy_file(os.path.join(desc.root_dir(), rel_path),
+                           os.path.join(output_dir, raw_path), hardlink)
+                manifest['raw_files'][include_url + rel_path] = raw_path
+
+        manifest['suites'].append({
+            'name': suite_name,
+            'root_dir': desc.root_dir(),
+            'prepend_path': desc.prepend_path(),
+            'test_runner': desc.test_runner(),
+            'lib_paths': desc.lib_paths(),
+            'src_paths': desc.src_paths(),
+            'spec_paths': desc.spec_paths(),
+            'fixture_paths': desc.fixture_paths(),
+            'preload_fixtures': preload_fixtures,
+            'asset_urls': asset_urls,
+            'instrumented_src_paths': instrumented_paths,
+        })
+
+    def _instrument(self, desc, rel_path_list):
+        """
+        Return a list of `(rel_path, contents)` tuples for the instrumented
+        versions of the sources in `rel_path_list`, running JSCover
+        in the root directory of `desc`.
+
+        Raises a `CompileError` if a source could not be instrumented.
+        """
+        instr = self._instrumenter_class(desc.root_dir(),
+                                         tool_path=self._jscover_path,
+                                         jvm_options=self._jvm_options)
+        instr.start()
+
+        try:
+            return [(rel_path, instr.instrumented_src(rel_path))
+                    for rel_path in rel_path_list]
+
+        except Exception as err:
+            msg = "Could not instrument sources in '{}': {}".format(desc.root_dir(), err)
+            raise CompileError(msg)
+
+        finally:
+            instr.stop()
+
+    @staticmethod
+    def _write_runner_assets(output_dir, manifest):
+        """
+        Copy the runner assets (e.g. jasmine.js) from this package
+        to `output_dir`, recording them in `manifest`.
+        """
+        for rel_path, asset in runner_assets().items():
+            resource_path = 'runner/' + rel_path
+            _write_file(output_dir, resource_path, asset.contents)
+            manifest['files'][resource_path] = resource_path
+
+            asset_path = 'asset/{}/{}'.format(asset.digest, rel_path)
+            _write_file(output_dir, asset_path, asset.contents)
+            manifest['files'][asset_path] = asset_path
+
+    @staticmethod
+    def _prepare_output_dir(output_dir):
+        """
+        Create `output_dir`, or remove the files written
+        to it by an earlier compile (as listed in its manifest).
+        Other files in `output_dir` are left alone.
+
+        Raises a `CompileError` if `output_dir` is not empty
+        and does not contain our manifest.
+        """
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+            return
+
+        if not os.listdir(output_dir):
+            return
+
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        not_ours_msg = ("'{}' is not empty and was not written by "
+                        "js-test-tool compile".format(output_dir))
+
+        # Other tools write files named manifest.json too
+        try:
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+
+        except (IOError, ValueError):
+            raise CompileError(not_ours_msg)
+
+        if not (isinstance(manifest, dict) and
+                manifest.get('version') == MANIFEST_VERSION and
+                isinstance(manifest.get('suites'), list) and
+                isinstance(manifest.get('files'), dict) and
+                isinstance(manifest.get('raw_files'), dict)):
+            raise CompileError(not_ours_msg)
+
+        rel_path_list = (list(manifest['files'].values()) +
+                         list(manifest['raw_files'].values()))
+
+        # Only remove files inside the output directory
+        for rel_path in rel_path_list:
+            if (not isinstance(rel_path, basestring) or os.path.isabs(rel_path) or
+                    os.path.normpath(rel_path).split(os.sep)[0] == os.pardir):
+                raise CompileError(not_ours_msg)
+
+        for rel_path in set(rel_path_list):
+            _remove_file(output_dir, rel_path)
+
+        os.remove(manifest_path)
+
+
+class CompiledSuites(object):
+    """
+    Suites written by `SuiteCompiler`, loaded from the manifest.
+    Finding a file to serve is a dictionary lookup.
+    """
+
+    def __init__(self, output_dir):
+        """
+        Load the manifest of the suites compiled to `output_dir`.
+
+        Raises a `CompileError` if the manifest is missing or invalid.
+        """
+        self._output_dir = os.path.abspath(output_dir)
+        manifest_path = os.path.join(self._output_dir, MANIFEST_NAME)
+
+        try:
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+
+        except (IOError, ValueError) as err:
+            msg = "Could not load compiled suites from '{}': {}".format(output_dir, err)
+            raise CompileError(msg)
+
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            msg = ("'{}' was compiled by a different version of js-test-tool; "
+                   "compile the suites again.".format(manifest_path))
+            raise CompileError(msg)
+
+        self._instrumented = manifest['instrumented']
+        self._desc_list = [CompiledSuiteDescription(suite_dict)
+                           for suite_dict in manifest['suites']]
+        self._file_dict = manifest['files']
+        self._raw_file_dict = manifest['raw_files']
+
+    def output_dir(self):
+        """
+        Return the absolute path to the directory of compiled suites.
+        """
+        return self._output_dir
+
+    def instrumented(self):
+        """
+        Return True if the sources were instrumented for coverage.
+        """
+        return self._instrumented
+
+    def descriptions(self):
+        """
+        Return a list of `CompiledSuiteDescription` instances,
+        one for each suite.
+        """
+        return list(self._desc_list)
+
+    def file_path(self, url_path, raw_src=False):
+        """
+        Return the absolute path of the file to serve for `url_path`
+        (the path part of the URL, without the leading slash),
+        or None if there is no such file.
+
+        If `raw_src` is True, serve files that do not
+        report coverage where they are available.
+        """
+        url_path = url_path.rstrip('/')
+        rel_path = None
+
+        if raw_src:
+            rel_path = self._raw_file_dict.get(url_path)
+
+        if rel_path is None:
+            rel_path = self._file_dict.get(url_path)
+
+        if rel_path is None:
+            return None
+
+        return os.path.join(self._output_dir, rel_path)
+
+
+class CompiledSuiteDescription(object):
+    """
+    Description of a compiled suite, loaded from the manifest.
+    Provides the `SuiteDescription` methods used by the page
+    server and the coverage reports, without searching for files.
+    """
+
+    def __init__(self, suite_dict):
+        """
+        Load the description from `suite_dict`,
+        the suite's entry in the manifest.
+        """
+        self._suite_dict = suite_dict
+        self._instrumented_set = frozenset(suite_dict['instrumented_src_paths'])
+
+    def suite_name(self):
+        """
+        Return the name of the suite.
+        """
+        return self._suite_dict['name']
+
+    def root_dir(self):
+        """
+        Return the root directory of the suite when it was compiled.
+        """
+        return self._suite_dict['root_dir']
+
+    def prepend_path(self):
+        """
+        Return the path prepended to sources in coverage reports.
+        """
+        return self._suite_dict['prepend_path']
+
+    def test_runner(self):
+        """
+        Return the name of the test runner (e.g. "jasmine").
+        """
+        return self._suite_dict['test_runner']
+
+    def lib_paths(self, only_in_page=False, enable_warnings=False):
+        """
+        Return the list of library paths, relative to the root directory.
+        """
+        return list(self._suite_dict['lib_paths'])
+
+    def src_paths(self, only_in_page=False, enable_warnings=False):
+        """
+        Return the list of source paths, relative to the root directory.
+        """
+        return list(self._suite_dict['src_paths'])
+
+    def spec_paths(self, only_in_page=False, enable_warnings=False):
+        """
+        Return the list of spec paths, relative to the root directory.
+        """
+        return list(self._suite_dict['spec_paths'])
+
+    def fixture_paths(self, enable_warnings=False):
+        """
+        Return the list of fixture paths, relative to the root directory.
+        """
+        return list(self._suite_dict['fixture_paths'])
+
+    def preload_fixtures(self):
+        """
+        Return True if the fixtures were bundled to load in one request.
+        """
+        return self._suite_dict.get('preload_fixtures', False)
+
+    def asset_urls(self):
+        """
+        Return True if the pages load the libraries from their asset URLs.
+        """
+        return self._suite_dict.get('asset_urls', True)
+
+    def should_instrument(self, src_path):
+        """
+        Return True if the source at `src_path` was instrumented.
+        """
+        return src_path in self._instrumented_set
+
+
+def _write_file(output_dir, rel_path, contents):
+    """
+    Write `contents` (a byte or unicode string) to
+    `rel_path` in `output_dir`, creating directories as needed.
+    """
+    path = os.path.join(output_dir, rel_path)
+    _make_parent_dir(path)
+
+    if isinstance(contents, unicode):
+        contents = contents.encode('utf-8')
+
+    with open(path, 'wb') as output_file:
+        output_file.write(contents)
+
+
+def _copy_file(src_path, dest_path, hardlink):
+    """
+    Copy the file at `src_path` to `dest_path`, creating directories
+    as needed.  If `hardlink` is True, try to hard-link the file first.
+    """
+    _make_parent_dir(dest_path)
+
+    if hardlink:
+        try:
+            os.link(src_path, dest_path)
+            return
+
+        # Hard links are not supported across file systems,
+        # or on every platform, so fall back to copying
+        except (OSError, AttributeError) as err:
+            LOGGER.debug("Could not link '{}': {}".format(src_path, err))
+
+    shutil.copyfile(src_path, dest_path)
+
+
+def _remove_file(output_dir, rel_path):
+    """
+    Remove the file at `rel_path` in `output_dir` (if it exists),
+    and any directories between it and `output_dir` left empty.
+    """
+    path = os.path.join(output_dir, rel_path)
+
+    if os.path.isfile(path) or os.path.islink(path):
+        os.remove(path)
+
+    parent_dir = os.path.dirname(path)
+    output_dir = os.path.abspath(output_dir)
+
+    while (os.path.abspath(parent_dir) != output_dir and
+           os.path.isdir(parent_dir) and not os.listdir(parent_dir)):
+        os.rmdir(parent_dir)
+        parent_dir = os.path.dirname(parent_dir)
+
+
+def _make_parent_dir(path):
+    """
+    Create the directory containing `path` if it does not exist.
+    """
+    parent_dir = os.path.dirname(path)
+
+    if not os.path.isdir(parent_dir):
+        os.makedirs(parent_dir)
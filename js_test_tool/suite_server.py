@@ -6,21 +6,42 @@ from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
 from SocketServer import ThreadingMixIn
 import threading
 import re
-import pkg_resources
 import os.path
 import logging
 import json
 import time
 import mimetypes
 import shutil
+import signal
 import socket
+import os
 from StringIO import StringIO
+from urlparse import parse_qs
 from abc import ABCMeta, abstractmethod
 from js_test_tool.coverage import SrcInstrumenter, SrcInstrumenterError, CoverageData
+from js_test_tool.jscover_supervisor import InstrumenterSupervisor, reap_orphans
+from js_test_tool.worker_pool import WorkerPool
+from js_test_tool.prefork import CoverageForwarder, apply_coverage_messages
+from js_test_tool.assets import ASSET_CACHE_CONTROL, is_asset_url, \
+    file_digest, runner_assets
+from js_test_tool.fixtures import FixtureCache, FIXTURE_BUNDLE_NAME
+from js_test_tool.requirejs import DependencyScanner, MODULE_MANIFEST_NAME, \
+    module_manifest, suite_modules
+from js_test_tool.packing import PACK_SEPARATOR, pack_suites, pack_url
+from js_test_tool.sharding import SHARD_DURATIONS_URL
 
 
 LOGGER = logging.getLogger(__name__)
 
+# GET parameter that tells the server to serve
+# source files without instrumenting them for coverage
+RAW_SRC_PARAM = 'raw_src'
+
+# Response sent when the server is too busy to queue a request
+BUSY_RESPONSE = ('HTTP/1.0 503 Service Unavailable\r\n'
+                 'Retry-After: 1\r\n'
+                 'Content-Length: 0\r\n\r\n')
+
 
 class TimeoutError(Exception):
     """
@@ -62,13 +83,22 @@ class SuitePageServer(ThreadingMixIn, HTTPServer):
     # have all the coverage info
     COVERAGE_WAIT_TIME = 0.1
 
+    # When using worker pools: the maximum number of connections
+    # waiting to be accepted, and waiting in each pool's queue
+    ACCEPT_BACKLOG = 128
+    POOL_QUEUE_SIZE = 64
+
+    # Number of bytes to read when peeking at the request line
+    PEEK_SIZE = 2048
+
     # Returns the `CoverageData` instance used by the server
     # to store coverage data received from the test suites.
     # Since `CoverageData` is thread-safe, it is okay for
     # other processes to write to it asynchronously.
     coverage_data = None
 
-    def __init__(self, suite_desc_list, suite_renderer, jscover_path=None, port=0):
+    def __init__(self, suite_desc_list, suite_renderer, jscover_path=None, port=0,
+                 jvm_options=None, workers=None, processes=None, compiled=None):
         """
         Initialize the server to serve test runner pages
         and dependencies described by `suite_desc_list`
@@ -77,19 +107,97 @@ class SuitePageServer(ThreadingMixIn, HTTPServer):
         `jscover_path` is the path to the JSCover JAR file.  If not
         specified, no coverage information will be collected.
 
+        `jvm_options` is a list of options for the JVMs running JSCover
+        (e.g. ["-Xmx1g"]).
+
+        By default, each connection is handled in a new thread.
+        If `workers` is specified, connections are instead handled by
+        a pool of `workers` threads, with queued connections bounded
+        by `POOL_QUEUE_SIZE`.  Requests for instrumented sources and
+        coverage reports, which wait on JSCover, are handed to a smaller
+        pool of their own, so other dependencies keep being served
+        while instrumentation is slow.
+
+        If `processes` is specified, that many worker processes
+        (forked when the server starts) accept connections on the
+        same port, so that Python work is not limited to one core.
+        The suite pages and lists of dependencies are built once before
+        forking and shared by the workers.  Coverage reported to the
+        workers is sent back to this process over pipes and merged,
+        so `all_coverage_data()` works as usual.  Requires `os.fork()`.
+
+        If `compiled` (a `CompiledSuites` instance) is specified, the
+        server is read-only: it serves the pages and dependencies written
+        by `js-test-tool compile` without rendering, searching for files
+        or running JSCover.  If the compiled sources were instrumented,
+        it stores the coverage they report.  `suite_desc_list` should be
+        `compiled.descriptions()`, and `suite_renderer` is not used.
+
         Use `suite_renderer` (a `SuiteRenderer` instance) to
         render the test suite pages.
         """
 
         # Store dependencies
-        self.desc_dict = self._suite_dict_from_list(suite_desc_list)
+        self.desc_dict = suite_dict_from_list(suite_desc_list)
         self.renderer = suite_renderer
         self._jscover_path = jscover_path
+        self._jvm_options = jvm_options
+        self.compiled = compiled
 
         # Create a dict for source instrumenter services
         # (One for each suite description)
         self.src_instr_dict = {}
 
+        # Restarts instrumenters that fail and tracks their memory use
+        self._supervisor = None
+
+        # Names of the suites we expect to report coverage
+        self._coverage_suite_names = set()
+
+        # Dict mapping suite names to the sets of sources we instrument
+        self._instrumented_src_dict = {}
+
+        # Pools of threads that handle requests (if configured)
+        self._fast_pool = None
+        self._slow_pool = None
+
+        # Thread running `serve_forever()` in this process
+        self._server_thread = None
+
+        # Worker processes (if configured), and the threads
+        # merging the coverage they receive
+        if processes is not None and not hasattr(os, 'fork'):
+            raise ValueError("Worker processes are not supported on this platform.")
+
+        self._num_processes = processes
+        self._worker_pids = []
+        self._aggregator_threads = []
+
+        # Snapshot of the pages and dependencies we serve,
+        # built before forking worker processes
+        self.page_cache = None
+
+        # Bundles of fixtures for suites that preload them
+        self.fixture_cache = FixtureCache(self.desc_dict)
+
+        # Dependencies of RequireJS modules, cached by file contents
+        self.module_scanner = DependencyScanner()
+
+        # Libraries served at asset URLs, found when the server starts
+        self.lib_asset_index = LibAssetIndex(self.desc_dict)
+
+        # Durations of the test groups in earlier runs,
+        # used by pages running one shard of a suite
+        self.shard_durations = {}
+
+        if workers is not None:
+            self.request_queue_size = self.ACCEPT_BACKLOG
+            self._fast_pool = WorkerPool('fast', workers, self._dispatch_request,
+                                         self.POOL_QUEUE_SIZE)
+            self._slow_pool = WorkerPool('slow', max(2, workers // 4),
+                                         self._handle_request_item,
+                                         self.POOL_QUEUE_SIZE)
+
         address = ('0.0.0.0', port)
         HTTPServer.__init__(self, address, SuitePageRequestHandler)
 
@@ -97,60 +205,233 @@ class SuitePageServer(ThreadingMixIn, HTTPServer):
         """
         Start serving pages on an open local port.
         """
-        server_thread = threading.Thread(target=self.serve_forever)
-        server_thread.daemon = True
-        server_thread.start()
+        # Load the runner assets now, rather than on the first request
+        # (and before forking, so the workers share them)
+        runner_assets()
+
+        # Compiled suites were scanned when they were compiled
+        if self.compiled is None:
+            self._report_modules()
+
+        # Find the libraries once, before any worker processes fork
+        self.lib_asset_index.load()
+
+        # Compiled sources were instrumented in advance
+        if self.compiled is not None:
+            self.reset_coverage()
+            self.src_instr_dict = {}
 
         # If we're collecting coverage information
-        if self._jscover_path is not None:
+        elif self._jscover_path is not None:
 
             # Create an object to store coverage data we receive
-            self.coverage_data = CoverageData()
+            self.reset_coverage()
+
+            # Clean up JSCover processes left behind by runs that were killed
+            reap_orphans()
+            self._supervisor = InstrumenterSupervisor()
 
             # Start each SrcInstrumenter instance if we know where JSCover is
             for suite_name, desc in self.desc_dict.iteritems():
 
-                # Inform the coverage data that we expect this source
-                # (report it as 0% if no info received).
-                for rel_path in desc.src_paths():
-                    self.coverage_data.add_expected_src(desc.root_dir(), rel_path)
-
                 # Create an instrumenter serving files
                 # in the suite description root directory
                 instr = SrcInstrumenter(desc.root_dir(),
-                                        tool_path=self._jscover_path)
+                                        tool_path=self._jscover_path,
+                                        jvm_options=self._jvm_options)
 
                 # Start the instrumenter service
                 instr.start()
 
                 # Associate the instrumenter with its suite description
                 self.src_instr_dict[suite_name] = instr
+                self._supervisor.add(suite_name, instr)
 
         else:
             self.src_instr_dict = {}
 
+        # Fork before starting any threads in this process,
+        # since only the forking thread exists in the workers
+        if self._num_processes is not None:
+            self._start_worker_processes()
+
+        else:
+            self._start_pools()
+            self._server_thread = threading.Thread(target=self.serve_forever)
+            self._server_thread.daemon = True
+            self._server_thread.start()
+
+        if self._supervisor is not None:
+            self._supervisor.start()
+
     def stop(self):
         """
         Stop the server and free the port.
         """
 
+        # Stop supervising the instrumenters, so they are not restarted
+        if self._supervisor is not None:
+            self._supervisor.stop()
+            self._supervisor = None
+
         # Stop each instrumenter service that we started
         for instr in self.src_instr_dict.values():
             instr.stop()
 
+        # Stop the worker processes, then wait for the
+        # coverage they sent us to be merged
+        for pid in self._worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+
+            except OSError:
+                pass
+
+        for thread in self._aggregator_threads:
+            thread.join()
+
+        self._worker_pids = []
+        self._aggregator_threads = []
+
         # Stop the page server and free the port
-        self.shutdown()
+        if self._server_thread is not None:
+            self.shutdown()
+            self._server_thread = None
+
         self.socket.close()
 
-    def suite_url_list(self):
+        # Finish the requests being handled by the worker pools,
+        # and close the connections still waiting in their queues.
+        # The fast pool hands requests to the slow pool, so stop it first.
+        for pool in (self._fast_pool, self._slow_pool):
+            if pool is not None:
+                for request, _ in pool.stop():
+                    self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        """
+        Handle the connection `request` from `client_address`,
+        either in a new thread or by queueing it for a worker pool.
+
+        If the pool's queue stays full for `timeout` seconds,
+        the client is told to try again later.
+        """
+        if self._fast_pool is None:
+            ThreadingMixIn.process_request(self, request, client_address)
+
+        elif not self._fast_pool.submit((request, client_address), timeout=self.timeout):
+            self._reject_request(request)
+
+    def is_slow_request(self, method, path):
+        """
+        Return True if the request for `path` using HTTP `method`
+        needs to wait for JSCover: requests for instrumented sources,
+        and coverage reports POSTed by the test pages.
+        """
+        if method == 'POST':
+            return True
+
+        # Compiled sources were instrumented in advance
+        if self.compiled is not None:
+            return False
+
+        result = InstrumentedSrcPageHandler.PATH_REGEX.match(path or '')
+
+        if result is None:
+            return False
+
+        suite_name, rel_path, query = result.groups()
+
+        if BasePageHandler.is_raw_src_request(query):
+            return False
+
+        return rel_path in self._instrumented_src_dict.get(suite_name, ())
+
+    def set_shard_durations(self, durations):
+        """
+        Serve `durations` (a dict mapping test group names to the
+        number of seconds they took in earlier runs) to pages that
+        run one shard of a suite (see `sharding`).
+
+        Worker processes see the durations set before the server starts.
+        """
+        self.shard_durations = durations
+
+    def reset_coverage(self):
+        """
+        Discard any coverage data received so far, so that a
+        running server can be reused for another test run.
+
+        Does nothing if we are not collecting coverage.
+        """
+        if self.compiled is not None:
+            if not self.compiled.instrumented():
+                return
+
+        elif self._jscover_path is None:
+            return
+
+        coverage_data = CoverageData()
+        coverage_suite_names = set()
+        instrumented_src_dict = {}
+
+        for suite_name, desc in self.desc_dict.iteritems():
+
+            # Inform the coverage data that we expect this source
+            # (report it as 0% if no info received).
+            # Sources excluded from instrumentation are served raw,
+            # so we will never receive coverage for them.
+            for rel_path in desc.src_paths():
+                if desc.should_instrument(rel_path):
+                    coverage_data.add_expected_src(desc.root_dir(), rel_path)
+                    coverage_suite_names.add(suite_name)
+                    instrumented_src_dict.setdefault(suite_name, set()).add(rel_path)
+
+        self.coverage_data = coverage_data
+        self._coverage_suite_names = coverage_suite_names
+        self._instrumented_src_dict = instrumented_src_dict
+
+    def suite_url_list(self, raw_src=False):
         """
         Return a list of URLs (unicode strings), where each URL
         is a test suite page containing the JS code to run
         the JavaScript tests.
+
+        If `raw_src` is True, the pages load source files
+        without instrumentation, so they do not report coverage.
         """
-        return [self.root_url() + u'suite/{}'.format(suite_name)
+        url_args = u'?{}=1'.format(RAW_SRC_PARAM) if raw_src else u''
+        return [self.root_url() + u'suite/{}{}'.format(suite_name, url_args)
                 for suite_name in self.desc_dict.keys()]
 
+    def packed_suite_url_list(self, max_pack_size, raw_src=False):
+        """
+        Return a list of URLs (unicode strings) of pages that together
+        run every test suite, packing up to `max_pack_size` suites
+        that can share a page into one (see `packing`).
+
+        Compiled suites are never packed, since their pages
+        were rendered when they were compiled.
+
+        `raw_src` is as for `suite_url_list()`.
+        """
+        if self.compiled is not None:
+            return self.suite_url_list(raw_src=raw_src)
+
+        url_args = u'?{}=1'.format(RAW_SRC_PARAM) if raw_src else u''
+        url_list = []
+
+        for suite_name_list in pack_suites(self.desc_dict, max_pack_size):
+            if len(suite_name_list) == 1:
+                url_path = u'suite/{}'.format(suite_name_list[0])
+            else:
+                url_path = pack_url(suite_name_list).lstrip('/')
+
+            url_list.append(self.root_url() + url_path + url_args)
+
+        return url_list
+
     def root_url(self):
         """
         Return the root URL (including host and port) for the server
@@ -176,6 +457,157 @@ class SuitePageServer(ThreadingMixIn, HTTPServer):
         else:
             return None
 
+    def _report_modules(self):
+        """
+        Log the RequireJS modules each `jasmine_requirejs` suite
+        loads, and the suite files it never loads (see `requirejs`).
+        """
+        for suite_name, desc in sorted(self.desc_dict.items()):
+            if desc.test_runner() != 'jasmine_requirejs':
+                continue
+
+            modules = suite_modules(suite_name, desc, self.module_scanner)
+
+            LOGGER.info(
+                "Suite '{}' loads {} RequireJS modules; {} suite files are not "
+                "reachable from '{}'".format(suite_name, len(modules['modules']),
+                                             len(modules['unreachable']), modules['entry'])
+            )
+
+            for path in modules['unreachable']:
+                LOGGER.debug("Suite '{}' does not load '{}'".format(suite_name, path))
+
+            for name in modules['missing']:
+                LOGGER.info("Suite '{}' requires module '{}', but its file "
+                            "could not be read".format(suite_name, name))
+
+    def _start_pools(self):
+        """
+        Start the worker pools, if configured.
+        """
+        if self._fast_pool is not None:
+            self._fast_pool.start()
+            self._slow_pool.start()
+
+    def _start_worker_processes(self):
+        """
+        Build the page cache, then fork the worker processes.
+        Start a thread for each worker to merge the coverage it sends us.
+        """
+        if self.compiled is None:
+            self.page_cache = PageCache(self.desc_dict, self.renderer,
+                                        self._instrumented_src_dict)
+
+        for _ in range(self._num_processes):
+            read_fd, write_fd = os.pipe()
+            pid = os.fork()
+
+            # In the worker: serve until killed
+            if pid == 0:
+                os.close(read_fd)
+                self._run_worker_process(write_fd)
+
+            os.close(write_fd)
+            self._worker_pids.append(pid)
+
+            pipe_file = os.fdopen(read_fd, 'rb')
+            thread = threading.Thread(target=apply_coverage_messages,
+                                      args=(pipe_file, lambda: self.coverage_data))
+            thread.daemon = True
+            thread.start()
+            self._aggregator_threads.append(thread)
+
+    def _run_worker_process(self, write_fd):
+        """
+        Serve requests in a forked worker process, sending coverage
+        to the parent through the pipe `write_fd`.  Never returns.
+        """
+        status = 0
+
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+            if self.coverage_data is not None:
+                self.coverage_data = CoverageForwarder(os.fdopen(write_fd, 'wb'))
+
+            self._start_pools()
+            self.serve_forever()
+
+        except BaseException:
+            LOGGER.exception("Page server worker process failed")
+            status = 1
+
+        finally:
+            # Never return into the parent's code
+            os._exit(status)
+
+    def _dispatch_request(self, item):
+        """
+        Handle the `(request, client_address)` tuple `item` in
+        a fast pool thread, or hand it to the slow pool if it
+        will wait on JSCover.
+
+        Browsers do not retry scripts or coverage reports that
+        the server is too busy to handle, so wait for room in the
+        slow pool's queue: up to `timeout` seconds for sources, and
+        for as long as it takes for coverage reports, which are
+        sent only once.
+        """
+        request, client_address = item
+        method, path = self._peek_request_line(request)
+
+        if not self.is_slow_request(method, path):
+            self._handle_request_item(item)
+
+        elif method == 'POST':
+            while not self._slow_pool.submit(item, timeout=self.timeout):
+                LOGGER.debug("Waiting for a thread to store coverage data")
+
+        elif not self._slow_pool.submit(item, timeout=self.timeout):
+            self._reject_request(request)
+
+    def _handle_request_item(self, item):
+        """
+        Handle the `(request, client_address)` tuple `item`
+        in the current thread, then close the connection.
+        """
+        self.process_request_thread(*item)
+
+    def _peek_request_line(self, request):
+        """
+        Return the `(method, path)` of the HTTP request on the
+        socket `request`, leaving the data to be read by the
+        request handler.  Returns `(None, None)` if the request
+        line could not be read.
+        """
+        try:
+            request.settimeout(self.timeout)
+            data = request.recv(self.PEEK_SIZE, socket.MSG_PEEK)
+
+        except socket.error:
+            return (None, None)
+
+        words = data.split('\r\n', 1)[0].split()
+
+        if len(words) < 2:
+            return (None, None)
+
+        return (words[0], words[1])
+
+    def _reject_request(self, request):
+        """
+        Tell the client that the server is too busy, and close `request`.
+        """
+        LOGGER.warning("Server is too busy to handle a request; asking the client to retry.")
+
+        try:
+            request.sendall(BUSY_RESPONSE)
+
+        except socket.error:
+            pass
+
+        self.shutdown_request(request)
+
     def _block_until(self, success_func):
         """
         Block until `success_func` returns True.
@@ -198,60 +630,138 @@ class SuitePageServer(ThreadingMixIn, HTTPServer):
     def _has_all_coverage(self):
         """
         Returns True if and only if every suite
-        has coverage information.
+        with instrumented sources has coverage information.
+        (Suites with no instrumented sources never report coverage.)
         """
         # Retrieve the indices of each suite for which coverage
         # information was reported.
         suite_name_list = self.coverage_data.suite_name_list()
 
         # Check that we have an index for every suite
-        # (This is not the most efficient way to do this --
-        # if it becomes a bottleneck, we can revisit.)
-        return (sorted(suite_name_list) == sorted(self.desc_dict.keys()))
+        return self._coverage_suite_names.issubset(suite_name_list)
 
-    @classmethod
-    def _suite_dict_from_list(cls, suite_desc_list):
+
+class PageCache(object):
+    """
+    Suite runner pages and lists of dependencies, built once
+    and never modified, so that forked worker processes can
+    share them without copying.
+    """
+
+    def __init__(self, desc_dict, renderer, instrumented_src_dict):
         """
-        Given a list of `SuiteDescription` instances, construct
-        a dictionary mapping suite names to the instances.
+        Render the runner page for each suite in `desc_dict` (a dict
+        mapping suite names to `SuiteDescription` instances) using
+        `renderer`, and find each suite's dependencies.
 
-        Raises a `DuplicateSuiteNameError` if two suites have
-        the same name.
+        `instrumented_src_dict` maps suite names to the
+        sets of sources that are instrumented for coverage.
         """
-        suite_dict = {
-            suite.suite_name(): suite
-            for suite in suite_desc_list
-        }
+        self._page_dict = {}
+        self._dependency_dict = {}
+        self._instrumented_src_dict = {}
+
+        raw_url_args = u'{}=1'.format(RAW_SRC_PARAM)
 
-        # Check that we haven't repeated keys
-        duplicates = cls._duplicates([suite.suite_name() for suite in suite_desc_list])
+        for suite_name, desc in desc_dict.iteritems():
 
-        if len(duplicates) > 0:
-            msg = "Duplicate suite name(s): {}".format(",".join(duplicates))
-            raise DuplicateSuiteNameError(msg)
+            # Render the page with and without instrumented sources
+            for raw_src, url_args in [(False, u''), (True, raw_url_args)]:
+                page = renderer.render_to_string(suite_name, desc, src_url_args=url_args)
 
-        return suite_dict
+                if isinstance(page, unicode):
+                    page = page.encode('utf-8')
 
-    @classmethod
-    def _duplicates(cls, name_list):
+                self._page_dict[(suite_name, raw_src)] = page
+
+            self._dependency_dict[suite_name] = frozenset(
+                desc.lib_paths() + desc.src_paths() +
+                desc.spec_paths() + desc.fixture_paths()
+            )
+
+            self._instrumented_src_dict[suite_name] = frozenset(
+                instrumented_src_dict.get(suite_name, ())
+            )
+
+    def suite_page(self, suite_name, raw_src):
         """
-        Given a list of strings, return a set of duplicates in the list.
+        Return the runner page (a byte string) for the suite named
+        `suite_name`, loading sources without instrumentation if
+        `raw_src` is True.  Returns None if there is no such suite.
         """
-        seen = set()
-        duplicates = set()
+        return self._page_dict.get((suite_name, raw_src))
 
-        for name in name_list:
+    def dependency_paths(self, suite_name):
+        """
+        Return the set of dependency paths (relative to the suite's
+        root directory) for the suite named `suite_name`.
+        """
+        return self._dependency_dict.get(suite_name, frozenset())
 
-            # Check if we've already seen the name; if so, add it
-            # to the list of duplicates
-            if name in seen:
-                duplicates.add(name)
+    def instrumented_src_paths(self, suite_name):
+        """
+        Return the set of source paths instrumented for
+        coverage in the suite named `suite_name`.
+        """
+        return self._instrumented_src_dict.get(suite_name, frozenset())
 
-            # Add the name to the list of names we've already seen
-            else:
-                seen.add(name)
 
-        return duplicates
+class LibAssetIndex(object):
+    """
+    Index of the libraries that can be served at asset URLs,
+    built once (searching each suite's library paths),
+    so that serving an asset does not search the file system.
+
+    This class is thread safe.
+    """
+
+    def __init__(self, desc_dict):
+        """
+        Index the libraries of the suites in `desc_dict` (a dict
+        mapping suite names to `SuiteDescription` instances).
+        The libraries are found the first time the index is used.
+        """
+        self._desc_dict = desc_dict
+        self._path_dict = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Find the libraries now, rather than on first use
+        (e.g. before forking worker processes).
+        """
+        with self._lock:
+            if self._path_dict is None:
+                path_dict = {}
+
+                for desc in self._desc_dict.values():
+                    for rel_path in desc.lib_paths():
+                        full_path = os.path.join(desc.root_dir(), rel_path)
+                        full_path_list = path_dict.setdefault(rel_path, [])
+
+                        if full_path not in full_path_list:
+                            full_path_list.append(full_path)
+
+                self._path_dict = path_dict
+
+            return self._path_dict
+
+    def lib_path(self, digest, rel_path):
+        """
+        Return the full path of a library at `rel_path` (in any suite)
+        whose contents hash to `digest`, or None if there is no such library.
+        """
+        for full_path in self.load().get(rel_path, []):
+
+            # Digests are cached until the file changes
+            try:
+                if file_digest(full_path) == digest:
+                    return full_path
+
+            except (IOError, OSError):
+                pass
+
+        return None
 
 
 class BasePageHandler(object):
@@ -356,6 +866,19 @@ class BasePageHandler(object):
         # so we can create the buffer.
         return StringIO(content)
 
+    @staticmethod
+    def is_raw_src_request(query):
+        """
+        Return True if `query` (the GET parameters of the
+        request, including the leading '?', or None)
+        asks for sources without instrumentation.
+        """
+        if not query:
+            return False
+
+        params = parse_qs(query.lstrip('?'), keep_blank_values=True)
+        return RAW_SRC_PARAM in params
+
 
 class SuitePageHandler(BasePageHandler):
     """
@@ -368,79 +891,297 @@ class SuitePageHandler(BasePageHandler):
     # Ignore GET parameters
     PATH_REGEX = re.compile(r'^/suite/([^?/]+)/?(\?.*)?$')
 
-    def __init__(self, renderer, desc_dict):
+    def __init__(self, renderer, desc_dict, page_cache=None):
         """
         Initialize the `SuitePageHandler` to use `renderer`
         (a `SuiteRenderer` instance) and `desc_dict` (a dict
         mapping suite names to `SuiteDescription` instances).
+
+        If `page_cache` (a `PageCache`) is provided,
+        serve the pages rendered in advance.
+        """
+        super(SuitePageHandler, self).__init__()
+        self._renderer = renderer
+        self._desc_dict = desc_dict
+        self._page_cache = page_cache
+
+    def load_page(self, method, content, *args):
+        """
+        Render the suite runner page.
+        """
+
+        # Args are the suite name and the GET parameters
+        suite_name, query = args
+
+        # Try to find the suite description
+        suite_desc = self._desc_dict.get(suite_name)
+
+        # If we can't find it, don't serve it
+        if suite_desc is None:
+            return None
+
+        # Serve the page rendered in advance, if we have one
+        elif self._page_cache is not None:
+            page = self._page_cache.suite_page(suite_name, self.is_raw_src_request(query))
+            return StringIO(page) if page is not None else None
+
+        # Otherwise, render the page.
+        # If the page was requested without coverage, pass the
+        # flag on to the source URLs so they are served raw.
+        elif self.is_raw_src_request(query):
+            page = self._renderer.render_to_string(
+                suite_name, suite_desc,
+                src_url_args=u'{}=1'.format(RAW_SRC_PARAM)
+            )
+            return self.safe_str_buffer(page)
+
+        else:
+            page = self._renderer.render_to_string(suite_name, suite_desc)
+            return self.safe_str_buffer(page)
+
+    def mime_type(self, method, content, *args):
+        """
+        Return the MIME type for the page.
+        """
+        return 'text/html'
+
+
+class PackPageHandler(BasePageHandler):
+    """
+    Handle requests for paths of the form `/pack/SUITE_NAME,SUITE_NAME,...`,
+    serving a runner page for several suites (see `packing`).
+    """
+
+    # Parse the suite names, ignoring GET parameters
+    PATH_REGEX = re.compile(r'^/pack/([^?/]+)/?(\?.*)?$')
+
+    def __init__(self, renderer, desc_dict):
+        """
+        Render pages using `renderer` (a `SuiteRenderer` instance)
+        for the suites in `desc_dict` (a dict mapping suite names
+        to `SuiteDescription` instances).
+        """
+        super(PackPageHandler, self).__init__()
+        self._renderer = renderer
+        self._desc_dict = desc_dict
+
+    def load_page(self, method, content, *args):
+        """
+        Render the packed runner page, or return None
+        if any of the suites does not exist.
+        """
+        suite_names, query = args
+        suite_list = []
+
+        for suite_name in suite_names.split(PACK_SEPARATOR):
+            suite_desc = self._desc_dict.get(suite_name)
+
+            if suite_desc is None:
+                return None
+
+            suite_list.append((suite_name, suite_desc))
+
+        if self.is_raw_src_request(query):
+            page = self._renderer.render_pack_to_string(
+                suite_list, src_url_args=u'{}=1'.format(RAW_SRC_PARAM)
+            )
+
+        else:
+            page = self._renderer.render_pack_to_string(suite_list)
+
+        return self.safe_str_buffer(page)
+
+    def mime_type(self, method, content, *args):
+        """
+        Return the MIME type for the page.
+        """
+        return 'text/html'
+
+
+class RunnerPageHandler(BasePageHandler):
+    """
+    Handle requests for paths of the form '/runner/RUNNER_PATH', where
+    `RUNNER_PATH` is a page that runs JavaScript tests.
+    """
+
+    # Handle requests to /runner/ pages, ignoring
+    # GET parameters
+    PATH_REGEX = re.compile(r'^/runner/([^\?]+).*$')
+
+    def load_page(self, method, content, *args):
+        """
+        Load the runner file from the runner assets
+        loaded from this package's resources.
+        """
+
+        # Only arg should be the relative path
+        asset = runner_assets().get(args[0])
+
+        # If there is no such asset, return None
+        if asset is None:
+            return None
+
+        else:
+            return asset.content_file()
+
+    def mime_type(self, method, content, *args):
+        """
+        Return the MIME type for the page.
+        """
+        asset = runner_assets().get(args[0])
+        return asset.mime_type if asset is not None else 'text/plain'
+
+
+class AssetPageHandler(BasePageHandler):
+    """
+    Handle requests for paths of the form `/asset/DIGEST/PATH`,
+    serving the library or runner asset at `PATH` if its contents
+    hash to `DIGEST` (see `assets`).  Any suite's libraries can be
+    served, so that suites share the browser's cached copy.
+    """
+
+    # Parse the digest and relative path, ignoring GET parameters
+    PATH_REGEX = re.compile(r'^/asset/([0-9a-f]+)/([^?]+).*$')
+
+    def __init__(self, lib_asset_index):
+        """
+        Serve the libraries in `lib_asset_index` (a `LibAssetIndex`).
+        """
+        super(AssetPageHandler, self).__init__()
+        self._lib_asset_index = lib_asset_index
+
+    def load_page(self, method, content, *args):
+        """
+        Load the asset, or return None if no library or
+        runner asset matches both the path and the digest.
+        """
+        digest, rel_path = args
+
+        # Check the runner assets first, since they are already loaded
+        asset = runner_assets().get(rel_path)
+
+        if asset is not None and asset.digest == digest:
+            return asset.content_file()
+
+        full_path = self._lib_asset_index.lib_path(digest, rel_path)
+
+        if full_path is None:
+            return None
+
+        try:
+            return open(full_path, 'rb')
+
+        except IOError:
+            return None
+
+    def mime_type(self, method, content, *args):
+        """
+        Return the MIME type for the page.
+        """
+        _, rel_path = args
+        asset = runner_assets().get(rel_path)
+        return asset.mime_type if asset is not None else self.guess_mime_type(rel_path)
+
+
+class FixtureBundlePageHandler(BasePageHandler):
+    """
+    Handle requests for paths of the form `/suite/SUITE_NAME/fixtures.json`,
+    serving all the fixtures of a suite that preloads them (see `fixtures`).
+    """
+
+    # Parse the suite name, ignoring GET parameters
+    PATH_REGEX = re.compile(r'^/suite/([^/?]+)/' + re.escape(FIXTURE_BUNDLE_NAME) + r'(\?.*)?$')
+
+    def __init__(self, fixture_cache):
+        """
+        Serve the bundles in `fixture_cache` (a `FixtureCache`).
+        """
+        super(FixtureBundlePageHandler, self).__init__()
+        self._fixture_cache = fixture_cache
+
+    def load_page(self, method, content, *args):
+        """
+        Load the fixture bundle, or return None if
+        the suite does not preload its fixtures.
+        """
+        bundle = self._fixture_cache.bundle(args[0])
+        return StringIO(bundle) if bundle is not None else None
+
+    def mime_type(self, method, content, *args):
+        """
+        Return the MIME type for the page.
+        """
+        return 'application/json'
+
+
+class ModuleManifestPageHandler(BasePageHandler):
+    """
+    Handle requests for paths of the form `/suite/SUITE_NAME/modules.json`,
+    serving the RequireJS modules reachable from a `jasmine_requirejs`
+    suite's `main` module (see `requirejs`).
+    """
+
+    # Parse the suite name, ignoring GET parameters
+    PATH_REGEX = re.compile(r'^/suite/([^/?]+)/' + re.escape(MODULE_MANIFEST_NAME) + r'(\?.*)?$')
+
+    def __init__(self, desc_dict, module_scanner):
         """
-        super(SuitePageHandler, self).__init__()
-        self._renderer = renderer
+        Serve manifests for the suites in `desc_dict` (a dict mapping
+        suite names to `SuiteDescription` instances), scanning
+        files with `module_scanner` (a `DependencyScanner`).
+        """
+        super(ModuleManifestPageHandler, self).__init__()
         self._desc_dict = desc_dict
+        self._module_scanner = module_scanner
 
     def load_page(self, method, content, *args):
         """
-        Render the suite runner page.
+        Load the module manifest, or return None if
+        the suite does not use RequireJS.
         """
-
-        # The only arg should be the suite name
         suite_name = args[0]
+        desc = self._desc_dict.get(suite_name)
 
-        # Try to find the suite description
-        suite_desc = self._desc_dict.get(suite_name)
-
-        # If we can't find it, don't serve it
-        if suite_desc is None:
+        if desc is None or desc.test_runner() != 'jasmine_requirejs':
             return None
 
-        # Otherwise, render the page
-        else:
-            page = self._renderer.render_to_string(suite_name, suite_desc)
-            return self.safe_str_buffer(page)
+        return StringIO(module_manifest(suite_name, desc, self._module_scanner))
 
     def mime_type(self, method, content, *args):
         """
         Return the MIME type for the page.
         """
-        return 'text/html'
+        return 'application/json'
 
 
-class RunnerPageHandler(BasePageHandler):
+class ShardDurationsPageHandler(BasePageHandler):
     """
-    Handle requests for paths of the form '/runner/RUNNER_PATH', where
-    `RUNNER_PATH` is a page that runs JavaScript tests.
+    Handle requests for `/shard-durations.json`, serving the
+    durations of the test groups in earlier runs (see `sharding`).
     """
 
-    # Handle requests to /runner/ pages, ignoring
-    # GET parameters
-    PATH_REGEX = re.compile(r'^/runner/([^\?]+).*$')
+    # Ignore GET parameters
+    PATH_REGEX = re.compile(r'^' + re.escape(SHARD_DURATIONS_URL) + r'(\?.*)?$')
 
-    def load_page(self, method, content, *args):
+    def __init__(self, durations):
         """
-        Load the runner file from this package's resources.
+        Serve `durations`, a dict mapping test group
+        names to durations in seconds.
         """
+        super(ShardDurationsPageHandler, self).__init__()
+        self._durations = durations
 
-        # Only arg should be the relative path
-        rel_path = os.path.join('runner', args[0])
-
-        # Attempt to load the package resource
-        try:
-            content = pkg_resources.resource_string('js_test_tool', rel_path)
-
-        # If we could not load it, return None
-        except BaseException:
-            return None
-
-        # If we successfully loaded it, return the content
-        # as a file-like object.
-        else:
-            return self.safe_str_buffer(content)
+    def load_page(self, method, content, *args):
+        """
+        Load the durations as JSON.
+        """
+        return StringIO(json.dumps(self._durations))
 
     def mime_type(self, method, content, *args):
         """
         Return the MIME type for the page.
         """
-        return self.guess_mime_type(args[0])
+        return 'application/json'
 
 
 class DependencyPageHandler(BasePageHandler):
@@ -460,14 +1201,18 @@ class DependencyPageHandler(BasePageHandler):
         'application/xml',
     ]
 
-    def __init__(self, desc_dict):
+    def __init__(self, desc_dict, page_cache=None):
         """
         Initialize the dependency page handler to serve dependencies
         specified by `desc_dict` (a dict mapping suite names to 
         `SuiteDescription` instances).
+
+        If `page_cache` (a `PageCache`) is provided, use the
+        lists of dependencies it found rather than searching again.
         """
         super(DependencyPageHandler, self).__init__()
         self._desc_dict = desc_dict
+        self._page_cache = page_cache
 
     def load_page(self, method, content, *args):
         """
@@ -522,10 +1267,14 @@ class DependencyPageHandler(BasePageHandler):
             return None
 
         # Get all dependency paths
-        all_paths = (suite_desc.lib_paths() +
-                     suite_desc.src_paths() +
-                     suite_desc.spec_paths() +
-                     suite_desc.fixture_paths())
+        if self._page_cache is not None:
+            all_paths = self._page_cache.dependency_paths(suite_name)
+
+        else:
+            all_paths = (suite_desc.lib_paths() +
+                         suite_desc.src_paths() +
+                         suite_desc.spec_paths() +
+                         suite_desc.fixture_paths())
 
         # If the path is in our listed dependencies, we can serve it
         if path in all_paths:
@@ -544,9 +1293,10 @@ class InstrumentedSrcPageHandler(BasePageHandler):
     Instrument the JavaScript source file to collect coverage information.
     """
 
-    PATH_REGEX = re.compile('^/suite/([^/]+)/include/([^?]+).*$')
+    # Parse the suite name, relative path, and GET parameters
+    PATH_REGEX = re.compile(r'^/suite/([^/]+)/include/([^?]+)(\?.*)?$')
 
-    def __init__(self, desc_dict, instr_dict):
+    def __init__(self, desc_dict, instr_dict, page_cache=None):
         """
         Initialize the dependency page handler to serve dependencies
         specified by `desc_dict` (a dict mapping suite names
@@ -555,10 +1305,14 @@ class InstrumentedSrcPageHandler(BasePageHandler):
         `instr_dict` is a dict mapping suite names to 
         `SrcInstrumenter` instances.  There should be one
         instrumenter for each suite.
+
+        If `page_cache` (a `PageCache`) is provided, use the
+        sources it found rather than searching again.
         """
         super(InstrumentedSrcPageHandler, self).__init__()
         self._desc_dict = desc_dict
         self._instr_dict = instr_dict
+        self._page_cache = page_cache
 
     def load_page(self, method, content, *args):
         """
@@ -566,7 +1320,12 @@ class InstrumentedSrcPageHandler(BasePageHandler):
         """
 
         # Interpret the arguments (from the regex)
-        suite_name, rel_path = args
+        suite_name, rel_path, query = args
+
+        # If the page asked for sources without coverage,
+        # let the dependency handler serve the raw file.
+        if self.is_raw_src_request(query):
+            return None
 
         # Check that this is a source file (not a lib or spec)
         if self._is_src_file(suite_name, rel_path):
@@ -592,7 +1351,7 @@ class InstrumentedSrcPageHandler(BasePageHandler):
         """
         Return the MIME type for the page.
         """
-        _, rel_path = args
+        rel_path = args[1]
         return self.guess_mime_type(rel_path)
 
     def _send_instrumented_src(self, suite_name, rel_path):
@@ -629,7 +1388,7 @@ class InstrumentedSrcPageHandler(BasePageHandler):
     def _is_src_file(self, suite_name, rel_path):
         """
         Returns True only if the file at `rel_path` is a source file
-        in the suite named `suite_name`.
+        in the suite named `suite_name` that should be instrumented.
         """
 
         suite_desc = self._desc_dict.get(suite_name)
@@ -637,7 +1396,55 @@ class InstrumentedSrcPageHandler(BasePageHandler):
         if suite_desc is None:
             return False
 
-        return (rel_path in suite_desc.src_paths())
+        if self._page_cache is not None:
+            return rel_path in self._page_cache.instrumented_src_paths(suite_name)
+
+        return (rel_path in suite_desc.src_paths() and
+                suite_desc.should_instrument(rel_path))
+
+
+class CompiledPageHandler(BasePageHandler):
+    """
+    Serve the pages and dependencies written by `js-test-tool compile`.
+    """
+
+    # Parse the path and GET parameters
+    PATH_REGEX = re.compile(r'^/([^?]*)(\?.*)?$')
+
+    def __init__(self, compiled):
+        """
+        Serve the files of `compiled` (a `CompiledSuites` instance).
+        """
+        super(CompiledPageHandler, self).__init__()
+        self._compiled = compiled
+
+    def load_page(self, method, content, *args):
+        """
+        Load the compiled file, or return None if there is no such file.
+        """
+        file_path = self._file_path(*args)
+
+        if file_path is None:
+            return None
+
+        try:
+            return open(file_path, 'rb')
+
+        except IOError:
+            return None
+
+    def mime_type(self, method, content, *args):
+        """
+        Return the MIME type for the page.
+        """
+        return self.guess_mime_type(self._file_path(*args) or '')
+
+    def _file_path(self, url_path, query):
+        """
+        Return the path of the compiled file for `url_path`,
+        loading sources without instrumentation if `query` asks for them.
+        """
+        return self._compiled.file_path(url_path, raw_src=self.is_raw_src_request(query))
 
 
 class StoreCoveragePageHandler(BasePageHandler):
@@ -646,7 +1453,9 @@ class StoreCoveragePageHandler(BasePageHandler):
     by clients running instrumented JavaScript sources.
     """
 
-    PATH_REGEX = re.compile('^/jscoverage-store/([^/]+)/?$')
+    # Pages running several suites report the coverage of each
+    # suite to /jscoverage-store/SUITE_NAME/pack (see `packing`)
+    PATH_REGEX = re.compile('^/jscoverage-store/([^/]+)(/pack)?/?$')
 
     # Handle only POST
     HTTP_METHODS = ["POST"]
@@ -670,10 +1479,10 @@ class StoreCoveragePageHandler(BasePageHandler):
         """
 
         # Retrieve the suite name from the URL
-        suite_name = args[0]
+        suite_name, packed = args
 
         # Store the coverage data
-        return self._store_coverage_data(suite_name, content)
+        return self._store_coverage_data(suite_name, content, packed is not None)
 
     def mime_type(self, method, content, *args):
         """
@@ -681,18 +1490,34 @@ class StoreCoveragePageHandler(BasePageHandler):
         """
         return 'text/plain'
 
-    def _store_coverage_data(self, suite_name, request_content):
+    def _store_coverage_data(self, suite_name, request_content, packed=False):
         """
         Store received coverage data for the JS source file
         in the suite with name `suite_name`.
 
         `request_content` is the content of the HTTP POST request.
+        If `packed` is True, it was sent by a page running several
+        suites, so it includes the coverage of the other suites' sources.
 
         Returns None if any errors occur; returns a success method if successful.
         """
 
-        # Record that we got a coverage report for this suite
-        self._coverage_data.add_suite_name(suite_name)
+        try:
+            return self._load_coverage_data(suite_name, request_content, packed)
+
+        # Record that we got a coverage report for this suite.
+        # We do this after loading the data, so that waiting
+        # for all coverage cannot finish before it is loaded.
+        finally:
+            self._coverage_data.add_suite_name(suite_name)
+
+    def _load_coverage_data(self, suite_name, request_content, packed):
+        """
+        Load the coverage data in `request_content` for the suite
+        with name `suite_name`, keeping only the coverage of the
+        suite's sources if `packed` is True.  Returns None if any
+        errors occur; returns a success message if successful.
+        """
 
         # Retrieve the root directory for this suite
         suite_desc = self._desc_dict.get(suite_name)
@@ -708,6 +1533,14 @@ class StoreCoveragePageHandler(BasePageHandler):
             if not isinstance(coverage_dict, dict):
                 raise ValueError()
 
+            if packed:
+                src_paths = set(suite_desc.src_paths())
+                coverage_dict = dict(
+                    (src_path, src_coverage)
+                    for src_path, src_coverage in coverage_dict.iteritems()
+                    if src_path.lstrip('/') in src_paths
+                )
+
             # `CoverageData.load_from_dict()` is thread-safe, so it
             # is okay to write to this, even if the request handler
             # is running asynchronously.
@@ -725,6 +1558,348 @@ class StoreCoveragePageHandler(BasePageHandler):
             return StringIO("Success: coverage data received")
 
 
+def build_page_handlers(renderer, desc_dict, src_instr_dict=None,
+                        coverage_data=None, page_cache=None,
+                        fixture_cache=None, module_scanner=None, compiled=None,
+                        shard_durations=None, lib_asset_index=None):
+    """
+    Return the list of page handlers that serve the suites in
+    `desc_dict` (a dict mapping suite names to `SuiteDescription`
+    instances), in the order they should be tried.
+
+    `renderer` is the `SuiteRenderer` for suite runner pages.
+
+    If `src_instr_dict` (a dict mapping suite names to `SrcInstrumenter`
+    instances) is not empty, serve instrumented sources and store
+    the coverage POSTed by the runner pages in `coverage_data`.
+
+    `page_cache` is an optional `PageCache` of pages rendered in advance.
+
+    `fixture_cache` is the `FixtureCache` for suites that preload their
+    fixtures.  If not provided, the fixture bundles are built per request.
+
+    `module_scanner` is the `DependencyScanner` used to build module
+    manifests for RequireJS suites.  If not provided, files are
+    scanned per request.
+
+    If `compiled` (a `CompiledSuites` instance) is provided, serve
+    only the compiled files, and store the coverage reported by
+    instrumented sources in `coverage_data` (if not None).
+
+    `shard_durations` is the dict of test group durations served
+    to pages that run one shard of a suite (empty if not provided).
+
+    `lib_asset_index` is the `LibAssetIndex` of libraries served at
+    asset URLs.  If not provided, the libraries are found per request.
+    """
+    durations_handler = ShardDurationsPageHandler(shard_durations or {})
+
+    if compiled is not None:
+        page_handlers = [CompiledPageHandler(compiled), durations_handler]
+
+        if coverage_data is not None:
+            page_handlers.append(StoreCoveragePageHandler(desc_dict, coverage_data))
+
+        return page_handlers
+
+    # We always handle suite runner pages (alone or packed), the runner
+    # dependencies (e.g. jasmine.js), shared assets, fixture bundles,
+    # module manifests and test group durations
+    page_handlers = [SuitePageHandler(renderer, desc_dict, page_cache=page_cache),
+                     PackPageHandler(renderer, desc_dict),
+                     RunnerPageHandler(),
+                     AssetPageHandler(lib_asset_index or LibAssetIndex(desc_dict)),
+                     FixtureBundlePageHandler(fixture_cache or FixtureCache(desc_dict)),
+                     ModuleManifestPageHandler(desc_dict, module_scanner or DependencyScanner()),
+                     durations_handler]
+
+    # If we are configured for coverage, add another handler
+    # to serve instrumented versions of the source files.
+    if src_instr_dict:
+
+        # Create the handler to serve instrumented JS pages
+        instr_src_handler = InstrumentedSrcPageHandler(desc_dict,
+                                                       src_instr_dict,
+                                                       page_cache=page_cache)
+        page_handlers.append(instr_src_handler)
+
+        # Create a handler to store coverage data POSTed back
+        # to the server from the client.
+        store_coverage_handler = StoreCoveragePageHandler(desc_dict, coverage_data)
+        page_handlers.append(store_coverage_handler)
+
+    # We always serve dependencies.  If running with coverage,
+    # the instrumented src handler will intercept source files.
+    # Serving the un-instrumented version is the fallback, and
+    # will still be used for library/spec dependencies.
+    page_handlers.append(DependencyPageHandler(desc_dict, page_cache=page_cache))
+
+    return page_handlers
+
+
+def find_page(page_handlers, path, method, request_content, range_header=None,
+              if_none_match=None, accept_encoding=None):
+    """
+    Find the response to a request using `page_handlers`
+    (see `build_page_handlers()`).
+
+    `path` is the URL path (including GET parameters), `method` is
+    the HTTP method (e.g. "GET" or "POST"), `request_content` is
+    the content of the request, and `range_header`, `if_none_match`
+    and `accept_encoding` are the values of the 'Range', 'If-None-Match'
+    and 'Accept-Encoding' headers (or None).  The last two apply
+    only to runner assets, which have ETags and gzipped copies.
+
+    Returns a `(status_code, content, mime_type, byte_range)` tuple,
+    where `content` is a file-like object (or None) and `byte_range`
+    is the `(start_pos, end_pos)` of the content to send (or None
+    to send all of it).
+    """
+    for handler in page_handlers:
+
+        # Try to retrieve the page
+        content, mime_type = handler.page_contents(path, method, request_content)
+
+        # If we got a page, send the contents
+        if content is not None:
+
+            # Runner assets are loaded in advance with their ETags
+            # and compressed copies, so check if the client has the
+            # asset already, or will accept the compressed copy.
+            asset = getattr(content, 'asset', None)
+
+            if asset is not None:
+
+                if _etag_matches(if_none_match, asset.etag):
+                    return (304, asset.not_modified_file(), mime_type, None)
+
+                if range_header is None and _accepts_gzip(accept_encoding):
+                    content = asset.content_file(gzip=True)
+
+            try:
+                byte_range = requested_byte_range(range_header, content)
+
+            # The requested range is not satisfiable; send a 406
+            except RequestRangeError:
+                return (406, None, 'text/plain', None)
+
+            # If no byte range requested, send all the content
+            if byte_range is None:
+                return (200, content, mime_type, None)
+
+            # If a byte range was requested, send partial content
+            else:
+                return (206, content, mime_type, byte_range)
+
+    # If we could not retrieve the contents (e.g. because
+    # the file does not exist), send an error response
+    return (404, None, 'text/plain', None)
+
+
+def response_headers(content, mime_type, byte_range=None, path=None):
+    """
+    Return the list of `(name, value)` headers to send with
+    `content` (a file-like object, or None) of type `mime_type`.
+
+    `byte_range` is the `(start_pos, end_pos)` of the content
+    being sent, or None if sending all of it.
+
+    `path` is the requested URL path.  Assets (see `assets`)
+    are sent with headers that let browsers cache them indefinitely.
+    """
+    headers = [('Content-Type', mime_type + '; charset=utf-8'),
+               ('Content-Language', 'en'),
+               ('Accept-Ranges', 'bytes')]
+
+    if content is not None and is_asset_url(path):
+        headers.append(('Cache-Control', ASSET_CACHE_CONTROL))
+
+    # Runner assets (see `find_page()`) have ETags and may be compressed
+    asset = getattr(content, 'asset', None)
+
+    if asset is not None:
+        headers.append(('ETag', asset.etag))
+
+        if asset.gzip_contents is not None:
+            headers.append(('Vary', 'Accept-Encoding'))
+
+        if content.content_encoding is not None:
+            headers.append(('Content-Encoding', content.content_encoding))
+
+    if byte_range is not None:
+        start_pos, end_pos = byte_range
+        headers.append((
+            'Content-Range',
+            'bytes {0}-{1}/{2}'.format(start_pos, end_pos, file_size(content))
+        ))
+
+        headers.append(('Content-Length', str(end_pos - start_pos + 1)))
+
+    else:
+        content_length = file_size(content) if content is not None else 0
+        headers.append(('Content-Length', str(content_length)))
+
+    return headers
+
+
+def _etag_matches(if_none_match, etag):
+    """
+    Return True if `if_none_match` (the value of the
+    'If-None-Match' header, or None) matches `etag`.
+    """
+    if not if_none_match:
+        return False
+
+    tag_list = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tag_list or etag in tag_list or 'W/' + etag in tag_list
+
+
+def _accepts_gzip(accept_encoding):
+    """
+    Return True if `accept_encoding` (the value of the
+    'Accept-Encoding' header, or None) allows gzipped content.
+    """
+    if not accept_encoding:
+        return False
+
+    for coding in accept_encoding.split(','):
+        params = coding.split(';')
+
+        if params[0].strip().lower() != 'gzip':
+            continue
+
+        # A quality of 0 means the client refuses gzip
+        for param in params[1:]:
+            name, _, value = param.partition('=')
+
+            if name.strip() == 'q':
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+
+        return True
+
+    return False
+
+
+def requested_byte_range(range_header, content_file):
+    """
+    Parse the requested byte range (`range_header` is the value
+    of the 'Range' header, or None) and return a `(start_pos, end_pos)`
+    tuple indicating the start/end bytes to transmit (inclusive).
+
+    `content_file` is the file to transmit
+    (used to determine the file size).
+
+    If no byte range requested, returns None.
+
+    Raises a `RequestRangeError` if the byte range is not satisfiable.
+    (in which case the server should send a 416 response).
+
+    See http://www.w3.org/Protocols/rfc2616/rfc2616-sec14.html#sec14.35.1
+    """
+
+    # No byte range specified, so send the whole file
+    if range_header is None or range_header == '':
+        return None
+
+    # Otherwise, parse the header
+    # Expect it to have the form: "bytes=byte-ranges"
+    elif range_header.startswith('bytes='):
+
+        # Get the file size
+        size = file_size(content_file)
+
+        # Chop off the "bytes=" part, so we just get the ranges
+        # Then split into individual ranges
+        # Example: "bytes=0-10,22-43" --> ["0-10", "22-43"]
+        range_str_list = range_header[len('bytes='):].split(",")
+
+        # We don't implement multiple byte ranges
+        # Just respond with a 200 and the full file instead
+        if len(range_str_list) > 1:
+            return None
+
+        # Parse the range
+        return _parse_byte_range(range_str_list[0], size)
+
+    # Don't recognize the format
+    # The RFC says to return a 200 with the full file
+    else:
+        return None
+
+
+def file_size(file_handle):
+    """
+    Return the size of `file_handle` (a file-like object) in bytes.
+    """
+    old_pos = file_handle.tell()
+
+    # Seek to the end of the file to find the last byte position
+    # (2 means relative to the end of the file)
+    file_handle.seek(0, 2)
+    size = file_handle.tell()
+
+    # Reset the old position
+    file_handle.seek(old_pos)
+
+    return size
+
+
+def _parse_byte_range(range_str, size):
+    """
+    Return a `(start_pos, end_pos)` tuple by parsing `range_str`
+    which can take the form:
+
+        * START-END
+        * START-
+        * -LENGTH
+        * Comma-separated list of above options
+
+    `size` is the size of the file to serve in bytes.
+
+    Raises a `RequestRangeError` if the byte range is not satisfiable.
+    Returns None if the byte range could not be parsed (invalid format),
+    triggering a 200 with the full file.
+    """
+    try:
+        start_pos, end_pos = range_str.split("-")
+        start_pos = int(start_pos) if start_pos != '' else None
+        end_pos = int(end_pos) if end_pos != '' else None
+
+    # Can't interpret the start/end position,
+    # so trigger a 200 with the full file instead.
+    except ValueError:
+        return None
+
+    # There are three cases to handle here:
+    # 1) Both start and end specified: "0-10" (interpret as start/end byte indices)
+    # 2) Only start specified: "0-" (interpret as start index to the end of the file)
+    # 3) Only end specified: "-10" (interpret as length from the end)
+    if start_pos is not None and end_pos is not None:
+
+        # Verify that start <= end
+        if start_pos > end_pos:
+            msg = "Start byte > end byte in range {0}".format(range_str)
+            raise RequestRangeError(msg)
+
+        return (start_pos, min(end_pos, size - 1))
+
+    elif start_pos is not None and end_pos is None:
+        return (start_pos, size - 1)
+
+    elif start_pos is None and end_pos is not None:
+        # Interpret `end_pos` as length from end when only end position is provided
+        len_from_end = end_pos
+        return (size - len_from_end, size - 1)
+
+    # Neither start nor end specified -- invalid byte range, so
+    # trigger a 200 with the full file instead.
+    else:
+        return None
+
+
 class SuitePageRequestHandler(BaseHTTPRequestHandler):
     """
     Handle HTTP requsts to the `SuitePageServer`.
@@ -735,31 +1910,15 @@ class SuitePageRequestHandler(BaseHTTPRequestHandler):
     def __init__(self, request, client_address, server):
 
         # Initialize the page handlers
-        # We always handle suite runner pages, and
-        # the runner dependencies (e.g. jasmine.js)
-        self._page_handlers = [SuitePageHandler(server.renderer, server.desc_dict),
-                               RunnerPageHandler()]
-
-        # If we are configured for coverage, add another handler
-        # to serve instrumented versions of the source files.
-        if len(server.src_instr_dict) > 0:
-
-            # Create the handler to serve instrumented JS pages
-            instr_src_handler = InstrumentedSrcPageHandler(server.desc_dict,
-                                                           server.src_instr_dict)
-            self._page_handlers.append(instr_src_handler)
-
-            # Create a handler to store coverage data POSTed back
-            # to the server from the client.
-            store_coverage_handler = StoreCoveragePageHandler(server.desc_dict,
-                                                              server.coverage_data)
-            self._page_handlers.append(store_coverage_handler)
-
-        # We always serve dependencies.  If running with coverage,
-        # the instrumented src handler will intercept source files.
-        # Serving the un-instrumented version is the fallback, and
-        # will still be used for library/spec dependencies.
-        self._page_handlers.append(DependencyPageHandler(server.desc_dict))
+        self._page_handlers = build_page_handlers(server.renderer, server.desc_dict,
+                                                  src_instr_dict=server.src_instr_dict,
+                                                  coverage_data=server.coverage_data,
+                                                  page_cache=server.page_cache,
+                                                  fixture_cache=server.fixture_cache,
+                                                  module_scanner=server.module_scanner,
+                                                  compiled=server.compiled,
+                                                  shard_durations=server.shard_durations,
+                                                  lib_asset_index=server.lib_asset_index)
 
         # Call the superclass implementation
         # This will immediately call do_GET() if the request is a GET
@@ -815,159 +1974,14 @@ class SuitePageRequestHandler(BaseHTTPRequestHandler):
         # Get the request content
         request_content = self._content()
 
-        for handler in self._page_handlers:
-
-            # Try to retrieve the page
-            content, mime_type = handler.page_contents(
-                self.path, method, request_content
-            )
-
-            # If we got a page, send the contents
-            if content is not None:
-
-                try:
-                    byte_range = self._requested_byte_range(self.headers, content)
-
-                # The requested range is not satisfiable; send a 406
-                except RequestRangeError:
-                    self._send_response(406, None, 'text/plain')
-                    return
-
-                # If no byte range requested, send all the content
-                if byte_range is None:
-                    self._send_response(200, content, mime_type)
-                    return
+        status_code, content, mime_type, byte_range = find_page(
+            self._page_handlers, self.path, method,
+            request_content, self.headers.get('Range'),
+            if_none_match=self.headers.get('If-None-Match'),
+            accept_encoding=self.headers.get('Accept-Encoding')
+        )
 
-                # If a byte range was requested, send partial content
-                else:
-                    self._send_response(
-                        206, content, mime_type,
-                        byte_range=byte_range
-                    )
-                    return
-
-        # If we could not retrieve the contents (e.g. because
-        # the file does not exist), send an error response
-        self._send_response(404, None, 'text/plain')
-
-    def _requested_byte_range(self, headers, content_file):
-        """
-        Parse the requested byte range ('Range' header)
-        and return a `(start_pos, end_pos)` tuple indicating
-        the start/end bytes to transmit (inclusive).
-
-        `headers` represents the request headers
-        (a `mimetools.Message` instance).
-
-        `content_file` is the file to transmit
-        (used to determine the file size).
-
-        If no byte range requested, returns None.
-
-        Raises a `RequestRangeError` if the byte range is not satisfiable.
-        (in which case the server should send a 416 response).
-
-        See http://www.w3.org/Protocols/rfc2616/rfc2616-sec14.html#sec14.35.1
-        """
-        range_header = headers.get('Range')
-
-        # No byte range specified, so send the whole file
-        if range_header is None or range_header == '':
-            return None
-
-        # Otherwise, parse the header
-        # Expect it to have the form: "bytes=byte-ranges"
-        elif range_header.startswith('bytes='):
-
-            # Get the file size
-            file_size = self._file_size(content_file)
-
-            # Chop off the "bytes=" part, so we just get the ranges
-            # Then split into individual ranges
-            # Example: "bytes=0-10,22-43" --> ["0-10", "22-43"]
-            range_str_list = range_header[len('bytes='):].split(",")
-
-            # We don't implement multiple byte ranges
-            # Just respond with a 200 and the full file instead
-            if len(range_str_list) > 1:
-                return None
-
-            # Parse the range
-            return self._parse_byte_range(range_str_list[0], file_size)
-
-        # Don't recognize the format
-        # The RFC says to return a 200 with the full file
-        else:
-            return None
-
-    @staticmethod
-    def _file_size(file_handle):
-        """
-        Return the size of `file_handle` (a file-like object) in bytes.
-        """
-        old_pos = file_handle.tell()
-
-        # Seek to the end of the file to find the last byte position
-        # (2 means relative to the end of the file)
-        file_handle.seek(0, 2)
-        size = file_handle.tell()
-
-        # Reset the old position
-        file_handle.seek(old_pos)
-
-        return size
-
-    def _parse_byte_range(self, range_str, file_size):
-        """
-        Return a `(start_pos, end_pos)` tuple by parsing `range_str`
-        which can take the form:
-
-            * START-END
-            * START-
-            * -LENGTH
-            * Comma-separated list of above options
-
-        `file_size` is the size of the file to serve in bytes.
-
-        Raises a `RequestRangeError` if the byte range is not satisfiable.
-        Returns None if the byte range could not be parsed (invalid format),
-        triggering a 200 with the full file.
-        """
-        try:
-            start_pos, end_pos = range_str.split("-")
-            start_pos = int(start_pos) if start_pos != '' else None
-            end_pos = int(end_pos) if end_pos != '' else None
-
-        # Can't interpret the start/end position,
-        # so trigger a 200 with the full file instead.
-        except ValueError:
-            return None
-
-        # There are three cases to handle here:
-        # 1) Both start and end specified: "0-10" (interpret as start/end byte indices)
-        # 2) Only start specified: "0-" (interpret as start index to the end of the file)
-        # 3) Only end specified: "-10" (interpret as length from the end)
-        if start_pos is not None and end_pos is not None:
-
-            # Verify that start <= end
-            if start_pos > end_pos:
-                msg = "Start byte > end byte in range {0}".format(range_str)
-                raise RequestRangeError(msg)
-
-            return (start_pos, min(end_pos, file_size - 1))
-
-        elif start_pos is not None and end_pos is None:
-            return (start_pos, file_size - 1)
-
-        elif start_pos is None and end_pos is not None:
-            # Interpret `end_pos` as length from end when only end position is provided
-            len_from_end = end_pos
-            return (file_size - len_from_end, file_size - 1)
-
-        # Neither start nor end specified -- invalid byte range, so
-        # trigger a 200 with the full file instead.
-        else:
-            return None
+        self._send_response(status_code, content, mime_type, byte_range=byte_range)
 
     def _send_response(self, status_code, content, mime_type, byte_range=None):
         """
@@ -984,22 +1998,12 @@ class SuitePageRequestHandler(BaseHTTPRequestHandler):
         If content is None, send a response with no content.
         """
         self.send_response(status_code)
-        self.send_header('Content-Type', mime_type + '; charset=utf-8')
-        self.send_header('Content-Language', 'en')
-        self.send_header('Accept-Ranges', 'bytes')
-
-        if byte_range is not None:
-            start_pos, end_pos = byte_range
-            self.send_header(
-                'Content-Range',
-                'bytes {0}-{1}/{2}'.format(start_pos, end_pos, self._file_size(content))
-            )
 
-            self.send_header('Content-Length', end_pos - start_pos + 1)
+        headers = response_headers(content, mime_type,
+                                   byte_range=byte_range, path=self.path)
 
-        else:
-            content_length = self._file_size(content) if content is not None else 0
-            self.send_header('Content-Length', content_length)
+        for name, value in headers:
+            self.send_header(name, value)
 
         self.end_headers()
 
@@ -1032,3 +2036,47 @@ class SuitePageRequestHandler(BaseHTTPRequestHandler):
             return ""
         else:
             return self.rfile.read(length)
+
+
+def suite_dict_from_list(suite_desc_list):
+    """
+    Given a list of `SuiteDescription` instances, construct
+    a dictionary mapping suite names to the instances.
+
+    Raises a `DuplicateSuiteNameError` if two suites have
+    the same name.
+    """
+    suite_dict = {
+        suite.suite_name(): suite
+        for suite in suite_desc_list
+    }
+
+    # Check that we haven't repeated keys
+    duplicates = _duplicates([suite.suite_name() for suite in suite_desc_list])
+
+    if len(duplicates) > 0:
+        msg = "Duplicate suite name(s): {}".format(",".join(duplicates))
+        raise DuplicateSuiteNameError(msg)
+
+    return suite_dict
+
+
+def _duplicates(name_list):
+    """
+    Given a list of strings, return a set of duplicates in the list.
+    """
+    seen = set()
+    duplicates = set()
+
+    for name in name_list:
+
+        # Check if we've already seen the name; if so, add it
+        # to the list of duplicates
+        if name in seen:
+            duplicates.add(name)
+
+        # Add the name to the list of names we've already seen
+        else:
+            seen.add(name)
+
+    return duplicates
@@ -29,6 +29,37 @@ class ParseArgsTest(unittest.TestCase):
         arg_dict = parse_args(argv)
         self.assertEqual(arg_dict.get('command'), 'dev')
 
+    def test_daemon_command(self):
+        argv = [self.TOOL_NAME, 'daemon', '--socket', '/tmp/test.sock']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('command'), 'daemon')
+        self.assertEqual(arg_dict.get('test_suite_paths'), [])
+        self.assertEqual(arg_dict.get('socket'), '/tmp/test.sock')
+
+    def test_parse_run_with_daemon(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome']
+        self.assertFalse(parse_args(argv).get('daemon'))
+        self.assertTrue(parse_args(argv + ['--daemon']).get('daemon'))
+
+    def test_compile_command(self):
+        argv = [self.TOOL_NAME, 'compile', 'test_suite.yaml', '--output-dir', 'compiled']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('command'), 'compile')
+        self.assertEqual(arg_dict.get('test_suite_paths'), ['test_suite.yaml'])
+        self.assertEqual(arg_dict.get('output_dir'), 'compiled')
+        self.assertFalse(arg_dict.get('instrument'))
+        self.assertFalse(arg_dict.get('hardlink'))
+
+        arg_dict = parse_args(argv + ['--instrument', '--hardlink'])
+        self.assertTrue(arg_dict.get('instrument'))
+        self.assertTrue(arg_dict.get('hardlink'))
+
+    def test_parse_run_compiled(self):
+        argv = [self.TOOL_NAME, 'run', '--compiled', 'compiled', '--use-chrome']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('compiled'), 'compiled')
+        self.assertEqual(arg_dict.get('test_suite_paths'), [])
+
     def test_parse_test_suite_multiple_files(self):
         argv = [self.TOOL_NAME, 'run', 'test_suite_1.yaml', 'test_suite_2.yaml', '--use-chrome']
         arg_dict = parse_args(argv)
@@ -56,6 +87,107 @@ class ParseArgsTest(unittest.TestCase):
         arg_dict = parse_args(argv)
         self.assertEqual(arg_dict.get('coverage_html'), 'coverage.html')
 
+    def test_parse_coverage_html_dir(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--coverage-html-dir', 'coverage',
+                '--use-firefox']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('coverage_html_dir'), 'coverage')
+
+    def test_parse_coverage_lcov(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--coverage-lcov', 'coverage.lcov',
+                '--use-firefox']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('coverage_lcov'), 'coverage.lcov')
+
+    def test_parse_coverage_thresholds(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-firefox',
+                '--coverage-summary-json', 'summary.json',
+                '--coverage-fail-under', '80', '--coverage-file-fail-under', '50.5']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('coverage_summary_json'), 'summary.json')
+        self.assertEqual(arg_dict.get('coverage_fail_under'), 80.0)
+        self.assertEqual(arg_dict.get('coverage_file_fail_under'), 50.5)
+
+    def test_parse_coverage_db(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--coverage-db', 'coverage.db',
+                '--use-firefox']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('coverage_db'), 'coverage.db')
+
+    def test_parse_coverage_snapshot(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--coverage-snapshot', 'shard.snapshot',
+                '--use-firefox']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('coverage_snapshot'), 'shard.snapshot')
+
+    def test_combine_command(self):
+        argv = [self.TOOL_NAME, 'combine', 'shard_1.snapshot', 'shard_2.snapshot',
+                '--coverage-xml', 'coverage.xml', '--num-processes', '4']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('command'), 'combine')
+        self.assertEqual(arg_dict.get('test_suite_paths'),
+                         ['shard_1.snapshot', 'shard_2.snapshot'])
+        self.assertEqual(arg_dict.get('coverage_xml'), 'coverage.xml')
+        self.assertEqual(arg_dict.get('num_processes'), 4)
+
+    def test_diff_command(self):
+        argv = [self.TOOL_NAME, 'diff', 'baseline.snapshot', '--git-range', 'master...HEAD']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('command'), 'diff')
+        self.assertEqual(arg_dict.get('test_suite_paths'), ['baseline.snapshot'])
+        self.assertEqual(arg_dict.get('git_range'), 'master...HEAD')
+        self.assertIs(arg_dict.get('diff_file'), None)
+
+    def test_parse_coverage_browser(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml',
+                '--use-chrome', '--use-firefox',
+                '--coverage-browser', 'chrome']
+        arg_dict = parse_args(argv)
+        self.assertEqual(arg_dict.get('coverage_browser'), 'chrome')
+
+    def test_parse_coverage_backend(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome']
+        self.assertEqual(parse_args(argv).get('coverage_backend'), 'jscover')
+
+        arg_dict = parse_args(argv + ['--coverage-backend', 'native'])
+        self.assertEqual(arg_dict.get('coverage_backend'), 'native')
+
+    def test_parse_jscover_heap(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome']
+        self.assertIs(parse_args(argv).get('jscover_heap'), None)
+
+        arg_dict = parse_args(argv + ['--jscover-heap', '1g'])
+        self.assertEqual(arg_dict.get('jscover_heap'), '1g')
+
+    def test_parse_server_workers(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome']
+        self.assertIs(parse_args(argv).get('server_workers'), None)
+        self.assertEqual(parse_args(argv + ['--server-workers', '8']).get('server_workers'), 8)
+
+    def test_parse_server_processes(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome']
+        self.assertIs(parse_args(argv).get('server_processes'), None)
+        self.assertEqual(parse_args(argv + ['--server-processes', '4']).get('server_processes'), 4)
+
+    def test_parse_pack(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome']
+        self.assertIs(parse_args(argv).get('pack'), None)
+        self.assertEqual(parse_args(argv + ['--pack', '5']).get('pack'), 5)
+
+    def test_parse_shards(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome']
+        self.assertIs(parse_args(argv).get('shards'), None)
+        self.assertIs(parse_args(argv).get('shard_durations'), None)
+
+        arg_dict = parse_args(argv + ['--shards', '4', '--shard-durations', 'durations.json'])
+        self.assertEqual(arg_dict.get('shards'), 4)
+        self.assertEqual(arg_dict.get('shard_durations'), 'durations.json')
+
+    def test_parse_tabs(self):
+        argv = [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome']
+        self.assertIs(parse_args(argv).get('tabs'), None)
+        self.assertEqual(parse_args(argv + ['--tabs', '4']).get('tabs'), 4)
+
     def test_parse_coverage_xml_and_html(self):
         argv = [self.TOOL_NAME, 'run', 'test_suite.yaml',
                 '--coverage-xml', 'coverage.xml',
@@ -132,6 +264,67 @@ class ParseArgsTest(unittest.TestCase):
 
             # Dev mode with multiple suites
             [self.TOOL_NAME, 'dev', 'test_suite_1.yaml', 'test_suite_2.yaml'],
+
+            # Diff coverage without exactly one source of changed lines
+            [self.TOOL_NAME, 'diff', 'baseline.snapshot'],
+            [self.TOOL_NAME, 'diff', 'baseline.snapshot',
+             '--diff-file', 'changes.diff', '--git-range', 'HEAD'],
+
+            # Diff coverage with multiple snapshots
+            [self.TOOL_NAME, 'diff', 'shard_1.snapshot', 'shard_2.snapshot',
+             '--diff-file', 'changes.diff'],
+
+            # Coverage browser not used to run the tests
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome',
+             '--coverage-browser', 'firefox'],
+
+            # Unknown coverage browser
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome',
+             '--coverage-browser', 'safari'],
+
+            # Native coverage without Chrome
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-firefox',
+             '--coverage-backend', 'native'],
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-firefox', '--use-chrome',
+             '--coverage-backend', 'native', '--coverage-browser', 'firefox'],
+
+            # No server workers
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome',
+             '--server-workers', '0'],
+
+            # Compile without an output directory
+            [self.TOOL_NAME, 'compile', 'test_suite.yaml'],
+
+            # Compiled suites and suite files
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--compiled', 'compiled',
+             '--use-chrome'],
+
+            # Compiled suites in dev mode
+            [self.TOOL_NAME, 'dev', '--compiled', 'compiled'],
+
+            # No server processes
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome',
+             '--server-processes', '0'],
+
+            # No suites per packed page
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome',
+             '--pack', '0'],
+
+            # Packed compiled suites
+            [self.TOOL_NAME, 'run', '--compiled', 'compiled', '--use-chrome',
+             '--pack', '5'],
+
+            # No shards
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome',
+             '--shards', '0'],
+
+            # No tabs
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome',
+             '--tabs', '0'],
+
+            # Invalid JSCover heap size
+            [self.TOOL_NAME, 'run', 'test_suite.yaml', '--use-chrome',
+             '--jscover-heap', 'lots'],
         ]
 
         for argv in invalid_argv:
@@ -0,0 +1,72 @@
+import os
+import gzip
+import mimetypes
+import pkg_resources
+from StringIO import StringIO
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.assets import RunnerAsset, runner_assets, runner_asset_url, \
+    runner_module_paths, lib_asset_url, file_digest
+
+
+class RunnerAssetTest(TempWorkspaceTestCase):
+
+    def test_runner_assets(self):
+        assets = runner_assets()
+
+        # Expect that the assets are loaded only once
+        self.assertIs(runner_assets(), assets)
+
+        asset = assets['jasmine/jasmine.js']
+        expected = pkg_resources.resource_string('js_test_tool', 'runner/jasmine/jasmine.js')
+        self.assertEqual(asset.contents, expected)
+        self.assertEqual(asset.length, len(expected))
+        self.assertEqual(asset.mime_type, mimetypes.guess_type('jasmine.js')[0])
+        self.assertEqual(asset.etag, '"{}"'.format(asset.digest))
+        self.assertEqual(asset.url, '/asset/{}/jasmine/jasmine.js'.format(asset.digest))
+        self.assertEqual(assets['jasmine/jasmine.css'].mime_type, 'text/css')
+
+    def test_gzip(self):
+        contents = 'var x = 1;\n' * 100
+        asset = RunnerAsset('test.js', contents)
+
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(asset.gzip_contents)).read(), contents)
+        self.assertEqual(asset.content_file(gzip=True).read(), asset.gzip_contents)
+        self.assertEqual(asset.content_file(gzip=True).content_encoding, 'gzip')
+        self.assertEqual(asset.content_file().read(), contents)
+        self.assertIs(asset.content_file().content_encoding, None)
+
+        # Expect that the compressed copy does not depend on the time
+        self.assertEqual(RunnerAsset('test.js', contents).gzip_contents, asset.gzip_contents)
+
+    def test_small_assets_not_compressed(self):
+        asset = RunnerAsset('test.js', 'var x;')
+        self.assertIs(asset.gzip_contents, None)
+        self.assertEqual(asset.content_file(gzip=True).read(), 'var x;')
+
+    def test_not_modified_file(self):
+        content = RunnerAsset('test.txt', 'test').not_modified_file()
+        self.assertEqual(content.read(), '')
+        self.assertEqual(content.etag, RunnerAsset('other.txt', 'test').etag)
+
+    def test_runner_asset_url(self):
+        self.assertEqual(runner_asset_url('jasmine/jasmine.js'),
+                         runner_assets()['jasmine/jasmine.js'].url)
+        self.assertEqual(runner_asset_url('missing.js'), '/runner/missing.js')
+
+    def test_runner_module_paths(self):
+        module_paths = runner_module_paths('jasmine_requirejs')
+
+        self.assertEqual(module_paths['jquery'],
+                         runner_assets()['jasmine_requirejs/jquery.js'].url[:-len('.js')])
+        self.assertNotIn('jasmine.css', module_paths)
+        self.assertEqual(runner_module_paths('missing'), {})
+
+    def test_lib_asset_url(self):
+        with open('lib.js', 'w') as lib_file:
+            lib_file.write('var lib;')
+
+        digest = file_digest(os.path.abspath('lib.js'))
+        self.assertEqual(lib_asset_url('test-suite', self.temp_dir, 'lib.js'),
+                         '/asset/{}/lib.js'.format(digest))
+        self.assertEqual(lib_asset_url('test-suite', self.temp_dir, 'missing.js'),
+                         '/suite/test-suite/include/missing.js')
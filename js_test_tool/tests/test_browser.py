@@ -3,6 +3,7 @@ import mock
 import json
 from textwrap import dedent
 import splinter
+from selenium.common.exceptions import WebDriverException
 from js_test_tool.browser import Browser, BrowserError, JavaScriptError
 from js_test_tool.tests.helpers import StubServer
 
@@ -318,3 +319,266 @@ class BrowserDisconnectTest(FastBrowserTest):
         # Since we are mocking the browser, the URL doesn't matter
         with self.assertRaises(BrowserError):
             browser.get_page_results('http://www.example.com')
+
+
+class BrowserNativeCoverageTest(FastBrowserTest):
+    """
+    Test that the browser records precise coverage
+    through the WebDriver session.
+    """
+
+    @mock.patch('js_test_tool.browser.SplinterBrowser')
+    def test_take_script_coverage(self, mock_class):
+
+        # Configure a mock splinter browser with a finished results page
+        mock_browser = mock.MagicMock()
+        mock_browser.is_element_present_by_css.return_value = True
+        results_elems = mock.MagicMock()
+        results_elems.is_empty.return_value = False
+        results_elems.first.html = json.dumps([])
+
+        error_elems = mock.MagicMock()
+        error_elems.is_empty.return_value = True
+
+        mock_browser.find_by_id.side_effect = lambda elem_id: (
+            results_elems if elem_id == Browser.RESULTS_DIV_ID else error_elems
+        )
+        mock_class.return_value = mock_browser
+
+        script_coverage = [{'url': 'http://localhost/suite/test/include/src.js',
+                            'functions': []}]
+
+        def cdp_cmd(command, params):
+            if command == 'Profiler.takePreciseCoverage':
+                return {'result': script_coverage}
+            return {}
+
+        mock_browser.driver.execute_cdp_cmd.side_effect = cdp_cmd
+
+        browser = Browser('chrome', timeout_sec=0.3, native_coverage=True)
+        browser.get_page_results('http://www.example.com')
+
+        # Expect that coverage was started before the page loaded
+        commands = [args[0] for args, _ in mock_browser.driver.execute_cdp_cmd.call_args_list]
+        self.assertEqual(commands[:2], ['Profiler.enable', 'Profiler.startPreciseCoverage'])
+
+        # Expect that the coverage is returned once
+        self.assertEqual(browser.take_script_coverage(), script_coverage)
+        self.assertEqual(browser.take_script_coverage(), [])
+
+    @mock.patch('js_test_tool.browser.SplinterBrowser')
+    def test_native_coverage_unsupported(self, mock_class):
+
+        with self.assertRaises(BrowserError):
+            Browser('firefox', native_coverage=True)
+
+
+class BrowserDurationTest(FastBrowserTest):
+    """
+    Test that the browser reports how long each test took,
+    if the runner page timed it.
+    """
+
+    @mock.patch('js_test_tool.browser.SplinterBrowser')
+    def test_durations(self, mock_class):
+
+        results = [{'testGroup': 'Adder%20tests', 'testName': 'timed',
+                    'testStatus': 'pass', 'testDetail': '', 'testDuration': 1500},
+                   {'testGroup': 'Adder%20tests', 'testName': 'untimed',
+                    'testStatus': 'pass', 'testDetail': ''}]
+
+        # Configure a mock splinter browser with a finished results page
+        mock_browser = mock.MagicMock()
+        mock_browser.is_element_present_by_css.return_value = True
+        results_elems = mock.MagicMock()
+        results_elems.is_empty.return_value = False
+        results_elems.first.html = json.dumps(results)
+
+        error_elems = mock.MagicMock()
+        error_elems.is_empty.return_value = True
+
+        mock_browser.find_by_id.side_effect = lambda elem_id: (
+            results_elems if elem_id == Browser.RESULTS_DIV_ID else error_elems
+        )
+        mock_class.return_value = mock_browser
+
+        output_results = Browser('chrome', timeout_sec=0.3).get_page_results('http://www.example.com')
+
+        # Expect that durations are converted to seconds
+        self.assertEqual(output_results, [
+            {'test_group': 'Adder tests', 'test_name': 'timed',
+             'status': 'pass', 'detail': '', 'duration': 1.5},
+            {'test_group': 'Adder tests', 'test_name': 'untimed',
+             'status': 'pass', 'detail': ''},
+        ])
+
+
+class FakeTabbedDriver(object):
+    """
+    Fake WebDriver session that loads pages in tabs.
+    """
+
+    def __init__(self, page_dict):
+        """
+        `page_dict` maps each URL to a list of the results (lists of
+        dicts) the page reports each time it loads, or None
+        for loads in which the tab crashes.
+        """
+        self.page_dict = page_dict
+        self.window_handles = ['home']
+        self.current_handle = 'home'
+        self.opened_urls = []
+        self.max_open_tabs = 0
+        self._tab_dict = {}
+
+        self.switch_to = mock.MagicMock()
+        self.switch_to.window.side_effect = self._switch
+
+    def execute_script(self, script, *args):
+        if script.startswith('window.open'):
+            url = args[0]
+            handle = 'tab_{}'.format(len(self.opened_urls))
+            self.opened_urls.append(url)
+            self._tab_dict[handle] = self.page_dict[url].pop(0)
+            self.window_handles.append(handle)
+            self.max_open_tabs = max(self.max_open_tabs, len(self.window_handles) - 1)
+
+        # The page checks whether its tests are done
+        else:
+            if self.current_results() is None:
+                raise WebDriverException('tab crashed')
+            return True
+
+    def close(self):
+        self.window_handles.remove(self.current_handle)
+
+    def current_results(self):
+        return self._tab_dict.get(self.current_handle)
+
+    def _switch(self, handle):
+        if handle not in self.window_handles:
+            raise WebDriverException('no such window')
+        self.current_handle = handle
+
+
+class BrowserTabsTest(FastBrowserTest):
+    """
+    Test that the browser loads several pages at once in tabs.
+    """
+
+    def setUp(self):
+        super(BrowserTabsTest, self).setUp()
+
+        patcher = mock.patch('js_test_tool.browser.SplinterBrowser')
+        self.mock_class = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tabbed_results(self):
+        driver = self._install_driver({
+            'http://example.com/a': [self._results('a')],
+            'http://example.com/b': [self._results('b')],
+            'http://example.com/c': [self._results('c')],
+        })
+
+        browser = Browser('chrome', timeout_sec=0.3, max_tabs=2)
+        results = browser.get_pages_results(['http://example.com/a',
+                                             'http://example.com/b',
+                                             'http://example.com/c'])
+
+        # Expect the results of each page in order,
+        # with no more than two pages loading at once
+        self.assertEqual([result_list[0]['test_group'] for result_list in results],
+                         ['a', 'b', 'c'])
+        self.assertEqual(driver.max_open_tabs, 2)
+
+        # Expect that the tabs were closed
+        self.assertEqual(driver.window_handles, ['home'])
+
+    def test_retry_crashed_tab(self):
+        Browser.MAX_RESTARTS = 2
+        driver = self._install_driver({
+            'http://example.com/a': [self._results('a')],
+            'http://example.com/b': [None, self._results('b')],
+        })
+
+        browser = Browser('firefox', timeout_sec=0.3, max_tabs=2)
+        results = browser.get_pages_results(['http://example.com/a',
+                                             'http://example.com/b'])
+
+        # Expect that only the crashed page was loaded again
+        self.assertEqual([result_list[0]['test_group'] for result_list in results],
+                         ['a', 'b'])
+        self.assertEqual(driver.opened_urls, ['http://example.com/a',
+                                              'http://example.com/b',
+                                              'http://example.com/b'])
+
+        # Expect that the browser did not need to restart
+        self.assertEqual(self.mock_class.call_count, 1)
+
+    def test_crashed_tab_fails(self):
+        driver = self._install_driver({
+            'http://example.com/a': [self._results('a')],
+            'http://example.com/b': [None],
+        })
+
+        browser = Browser('chrome', timeout_sec=0.3, max_tabs=2)
+
+        # Expect an error once the page runs out of attempts,
+        # and that no tabs are left open
+        with self.assertRaises(BrowserError):
+            browser.get_pages_results(['http://example.com/a', 'http://example.com/b'])
+
+        self.assertEqual(driver.window_handles, ['home'])
+
+    def test_background_tabs_not_throttled(self):
+
+        # Expect that browsers loading several tabs
+        # do not slow down the tabs in the background
+        Browser('chrome', timeout_sec=0.3, max_tabs=2)
+        _, kwargs = self.mock_class.call_args
+        self.assertEqual(kwargs['options'].arguments, Browser.TABBED_CHROME_ARGS)
+
+        Browser('firefox', timeout_sec=0.3, max_tabs=2)
+        self.mock_class.assert_called_with(
+            'firefox', profile_preferences={'dom.min_background_timeout_value': 0}
+        )
+
+        # Expect that browsers loading one page are started as usual
+        Browser('chrome', timeout_sec=0.3)
+        self.mock_class.assert_called_with('chrome')
+
+    def test_tabs_unsupported(self):
+        with self.assertRaises(BrowserError):
+            Browser('phantomjs', max_tabs=2)
+
+    def _install_driver(self, page_dict):
+        """
+        Configure the mock splinter browser to use a `FakeTabbedDriver`
+        loading the pages in `page_dict`, and return the driver.
+        """
+        driver = FakeTabbedDriver(page_dict)
+
+        results_elems = mock.MagicMock()
+        results_elems.is_empty.return_value = False
+        type(results_elems.first).html = mock.PropertyMock(
+            side_effect=lambda: json.dumps(driver.current_results())
+        )
+
+        error_elems = mock.MagicMock()
+        error_elems.is_empty.return_value = True
+
+        mock_browser = mock.MagicMock()
+        mock_browser.driver = driver
+        mock_browser.find_by_id.side_effect = lambda elem_id: (
+            results_elems if elem_id == Browser.RESULTS_DIV_ID else error_elems
+        )
+        self.mock_class.return_value = mock_browser
+        return driver
+
+    @staticmethod
+    def _results(group_name):
+        """
+        Return the runner output of a page with one passing test in `group_name`.
+        """
+        return [{'testGroup': group_name, 'testName': 'test',
+                 'testStatus': 'pass', 'testDetail': ''}]
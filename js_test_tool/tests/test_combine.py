@@ -0,0 +1,92 @@
+import os
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.coverage import CoverageData
+from js_test_tool.combine import combine_snapshots, merge_snapshot_dicts
+
+
+class CombineSnapshotsTest(TempWorkspaceTestCase):
+
+    def test_combine_single_process(self):
+
+        paths = self._write_snapshots([
+            {'src1.js': [1, 0, None]},
+            {'src1.js': [0, 1, None, 0], 'src2.js': [0]},
+        ])
+
+        combined = combine_snapshots(paths, num_processes=1)
+        self._assert_combined(combined)
+
+    def test_combine_process_pool(self):
+
+        # Use more snapshots than processes, so that both the
+        # per-process chunks and the tree-reduce are exercised
+        paths = self._write_snapshots([
+            {'src1.js': [1, 0, None]},
+            {'src1.js': [0, 1, None, 0]},
+            {'src2.js': [0]},
+            {},
+            {'src1.js': [0, 0]},
+        ])
+
+        combined = combine_snapshots(paths, num_processes=3)
+        self._assert_combined(combined)
+
+    def test_combine_no_snapshots(self):
+        combined = combine_snapshots([])
+        self.assertEqual(combined.src_list(), [])
+
+    def test_invalid_snapshot(self):
+
+        paths = self._write_snapshots([{'src1.js': [1]}])
+        with open(paths[0], 'w') as snapshot_file:
+            snapshot_file.write('not a snapshot')
+
+        with self.assertRaises(IOError):
+            combine_snapshots(paths, num_processes=1)
+
+    def test_merge_expected_sources(self):
+
+        first = CoverageData()
+        first.add_expected_src('/root', 'src.js')
+
+        second = CoverageData()
+        second.load_from_dict('/root', '', {'src.js': {'lineData': [None, 1]}})
+
+        merged = merge_snapshot_dicts(first.to_snapshot_dict(), second.to_snapshot_dict())
+        self.assertEqual(merged['sources']['/root/src.js']['lines'], [None, 1])
+
+    def _assert_combined(self, combined):
+        """
+        Assert that `combined` contains the merged coverage
+        for the snapshots used in the tests.
+        """
+        root_dir = os.getcwd()
+        self.assertEqual(combined.src_list(),
+                         [os.path.join(root_dir, 'src1.js'),
+                          os.path.join(root_dir, 'src2.js')])
+        self.assertEqual(combined.line_dict_for_src(os.path.join(root_dir, 'src1.js')),
+                         {0: True, 1: True, 3: False})
+        self.assertEqual(combined.line_dict_for_src(os.path.join(root_dir, 'src2.js')),
+                         {0: False})
+
+    def _write_snapshots(self, coverage_dict_list):
+        """
+        Write a snapshot for each dict in `coverage_dict_list`
+        (mapping source paths to JSCover line data)
+        and return the list of snapshot paths.
+        """
+        path_list = []
+
+        for index, coverage_dict in enumerate(coverage_dict_list):
+            data = CoverageData()
+            data.add_suite_name('suite-{}'.format(index))
+            data.load_from_dict(os.getcwd(), '', {
+                src_path: {'lineData': line_data}
+                for src_path, line_data in coverage_dict.items()
+            })
+
+            path = 'shard_{}.snapshot'.format(index)
+            data.write_snapshot(path)
+            path_list.append(path)
+
+        return path_list
@@ -2,8 +2,13 @@ import unittest
 import mock
 import requests
 import re
+import os
+import shutil
+import tempfile
 from textwrap import dedent
-from js_test_tool.coverage import SrcInstrumenter, SrcInstrumenterError, CoverageData
+import signal
+from js_test_tool.coverage import SrcInstrumenter, SrcInstrumenterError, CoverageData, \
+    _new_process_group
 
 
 class SrcInstrumenterTest(unittest.TestCase):
@@ -35,6 +40,16 @@ class SrcInstrumenterTest(unittest.TestCase):
         self.process = mock.Mock()
         self.subprocess.Popen = mock.Mock(return_value=self.process)
         self.process.communicate = mock.Mock()
+        self.process.pid = 12345
+
+        # Do not signal real processes or record them in pidfiles
+        for name in ['js_test_tool.coverage.os.killpg',
+                     'js_test_tool.coverage.write_pidfile']:
+            patcher = mock.patch(name)
+            self.addCleanup(patcher.stop)
+            setattr(self, name.split('.')[-1], patcher.start())
+
+        self.write_pidfile.return_value = None
 
         # Configure the tool to return non-error
         self._configure_tool()
@@ -67,11 +82,67 @@ class SrcInstrumenterTest(unittest.TestCase):
         self._assert_jscover_called(self.TEST_TOOL_PATH,
                                     self.TEST_ROOT_DIR)
 
+        # Expect that the process was recorded for orphan cleanup
+        self.write_pidfile.assert_called_once_with(12345)
+
         # Stop the instrumenter service
+        # Configure the process to exit once it is signalled
+        self.process.poll.return_value = 0
+        self.instrumenter.stop()
+
+        # Expect that the service's process group was terminated and reaped
+        self.killpg.assert_called_once_with(12345, signal.SIGTERM)
+        self.process.wait.assert_called_once_with()
+
+    def test_kill_if_not_stopped(self):
+
+        self.instrumenter.start()
+
+        # Configure the process to ignore SIGTERM
+        old_timeout = SrcInstrumenter.STOP_TIMEOUT
+        SrcInstrumenter.STOP_TIMEOUT = 0.01
+        self.addCleanup(setattr, SrcInstrumenter, 'STOP_TIMEOUT', old_timeout)
+
         self.instrumenter.stop()
 
-        # Expect that the service process was terminated
-        self.process.terminate.assert_called_once_with()
+        self.assertEqual(self.killpg.call_args_list,
+                         [mock.call(12345, signal.SIGTERM),
+                          mock.call(12345, signal.SIGKILL)])
+        self.process.wait.assert_called_once_with()
+
+    def test_jvm_options(self):
+
+        instrumenter = SrcInstrumenter(self.TEST_ROOT_DIR,
+                                       tool_path=self.TEST_TOOL_PATH,
+                                       jvm_options=['-Xmx1g', '-XX:+UseSerialGC'],
+                                       subprocess_module=self.subprocess,
+                                       requests_module=self.requests)
+        instrumenter.start()
+
+        args, _ = self.subprocess.Popen.call_args
+        self.assertEqual(args[0][:5], ['java', '-Xmx1g', '-XX:+UseSerialGC',
+                                       '-jar', self.TEST_TOOL_PATH])
+
+    def test_restart(self):
+
+        self.instrumenter.start()
+        self.assertTrue(self.instrumenter.is_running())
+        self.assertEqual(self.instrumenter.pid(), 12345)
+
+        # Simulate JSCover exiting, then restart it
+        self.process.poll.return_value = 1
+        self.assertFalse(self.instrumenter.is_running())
+
+        self._configure_tool()
+        self.process.poll.side_effect = [0, 0, None, None]
+        self.instrumenter.restart()
+
+        self.assertEqual(len(self.subprocess.Popen.call_args_list), 2)
+        self.assertTrue(self.instrumenter.is_running())
+
+        # Expect that JSCover was restarted on the same port
+        first_call, second_call = self.subprocess.Popen.call_args_list
+        self.assertEqual(first_call[0][0], second_call[0][0])
 
     def test_get_instrumented_src(self):
 
@@ -289,9 +360,11 @@ class SrcInstrumenterTest(unittest.TestCase):
             self.assertEqual(len(args), 1)
             call = args[0]
 
-            # Should send stdout and stderr back to the caller
+            # Should send stdout and stderr back to the caller,
+            # starting JSCover in its own process group
             self.assertEqual(kwargs, {'stdout': None,
-                                      'stderr': self.subprocess.PIPE})
+                                      'stderr': self.subprocess.PIPE,
+                                      'preexec_fn': _new_process_group})
 
             # Should be correct number of args
             self.assertEqual(len(call), 6)
@@ -467,6 +540,35 @@ class CoverageDataTest(unittest.TestCase):
         # Expect that total coverage is 0%
         self.assertEqual(coverage_data.total_coverage(), 0.0)
 
+    @mock.patch.object(CoverageData, 'num_file_lines')
+    def test_summary(self, mock_num_file_lines):
+
+        coverage_data = CoverageData()
+        coverage_data.add_expected_src('/root_dir', 'uncovered.js')
+        coverage_data.load_from_dict('/root_dir', 'base', {
+            'src.js': {'lineData': [None, 1, 0, 1]},
+        })
+        mock_num_file_lines.return_value = 2
+
+        self.assertEqual(coverage_data.summary_dict(), {
+            'total_coverage': 0.4,
+            'lines_covered': 2,
+            'lines_measured': 5,
+            'files': {
+                'base/src.js': {'src_coverage': 2.0 / 3,
+                                'lines_covered': 2, 'lines_measured': 3},
+                'uncovered.js': {'src_coverage': 0.0,
+                                 'lines_covered': 0, 'lines_measured': 2},
+            }
+        })
+
+        # Expect that the expected source was only read once
+        self.assertEqual(coverage_data.total_coverage(), 0.4)
+        self.assertEqual(mock_num_file_lines.call_count, 1)
+
+    def test_line_counts_unknown_src(self):
+        self.assertIs(CoverageData().line_counts_for_src('/unknown.js'), None)
+
     @mock.patch.object(CoverageData, 'num_file_lines')
     def test_covered_and_uncovered_src(self, mock_num_file_lines):
 
@@ -496,3 +598,57 @@ class CoverageDataTest(unittest.TestCase):
         # of the uncovered file.
         expected_coverage = 6.0 / (8.0 + num_lines)
         self.assertEqual(coverage_data.total_coverage(), expected_coverage)
+
+    def test_merge(self):
+
+        # Load overlapping data into two instances
+        coverage_data = CoverageData()
+        coverage_data.load_from_dict('/root_dir', '', self.TEST_COVERAGE_DICT)
+        coverage_data.add_suite_name('suite-1')
+
+        other = CoverageData()
+        other.load_from_dict('/root_dir', '', {'/src1.js': {'lineData': [0, 1, 0, 1]}})
+        other.add_expected_src('/root_dir', 'other.js')
+        other.add_suite_name('suite-2')
+
+        coverage_data.merge(other)
+
+        # Expect that a line is covered if it is covered in either instance
+        self.assertEqual(coverage_data.line_dict_for_src('/root_dir/src1.js'),
+                         {0: True, 1: True, 2: True, 3: True, 5: True})
+        self.assertEqual(coverage_data.src_list(),
+                         ['/root_dir/other.js', '/root_dir/src1.js',
+                          '/root_dir/subdir/src2.js'])
+        self.assertEqual(coverage_data.suite_name_list(), ['suite-1', 'suite-2'])
+
+    def test_snapshot_round_trip(self):
+
+        coverage_data = CoverageData()
+        coverage_data.load_from_dict('/root_dir', 'prepend', self.TEST_COVERAGE_DICT)
+        coverage_data.add_expected_src('/root_dir', 'uncovered.js')
+        coverage_data.add_suite_name('suite-1')
+
+        # Write the snapshot and load it again
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        snapshot_path = os.path.join(temp_dir, 'coverage.snapshot')
+
+        coverage_data.write_snapshot(snapshot_path)
+        loaded = CoverageData.load_snapshot(snapshot_path)
+
+        # Expect that we get the same coverage information back
+        self.assertEqual(loaded.src_list(), coverage_data.src_list())
+        self.assertEqual(loaded.suite_name_list(), ['suite-1'])
+        self.assertEqual(loaded.line_dict_for_src('/root_dir/src1.js'),
+                         {0: True, 2: True, 3: False, 5: True})
+        self.assertEqual(loaded.rel_src_path('/root_dir/src1.js'), 'prepend/src1.js')
+
+        # Expected sources with no information stay that way
+        self.assertEqual(loaded.to_snapshot_dict()['sources']['/root_dir/uncovered.js'],
+                         {'rel_path': 'uncovered.js', 'lines': None})
+
+    def test_invalid_snapshot(self):
+
+        for invalid in [None, [], {'version': 0, 'sources': {}}]:
+            with self.assertRaises(ValueError):
+                CoverageData.from_snapshot_dict(invalid)
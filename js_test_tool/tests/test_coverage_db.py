@@ -0,0 +1,117 @@
+import os
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.coverage import CoverageData
+from js_test_tool.coverage_db import CoverageDatabase, DatabaseCoverageReporter
+
+
+class CoverageDatabaseTest(TempWorkspaceTestCase):
+
+    DB_PATH = 'coverage.db'
+
+    def setUp(self):
+        super(CoverageDatabaseTest, self).setUp()
+        self.database = CoverageDatabase(self.DB_PATH)
+        self.addCleanup(self.database.close)
+
+    def test_record_run(self):
+
+        data = self._coverage_data({'src1.js': [1, 0, None, 1],
+                                    'src2.js': [None, 0]})
+        data.add_suite_name('suite-1')
+        run_id = self.database.record_run(data, browser_names=['chrome'],
+                                          timestamp=100.0)
+
+        # Expect that the totals are stored for the run
+        self.assertEqual(self.database.coverage_trend(), [{
+            'run_id': run_id,
+            'timestamp': 100.0,
+            'total_coverage': 0.5,
+            'lines_covered': 2,
+            'lines_measured': 4,
+        }])
+
+        # Expect that the line data round-trips through the database
+        self.assertEqual(self.database.line_dict_for_run(run_id, 'src1.js'),
+                         {0: True, 1: False, 3: True})
+        self.assertEqual(self.database.line_dict_for_run(run_id, 'src2.js'),
+                         {1: False})
+
+        # Expect that the suites and browsers are recorded
+        self.assertEqual(self.database.suite_names_for_run(run_id), ['suite-1'])
+        self.assertEqual(self.database.browser_names_for_run(run_id), ['chrome'])
+
+    def test_record_many_files(self):
+
+        # Look up the file IDs in several batches
+        self.database.MAX_QUERY_PARAMS = 2
+
+        self.database.record_run(self._coverage_data({'old.js': [0]}), timestamp=1.0)
+
+        coverage_dict = {'src{}.js'.format(num): [1] * num for num in range(1, 6)}
+        run_id = self.database.record_run(self._coverage_data(coverage_dict),
+                                          timestamp=2.0)
+
+        # Expect that each file's coverage is stored with its own path
+        for path, line_list in coverage_dict.items():
+            self.assertEqual(self.database.line_dict_for_run(run_id, path),
+                             {num: True for num in range(len(line_list))})
+
+        self.assertIs(self.database.line_dict_for_run(run_id, 'old.js'), None)
+
+    def test_file_history(self):
+
+        self.database.record_run(self._coverage_data({'src.js': [0, 0]}),
+                                 timestamp=1.0)
+        self.database.record_run(self._coverage_data({'other.js': [1]}),
+                                 timestamp=2.0)
+        self.database.record_run(self._coverage_data({'src.js': [1, 0]}),
+                                 timestamp=3.0)
+
+        history = self.database.file_history('src.js')
+        self.assertEqual([entry['timestamp'] for entry in history], [1.0, 3.0])
+        self.assertEqual([entry['src_coverage'] for entry in history], [0.0, 0.5])
+
+        # Expect that the limit keeps only the most recent runs
+        history = self.database.file_history('src.js', limit=1)
+        self.assertEqual([entry['timestamp'] for entry in history], [3.0])
+
+    def test_coverage_trend_limit(self):
+
+        for timestamp in [1.0, 2.0, 3.0]:
+            self.database.record_run(self._coverage_data({'src.js': [1]}),
+                                     timestamp=timestamp)
+
+        trend = self.database.coverage_trend(limit=2)
+        self.assertEqual([entry['timestamp'] for entry in trend], [2.0, 3.0])
+
+    def test_unknown_run(self):
+        self.assertIs(self.database.line_dict_for_run(1, 'src.js'), None)
+
+    def test_reporter(self):
+
+        # Write two runs using the reporter
+        reporter = DatabaseCoverageReporter('reporter.db', browser_names=['firefox'],
+                                            metadata={'suite_paths': ['suite.yml']})
+        reporter.write_report(self._coverage_data({'src.js': [1, 0]}))
+        reporter.write_report(self._coverage_data({'src.js': [1, 1]}))
+
+        # Expect that both runs are in the database
+        database = CoverageDatabase('reporter.db')
+        self.addCleanup(database.close)
+
+        trend = database.coverage_trend()
+        self.assertEqual([entry['total_coverage'] for entry in trend], [0.5, 1.0])
+        self.assertEqual(database.browser_names_for_run(trend[0]['run_id']), ['firefox'])
+
+    @staticmethod
+    def _coverage_data(coverage_dict):
+        """
+        Create a `CoverageData` instance from `coverage_dict`,
+        which maps source paths to JSCover line data lists.
+        """
+        data = CoverageData()
+        data.load_from_dict(os.getcwd(), '', {
+            src_path: {'lineData': line_data}
+            for src_path, line_data in coverage_dict.items()
+        })
+        return data
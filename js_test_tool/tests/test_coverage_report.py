@@ -1,9 +1,14 @@
 from lxml import etree
 from textwrap import dedent
 import os
+import gzip
+import json
+import mock
 from js_test_tool.tests.helpers import TempWorkspaceTestCase
 from js_test_tool.coverage import CoverageData
-from js_test_tool.coverage_report import HtmlCoverageReporter, XmlCoverageReporter
+from js_test_tool import coverage_report
+from js_test_tool.coverage_report import HtmlCoverageReporter, XmlCoverageReporter, \
+    HtmlDirCoverageReporter, LcovCoverageReporter, SummaryCoverageReporter
 
 
 class BaseCoverageReporterTest(TempWorkspaceTestCase):
@@ -44,7 +49,7 @@ class BaseCoverageReporterTest(TempWorkspaceTestCase):
             with open(src_path, "w") as src_file:
                 src_file.write(self.SRC_CONTENT.encode('utf8'))
 
-    def assert_output_equals(self, coverage_dict, expected_output):
+    def assert_output_equals(self, coverage_dict, expected_output, compressed=False):
         """
         Asserts that the output from the coverage reporter
         is equal to `expected_output`.
@@ -64,6 +69,8 @@ class BaseCoverageReporterTest(TempWorkspaceTestCase):
 
         This assumes that the output is XML-parseable; it will
         parse the XML to ignore whitespace between elements.
+
+        If `compressed` is True, the output file is gunzipped first.
         """
 
         # Munge the dict into the right format
@@ -80,12 +87,18 @@ class BaseCoverageReporterTest(TempWorkspaceTestCase):
         self.reporter.write_report(data)
 
         # Read the data back in from the output file
-        with open(self.OUTPUT_FILE_NAME) as output_file:
+        open_func = gzip.open if compressed else open
+        output_file = open_func(self.OUTPUT_FILE_NAME)
+
+        try:
             output_str = output_file.read()
+        finally:
+            output_file.close()
 
         # Run the reports through the XML parser to normalize format
-        output_str = etree.tostring(etree.fromstring(output_str))
-        expected_output = etree.tostring(etree.fromstring(expected_output))
+        parser = etree.XMLParser(remove_blank_text=True)
+        output_str = etree.tostring(etree.fromstring(output_str, parser))
+        expected_output = etree.tostring(etree.fromstring(expected_output, parser))
 
         # Check that the the output matches what we expect
         self.assertEqual(output_str, expected_output)
@@ -320,6 +333,204 @@ class HtmlCoverageReporterTest(BaseCoverageReporterTest):
         return u"{}\n{}\n{}".format(self.HTML_HEADER, content, self.HTML_FOOTER)
 
 
+class HtmlDirCoverageReporterTest(TempWorkspaceTestCase):
+
+    SRC_CONTENT = u"\u026Eine 1\n<b>line 2</b>\nline 3\n"
+
+    def setUp(self):
+        super(HtmlDirCoverageReporterTest, self).setUp()
+
+        os.mkdir('root_dir')
+        for src_path in ['root_dir/src1.js', 'root_dir/src2.js']:
+            with open(src_path, 'w') as src_file:
+                src_file.write(self.SRC_CONTENT.encode('utf8'))
+
+        self.data = CoverageData()
+        self.data.load_from_dict('root_dir', 'base', {
+            'src1.js': {'lineData': [1, 0, None]},
+            'src2.js': {'lineData': [1, 1]},
+            'missing.js': {'lineData': [0]},
+        })
+
+    def test_single_process(self):
+        HtmlDirCoverageReporter('report', num_processes=1).write_report(self.data)
+        self._assert_report('report')
+
+    def test_process_pool(self):
+        HtmlDirCoverageReporter('report', num_processes=2).write_report(self.data)
+        self._assert_report('report')
+
+    def test_empty_report(self):
+        HtmlDirCoverageReporter('report').write_report(CoverageData())
+
+        index = self._parse('report/index.html')
+        self.assertEqual(index.findtext('.//p'), 'No coverage information was reported.')
+        self.assertEqual(sorted(os.listdir('report')), ['index.html', 'manifest.json'])
+
+    def test_incremental_report(self):
+
+        # Write the full report once
+        HtmlDirCoverageReporter('report', num_processes=1).write_report(self.data)
+
+        # Change the coverage for one source and the text of another
+        self.data.load_from_dict('root_dir', 'base', {'src2.js': {'lineData': [1, 1, 1]}})
+        with open('root_dir/src1.js', 'a') as src_file:
+            src_file.write('line 4\n')
+
+        rendered = self._rendered_pages(self.data)
+        self.assertEqual(rendered, ['base_src1.js.html', 'base_src2.js.html'])
+
+        # Expect that nothing is rendered if nothing changed
+        self.assertEqual(self._rendered_pages(self.data), [])
+
+        # Expect that pages for sources no longer reported are deleted
+        data = CoverageData()
+        data.load_from_dict('root_dir', 'base', {'src1.js': {'lineData': [1]}})
+        rendered = self._rendered_pages(data)
+
+        self.assertEqual(rendered, ['base_src1.js.html'])
+        self.assertEqual(sorted(os.listdir('report')),
+                         ['base_src1.js.html', 'index.html', 'manifest.json'])
+
+    def test_deleted_page_rendered(self):
+
+        HtmlDirCoverageReporter('report', num_processes=1).write_report(self.data)
+        os.remove('report/base_src2.js.html')
+
+        self.assertEqual(self._rendered_pages(self.data), ['base_src2.js.html'])
+
+    def test_invalid_manifest(self):
+
+        HtmlDirCoverageReporter('report', num_processes=1).write_report(self.data)
+        with open('report/manifest.json', 'w') as manifest_file:
+            manifest_file.write('not json')
+
+        self.assertEqual(len(self._rendered_pages(self.data)), 3)
+
+    def test_page_names_unique(self):
+        self.assertEqual(
+            HtmlDirCoverageReporter._page_names(['a/b.js', 'a_b.js', 'index']),
+            ['a_b.js.html', 'a_b.js_1.html', 'index_1.html']
+        )
+
+    def _assert_report(self, output_dir):
+        """
+        Assert that `output_dir` contains the index and source pages
+        for the coverage data created in `setUp()`.
+        """
+        index = self._parse(os.path.join(output_dir, 'index.html'))
+
+        # Expect one row per source file, linking to its page
+        links = [(link.get('href'), link.text) for link in index.iter('a')]
+        self.assertEqual(links, [
+            ('base_missing.js.html', 'base/missing.js'),
+            ('base_src1.js.html', 'base/src1.js'),
+            ('base_src2.js.html', 'base/src2.js'),
+        ])
+        self.assertIn('Total coverage', index.findtext('.//div[@class="summary"]/p/b'))
+        self.assertIn('Generated in', index.findtext('.//p[@class="generated"]'))
+
+        # Expect the source page to show each line, escaped
+        page = self._parse(os.path.join(output_dir, 'base_src1.js.html'))
+        rows = [[(cell.get('class'), cell.findtext('pre')) for cell in row.findall('td')][1]
+                for row in page.iter('tr')]
+        self.assertEqual(rows, [
+            ('covered', u'\u026Eine 1'),
+            ('uncovered', u'<b>line 2</b>'),
+            (None, u'line 3'),
+        ])
+
+        # Expect a missing source to be reported as such
+        page = self._parse(os.path.join(output_dir, 'base_missing.js.html'))
+        self.assertIn('Source file not found', page.findtext('.//div[@class="src_display"]'))
+
+    @staticmethod
+    def _rendered_pages(coverage_data):
+        """
+        Write the report for `coverage_data` to the "report" directory
+        and return the sorted list of source pages that were rendered.
+        """
+        with mock.patch.object(coverage_report, '_write_src_page',
+                               wraps=coverage_report._write_src_page) as write_page:
+            HtmlDirCoverageReporter('report', num_processes=1).write_report(coverage_data)
+
+        return sorted(call[0][0][1]['page_name'] for call in write_page.call_args_list)
+
+    @staticmethod
+    def _parse(path):
+        """
+        Parse the HTML page at `path` and return the root element.
+        """
+        with open(path) as page_file:
+            return etree.fromstring(page_file.read(), etree.HTMLParser(encoding='utf-8'))
+
+
+class LcovCoverageReporterTest(TempWorkspaceTestCase):
+
+    def test_empty_report(self):
+        self.assertEqual(self._write_report({}), "")
+
+    def test_multiple_src_files(self):
+        report = self._write_report({'src1.js': [None, 1, 1, 0, None, 1],
+                                     'src2.js': [None, 0]})
+
+        self.assertEqual(report, dedent("""
+            TN:
+            SF:src1.js
+            DA:1,1
+            DA:2,1
+            DA:3,0
+            DA:5,1
+            LF:4
+            LH:3
+            end_of_record
+            TN:
+            SF:src2.js
+            DA:1,0
+            LF:1
+            LH:0
+            end_of_record
+        """).lstrip())
+
+    @staticmethod
+    def _write_report(coverage_dict):
+        """
+        Write an LCOV report for `coverage_dict` (source paths mapped
+        to JSCover line data) and return its contents.
+        """
+        data = CoverageData()
+        data.load_from_dict('root_dir', '', {
+            src_path: {'lineData': line_data}
+            for src_path, line_data in coverage_dict.items()
+        })
+
+        LcovCoverageReporter('coverage.lcov').write_report(data)
+
+        with open('coverage.lcov') as output_file:
+            return output_file.read()
+
+
+class SummaryCoverageReporterTest(TempWorkspaceTestCase):
+
+    @mock.patch.object(CoverageData, 'num_file_lines')
+    def test_summary(self, mock_num_file_lines):
+        data = CoverageData()
+        data.load_from_dict('root_dir', '', {'src1.js': {'lineData': [1, 0]}})
+
+        SummaryCoverageReporter('summary.json').write_report(data)
+
+        with open('summary.json') as summary_file:
+            summary = json.load(summary_file)
+
+        self.assertEqual(summary['total_coverage'], 0.5)
+        self.assertEqual(summary['files'], {
+            'src1.js': {'src_coverage': 0.5, 'lines_covered': 1, 'lines_measured': 2}
+        })
+
+        # Expect that no source files were read
+        self.assertEqual(mock_num_file_lines.call_count, 0)
+
+
 class XmlCoverageReporterTest(BaseCoverageReporterTest):
 
     REPORTER_CLASS = XmlCoverageReporter
@@ -329,7 +540,7 @@ class XmlCoverageReporterTest(BaseCoverageReporterTest):
 
         coverage = {}
         expected = dedent("""
-            <?xml version="1.0" ?>
+            <?xml version='1.0' encoding='utf-8'?>
             <!DOCTYPE coverage
               SYSTEM 'http://cobertura.sourceforge.net/xml/coverage-03.dtd'>
             <coverage branch-rate="0" line-rate="0" timestamp="" version="">
@@ -343,7 +554,7 @@ class XmlCoverageReporterTest(BaseCoverageReporterTest):
 
         coverage = {'src1.js': [None, 1, 1, 0, None, 1]}
         expected = dedent("""
-            <?xml version="1.0" ?>
+            <?xml version='1.0' encoding='utf-8'?>
             <!DOCTYPE coverage
               SYSTEM 'http://cobertura.sourceforge.net/xml/coverage-03.dtd'>
             <coverage branch-rate="0" line-rate="0.75" timestamp="" version="">
@@ -372,7 +583,7 @@ class XmlCoverageReporterTest(BaseCoverageReporterTest):
     def test_multiple_src_files(self):
         coverage = {'src1.js': [None, 1, 1, 0, None, 1], 'src2.js': [1, 1]}
         expected = dedent("""
-            <?xml version="1.0" ?>
+            <?xml version='1.0' encoding='utf-8'?>
             <!DOCTYPE coverage
               SYSTEM 'http://cobertura.sourceforge.net/xml/coverage-03.dtd'>
             <coverage branch-rate="0" line-rate="0.8333" timestamp="" version="">
@@ -410,7 +621,7 @@ class XmlCoverageReporterTest(BaseCoverageReporterTest):
     def test_full_coverage(self):
         coverage = {'src1.js': [1, 1], 'src2.js': [1, 1]}
         expected = dedent("""
-            <?xml version="1.0" ?>
+            <?xml version='1.0' encoding='utf-8'?>
             <!DOCTYPE coverage
               SYSTEM 'http://cobertura.sourceforge.net/xml/coverage-03.dtd'>
             <coverage branch-rate="0" line-rate="1.0" timestamp="" version="">
@@ -446,7 +657,7 @@ class XmlCoverageReporterTest(BaseCoverageReporterTest):
     def test_no_coverage(self):
         coverage = {'src1.js': [0, 0], 'src2.js': [0, 0]}
         expected = dedent("""
-            <?xml version="1.0" ?>
+            <?xml version='1.0' encoding='utf-8'?>
             <!DOCTYPE coverage
               SYSTEM 'http://cobertura.sourceforge.net/xml/coverage-03.dtd'>
             <coverage branch-rate="0" line-rate="0.0" timestamp="" version="">
@@ -478,3 +689,46 @@ class XmlCoverageReporterTest(BaseCoverageReporterTest):
         """).strip()
 
         self.assert_output_equals(coverage, expected)
+
+    def test_gzip_report(self):
+
+        # Expect that the report is compressed because of the file extension
+        self.OUTPUT_FILE_NAME = 'coverage.xml.gz'
+        self.reporter = XmlCoverageReporter(self.OUTPUT_FILE_NAME)
+
+        coverage = {'src1.js': [1, 0]}
+        expected = dedent("""
+            <?xml version='1.0' encoding='utf-8'?>
+            <!DOCTYPE coverage
+              SYSTEM 'http://cobertura.sourceforge.net/xml/coverage-03.dtd'>
+            <coverage branch-rate="0" line-rate="0.5" timestamp="" version="">
+                <packages>
+                    <package branch-rate="0" complexity="0" line-rate="0.5" name="javascript">
+                        <classes>
+                            <class branch-rate="0" complexity="0"
+                                   filename="src1.js" line-rate="0.5"
+                                   name="src1.js">
+                                <methods />
+                                <lines>
+                                    <line hits="1" number="0" />
+                                    <line hits="0" number="1" />
+                                </lines>
+                            </class>
+                        </classes>
+                    </package>
+                </packages>
+            </coverage>
+        """).strip()
+
+        self.assert_output_equals(coverage, expected, compressed=True)
+
+    def test_sorted_by_rel_path(self):
+
+        # Expect that classes are written in order of their reported path
+        data = CoverageData()
+        data.load_from_dict('root_dir', 'b', {'src1.js': {'lineData': [1]}})
+        data.load_from_dict('root_dir', 'a', {'src2.js': {'lineData': [1]}})
+
+        root = etree.fromstring(self.reporter.generate_report(data).encode('utf8'))
+        self.assertEqual([elem.get('filename') for elem in root.iter('class')],
+                         ['a/src2.js', 'b/src1.js'])
@@ -0,0 +1,36 @@
+from unittest import TestCase
+from js_test_tool.coverage import CoverageData
+from js_test_tool.tool import check_coverage_thresholds
+
+
+class CoverageThresholdTest(TestCase):
+
+    def setUp(self):
+        self.data = CoverageData()
+        self.data.load_from_dict('/root_dir', '', {
+            'src1.js': {'lineData': [1, 1, 1, 0]},
+            'src2.js': {'lineData': [1, 0]},
+            'empty.js': {'lineData': [None]},
+        })
+
+    def test_no_thresholds(self):
+        self.assertTrue(check_coverage_thresholds(None, {}))
+
+    def test_total_threshold(self):
+        self.assertTrue(self._check(coverage_fail_under=66.0))
+        self.assertFalse(self._check(coverage_fail_under=67.0))
+
+    def test_file_threshold(self):
+        self.assertTrue(self._check(coverage_file_fail_under=50.0))
+        self.assertFalse(self._check(coverage_file_fail_under=60.0))
+
+    def test_no_coverage_data(self):
+
+        # Expect that the check fails if coverage could not be collected
+        self.assertFalse(check_coverage_thresholds(None, {'coverage_fail_under': 0.0}))
+
+    def _check(self, **args_dict):
+        """
+        Check the coverage data against the thresholds in `args_dict`.
+        """
+        return check_coverage_thresholds(self.data, args_dict)
@@ -0,0 +1,182 @@
+import os
+import socket
+import threading
+import logging
+import mock
+from StringIO import StringIO
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.daemon import SuiteDaemon, DaemonError, run_with_daemon
+from js_test_tool.suite import SuiteDescription
+from js_test_tool.suite_server import SuitePageServer
+from js_test_tool.browser import Browser
+from js_test_tool.runner import SuiteRunnerFactory
+
+
+class SuiteDaemonTest(TempWorkspaceTestCase):
+
+    def setUp(self):
+        super(SuiteDaemonTest, self).setUp()
+        self.socket_path = os.path.join(self.temp_dir, 'daemon.sock')
+
+        self.run_func = mock.MagicMock(return_value=True)
+        self.mock_desc_class = mock.MagicMock(side_effect=lambda *args: mock.MagicMock(SuiteDescription))
+        self.mock_server_class = mock.MagicMock(side_effect=lambda *args, **kwargs: mock.MagicMock(SuitePageServer))
+        self.mock_browser_class = mock.MagicMock(side_effect=lambda *args, **kwargs: mock.MagicMock(Browser))
+
+        self.daemon = SuiteDaemon(
+            self.run_func, socket_path=self.socket_path,
+            desc_class=self.mock_desc_class,
+            server_class=self.mock_server_class,
+            browser_class=self.mock_browser_class
+        )
+        self.addCleanup(self.daemon.stop)
+
+    def test_run(self):
+
+        def _run(args_dict, factory=None, stream=None, keep_alive=False):
+            stream.write('Test results\n')
+            logging.getLogger('js_test_tool.test').warning('Something went wrong')
+            return True
+
+        self.run_func.side_effect = _run
+
+        args_dict = {'command': 'run', 'test_suite_paths': ['suite.yml'],
+                     'browser_names': ['chrome'], 'coverage_xml': 'coverage.xml'}
+        output = StringIO()
+        self.assertTrue(self._run_with_daemon(args_dict, output))
+
+        # Expect that the output and log messages were sent to the client
+        self.assertIn('Test results\n', output.getvalue())
+        self.assertIn('WARNING: Something went wrong', output.getvalue())
+
+        # Expect that paths were made absolute, since
+        # the daemon may run in a different directory
+        (run_args,), kwargs = self.run_func.call_args
+        self.assertEqual(run_args['test_suite_paths'],
+                         [os.path.join(self.temp_dir, 'suite.yml')])
+        self.assertEqual(run_args['coverage_xml'],
+                         os.path.join(self.temp_dir, 'coverage.xml'))
+        self.assertEqual(run_args['browser_names'], ['chrome'])
+
+        # Expect that the servers and browsers are kept running
+        self.assertTrue(kwargs['keep_alive'])
+        self.assertTrue(isinstance(kwargs['factory'], SuiteRunnerFactory))
+
+    def test_run_fails(self):
+        self.run_func.return_value = False
+        self.assertFalse(self._run_with_daemon({'test_suite_paths': ['suite.yml']}))
+
+    def test_run_raises(self):
+        browser = self.daemon.browser('chrome')
+        self.run_func.side_effect = ValueError('Bad suite')
+
+        output = StringIO()
+        self.assertFalse(self._run_with_daemon({'test_suite_paths': ['suite.yml']}, output))
+        self.assertIn('Bad suite', output.getvalue())
+
+        # Expect that the browsers are started again for the next run
+        browser.quit.assert_called_once_with()
+        self.assertIsNot(self.daemon.browser('chrome'), browser)
+
+    def test_no_daemon(self):
+        with self.assertRaises(DaemonError):
+            run_with_daemon({'test_suite_paths': []},
+                            socket_path=os.path.join(self.temp_dir, 'missing.sock'))
+
+    def test_daemon_already_running(self):
+        with self.assertRaises(DaemonError):
+            SuiteDaemon(self.run_func, socket_path=self.socket_path)
+
+    def test_stale_socket(self):
+
+        # Leave a socket behind with nothing listening on it
+        stale_path = os.path.join(self.temp_dir, 'stale.sock')
+        stale_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale_socket.bind(stale_path)
+        stale_socket.close()
+
+        daemon = SuiteDaemon(self.run_func, socket_path=stale_path)
+        daemon.stop()
+        self.assertFalse(os.path.exists(stale_path))
+
+    def test_reuse_description(self):
+        desc = self.daemon.description(StringIO('suite contents'), '/root')
+
+        self.assertIs(self.daemon.description(StringIO('suite contents'), '/root'), desc)
+        self.assertIsNot(self.daemon.description(StringIO('changed contents'), '/root'), desc)
+        self.assertIsNot(self.daemon.description(StringIO('suite contents'), '/other'), desc)
+        self.assertEqual(self.mock_desc_class.call_count, 3)
+
+    def test_reuse_page_server(self):
+        desc_list = [mock.MagicMock(SuiteDescription)]
+        server = self.daemon.page_server(desc_list, mock.sentinel.renderer,
+                                         jscover_path='jscover.jar')
+
+        # Expect that the server is started once, then reused
+        self.assertIs(self.daemon.page_server(desc_list, mock.sentinel.renderer,
+                                              jscover_path='jscover.jar'), server)
+        server.start.assert_called_once_with()
+
+        # A different configuration needs a different server
+        self.assertIsNot(self.daemon.page_server(desc_list, mock.sentinel.renderer), server)
+
+    def test_stop_least_recently_used_server(self):
+        desc_lists = [[mock.MagicMock(SuiteDescription)]
+                      for _ in range(SuiteDaemon.MAX_SERVERS + 1)]
+
+        servers = [self.daemon.page_server(desc_list, mock.sentinel.renderer)
+                   for desc_list in desc_lists]
+
+        servers[0].stop.assert_called_once_with()
+        for server in servers[1:]:
+            self.assertFalse(server.stop.called)
+
+    def test_reuse_browser(self):
+        browser = self.daemon.browser('chrome', timeout_sec=5)
+
+        self.assertIs(self.daemon.browser('chrome', timeout_sec=5), browser)
+        self.assertIsNot(self.daemon.browser('chrome', timeout_sec=10), browser)
+        self.assertIsNot(self.daemon.browser('chrome', timeout_sec=5, native_coverage=True), browser)
+        self.assertIsNot(self.daemon.browser('chrome', timeout_sec=5, max_tabs=4), browser)
+
+    def test_distinct_browsers_per_run(self):
+        used_browsers = set()
+        browser = self.daemon.browser('chrome', exclude=used_browsers)
+
+        # Expect that a run asking for two browsers with
+        # the same configuration gets two browsers
+        other_browser = self.daemon.browser('chrome', exclude=used_browsers)
+        self.assertIsNot(other_browser, browser)
+        self.assertEqual(used_browsers, set([browser, other_browser]))
+
+        # Expect that both are reused by the next run
+        next_used = set()
+        self.assertEqual(set([self.daemon.browser('chrome', exclude=next_used),
+                              self.daemon.browser('chrome', exclude=next_used)]),
+                         set([browser, other_browser]))
+        self.assertEqual(self.mock_browser_class.call_count, 2)
+
+    def test_stop(self):
+        server = self.daemon.page_server([mock.MagicMock(SuiteDescription)], mock.sentinel.renderer)
+        browser = self.daemon.browser('firefox')
+
+        self.daemon.stop()
+
+        server.stop.assert_called_once_with()
+        browser.quit.assert_called_once_with()
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def _run_with_daemon(self, args_dict, output=None):
+        """
+        Submit `args_dict` to the daemon, handling the request
+        in another thread.  Returns the result of `run_with_daemon()`.
+        """
+        thread = threading.Thread(target=self.daemon.handle_request)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            return run_with_daemon(args_dict, socket_path=self.socket_path,
+                                   output_stream=output or StringIO())
+        finally:
+            thread.join()
@@ -0,0 +1,165 @@
+from unittest import TestCase
+from textwrap import dedent
+import mock
+import subprocess
+from js_test_tool.coverage import CoverageData
+from js_test_tool.diff_coverage import ChangedLines, DiffCoverageError, \
+    diff_coverage, format_diff_coverage, git_diff
+
+
+class ChangedLinesTest(TestCase):
+
+    DIFF = dedent("""
+        diff --git a/src/adder.js b/src/adder.js
+        index 1111111..2222222 100644
+        --- a/src/adder.js
+        +++ b/src/adder.js
+        @@ -1,4 +1,5 @@
+         var a = 1;
+        -var b = 2;
+        +var b = 3;
+        +var c = 4;
+         var d = 5;
+         var e = 6;
+        @@ -10 +11,0 @@
+        -removed();
+        @@ -20,0 +21,2 @@
+        +added();
+        +added();
+        diff --git a/src/deleted.js b/src/deleted.js
+        --- a/src/deleted.js
+        +++ /dev/null
+        @@ -1 +0,0 @@
+        -gone();
+        diff --git a/src/new.js b/src/new.js
+        --- /dev/null
+        +++ b/src/new.js
+        @@ -0,0 +1 @@
+        +created();
+    """).lstrip()
+
+    def test_parse_unified_diff(self):
+        changed = ChangedLines.from_unified_diff(self.DIFF)
+
+        self.assertEqual(changed.path_list(), ['src/adder.js', 'src/new.js'])
+        self.assertEqual(changed.range_list('src/adder.js'), [(2, 3), (21, 22)])
+        self.assertEqual(changed.range_list('src/new.js'), [(1, 1)])
+
+    def test_is_changed(self):
+        changed = ChangedLines.from_unified_diff(self.DIFF)
+
+        self.assertEqual(
+            [num for num in range(25) if changed.is_changed('src/adder.js', num)],
+            [2, 3, 21, 22]
+        )
+        self.assertFalse(changed.is_changed('src/other.js', 1))
+
+    def test_added_lines_like_headers(self):
+        diff_text = dedent("""
+            --- a/src/counter.js
+            +++ b/src/counter.js
+            @@ -1,0 +2,3 @@
+            +var i = 0;
+            +++ i;
+            +foo();
+            @@ -5 +8 @@
+            --- i;
+            +++ j;
+        """).lstrip()
+
+        # Expect that added lines starting with "++" are not read as headers
+        changed = ChangedLines.from_unified_diff(diff_text)
+        self.assertEqual(changed.path_list(), ['src/counter.js'])
+        self.assertEqual(changed.range_list('src/counter.js'), [(2, 4), (8, 8)])
+
+    def test_invalid_hunk(self):
+        with self.assertRaises(DiffCoverageError):
+            ChangedLines.from_unified_diff("+++ b/src.js\n@@ invalid @@\n")
+
+
+class DiffCoverageTest(TestCase):
+
+    def setUp(self):
+        self.data = CoverageData()
+        self.data.load_from_dict('/repo', '', {
+            'src/adder.js': {'lineData': [None, 1, 0, 1, None, 0]},
+            'src/other.js': {'lineData': [None, 0]},
+        })
+
+    def test_diff_coverage(self):
+        changed = ChangedLines()
+        for line_num in [1, 2, 4, 5, 6]:
+            changed.add_line('src/adder.js', line_num)
+        changed.add_line('src/unknown.js', 1)
+
+        report = diff_coverage(self.data, changed, '/repo')
+
+        self.assertEqual(report['lines_covered'], 1)
+        self.assertEqual(report['lines_measured'], 3)
+        self.assertAlmostEqual(report['diff_coverage'], 1.0 / 3)
+        self.assertEqual(report['files'], [{
+            'path': 'src/adder.js',
+            'covered_lines': [1],
+            'uncovered_lines': [2, 5],
+        }])
+
+        self.assertEqual(format_diff_coverage(report), dedent(u"""
+            Diff coverage: 33.3% (1 of 3 changed lines covered)
+            src/adder.js: 33.3% (missing lines 2, 5)
+        """).strip())
+
+    def test_match_other_checkout(self):
+
+        # Expect that the diff path matches the end of the
+        # source path if the snapshot was written elsewhere
+        changed = ChangedLines()
+        changed.add_line('src/other.js', 1)
+
+        report = diff_coverage(self.data, changed, '/other/checkout')
+        self.assertEqual(report['files'], [{
+            'path': 'src/other.js', 'covered_lines': [], 'uncovered_lines': [1]
+        }])
+
+    def test_no_measured_lines(self):
+        report = diff_coverage(self.data, ChangedLines(), '/repo')
+
+        self.assertIs(report['diff_coverage'], None)
+        self.assertEqual(format_diff_coverage(report),
+                         u"Diff coverage: no changed lines with coverage information.")
+
+
+class GitDiffTest(TestCase):
+
+    def test_git_diff(self):
+        mock_subprocess = self._mock_subprocess([('/repo\n', '', 0), ('DIFF', '', 0)])
+
+        self.assertEqual(git_diff('master...HEAD', subprocess_module=mock_subprocess),
+                         ('DIFF', '/repo'))
+
+        diff_call = mock_subprocess.Popen.call_args_list[1]
+        self.assertEqual(diff_call[0][0][-1], 'master...HEAD')
+
+    def test_git_failure(self):
+        mock_subprocess = self._mock_subprocess([('', 'not a git repository', 128)])
+
+        with self.assertRaises(DiffCoverageError):
+            git_diff('HEAD', subprocess_module=mock_subprocess)
+
+    @staticmethod
+    def _mock_subprocess(result_list):
+        """
+        Return a mock `subprocess` module whose processes return
+        each `(stdout, stderr, returncode)` tuple in `result_list`.
+        """
+        mock_subprocess = mock.MagicMock(subprocess)
+        mock_subprocess.PIPE = subprocess.PIPE
+
+        process_list = []
+        for stdout, stderr, returncode in result_list:
+            process = mock.MagicMock()
+            process.communicate.return_value = (stdout, stderr)
+            process.returncode = returncode
+            process_list.append(process)
+
+        mock_subprocess.Popen.side_effect = process_list
+        return mock_subprocess
@@ -0,0 +1,70 @@
+import os
+import json
+import mock
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.suite import SuiteDescription
+from js_test_tool.fixtures import FixtureCache, fixture_bundle, fixture_bundle_url
+
+
+class FixtureBundleTest(TempWorkspaceTestCase):
+
+    def setUp(self):
+        super(FixtureBundleTest, self).setUp()
+
+        os.makedirs('fixtures')
+        self._write('fixtures/text.html', u'<p>\u0236ext</p>'.encode('utf-8'))
+        self._write('fixtures/image.png', '\x89PNG\xff\xfe')
+
+        self.desc = mock.MagicMock(SuiteDescription)
+        self.desc.root_dir.return_value = self.temp_dir
+        self.desc.fixture_paths.return_value = ['fixtures/text.html', 'fixtures/image.png']
+        self.desc.preload_fixtures.return_value = True
+
+        self.cache = FixtureCache({'test-suite': self.desc})
+
+    def test_fixture_bundle(self):
+        bundle = fixture_bundle(self.temp_dir, ['fixtures/text.html',
+                                                'fixtures/image.png',
+                                                'fixtures/missing.html'])
+
+        # Expect that only text fixtures that exist are bundled
+        self.assertEqual(json.loads(bundle), {'fixtures/text.html': u'<p>\u0236ext</p>'})
+
+    def test_fixture_bundle_url(self):
+        self.assertEqual(fixture_bundle_url('test-suite'), '/suite/test-suite/fixtures.json')
+
+    def test_cache_bundle(self):
+        bundle = self.cache.bundle('test-suite')
+        self.assertEqual(json.loads(bundle), {'fixtures/text.html': u'<p>\u0236ext</p>'})
+
+        # Expect that the bundle is built only once
+        with mock.patch('js_test_tool.fixtures.fixture_bundle') as bundle_func:
+            self.assertIs(self.cache.bundle('test-suite'), bundle)
+            self.assertFalse(bundle_func.called)
+
+    def test_rebuild_changed_bundle(self):
+        self.cache.bundle('test-suite')
+
+        # Expect that the bundle is rebuilt when a fixture changes
+        self._write('fixtures/text.html', 'changed fixture')
+        self.assertEqual(json.loads(self.cache.bundle('test-suite')),
+                         {'fixtures/text.html': 'changed fixture'})
+
+        # ... or when fixtures are added
+        self._write('fixtures/new.html', 'new fixture')
+        self.desc.fixture_paths.return_value.append('fixtures/new.html')
+        self.assertIn('fixtures/new.html', json.loads(self.cache.bundle('test-suite')))
+
+    def test_no_bundle(self):
+        self.assertIs(self.cache.bundle('other-suite'), None)
+
+        self.desc.preload_fixtures.return_value = False
+        self.assertIs(self.cache.bundle('test-suite'), None)
+
+    @staticmethod
+    def _write(rel_path, contents):
+        """
+        Write `contents` (a byte string) to the file at `rel_path`.
+        """
+        with open(rel_path, 'wb') as fixture_file:
+            fixture_file.write(contents)
@@ -0,0 +1,172 @@
+import os
+import signal
+import socket
+import mock
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.coverage import SrcInstrumenter
+from js_test_tool.jscover_supervisor import InstrumenterSupervisor, \
+    write_pidfile, remove_pidfile, reap_orphans
+
+
+class PidfileTest(TempWorkspaceTestCase):
+
+    JSCOVER_PID = 4242
+    DEAD_OWNER_PID = 4343
+
+    def setUp(self):
+        super(PidfileTest, self).setUp()
+        self.pidfile_dir = os.path.join(self.temp_dir, 'pids')
+
+        # Pretend that the JSCover process is running
+        # and that its owner has died
+        patcher = mock.patch('js_test_tool.jscover_supervisor._is_running')
+        self.is_running = patcher.start()
+        self.is_running.side_effect = lambda pid: pid != self.DEAD_OWNER_PID
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch('js_test_tool.jscover_supervisor._is_jscover')
+        self.is_jscover = patcher.start()
+        self.is_jscover.return_value = True
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch('js_test_tool.jscover_supervisor.os.killpg')
+        self.killpg = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_write_and_remove_pidfile(self):
+        path = write_pidfile(self.JSCOVER_PID, pidfile_dir=self.pidfile_dir)
+
+        # Expect that the pidfile records the owner
+        self.assertEqual(path, os.path.join(self.pidfile_dir, '4242.pid'))
+        with open(path) as pidfile:
+            self.assertEqual(int(pidfile.read()), os.getpid())
+
+        remove_pidfile(path)
+        self.assertFalse(os.path.exists(path))
+
+        # Removing a missing pidfile is not an error
+        remove_pidfile(path)
+        remove_pidfile(None)
+
+    def test_reap_orphan(self):
+        path = self._write_pidfile(self.JSCOVER_PID, self.DEAD_OWNER_PID)
+
+        killed = reap_orphans(pidfile_dir=self.pidfile_dir)
+
+        # Expect that the JSCover process group was killed
+        self.assertEqual(killed, [self.JSCOVER_PID])
+        self.killpg.assert_called_once_with(self.JSCOVER_PID, signal.SIGKILL)
+        self.assertFalse(os.path.exists(path))
+
+    def test_ignore_live_owner(self):
+        path = write_pidfile(self.JSCOVER_PID, pidfile_dir=self.pidfile_dir)
+
+        # Our own process is still running, so leave JSCover alone
+        self.assertEqual(reap_orphans(pidfile_dir=self.pidfile_dir), [])
+        self.assertFalse(self.killpg.called)
+        self.assertTrue(os.path.exists(path))
+
+    def test_ignore_reused_pid(self):
+        path = self._write_pidfile(self.JSCOVER_PID, self.DEAD_OWNER_PID)
+
+        # The pid now belongs to some other program
+        self.is_jscover.return_value = False
+
+        self.assertEqual(reap_orphans(pidfile_dir=self.pidfile_dir), [])
+        self.assertFalse(self.killpg.called)
+
+        # The stale pidfile is removed
+        self.assertFalse(os.path.exists(path))
+
+    def test_missing_pidfile_dir(self):
+        self.assertEqual(reap_orphans(pidfile_dir=self.pidfile_dir), [])
+
+    def _write_pidfile(self, pid, owner_pid):
+        """
+        Write a pidfile recording that `owner_pid` owns `pid`.
+        Returns the path to the pidfile.
+        """
+        os.makedirs(self.pidfile_dir)
+        path = os.path.join(self.pidfile_dir, '{}.pid'.format(pid))
+
+        with open(path, 'w') as pidfile:
+            pidfile.write('{}\n'.format(owner_pid))
+
+        return path
+
+
+class InstrumenterSupervisorTest(TempWorkspaceTestCase):
+
+    def setUp(self):
+        super(InstrumenterSupervisorTest, self).setUp()
+        self.supervisor = InstrumenterSupervisor()
+
+        # Start a server for the instrumenter to accept connections
+        self.listen_socket = socket.socket()
+        self.listen_socket.bind(('127.0.0.1', 0))
+        self.listen_socket.listen(1)
+        self.addCleanup(self.listen_socket.close)
+
+        self.instr = mock.MagicMock(SrcInstrumenter)
+        self.instr.is_running.return_value = True
+        self.instr.port.return_value = self.listen_socket.getsockname()[1]
+        self.instr.rss_bytes.return_value = 2 * 1024 * 1024
+        self.supervisor.add('test-suite', self.instr)
+
+    def test_healthy_instrumenter(self):
+        self.supervisor.check()
+
+        self.assertFalse(self.instr.restart.called)
+        self.assertEqual(self.supervisor.report(), {
+            'test-suite': {'rss_bytes': 2097152, 'peak_rss_bytes': 2097152, 'restarts': 0}
+        })
+
+    def test_restart_exited_instrumenter(self):
+        self.instr.is_running.return_value = False
+
+        self.supervisor.check()
+
+        self.instr.restart.assert_called_once_with()
+        self.assertEqual(self.supervisor.report()['test-suite']['restarts'], 1)
+
+    def test_restart_unresponsive_instrumenter(self):
+
+        # Nothing is listening on the instrumenter's port
+        self.listen_socket.close()
+
+        self.supervisor.check()
+        self.instr.restart.assert_called_once_with()
+
+    def test_restart_fails(self):
+        self.instr.is_running.return_value = False
+        self.instr.restart.side_effect = OSError('No java')
+
+        # Expect that the error is logged, not raised
+        self.supervisor.check()
+        self.assertEqual(self.supervisor.report()['test-suite']['restarts'], 0)
+
+    def test_peak_memory(self):
+        self.supervisor.check()
+
+        self.instr.rss_bytes.return_value = 1024 * 1024
+        self.supervisor.check()
+
+        stats = self.supervisor.report()['test-suite']
+        self.assertEqual(stats['rss_bytes'], 1024 * 1024)
+        self.assertEqual(stats['peak_rss_bytes'], 2 * 1024 * 1024)
+
+    def test_format_report(self):
+        self.supervisor.add('other-suite', mock.MagicMock(SrcInstrumenter))
+
+        # Memory use is not known until we check it
+        self.assertEqual(self.supervisor.format_report(), [
+            "JSCover for 'other-suite': peak RSS unknown, 0 restart(s)",
+            "JSCover for 'test-suite': peak RSS unknown, 0 restart(s)",
+        ])
+
+    def test_stop_records_memory(self):
+        self.supervisor.start()
+        self.supervisor.stop()
+
+        self.assertEqual(self.supervisor.format_report(),
+                         ["JSCover for 'test-suite': peak RSS 2.0 MB, 0 restart(s)"])
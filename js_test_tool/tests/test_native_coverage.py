@@ -0,0 +1,142 @@
+import os
+import mock
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.suite import SuiteDescription
+from js_test_tool.native_coverage import NativeCoverageCollector, line_data_from_ranges
+
+
+class LineDataFromRangesTest(TempWorkspaceTestCase):
+
+    SRC = '\n'.join([
+        '// Adder',
+        'function add(x, y) {',
+        '    if (x < 0) {',
+        '        return 0;',
+        '    }',
+        '    return x + y;',
+        '}',
+        '',
+        'add(1, 2);',
+    ]) + '\n'
+
+    def setUp(self):
+        super(LineDataFromRangesTest, self).setUp()
+
+        with open('src.js', 'w') as src_file:
+            src_file.write(self.SRC)
+
+    def test_line_data(self):
+
+        # The script ran once and called `add()` once,
+        # but the branch inside the `if` never executed.
+        function_list = [
+            {'ranges': [self._range('// Adder', None, 1)]},
+            {'ranges': [self._range('function add', '\n}', 1),
+                        self._range('{\n        return', '    }', 0)]},
+        ]
+
+        line_data = line_data_from_ranges('src.js', function_list)
+
+        self.assertEqual(line_data, [None, None, 1, 1, 0, None, 1, None, None, 1])
+
+    def test_uncalled_function(self):
+
+        function_list = [
+            {'ranges': [self._range('// Adder', None, 1)]},
+            {'ranges': [self._range('function add', '\n}', 0)]},
+        ]
+
+        line_data = line_data_from_ranges('src.js', function_list)
+
+        # The declaration line is inside the function's range
+        self.assertEqual(line_data, [None, None, 0, 0, 0, None, 0, None, None, 1])
+
+    def test_comments(self):
+        src = '\n'.join([
+            '/* Multiplier',
+            '   of x and y',
+            ' */',
+            '/* c */ var z = x',
+            '    * factor;',
+            'var s = "/* not a comment";',
+            'var t = 1; /* trailing',
+            'comment */',
+            'var u = "//"; // done',
+            '/* unclosed',
+            'var v = 2;',
+        ]) + '\n'
+
+        with open('comments.js', 'w') as src_file:
+            src_file.write(src)
+
+        line_data = line_data_from_ranges(
+            'comments.js', [{'ranges': [{'startOffset': 0, 'endOffset': len(src), 'count': 1}]}]
+        )
+
+        # Expect that only lines with code outside comments are executable
+        self.assertEqual(line_data, [None, None, None, None, 1, 1, 1, 1, None, 1, None, None])
+
+    def test_missing_file(self):
+        self.assertIs(line_data_from_ranges('not_found.js', []), None)
+
+    def _range(self, start_text, end_text, count):
+        """
+        Return a precise coverage range dict starting at `start_text`
+        and ending after `end_text` (or at the end of the source).
+        """
+        start = self.SRC.index(start_text)
+
+        if end_text is None:
+            end = len(self.SRC)
+        else:
+            end = self.SRC.index(end_text, start) + len(end_text)
+
+        return {'startOffset': start, 'endOffset': end, 'count': count}
+
+
+class NativeCoverageCollectorTest(TempWorkspaceTestCase):
+
+    def setUp(self):
+        super(NativeCoverageCollectorTest, self).setUp()
+
+        for path in ['src.js', 'vendor.js']:
+            with open(path, 'w') as src_file:
+                src_file.write('var x = 1;\nvar y = 2;\n')
+
+        self.desc = mock.MagicMock(SuiteDescription)
+        self.desc.suite_name.return_value = 'test-suite'
+        self.desc.root_dir.return_value = os.getcwd()
+        self.desc.prepend_path.return_value = ''
+        self.desc.src_paths.return_value = ['src.js', 'vendor.js']
+        self.desc.should_instrument.side_effect = lambda path: path != 'vendor.js'
+
+        self.collector = NativeCoverageCollector([self.desc])
+
+    def test_expected_sources(self):
+
+        # Expect that only instrumented sources are reported
+        coverage_data = self.collector.coverage_data()
+        self.assertEqual(coverage_data.src_list(), [os.path.join(os.getcwd(), 'src.js')])
+
+    def test_add_script_coverage(self):
+
+        root_url = 'http://127.0.0.1:8080'
+        whole_script = [{'ranges': [{'startOffset': 0, 'endOffset': 22, 'count': 1}]}]
+
+        self.collector.add_script_coverage([
+            {'url': root_url + '/suite/test-suite/include/src.js?raw_src=1',
+             'functions': whole_script},
+            {'url': root_url + '/suite/test-suite/include/vendor.js',
+             'functions': whole_script},
+            {'url': root_url + '/runner/jasmine/jasmine.js',
+             'functions': whole_script},
+            {'url': root_url + '/suite/other-suite/include/src.js',
+             'functions': whole_script},
+        ])
+
+        coverage_data = self.collector.coverage_data()
+        full_path = os.path.join(os.getcwd(), 'src.js')
+
+        self.assertEqual(coverage_data.src_list(), [full_path])
+        self.assertEqual(coverage_data.line_dict_for_src(full_path), {1: True, 2: True})
+        self.assertEqual(coverage_data.suite_name_list(), ['test-suite'])
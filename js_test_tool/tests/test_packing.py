@@ -0,0 +1,91 @@
+import os
+import mock
+from collections import OrderedDict
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.suite import SuiteDescription
+from js_test_tool.packing import pack_key, pack_suites, pack_url
+
+
+class PackSuitesTest(TempWorkspaceTestCase):
+
+    def test_pack_key(self):
+
+        # Expect that suites including the same libraries share a key,
+        # even if their root directories differ
+        os.makedirs('other')
+        os.symlink(os.path.join(self.temp_dir, 'lib'), os.path.join(self.temp_dir, 'other', 'lib'))
+
+        desc = self._mock_desc(lib_paths=['lib/lib.js'])
+        other_desc = self._mock_desc(lib_paths=['lib/lib.js'],
+                                     root_dir=os.path.join(self.temp_dir, 'other'))
+        self.assertEqual(pack_key(desc), pack_key(other_desc))
+
+        self.assertNotEqual(pack_key(desc), pack_key(self._mock_desc(lib_paths=['lib/other.js'])))
+        self.assertNotEqual(pack_key(desc), pack_key(self._mock_desc()))
+
+    def test_unpackable_suites(self):
+        self.assertIs(pack_key(self._mock_desc(test_runner='jasmine_requirejs')), None)
+        self.assertIs(pack_key(self._mock_desc(preload_fixtures=True)), None)
+
+    def test_pack_suites(self):
+        desc_dict = OrderedDict([
+            ('suite-0', self._mock_desc()),
+            ('suite-1', self._mock_desc(lib_paths=['lib/lib.js'])),
+            ('suite-2', self._mock_desc()),
+            ('suite-3', self._mock_desc(test_runner='jasmine_requirejs')),
+            ('suite-4', self._mock_desc()),
+            ('suite-5', self._mock_desc(lib_paths=['lib/lib.js'])),
+        ])
+
+        self.assertEqual(pack_suites(desc_dict, 2),
+                         [['suite-0', 'suite-2'], ['suite-1', 'suite-5'],
+                          ['suite-3'], ['suite-4']])
+
+        self.assertEqual(pack_suites(desc_dict, 1), [[name] for name in desc_dict])
+
+    def test_overlapping_sources(self):
+        os.makedirs('first/src')
+        os.makedirs('second/src')
+
+        desc_dict = {
+            'suite-0': self._mock_desc(src_paths=['src/app.js'],
+                                       root_dir=os.path.join(self.temp_dir, 'first')),
+            'suite-1': self._mock_desc(src_paths=['src/app.js'],
+                                       root_dir=os.path.join(self.temp_dir, 'second')),
+            'suite-2': self._mock_desc(src_paths=['src/other.js'],
+                                       root_dir=os.path.join(self.temp_dir, 'second')),
+        }
+
+        # Expect that suites with a source at the same relative path
+        # are not packed together, even with different root directories
+        self.assertEqual(pack_suites(desc_dict, 3),
+                         [['suite-0', 'suite-2'], ['suite-1']])
+
+    def test_pack_order(self):
+        desc_dict = dict(('suite-{}'.format(index), self._mock_desc())
+                         for index in range(10))
+
+        # Expect the packs to follow the order of the suite names,
+        # however the dict orders them
+        self.assertEqual(pack_suites(desc_dict, 4),
+                         [['suite-0', 'suite-1', 'suite-2', 'suite-3'],
+                          ['suite-4', 'suite-5', 'suite-6', 'suite-7'],
+                          ['suite-8', 'suite-9']])
+
+    def test_pack_url(self):
+        self.assertEqual(pack_url(['suite-0', 'suite-1']), '/pack/suite-0,suite-1')
+
+    def _mock_desc(self, lib_paths=None, test_runner='jasmine',
+                   preload_fixtures=False, root_dir=None, src_paths=None):
+        """
+        Return a mock `SuiteDescription` including the libraries at
+        `lib_paths` and the sources at `src_paths` (relative to `root_dir`,
+        the temp directory by default) and using `test_runner`.
+        """
+        desc = mock.MagicMock(SuiteDescription)
+        desc.root_dir.return_value = root_dir or self.temp_dir
+        desc.lib_paths.return_value = lib_paths or []
+        desc.src_paths.return_value = src_paths or []
+        desc.test_runner.return_value = test_runner
+        desc.preload_fixtures.return_value = preload_fixtures
+        return desc
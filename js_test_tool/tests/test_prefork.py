@@ -0,0 +1,59 @@
+import os
+import marshal
+import struct
+import mock
+import unittest
+from js_test_tool.coverage import CoverageData
+from js_test_tool.prefork import CoverageForwarder, apply_coverage_messages
+
+
+class CoverageForwarderTest(unittest.TestCase):
+
+    def setUp(self):
+        read_fd, write_fd = os.pipe()
+        self.read_file = os.fdopen(read_fd, 'rb')
+        self.write_file = os.fdopen(write_fd, 'wb')
+        self.addCleanup(self.read_file.close)
+
+        self.coverage_data = mock.MagicMock(CoverageData)
+
+    def test_forward_coverage(self):
+        forwarder = CoverageForwarder(self.write_file)
+        forwarder.load_from_dict(u'/root', u'prepend', {u'src.js': {u'lineData': [None, 1, 0]}})
+        forwarder.add_suite_name(u'test-suite')
+        self.write_file.close()
+
+        apply_coverage_messages(self.read_file, lambda: self.coverage_data)
+
+        # Expect that the calls were applied in the order they were made
+        self.assertEqual(self.coverage_data.method_calls, [
+            mock.call.load_from_dict(u'/root', u'prepend', {u'src.js': {u'lineData': [None, 1, 0]}}),
+            mock.call.add_suite_name(u'test-suite'),
+        ])
+
+    def test_ignore_unknown_method(self):
+        data = marshal.dumps(('stop', ()))
+        self.write_file.write(struct.pack('!I', len(data)) + data)
+        CoverageForwarder(self.write_file).add_suite_name(u'test-suite')
+        self.write_file.close()
+
+        apply_coverage_messages(self.read_file, lambda: self.coverage_data)
+
+        # Expect that the unknown message was skipped
+        self.assertEqual(self.coverage_data.method_calls,
+                         [mock.call.add_suite_name(u'test-suite')])
+
+    def test_truncated_message(self):
+        self.write_file.write(struct.pack('!I', 100) + 'short')
+        self.write_file.close()
+
+        # Expect that we stop reading without error
+        apply_coverage_messages(self.read_file, lambda: self.coverage_data)
+        self.assertEqual(self.coverage_data.method_calls, [])
+
+    def test_no_coverage_data(self):
+        CoverageForwarder(self.write_file).add_suite_name(u'test-suite')
+        self.write_file.close()
+
+        # Coverage is discarded if we are not collecting it
+        apply_coverage_messages(self.read_file, lambda: None)
@@ -0,0 +1,210 @@
+import os
+import json
+import mock
+from textwrap import dedent
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.suite import SuiteDescription
+from js_test_tool.requirejs import scan_dependencies, defines_module, DependencyScanner, \
+    ModuleGraph, suite_modules, module_manifest, module_manifest_url
+
+
+class ScanDependenciesTest(TempWorkspaceTestCase):
+
+    def test_define(self):
+        contents = dedent("""
+            define(["jquery", 'views/item', "text!templates/item.html"], function($, ItemView) {
+                return ItemView;
+            });
+        """)
+        self.assertEqual(scan_dependencies(contents),
+                         ['jquery', 'views/item', 'text!templates/item.html'])
+
+    def test_named_define(self):
+        contents = 'define("views/list", ["views/item"], function(ItemView) {});'
+        self.assertEqual(scan_dependencies(contents), ['views/item'])
+
+    def test_require(self):
+        contents = dedent("""
+            require(["spec/a_spec", "spec/b_spec"]);
+            requirejs(["spec/c_spec"], function() {});
+            define(function(require) {
+                var a = require("views/a");
+                var b = require('views/b');
+            });
+        """)
+        self.assertEqual(scan_dependencies(contents),
+                         ['spec/a_spec', 'spec/b_spec', 'spec/c_spec', 'views/a', 'views/b'])
+
+    def test_ignore_comments(self):
+        contents = dedent("""
+            // require(["commented/out"]);
+            /* define(["commented/out/too"], function() {}); */
+            define(["url"], function() { return "http://example.com"; });
+        """)
+        self.assertEqual(scan_dependencies(contents), ['url'])
+
+    def test_ignore_methods(self):
+        contents = 'loader.require(["not/a/dependency"]); obj.define(["nor/this"]);'
+        self.assertEqual(scan_dependencies(contents), [])
+
+    def test_no_duplicates(self):
+        contents = 'define(["a", "b"], function() { require(["b", "a"]); });'
+        self.assertEqual(scan_dependencies(contents), ['a', 'b'])
+
+
+    def test_defines_module(self):
+        self.assertTrue(defines_module('define(["a"], function() {});'))
+        self.assertTrue(defines_module('define({color: "red"});'))
+
+        # Plain scripts and libraries that also work without
+        # an AMD loader are not modules
+        self.assertFalse(defines_module('window.plugin = function() {};'))
+        self.assertFalse(defines_module('// define(["a"], function() {});'))
+        self.assertFalse(defines_module(dedent("""
+            if (typeof define === "function" && define.amd) {
+                define("jquery", [], function() { return jQuery; });
+            }
+        """)))
+
+
+class DependencyScannerTest(TempWorkspaceTestCase):
+
+    def test_cached_by_contents(self):
+        with open('module.js', 'w') as module_file:
+            module_file.write('define(["a"], function() {});')
+
+        scanner = DependencyScanner()
+
+        with mock.patch('js_test_tool.requirejs.scan_dependencies',
+                        side_effect=scan_dependencies) as scan:
+            self.assertEqual(scanner.dependencies('module.js'), ['a'])
+            self.assertEqual(scanner.dependencies('module.js'), ['a'])
+            self.assertEqual(scan.call_count, 1)
+
+            # Expect that the file is scanned again when it changes
+            with open('module.js', 'w') as module_file:
+                module_file.write('define(["a", "bb"], function() {});')
+
+            self.assertEqual(scanner.dependencies('module.js'), ['a', 'bb'])
+            self.assertEqual(scan.call_count, 2)
+
+    def test_missing_file(self):
+        with self.assertRaises(EnvironmentError):
+            DependencyScanner().dependencies('missing.js')
+
+
+class ModuleGraphTest(TempWorkspaceTestCase):
+
+    def setUp(self):
+        super(ModuleGraphTest, self).setUp()
+
+        _create_files(self.temp_dir, {
+            'js/main.js': 'require(["spec/item_spec", "require"]);',
+            'js/spec/item_spec.js': 'define(["views/item", "./helpers"], function() {});',
+            'js/spec/helpers.js': 'define(["jquery"], function() {});',
+            'js/views/item.js': ('define(["text!templates/item.html", "underscore", '
+                                 '"http://example.com/remote.js", "missing"], function() {});'),
+            'js/text.js': 'define(function() {});',
+            'js/templates/item.html': '<div></div>',
+            'vendor/jquery.js': 'var jQuery;',
+            'vendor/underscore-min.js': 'var _;',
+        })
+
+        self.graph = ModuleGraph('test-suite', self.temp_dir, '/js', {
+            'jquery': '../vendor/jquery',
+            'underscore': ['../vendor/underscore-min', 'http://example.com/underscore'],
+        }, DependencyScanner())
+
+    def test_reachable(self):
+        module_dict, resource_list, missing_list = self.graph.reachable()
+
+        self.assertEqual(module_dict, {
+            'main': 'js/main.js',
+            'spec/item_spec': 'js/spec/item_spec.js',
+            'spec/helpers': 'js/spec/helpers.js',
+            'views/item': 'js/views/item.js',
+            'jquery': 'vendor/jquery.js',
+            'underscore': 'vendor/underscore-min.js',
+            'text': 'js/text.js',
+        })
+        self.assertEqual(resource_list, ['js/templates/item.html'])
+        self.assertEqual(missing_list, ['missing'])
+
+    def test_other_entry_module(self):
+        module_dict, _, _ = self.graph.reachable('spec/helpers')
+        self.assertEqual(sorted(module_dict), ['jquery', 'spec/helpers'])
+
+    def test_suite_urls(self):
+        _create_files(self.temp_dir, {
+            'js/main.js': 'require(["/suite/test-suite/include/vendor/jquery.js", "/other/lib.js"]);',
+        })
+
+        module_dict, _, missing_list = self.graph.reachable()
+        self.assertEqual(module_dict, {
+            'main': 'js/main.js',
+            '/suite/test-suite/include/vendor/jquery.js': 'vendor/jquery.js',
+        })
+        self.assertEqual(missing_list, [])
+
+    def test_outside_root_dir(self):
+        _create_files(self.temp_dir, {'js/main.js': 'require(["../../../outside"]);'})
+
+        module_dict, _, missing_list = self.graph.reachable()
+        self.assertEqual(module_dict, {'main': 'js/main.js'})
+        self.assertEqual(missing_list, [])
+
+
+class SuiteModulesTest(TempWorkspaceTestCase):
+
+    def setUp(self):
+        super(SuiteModulesTest, self).setUp()
+
+        _create_files(self.temp_dir, {
+            'js/main.js': 'require(["spec/item_spec"]);',
+            'js/spec/item_spec.js': 'define(["views/item", "jquery"], function() {});',
+            'js/views/item.js': 'define(["text!templates/item.html", "underscore"], function() {});',
+            'js/src/unused.js': 'define([], function() {});',
+            'vendor/jquery.js': 'var jQuery;',
+            'vendor/underscore-min.js': 'var _;',
+        })
+
+        self.desc = mock.MagicMock(SuiteDescription)
+        self.desc.root_dir.return_value = self.temp_dir
+        self.desc.requirejs_baseUrl.return_value = '/js'
+        self.desc.requirejs_path_map.return_value = {'jquery': '../vendor/jquery'}
+        self.desc.lib_paths.return_value = ['vendor/jquery.js', 'vendor/underscore-min.js']
+        self.desc.src_paths.return_value = ['js/views/item.js', 'js/src/unused.js']
+        self.desc.spec_paths.return_value = ['js/main.js', 'js/spec/item_spec.js']
+
+    def test_suite_modules(self):
+        modules = suite_modules('test-suite', self.desc, DependencyScanner())
+
+        self.assertEqual(modules['entry'], 'main')
+        self.assertEqual(modules['modules']['jquery'], 'vendor/jquery.js')
+        self.assertEqual(modules['resources'], ['js/templates/item.html'])
+        self.assertEqual(modules['missing'], ['underscore', 'text'])
+        self.assertEqual(modules['unreachable'], ['vendor/underscore-min.js', 'js/src/unused.js'])
+
+        # Expect that only the unreachable files that define modules can be pruned
+        self.assertEqual(modules['unreachable_modules'], ['js/src/unused.js'])
+
+    def test_module_manifest(self):
+        manifest = module_manifest('test-suite', self.desc, DependencyScanner())
+        self.assertEqual(json.loads(manifest),
+                         suite_modules('test-suite', self.desc, DependencyScanner()))
+        self.assertEqual(module_manifest_url('test-suite'), '/suite/test-suite/modules.json')
+
+
+def _create_files(root_dir, contents_dict):
+    """
+    Create files in `root_dir` from `contents_dict`,
+    a dict mapping relative paths to contents.
+    """
+    for rel_path, contents in contents_dict.items():
+        path = os.path.join(root_dir, rel_path)
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with open(path, 'w') as js_file:
+            js_file.write(contents)
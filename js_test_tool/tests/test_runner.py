@@ -3,14 +3,22 @@ import mock
 from textwrap import dedent
 import os.path
 import sys
+import json
+import shutil
+import tempfile
 from js_test_tool.runner import SuiteRunner, SuiteRunnerFactory, \
     UnknownBrowserError
-from js_test_tool.browser import Browser
+from js_test_tool.browser import Browser, BrowserError
 from js_test_tool.suite import SuiteDescription, SuiteRenderer
 from js_test_tool.suite_server import SuitePageServer, TimeoutError
 from js_test_tool.coverage import CoverageData
-from js_test_tool.coverage_report import HtmlCoverageReporter, XmlCoverageReporter
+from js_test_tool.coverage_report import HtmlCoverageReporter, XmlCoverageReporter, \
+    HtmlDirCoverageReporter, LcovCoverageReporter, SnapshotCoverageReporter, \
+    SummaryCoverageReporter
+from js_test_tool.coverage_db import DatabaseCoverageReporter
+from js_test_tool.native_coverage import NativeCoverageCollector
 from js_test_tool.result_report import ConsoleResultReporter, XUnitResultReporter
+from js_test_tool.suite_compiler import SuiteCompiler, CompiledSuites, CompileError
 from js_test_tool.tests.helpers import TempWorkspaceTestCase, assert_long_str_equal
 
 
@@ -58,6 +66,20 @@ class SuiteRunnerTest(TestCase):
         self.mock_page_server.start.assert_called_once_with()
         self.mock_page_server.stop.assert_called_once_with()
 
+    def test_keep_server_running(self):
+
+        runner = SuiteRunner(
+            [self.mock_browser], self.mock_page_server,
+            self.mock_result_reporters, self.mock_coverage_reporters,
+            keep_server=True
+        )
+        runner.run()
+
+        # Expect that the running server was reused
+        self.mock_page_server.reset_coverage.assert_called_once_with()
+        self.assertFalse(self.mock_page_server.start.called)
+        self.assertFalse(self.mock_page_server.stop.called)
+
     def test_loads_all_suite_urls(self):
 
         # Configure the suite runner to load multiple pages
@@ -215,6 +237,9 @@ class SuiteRunnerTest(TestCase):
         for reporter in self.mock_coverage_reporters:
             reporter.write_report.assert_called_with(self.mock_coverage_data)
 
+        # Expect that the coverage data is available to the caller
+        self.assertIs(self.runner.coverage_data(), self.mock_coverage_data)
+
     def test_coverage_timeout(self):
 
         # Simulate `all_coverage_data()` timeout
@@ -231,6 +256,168 @@ class SuiteRunnerTest(TestCase):
         for reporter in self.mock_coverage_reporters:
             self.assertEqual(reporter.write_report.call_args_list, list())
 
+        self.assertIs(self.runner.coverage_data(), None)
+
+    def test_coverage_browser(self):
+
+        other_browser = mock.MagicMock(Browser)
+        other_browser.name.return_value = 'firefox'
+        other_browser.get_page_results.return_value = []
+
+        self.runner = SuiteRunner(
+            [self.mock_browser, other_browser],
+            self.mock_page_server,
+            self.mock_result_reporters,
+            self.mock_coverage_reporters,
+            coverage_browser='firefox'
+        )
+        self.runner.run()
+
+        # Expect that only the coverage browser loads instrumented sources
+        self.assertEqual(
+            self.mock_page_server.suite_url_list.call_args_list,
+            [mock.call(raw_src=True), mock.call(raw_src=False)]
+        )
+
+    def test_pack_suites(self):
+
+        pack_urls = ['http://127.0.0.1:8080/pack/0,1', 'http://127.0.0.1:8080/suite/2']
+        self.mock_page_server.packed_suite_url_list.return_value = pack_urls
+
+        self.runner = SuiteRunner(
+            [self.mock_browser],
+            self.mock_page_server,
+            self.mock_result_reporters,
+            self.mock_coverage_reporters,
+            pack_size=5
+        )
+        self.runner.run()
+
+        # Expect that the browser loaded the packed pages
+        self.mock_page_server.packed_suite_url_list.assert_called_once_with(5, raw_src=False)
+        loaded_urls = [args[0] for (args, _)
+                       in self.mock_browser.get_page_results.call_args_list]
+        self.assertEqual(sorted(loaded_urls), pack_urls)
+
+    def test_shards(self):
+
+        browsers = [mock.MagicMock(Browser) for _ in range(2)]
+        for index, browser in enumerate(browsers):
+            browser.name.return_value = 'chrome'
+            browser.get_page_results.side_effect = (
+                lambda url, index=index: [{'test_group': 'group {}'.format(index),
+                                           'test_name': url, 'status': 'pass',
+                                           'detail': ''}]
+            )
+
+        self._set_suite_urls(['http://127.0.0.1:8080/suite/0?raw_src=1'])
+        runner = SuiteRunner(browsers, self.mock_page_server,
+                             self.mock_result_reporters,
+                             self.mock_coverage_reporters,
+                             shard_count=2)
+        results = runner.run()
+
+        # Expect that each browser loaded its shard of the page,
+        # and that the results were merged in shard order
+        self.assertEqual(results.browsers(), ['chrome'])
+        self.assertEqual([result['test_name'] for result in results.test_results('chrome')],
+                         ['http://127.0.0.1:8080/suite/0?raw_src=1&shard=1/2',
+                          'http://127.0.0.1:8080/suite/0?raw_src=1&shard=2/2'])
+
+    def test_tabs(self):
+
+        self.mock_browser.get_pages_results.side_effect = lambda url_list: [
+            [{'test_group': 'group', 'test_name': url, 'status': 'pass', 'detail': ''}]
+            for url in url_list
+        ]
+
+        self._set_suite_urls(['http://127.0.0.1:8080/suite/0',
+                              'http://127.0.0.1:8080/suite/1'])
+        runner = SuiteRunner([self.mock_browser], self.mock_page_server,
+                             self.mock_result_reporters,
+                             self.mock_coverage_reporters,
+                             tab_count=2)
+        results = runner.run()
+
+        # Expect that the browser was given all the pages at once,
+        # and that the results are in page order
+        self.mock_browser.get_pages_results.assert_called_once_with(
+            ['http://127.0.0.1:8080/suite/0', 'http://127.0.0.1:8080/suite/1']
+        )
+        self.assertFalse(self.mock_browser.get_page_results.called)
+        self.assertEqual([result['test_name'] for result in results.test_results('chrome')],
+                         ['http://127.0.0.1:8080/suite/0', 'http://127.0.0.1:8080/suite/1'])
+
+    def test_shard_errors(self):
+
+        browsers = [mock.MagicMock(Browser) for _ in range(2)]
+        for browser in browsers:
+            browser.name.return_value = 'chrome'
+            browser.get_page_results.return_value = []
+
+        browsers[1].get_page_results.side_effect = BrowserError
+
+        runner = SuiteRunner(browsers, self.mock_page_server,
+                             self.mock_result_reporters,
+                             self.mock_coverage_reporters,
+                             shard_count=2)
+
+        # Expect that errors in a shard are raised, after the other shards finish
+        with self.assertRaises(BrowserError):
+            runner.run()
+
+        self.assertTrue(browsers[0].get_page_results.called)
+
+        # Each shard needs a browser
+        with self.assertRaises(ValueError):
+            SuiteRunner(browsers, self.mock_page_server,
+                        self.mock_result_reporters,
+                        self.mock_coverage_reporters,
+                        shard_count=3)
+
+    def test_shard_durations(self):
+
+        durations_path = os.path.join(tempfile.mkdtemp(), 'durations.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(durations_path))
+
+        with open(durations_path, 'w') as durations_file:
+            json.dump({'Adder': 3.0}, durations_file)
+
+        self._add_browser_result(self.mock_browser, 'Multiplier', 'multiplies', 'pass', '')
+        self.mock_browser.get_page_results.return_value[0]['duration'] = 1.0
+
+        runner = SuiteRunner([self.mock_browser], self.mock_page_server,
+                             self.mock_result_reporters,
+                             self.mock_coverage_reporters,
+                             shard_durations_path=durations_path)
+        runner.run()
+
+        # Expect that the server served the durations from the last run,
+        # and that this run's durations were recorded
+        self.mock_page_server.set_shard_durations.assert_called_once_with({'Adder': 3.0})
+
+        with open(durations_path) as durations_file:
+            self.assertEqual(json.load(durations_file), {'Adder': 3.0, 'Multiplier': 1.0})
+
+    def test_native_coverage(self):
+
+        native_coverage = mock.MagicMock(NativeCoverageCollector)
+        self.mock_browser.take_script_coverage.return_value = ['script coverage']
+
+        self.runner = SuiteRunner(
+            [self.mock_browser],
+            self.mock_page_server,
+            self.mock_result_reporters,
+            self.mock_coverage_reporters,
+            native_coverage=native_coverage
+        )
+        self.runner.run()
+
+        # Expect that coverage recorded by the browser is collected
+        native_coverage.add_script_coverage.assert_called_with(['script coverage'])
+        self.assertEqual(self.runner.coverage_data(),
+                         native_coverage.coverage_data.return_value)
+
     def _set_suite_urls(self, url_list):
         """
         Configure the suite page server to use each url in `url_list`
@@ -284,7 +471,13 @@ class SuiteRunnerFactoryTest(TempWorkspaceTestCase):
         self.mock_console_result = mock.MagicMock(ConsoleResultReporter)
         self.mock_xunit_result = mock.MagicMock(XUnitResultReporter)
         self.mock_html_coverage = mock.MagicMock(HtmlCoverageReporter)
+        self.mock_html_dir_coverage = mock.MagicMock(HtmlDirCoverageReporter)
         self.mock_xml_coverage = mock.MagicMock(XmlCoverageReporter)
+        self.mock_lcov_coverage = mock.MagicMock(LcovCoverageReporter)
+        self.mock_db_coverage = mock.MagicMock(DatabaseCoverageReporter)
+        self.mock_snapshot_coverage = mock.MagicMock(SnapshotCoverageReporter)
+        self.mock_summary_coverage = mock.MagicMock(SummaryCoverageReporter)
+        self.mock_native_coverage = mock.MagicMock(NativeCoverageCollector)
         self.mock_browser = mock.MagicMock(Browser)
         self.mock_runner = mock.MagicMock(SuiteRunner)
 
@@ -295,9 +488,21 @@ class SuiteRunnerFactoryTest(TempWorkspaceTestCase):
         self.mock_console_result_class = mock.MagicMock(return_value=self.mock_console_result)
         self.mock_xunit_result_class = mock.MagicMock(return_value=self.mock_xunit_result)
         self.mock_html_coverage_class = mock.MagicMock(return_value=self.mock_html_coverage)
+        self.mock_html_dir_coverage_class = mock.MagicMock(return_value=self.mock_html_dir_coverage)
         self.mock_xml_coverage_class = mock.MagicMock(return_value=self.mock_xml_coverage)
+        self.mock_lcov_coverage_class = mock.MagicMock(return_value=self.mock_lcov_coverage)
+        self.mock_db_coverage_class = mock.MagicMock(return_value=self.mock_db_coverage)
+        self.mock_snapshot_coverage_class = mock.MagicMock(return_value=self.mock_snapshot_coverage)
+        self.mock_summary_coverage_class = mock.MagicMock(return_value=self.mock_summary_coverage)
+        self.mock_native_coverage_class = mock.MagicMock(return_value=self.mock_native_coverage)
         self.mock_browser_class = mock.MagicMock(return_value=self.mock_browser)
 
+        self.mock_compiler = mock.MagicMock(SuiteCompiler)
+        self.mock_compiled = mock.MagicMock(CompiledSuites)
+        self.mock_compiled.descriptions.return_value = [self.mock_desc]
+        self.mock_compiler_class = mock.MagicMock(return_value=self.mock_compiler)
+        self.mock_compiled_class = mock.MagicMock(return_value=self.mock_compiled)
+
         # Create the factory
         self.factory = SuiteRunnerFactory(
             desc_class=self.mock_desc_class,
@@ -306,8 +511,16 @@ class SuiteRunnerFactoryTest(TempWorkspaceTestCase):
             console_result_class=self.mock_console_result_class,
             xunit_result_class=self.mock_xunit_result_class,
             html_coverage_class=self.mock_html_coverage_class,
+            html_dir_coverage_class=self.mock_html_dir_coverage_class,
             xml_coverage_class=self.mock_xml_coverage_class,
-            browser_class=self.mock_browser_class
+            lcov_coverage_class=self.mock_lcov_coverage_class,
+            db_coverage_class=self.mock_db_coverage_class,
+            snapshot_coverage_class=self.mock_snapshot_coverage_class,
+            summary_coverage_class=self.mock_summary_coverage_class,
+            native_coverage_class=self.mock_native_coverage_class,
+            browser_class=self.mock_browser_class,
+            compiler_class=self.mock_compiler_class,
+            compiled_class=self.mock_compiled_class
         )
 
     def test_configure_browsers(self):
@@ -341,7 +554,11 @@ class SuiteRunnerFactoryTest(TempWorkspaceTestCase):
         suite_desc_list = [self.mock_desc for _ in range(num_suites)]
         self.mock_server_class.assert_called_with(suite_desc_list,
                                                   self.mock_renderer,
-                                                  jscover_path=None)
+                                                  jscover_path=None,
+                                                  jvm_options=None,
+                                                  workers=None,
+                                                  processes=None,
+                                                  compiled=None)
 
     def test_configure_suite_desc(self):
 
@@ -392,6 +609,43 @@ class SuiteRunnerFactoryTest(TempWorkspaceTestCase):
             [self.mock_xml_coverage, self.mock_html_coverage]
         )
 
+    def test_configure_coverage_db(self):
+
+        # Build a runner that records coverage in a database
+        runner, _ = self._build_runner(
+            1, browser_names=['chrome', 'firefox'],
+            coverage_db_path='coverage.db'
+        )
+
+        # Expect that the database reporter records the browsers
+        # and suite description paths with each run
+        self.mock_db_coverage_class.assert_called_with(
+            'coverage.db', browser_names=['chrome', 'firefox'],
+            metadata={'suite_paths': self._suite_paths(1)}
+        )
+        self.assertEqual(runner.coverage_reporters(), [self.mock_db_coverage])
+
+    def test_configure_coverage_html_dir(self):
+
+        runner, _ = self._build_runner(1, coverage_html_dir_path='coverage')
+
+        self.mock_html_dir_coverage_class.assert_called_with('coverage')
+        self.assertEqual(runner.coverage_reporters(), [self.mock_html_dir_coverage])
+
+    def test_configure_coverage_lcov(self):
+
+        runner, _ = self._build_runner(1, coverage_lcov_path='coverage.lcov')
+
+        self.mock_lcov_coverage_class.assert_called_with('coverage.lcov')
+        self.assertEqual(runner.coverage_reporters(), [self.mock_lcov_coverage])
+
+    def test_configure_coverage_snapshot(self):
+
+        runner, _ = self._build_runner(1, coverage_snapshot_path='shard.snapshot')
+
+        self.mock_snapshot_coverage_class.assert_called_with('shard.snapshot')
+        self.assertEqual(runner.coverage_reporters(), [self.mock_snapshot_coverage])
+
     def test_configure_jscover(self):
 
         # Set the environment variable to configure
@@ -423,6 +677,168 @@ class SuiteRunnerFactoryTest(TempWorkspaceTestCase):
         self.assertEqual(kwargs.get('jscover_path'), None)
         self.assertEqual(runner.coverage_reporters(), [])
 
+    def test_configure_coverage_summary(self):
+
+        runner, _ = self._build_runner(1, coverage_summary_path='summary.json')
+
+        self.mock_summary_coverage_class.assert_called_with('summary.json')
+        self.assertEqual(runner.coverage_reporters(), [self.mock_summary_coverage])
+
+    def test_collect_coverage_without_report(self):
+
+        # Expect that coverage is collected if requested,
+        # even though no report will be written
+        with mock.patch.dict('os.environ', JSCOVER_JAR='jscover.jar'):
+            runner, _ = self._build_runner(1, collect_coverage=True)
+
+        _, kwargs = self.mock_server_class.call_args
+        self.assertEqual(kwargs.get('jscover_path'), 'jscover.jar')
+        self.assertEqual(runner.coverage_reporters(), [])
+
+    def test_configure_server_workers(self):
+        self._build_runner(1, server_workers=8)
+
+        _, kwargs = self.mock_server_class.call_args
+        self.assertEqual(kwargs.get('workers'), 8)
+
+    def test_configure_server_processes(self):
+        self._build_runner(1, server_processes=4)
+
+        _, kwargs = self.mock_server_class.call_args
+        self.assertEqual(kwargs.get('processes'), 4)
+
+    def test_configure_compiled_suites(self):
+        self.mock_compiled.instrumented.return_value = True
+
+        with mock.patch.dict('os.environ', JSCOVER_JAR='jscover.jar'):
+            self._build_runner(0, coverage_xml_path='coverage.xml', compiled_dir='compiled')
+
+        # Expect that the server serves the compiled suites,
+        # using the coverage instrumentation done when compiling
+        self.mock_compiled_class.assert_called_once_with('compiled')
+        self.assertFalse(self.mock_desc_class.called)
+        self.mock_server_class.assert_called_with([self.mock_desc],
+                                                  self.mock_renderer,
+                                                  jscover_path=None,
+                                                  jvm_options=None,
+                                                  workers=None,
+                                                  processes=None,
+                                                  compiled=self.mock_compiled)
+
+    def test_compiled_suites_native_coverage(self):
+        self.mock_compiled.instrumented.return_value = True
+
+        with self.assertRaises(CompileError):
+            self._build_runner(0, coverage_xml_path='coverage.xml',
+                               coverage_backend='native', compiled_dir='compiled')
+
+    def test_compile_suites(self):
+        suite_path_list = self._suite_paths(2)
+        for path in suite_path_list:
+            with open(path, 'w') as file_handle:
+                file_handle.write('test file')
+
+        with mock.patch.dict('os.environ', JSCOVER_JAR='jscover.jar'):
+            compiled = self.factory.compile_suites(suite_path_list, 'compiled',
+                                                   instrument=True, jscover_heap='1g',
+                                                   hardlink=True)
+
+        self.assertIs(compiled, self.mock_compiler.compile.return_value)
+        self.mock_compiler_class.assert_called_once_with(self.mock_renderer,
+                                                         jscover_path='jscover.jar',
+                                                         jvm_options=['-Xmx1g'])
+        self.mock_compiler.compile.assert_called_once_with([self.mock_desc, self.mock_desc],
+                                                           'compiled', hardlink=True)
+
+    def test_compile_instrumented_without_jscover(self):
+        with mock.patch.dict('os.environ', clear=True):
+            with self.assertRaises(CompileError):
+                self.factory.compile_suites([], 'compiled', instrument=True)
+
+    def test_configure_jscover_jvm_options(self):
+
+        env = {'JSCOVER_JAR': 'jscover.jar', 'JSCOVER_JVM_OPTS': '-XX:+UseSerialGC -Dfoo="a b"'}
+        with mock.patch.dict('os.environ', env):
+            self._build_runner(1, coverage_xml_path='coverage.xml', jscover_heap='1g')
+
+        # Expect that the heap size follows the options from the environment
+        _, kwargs = self.mock_server_class.call_args
+        self.assertEqual(kwargs.get('jvm_options'),
+                         ['-XX:+UseSerialGC', '-Dfoo=a b', '-Xmx1g'])
+
+    def test_configure_coverage_browser(self):
+
+        runner, _ = self._build_runner(1, browser_names=['chrome', 'firefox'],
+                                       coverage_browser='chrome')
+        self.assertEqual(runner._coverage_browser, 'chrome')
+
+        # The coverage browser must be one of the browsers used
+        with self.assertRaises(UnknownBrowserError):
+            self._build_runner(1, browser_names=['chrome'],
+                               coverage_browser='firefox')
+
+    def test_configure_native_coverage(self):
+
+        runner, _ = self._build_runner(
+            1, browser_names=['chrome', 'firefox'],
+            coverage_xml_path='coverage.xml', coverage_backend='native'
+        )
+
+        # Expect that JSCover is not used
+        _, kwargs = self.mock_server_class.call_args
+        self.assertEqual(kwargs.get('jscover_path'), None)
+
+        # Expect that only Chrome records native coverage
+        native_dict = {args[0]: kwargs.get('native_coverage')
+                       for args, kwargs in self.mock_browser_class.call_args_list}
+        self.assertEqual(native_dict, {'chrome': True, 'firefox': False})
+
+        self.mock_native_coverage_class.assert_called_with([self.mock_desc])
+        self.assertEqual(runner._native_coverage, self.mock_native_coverage)
+
+    def test_configure_pack_size(self):
+
+        runner, _ = self._build_runner(1)
+        self.assertIs(runner._pack_size, None)
+
+        runner, _ = self._build_runner(1, pack_size=5)
+        self.assertEqual(runner._pack_size, 5)
+
+    def test_configure_shards(self):
+
+        def _browser(name, **kwargs):
+            browser = mock.MagicMock(Browser)
+            browser.name.return_value = name
+            return browser
+
+        self.mock_browser_class.side_effect = _browser
+        runner, browsers = self._build_runner(1, browser_names=['chrome', 'firefox'],
+                                              shard_count=3,
+                                              shard_durations_path='durations.json')
+
+        # Expect that there are three instances of each browser
+        self.assertEqual([browser.name() for browser in browsers],
+                         ['chrome'] * 3 + ['firefox'] * 3)
+        self.assertEqual(runner._shard_count, 3)
+        self.assertEqual(runner._shard_durations_path, 'durations.json')
+
+    def test_configure_tabs(self):
+        runner, _ = self._build_runner(1, browser_names=['chrome', 'phantomjs'],
+                                       tab_count=4)
+
+        # Expect that only browsers that support tabs use them
+        max_tabs = {args[0]: kwargs.get('max_tabs')
+                    for args, kwargs in self.mock_browser_class.call_args_list}
+        self.assertEqual(max_tabs, {'chrome': 4, 'phantomjs': 1})
+        self.assertEqual(runner._tab_count, 4)
+
+    def test_native_coverage_requires_chrome(self):
+
+        with self.assertRaises(UnknownBrowserError):
+            self._build_runner(1, browser_names=['firefox'],
+                               coverage_xml_path='coverage.xml',
+                               coverage_backend='native')
+
     def test_configure_console_result(self):
         runner, _ = self._build_runner(1)
 
@@ -473,7 +889,8 @@ class SuiteRunnerFactoryTest(TempWorkspaceTestCase):
                       coverage_xml_path=None,
                       coverage_html_path=None,
                       browser_names=None,
-                      timeout_sec=None):
+                      timeout_sec=None,
+                      **kwargs):
         """
         Build a configured `SuiteRunner` instance
         using the `SuiteRunnerFactory`.
@@ -491,6 +908,9 @@ class SuiteRunnerFactoryTest(TempWorkspaceTestCase):
         `timeout_sec` is the number of seconds to wait for a page to load
         before timing out
 
+        Any other keyword arguments are passed through to
+        `SuiteRunnerFactory.build_runner()`.
+
         Because we are using mock dependencies that always return the same
         values, each suite runner will be identical,
         and they will all use the same browser dependencies.
@@ -514,5 +934,6 @@ class SuiteRunnerFactoryTest(TempWorkspaceTestCase):
         return self.factory.build_runner(
             suite_path_list, browser_names,
             xunit_path, coverage_xml_path,
-            coverage_html_path, timeout_sec
+            coverage_html_path, timeout_sec,
+            **kwargs
         )
@@ -0,0 +1,64 @@
+import json
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.result_report import ResultData
+from js_test_tool.sharding import shard_url, group_durations, \
+    load_durations, update_durations
+
+
+class ShardingTest(TempWorkspaceTestCase):
+
+    def test_shard_url(self):
+        self.assertEqual(shard_url(u'http://0.0.0.0:8000/suite/test', 2, 4),
+                         u'http://0.0.0.0:8000/suite/test?shard=2/4')
+        self.assertEqual(shard_url(u'http://0.0.0.0:8000/suite/test?raw_src=1', 1, 2),
+                         u'http://0.0.0.0:8000/suite/test?raw_src=1&shard=1/2')
+
+    def test_group_durations(self):
+        result_data = ResultData()
+        result_data.add_results('chrome', [
+            self._result('Adder', 1.0), self._result('Adder', 2.0),
+            self._result('Multiplier', 1.0), self._result('Untimed', None)
+        ])
+        result_data.add_results('firefox', [self._result('Adder', 5.0)])
+
+        # Expect that group durations are averaged over the browsers
+        self.assertEqual(group_durations(result_data),
+                         {'Adder': 4.0, 'Multiplier': 1.0})
+
+    def test_update_durations(self):
+        with open('durations.json', 'w') as durations_file:
+            json.dump({'Adder': 10.0, 'Divider': 3.0}, durations_file)
+
+        result_data = ResultData()
+        result_data.add_results('chrome', [self._result('Adder', 2.0),
+                                           self._result('Multiplier', 1.0)])
+
+        # Expect that groups that did not run keep their durations
+        expected = {'Adder': 2.0, 'Divider': 3.0, 'Multiplier': 1.0}
+        self.assertEqual(update_durations('durations.json', result_data), expected)
+        self.assertEqual(load_durations('durations.json'), expected)
+
+    def test_missing_durations(self):
+        self.assertEqual(load_durations('missing.json'), {})
+
+    def test_invalid_durations(self):
+        for contents in ['[1, 2]', '{"Adder": "slow"}']:
+            with open('durations.json', 'w') as durations_file:
+                durations_file.write(contents)
+
+            with self.assertRaises(ValueError):
+                load_durations('durations.json')
+
+    @staticmethod
+    def _result(group_name, duration):
+        """
+        Return a passing test result in `group_name` that took
+        `duration` seconds (None if the test was not timed).
+        """
+        result = {'test_group': group_name, 'test_name': 'test',
+                  'status': 'pass', 'detail': ''}
+
+        if duration is not None:
+            result['duration'] = duration
+
+        return result
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import os
+import mock
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.source_store import SourceStore
+
+
+class SourceStoreTest(TempWorkspaceTestCase):
+
+    def setUp(self):
+        super(SourceStoreTest, self).setUp()
+        self.store = SourceStore(max_entries=2)
+
+    def test_lines(self):
+        self._write('src.js', u'ɮine 1\nline 2\n\nline 4')
+
+        self.assertEqual(self.store.num_lines('src.js'), 4)
+        self.assertEqual(self.store.lines('src.js'),
+                         [u'ɮine 1', u'line 2', u'', u'line 4'])
+        self.assertEqual(self.store.text('src.js'), u'ɮine 1\nline 2\n\nline 4')
+
+    def test_trailing_newline(self):
+        self._write('src.js', u'line 1\nline 2\n')
+
+        # Expect the same line count as `readlines()`
+        self.assertEqual(self.store.num_lines('src.js'), 2)
+        self.assertEqual(self.store.lines('src.js'), [u'line 1', u'line 2'])
+
+    def test_empty_file(self):
+        self._write('src.js', u'')
+
+        self.assertEqual(self.store.num_lines('src.js'), 0)
+        self.assertEqual(self.store.lines('src.js'), [])
+
+    def test_missing_file(self):
+        self.assertEqual(self.store.num_lines('missing.js'), 0)
+        self.assertIs(self.store.lines('missing.js'), None)
+        self.assertIs(self.store.text('missing.js'), None)
+        self.assertIs(self.store.line_offsets('missing.js'), None)
+
+    def test_line_offsets(self):
+        self._write('src.js', u'ab\nc\n\ndef')
+
+        self.assertEqual(self.store.line_offsets('src.js'), [0, 3, 5, 6])
+        self.assertEqual([self.store.line_for_offset('src.js', offset)
+                          for offset in [0, 2, 3, 5, 6, 8]],
+                         [1, 1, 2, 3, 4, 4])
+
+    def test_reads_file_once(self):
+        self._write('src.js', u'line 1\n')
+
+        with mock.patch('__builtin__.open', side_effect=open) as mock_open:
+            self.store.num_lines('src.js')
+            self.store.lines('src.js')
+            self.store.text('src.js')
+
+        self.assertEqual(mock_open.call_count, 1)
+
+    def test_changed_file(self):
+        self._write('src.js', u'line 1\n')
+        self.assertEqual(self.store.num_lines('src.js'), 1)
+
+        # Expect that a file with a different size is read again
+        self._write('src.js', u'line 1\nline 2\n')
+        self.assertEqual(self.store.lines('src.js'), [u'line 1', u'line 2'])
+
+    def test_lru_eviction(self):
+        for name in ['src1.js', 'src2.js', 'src3.js']:
+            self._write(name, u'line\n')
+
+        self.store.num_lines('src1.js')
+        self.store.num_lines('src2.js')
+        self.store.num_lines('src1.js')
+        self.store.num_lines('src3.js')
+
+        # Expect that the least recently used file was evicted
+        with mock.patch('__builtin__.open', side_effect=open) as mock_open:
+            self.store.num_lines('src1.js')
+            self.store.num_lines('src3.js')
+            self.assertEqual(mock_open.call_count, 0)
+
+            self.store.num_lines('src2.js')
+            self.assertEqual(mock_open.call_count, 1)
+
+    @staticmethod
+    def _write(path, text):
+        """
+        Write `text` to `path`, encoded as UTF-8.
+        """
+        with open(path, 'w') as src_file:
+            src_file.write(text.encode('utf8'))
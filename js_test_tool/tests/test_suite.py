@@ -5,6 +5,9 @@ import os.path
 from StringIO import StringIO
 import yaml
 import copy
+import json
+import shutil
+import tempfile
 from textwrap import dedent
 from lxml import etree
 
@@ -12,6 +15,7 @@ from js_test_tool.tests.helpers import TempWorkspaceTestCase
 
 from js_test_tool.suite import SuiteDescription, SuiteDescriptionError, \
     SuiteRenderer, SuiteRendererError
+from js_test_tool.assets import runner_asset_url, file_digest
 
 
 class SuiteDescriptionTest(TempWorkspaceTestCase):
@@ -277,6 +281,61 @@ class SuiteDescriptionTest(TempWorkspaceTestCase):
         # Check that the prepend path is stored
         self.assertEqual(desc.prepend_path(), 'base/path')
 
+    def test_preload_fixtures(self):
+
+        # Fixtures are loaded as specs use them by default
+        desc = SuiteDescription(self._yaml_buffer(self.YAML_DATA), self.temp_dir)
+        self.assertFalse(desc.preload_fixtures())
+
+        yaml_data = copy.deepcopy(self.YAML_DATA)
+        yaml_data['preload_fixtures'] = True
+        desc = SuiteDescription(self._yaml_buffer(yaml_data), self.temp_dir)
+        self.assertTrue(desc.preload_fixtures())
+
+    def test_preload_fixtures_is_not_bool(self):
+
+        for preload_fixtures in ['yes please', 1, ['fixtures']]:
+            yaml_data = copy.deepcopy(self.YAML_DATA)
+            yaml_data['preload_fixtures'] = preload_fixtures
+            self._assert_invalid_desc(yaml_data)
+
+    def test_asset_urls(self):
+
+        # Libraries are loaded from their asset URLs by default
+        desc = SuiteDescription(self._yaml_buffer(self.YAML_DATA), self.temp_dir)
+        self.assertTrue(desc.asset_urls())
+
+        yaml_data = copy.deepcopy(self.YAML_DATA)
+        yaml_data['asset_urls'] = False
+        desc = SuiteDescription(self._yaml_buffer(yaml_data), self.temp_dir)
+        self.assertFalse(desc.asset_urls())
+
+    def test_asset_urls_is_not_bool(self):
+
+        for asset_urls in ['no thanks', 0, ['lib.js']]:
+            yaml_data = copy.deepcopy(self.YAML_DATA)
+            yaml_data['asset_urls'] = asset_urls
+            self._assert_invalid_desc(yaml_data)
+
+    def test_requirejs_prune_unreachable(self):
+
+        # Scripts are included in the page whether or not modules require them by default
+        desc = SuiteDescription(self._yaml_buffer(self.YAML_DATA), self.temp_dir)
+        self.assertFalse(desc.requirejs_prune_unreachable())
+
+        yaml_data = copy.deepcopy(self.YAML_DATA)
+        yaml_data['requirejs'] = {'baseUrl': '/src', 'prune_unreachable': True}
+        desc = SuiteDescription(self._yaml_buffer(yaml_data), self.temp_dir)
+        self.assertTrue(desc.requirejs_prune_unreachable())
+        self.assertEqual(desc.requirejs_baseUrl(), '/src')
+
+    def test_requirejs_prune_unreachable_is_not_bool(self):
+
+        for prune_unreachable in ['yes please', 1]:
+            yaml_data = copy.deepcopy(self.YAML_DATA)
+            yaml_data['requirejs'] = {'prune_unreachable': prune_unreachable}
+            self._assert_invalid_desc(yaml_data)
+
     def test_exclude_from_page(self):
 
         # Add in a rule to exclude files in other_* dir
@@ -330,6 +389,44 @@ class SuiteDescriptionTest(TempWorkspaceTestCase):
         self.assertEqual(desc.src_paths(only_in_page=True), self.SRC_FILES)
         self.assertEqual(desc.spec_paths(only_in_page=True), self.SPEC_FILES)
 
+    def test_instrument_all_src_by_default(self):
+
+        yaml_file = self._yaml_buffer(self.YAML_DATA)
+        desc = SuiteDescription(yaml_file, self.temp_dir)
+
+        for src_path in self.SRC_FILES:
+            self.assertTrue(desc.should_instrument(src_path))
+
+    def test_instrument_include_and_exclude(self):
+
+        # Instrument only files in src/, except those in subdirectories
+        yaml_data = copy.deepcopy(self.YAML_DATA)
+        yaml_data['instrument_include'] = 'src/.*'
+        yaml_data['instrument_exclude'] = ['src/subdir/.*', r'.*\.min\.js']
+
+        yaml_file = self._yaml_buffer(yaml_data)
+        desc = SuiteDescription(yaml_file, self.temp_dir)
+
+        self.assertTrue(desc.should_instrument('src/1.js'))
+        self.assertTrue(desc.should_instrument('src/2.js'))
+        self.assertFalse(desc.should_instrument('src/subdir/3.js'))
+        self.assertFalse(desc.should_instrument('src/vendor.min.js'))
+        self.assertFalse(desc.should_instrument('other_src/test.js'))
+
+        # The rules do not change which sources are served
+        self.assertEqual(desc.src_paths(), self.SRC_FILES)
+
+    def test_invalid_instrument_rule(self):
+
+        for key in ['instrument_include', 'instrument_exclude']:
+            yaml_data = copy.deepcopy(self.YAML_DATA)
+            yaml_data[key] = ['src/(unclosed']
+
+            yaml_file = self._yaml_buffer(yaml_data)
+
+            with self.assertRaises(SuiteDescriptionError):
+                SuiteDescription(yaml_file, self.temp_dir)
+
     def test_missing_required_data(self):
 
         for key in ['test_suite_name', 'src_paths', 'spec_paths', 'test_runner']:
@@ -529,6 +626,184 @@ class SuiteRendererTest(unittest.TestCase):
         desc.src_paths.assert_called_with(only_in_page=True)
         desc.spec_paths.assert_called_with(only_in_page=True)
 
+    def test_raw_src_url_args(self):
+
+        desc = self._mock_desc(['lib.js'], ['src.js'], ['spec.js'], 'jasmine')
+
+        html = self.renderer.render_to_string('test-suite', desc,
+                                              src_url_args='raw_src=1')
+        tree = etree.HTML(html)
+        src_list = [elem.get('src') for elem in tree.xpath('/html/head/script')
+                    if elem.get('src') is not None]
+
+        # Expect that only the source URL has the query string
+        self.assertIn('/suite/test-suite/include/lib.js', src_list)
+        self.assertIn('/suite/test-suite/include/src.js?raw_src=1', src_list)
+        self.assertIn('/suite/test-suite/include/spec.js', src_list)
+
+    def test_lib_asset_urls(self):
+
+        # Create a library file
+        root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root_dir)
+        os.makedirs(os.path.join(root_dir, 'lib'))
+        with open(os.path.join(root_dir, 'lib', 'lib.js'), 'w') as lib_file:
+            lib_file.write('var lib;')
+
+        desc = self._mock_desc(['lib/lib.js', 'missing.js'], ['src.js'], [], 'jasmine')
+        desc.root_dir.return_value = root_dir
+
+        html = self.renderer.render_to_string('test-suite', desc)
+        tree = etree.HTML(html)
+        src_list = [elem.get('src') for elem in tree.xpath('/html/head/script')
+                    if elem.get('src') is not None]
+
+        # Expect that the library is loaded from its asset URL,
+        # and that missing libraries and sources are loaded from the suite
+        digest = file_digest(os.path.join(root_dir, 'lib', 'lib.js'))
+        self.assertIn('/asset/{}/lib/lib.js'.format(digest), src_list)
+        self.assertIn('/suite/test-suite/include/missing.js', src_list)
+        self.assertIn('/suite/test-suite/include/src.js', src_list)
+
+        # Expect that the asset URL changes with the library's contents
+        with open(os.path.join(root_dir, 'lib', 'lib.js'), 'w') as lib_file:
+            lib_file.write('var changed_lib;')
+
+        self.assertNotEqual(file_digest(os.path.join(root_dir, 'lib', 'lib.js')), digest)
+
+    def test_no_asset_urls(self):
+
+        self.renderer = SuiteRenderer(asset_urls=False)
+        desc = self._mock_desc(['lib.js'], [], [], 'jasmine')
+
+        html = self.renderer.render_to_string('test-suite', desc)
+        tree = etree.HTML(html)
+        src_list = [elem.get('src') for elem in tree.xpath('/html/head/script')
+                    if elem.get('src') is not None]
+
+        self.assertEqual(src_list, ['/runner/jasmine/jasmine.js',
+                                    '/runner/jasmine/jasmine-json.js',
+                                    '/suite/test-suite/include/lib.js'])
+
+    def test_suite_without_asset_urls(self):
+
+        # Create a library that loads files relative to its own URL
+        root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root_dir)
+        with open(os.path.join(root_dir, 'lib.js'), 'w') as lib_file:
+            lib_file.write('var lib;')
+
+        desc = self._mock_desc(['lib.js'], [], [], 'jasmine')
+        desc.root_dir.return_value = root_dir
+        desc.asset_urls.return_value = False
+
+        html = self.renderer.render_to_string('test-suite', desc)
+        tree = etree.HTML(html)
+        src_list = [elem.get('src') for elem in tree.xpath('/html/head/script')
+                    if elem.get('src') is not None]
+
+        # Expect that the library is loaded from the suite's URLs,
+        # while the runner still uses its asset URLs
+        self.assertIn('/suite/test-suite/include/lib.js', src_list)
+        self.assertIn(runner_asset_url('jasmine/jasmine.js'), src_list)
+
+    def test_requirejs_runner_asset_urls(self):
+
+        desc = self._mock_desc(['lib.js'], [], [], 'jasmine_requirejs')
+        desc.requirejs_path_map.return_value = {}
+        desc.requirejs_baseUrl.return_value = ''
+
+        html = self.renderer.render_to_string('test-suite', desc)
+
+        # Expect that RequireJS loads the runner modules from their asset URLs
+        self.assertIn(runner_asset_url('jasmine_requirejs/require.js'), html)
+        self.assertIn(json.dumps(runner_asset_url('jasmine_requirejs/jasmine-json.js')[:-3]), html)
+        self.assertIn('/suite/test-suite/include/lib.js', html)
+
+    def test_requirejs_prune_unreachable(self):
+
+        # Create a suite whose main module requires only one of its modules,
+        # and that includes libraries that set globals no module requires
+        root_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root_dir)
+
+        for rel_path, contents in [
+                ('main.js', 'require(["used"]);'),
+                ('used.js', 'define([], function() { return globalLib; });'),
+                ('unused.js', 'define([], function() {});'),
+                ('global.js', 'var globalLib = {};'),
+                ('umd.js', 'if (typeof define === "function" && define.amd) { define([], f); }')]:
+            with open(os.path.join(root_dir, rel_path), 'w') as js_file:
+                js_file.write(contents)
+
+        desc = self._mock_desc(['global.js', 'umd.js', 'used.js', 'unused.js'], [],
+                               ['main.js'], 'jasmine_requirejs')
+        desc.root_dir.return_value = root_dir
+        desc.requirejs_path_map.return_value = {}
+        desc.requirejs_baseUrl.return_value = ''
+        renderer = SuiteRenderer(asset_urls=False)
+
+        # Expect that both libraries are loaded by default
+        html = renderer.render_to_string('test-suite', desc)
+        self.assertIn('/suite/test-suite/include/used.js', html)
+        self.assertIn('/suite/test-suite/include/unused.js', html)
+
+        # Expect that only the unreachable module is left out when pruning
+        desc.requirejs_prune_unreachable.return_value = True
+        html = renderer.render_to_string('test-suite', desc)
+        self.assertIn('/suite/test-suite/include/used.js', html)
+        self.assertNotIn('/suite/test-suite/include/unused.js', html)
+        self.assertIn('/suite/test-suite/include/global.js', html)
+        self.assertIn('/suite/test-suite/include/umd.js', html)
+
+    def test_render_pack(self):
+
+        self.renderer = SuiteRenderer(asset_urls=False)
+        suite_list = [
+            ('suite-0', self._mock_desc(['lib.js'], ['src0.js'], ['spec0.js'], 'jasmine')),
+            ('suite-1', self._mock_desc(['lib.js'], ['src1.js'], ['spec1.js'], 'jasmine')),
+        ]
+
+        html = self.renderer.render_pack_to_string(suite_list, src_url_args='raw_src=1')
+        tree = etree.HTML(html)
+        script_elems = tree.xpath('/html/head/script')
+        src_list = [elem.get('src') for elem in script_elems
+                    if elem.get('src') is not None]
+
+        # Expect that the libraries are loaded once,
+        # then each suite's sources and specs from its own URLs
+        self.assertEqual(src_list, ['/runner/jasmine/jasmine.js',
+                                    '/runner/jasmine/jasmine-json.js',
+                                    '/suite/suite-0/include/lib.js',
+                                    '/suite/suite-0/include/src0.js?raw_src=1',
+                                    '/suite/suite-0/include/spec0.js',
+                                    '/suite/suite-1/include/src1.js?raw_src=1',
+                                    '/suite/suite-1/include/spec1.js'])
+
+        # Expect that each suite claims the specs it defined
+        inline_list = [elem.text.strip() for elem in script_elems
+                       if elem.get('src') is None]
+        self.assertIn('js_test_tool.claimSuites("suite-0");', inline_list)
+        self.assertIn('js_test_tool.claimSuites("suite-1");', inline_list)
+        self.assertLess(html.index('spec0.js'), html.index('claimSuites("suite-0")'))
+        self.assertLess(html.index('claimSuites("suite-0")'), html.index('src1.js'))
+
+        # Expect that the results are reported for both suites
+        self.assertIn('new jasmine.JsonReporter("{}", ["suite-0", "suite-1"]);'.format(
+            SuiteRenderer.RESULTS_DIV_ID), html)
+
+    def test_render_pack_incompatible(self):
+
+        desc = self._mock_desc(['lib.js'], [], [], 'jasmine')
+
+        for other_desc in [self._mock_desc(['other_lib.js'], [], [], 'jasmine'),
+                           self._mock_desc(['lib.js'], [], [], 'jasmine_requirejs')]:
+            with self.assertRaises(SuiteRendererError):
+                self.renderer.render_pack_to_string([('suite-0', desc), ('suite-1', other_desc)])
+
+        with self.assertRaises(SuiteRendererError):
+            self.renderer.render_pack_to_string([])
+
     def test_no_lib_files(self):
 
         jasmine_libs = ['jasmine/jasmine.js',
@@ -562,6 +837,20 @@ class SuiteRendererTest(unittest.TestCase):
         self._assert_script(tree, self.JASMINE_TEST_RUNNER_SCRIPT, -1)
         self._assert_script(tree, self.JASMINE_LOAD_FIXTURES_SCRIPT, -2)
 
+    def test_render_preload_fixtures(self):
+
+        desc = self._mock_desc([], [], [], 'jasmine')
+        desc.preload_fixtures.return_value = True
+
+        tree = etree.HTML(self.renderer.render_to_string('test-suite', desc))
+
+        # Expect that the fixture cache is filled from the bundle
+        # after setting the fixture path
+        script = tree.xpath('/html/head/script')[-2].text
+        self.assertIn(self.JASMINE_LOAD_FIXTURES_SCRIPT.splitlines()[2].strip(), script)
+        self.assertIn('request.open("GET", "/suite/test-suite/fixtures.json", false);', script)
+        self.assertIn('fixtures.fixturesCache_[path] = preloaded[path];', script)
+
     def test_render_jasmine_dev_mode(self):
 
         # Create a test runner page in dev mode
@@ -666,7 +955,7 @@ class SuiteRendererTest(unittest.TestCase):
         """
         Render `suite_desc` (a `SuiteDescription` instance or mock) to
         `html`, then asserts that the `html` contains `<script>` tags with
-        `runner_includes` (files included by default, with a `/runner/` prefix)
+        `runner_includes` (files included by default, at their asset URLs)
         and `suite_includes` (files included by the test suite,
         with a `/suite/include` prefix)
         """
@@ -679,9 +968,8 @@ class SuiteRendererTest(unittest.TestCase):
         # Retrieve all <script> inclusions
         script_elems = tree.xpath('/html/head/script')
 
-        # Prepend the runner and suite includes
-        runner_includes = [os.path.join('/runner', path)
-                           for path in runner_includes]
+        # Runner includes are loaded from their asset URLs
+        runner_includes = [runner_asset_url(path) for path in runner_includes]
         suite_includes = [os.path.join('/suite', 'test-suite', 'include', path)
                           for path in suite_includes]
 
@@ -704,6 +992,11 @@ class SuiteRendererTest(unittest.TestCase):
         """
         desc = mock.MagicMock(SuiteDescription)
 
+        # The files do not exist, so they are served from the suite's URLs
+        desc.root_dir.return_value = os.path.join('nonexistent', 'root')
+        desc.preload_fixtures.return_value = False
+        desc.asset_urls.return_value = True
+        desc.requirejs_prune_unreachable.return_value = False
         desc.lib_paths.return_value = lib_paths
         desc.src_paths.return_value = src_paths
         desc.spec_paths.return_value = spec_paths
@@ -0,0 +1,297 @@
+import os
+import re
+import json
+import mock
+import pkg_resources
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.suite import SuiteDescription, SuiteRenderer
+from js_test_tool.coverage import SrcInstrumenter
+from js_test_tool.assets import file_digest, runner_digest
+from js_test_tool.suite_compiler import SuiteCompiler, CompiledSuites, \
+    CompileError, MANIFEST_NAME
+
+
+class SuiteCompilerTest(TempWorkspaceTestCase):
+
+    def setUp(self):
+        super(SuiteCompilerTest, self).setUp()
+
+        # Create the files for a suite
+        self.root_dir = os.path.join(self.temp_dir, 'repo')
+        for rel_path, contents in [('lib/lib.js', 'lib'), ('src/src.js', 'src'),
+                                   ('src/vendor.js', 'vendor'), ('spec/spec.js', 'spec'),
+                                   ('fixtures/fixture.html', '<div></div>')]:
+            path = os.path.join(self.root_dir, rel_path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as dep_file:
+                dep_file.write(contents)
+
+        self.desc = mock.MagicMock(SuiteDescription)
+        self.desc.suite_name.return_value = 'test-suite'
+        self.desc.root_dir.return_value = self.root_dir
+        self.desc.prepend_path.return_value = 'prefix'
+        self.desc.test_runner.return_value = 'jasmine'
+        self.desc.lib_paths.return_value = ['lib/lib.js']
+        self.desc.src_paths.return_value = ['src/src.js', 'src/vendor.js']
+        self.desc.spec_paths.return_value = ['spec/spec.js']
+        self.desc.fixture_paths.return_value = ['fixtures/fixture.html']
+        self.desc.should_instrument.side_effect = lambda path: path != 'src/vendor.js'
+        self.desc.preload_fixtures.return_value = False
+        self.desc.asset_urls.return_value = True
+
+        self.renderer = mock.MagicMock(SuiteRenderer)
+        self.renderer.render_to_string.side_effect = \
+            lambda name, desc, src_url_args=u'': u'page \u0236 {}'.format(src_url_args)
+
+        self.instr = mock.MagicMock(SrcInstrumenter)
+        self.instr.instrumented_src.side_effect = lambda path: u'instrumented ' + path
+        self.instr_class = mock.MagicMock(return_value=self.instr)
+
+        self.output_dir = os.path.join(self.temp_dir, 'compiled')
+
+    def test_compile(self):
+        compiled = SuiteCompiler(self.renderer).compile([self.desc], self.output_dir)
+
+        # Expect that the page and dependencies are laid out like the server's URLs
+        self.assertEqual(self._read('suite/test-suite/index.html'), u'page \u0236 '.encode('utf-8'))
+        self.assertEqual(self._read('suite/test-suite/include/lib/lib.js'), 'lib')
+        self.assertEqual(self._read('suite/test-suite/include/src/src.js'), 'src')
+        self.assertEqual(self._read('suite/test-suite/include/spec/spec.js'), 'spec')
+        self.assertEqual(self._read('suite/test-suite/include/fixtures/fixture.html'), '<div></div>')
+        self.assertEqual(self._read('runner/jasmine/jasmine.js'),
+                         pkg_resources.resource_string('js_test_tool', 'runner/jasmine/jasmine.js'))
+
+        # Expect that files are found using the manifest
+        self.assertFalse(compiled.instrumented())
+        self.assertEqual(compiled.file_path('suite/test-suite/'),
+                         os.path.join(self.output_dir, 'suite/test-suite/index.html'))
+        self.assertEqual(compiled.file_path('suite/test-suite/include/src/src.js', raw_src=True),
+                         os.path.join(self.output_dir, 'suite/test-suite/include/src/src.js'))
+        self.assertIs(compiled.file_path('suite/test-suite/include/missing.js'), None)
+        self.assertIs(compiled.file_path('suite/other-suite'), None)
+
+        # Expect that libraries and runner assets are written at their asset URLs
+        lib_asset_path = 'asset/{}/lib/lib.js'.format(
+            file_digest(os.path.join(self.root_dir, 'lib/lib.js')))
+        self.assertEqual(self._read(lib_asset_path), 'lib')
+        self.assertEqual(compiled.file_path(lib_asset_path),
+                         os.path.join(self.output_dir, lib_asset_path))
+
+        runner_asset_path = 'asset/{}/jasmine/jasmine.js'.format(runner_digest('jasmine/jasmine.js'))
+        self.assertEqual(self._read(runner_asset_path), self._read('runner/jasmine/jasmine.js'))
+        self.assertEqual(compiled.file_path(runner_asset_path),
+                         os.path.join(self.output_dir, runner_asset_path))
+
+        # Expect that nothing was instrumented
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, 'suite/test-suite/raw.html')))
+
+    def test_static_files(self):
+
+        # Render real pages for a suite using each runner
+        requirejs_desc = mock.MagicMock(SuiteDescription)
+        for method in ['root_dir', 'prepend_path', 'lib_paths', 'src_paths',
+                       'spec_paths', 'fixture_paths', 'preload_fixtures', 'asset_urls']:
+            getattr(requirejs_desc, method).return_value = getattr(self.desc, method).return_value
+
+        # RequireJS loads the sources, rather than the page
+        requirejs_desc.src_paths.side_effect = lambda only_in_page=False: (
+            [] if only_in_page else self.desc.src_paths.return_value
+        )
+
+        requirejs_desc.suite_name.return_value = 'requirejs-suite'
+        requirejs_desc.test_runner.return_value = 'jasmine_requirejs'
+        requirejs_desc.requirejs_path_map.return_value = {}
+        requirejs_desc.requirejs_baseUrl.return_value = '/suite/requirejs-suite/include'
+        requirejs_desc.requirejs_prune_unreachable.return_value = False
+
+        SuiteCompiler(SuiteRenderer()).compile([self.desc, requirejs_desc], self.output_dir)
+
+        # Expect that every file a page loads exists in the output
+        # at its URL path, so any static file server can serve it
+        for suite_name in ['test-suite', 'requirejs-suite']:
+            page = self._read('suite/{}/index.html'.format(suite_name))
+            url_list = [url for _, url in re.findall(r'(src|href)="([^"]+)"', page)]
+            self.assertTrue(any(url.startswith('/asset/') for url in url_list))
+
+            for url in url_list:
+                path = os.path.join(self.output_dir, url.split('?')[0].lstrip('/'))
+                self.assertTrue(os.path.isfile(path), msg="'{}' was not written".format(url))
+
+    def test_compiled_description(self):
+        SuiteCompiler(self.renderer).compile([self.desc], self.output_dir)
+
+        desc, = CompiledSuites(self.output_dir).descriptions()
+        self.assertEqual(desc.suite_name(), 'test-suite')
+        self.assertEqual(desc.root_dir(), self.root_dir)
+        self.assertEqual(desc.prepend_path(), 'prefix')
+        self.assertEqual(desc.test_runner(), 'jasmine')
+        self.assertEqual(desc.lib_paths(), ['lib/lib.js'])
+        self.assertEqual(desc.src_paths(), ['src/src.js', 'src/vendor.js'])
+        self.assertEqual(desc.spec_paths(only_in_page=True), ['spec/spec.js'])
+        self.assertEqual(desc.fixture_paths(), ['fixtures/fixture.html'])
+        self.assertFalse(desc.should_instrument('src/src.js'))
+        self.assertFalse(desc.preload_fixtures())
+        self.assertTrue(desc.asset_urls())
+
+    def test_compile_without_asset_urls(self):
+        self.desc.asset_urls.return_value = False
+        compiled = SuiteCompiler(self.renderer).compile([self.desc], self.output_dir)
+
+        # Expect that the libraries are written only at the suite's URLs
+        lib_asset_path = 'asset/{}/lib/lib.js'.format(
+            file_digest(os.path.join(self.root_dir, 'lib/lib.js')))
+        self.assertIs(compiled.file_path(lib_asset_path), None)
+        self.assertEqual(self._read('suite/test-suite/include/lib/lib.js'), 'lib')
+
+        desc, = compiled.descriptions()
+        self.assertFalse(desc.asset_urls())
+
+    def test_compile_preloaded_fixtures(self):
+        self.desc.preload_fixtures.return_value = True
+        compiled = SuiteCompiler(self.renderer).compile([self.desc], self.output_dir)
+
+        # Expect that the fixtures are bundled
+        self.assertEqual(compiled.file_path('suite/test-suite/fixtures.json'),
+                         os.path.join(self.output_dir, 'suite/test-suite/fixtures.json'))
+        self.assertEqual(json.loads(self._read('suite/test-suite/fixtures.json')),
+                         {'fixtures/fixture.html': '<div></div>'})
+
+        desc, = compiled.descriptions()
+        self.assertTrue(desc.preload_fixtures())
+
+    def test_compile_module_manifest(self):
+        self.desc.test_runner.return_value = 'jasmine_requirejs'
+        self.desc.requirejs_baseUrl.return_value = '/src'
+        self.desc.requirejs_path_map.return_value = {}
+        with open(os.path.join(self.root_dir, 'src/main.js'), 'w') as main_file:
+            main_file.write('require(["src"]);')
+
+        compiled = SuiteCompiler(self.renderer).compile([self.desc], self.output_dir)
+
+        # Expect that the modules reachable from main are recorded
+        self.assertEqual(compiled.file_path('suite/test-suite/modules.json'),
+                         os.path.join(self.output_dir, 'suite/test-suite/modules.json'))
+        self.assertEqual(json.loads(self._read('suite/test-suite/modules.json'))['modules'],
+                         {'main': 'src/main.js', 'src': 'src/src.js'})
+
+    def test_compile_instrumented(self):
+        compiler = SuiteCompiler(self.renderer, jscover_path='jscover.jar',
+                                 jvm_options=['-Xmx1g'], instrumenter_class=self.instr_class)
+        compiled = compiler.compile([self.desc], self.output_dir)
+
+        # Expect that JSCover ran in the suite's root directory, then stopped
+        self.instr_class.assert_called_once_with(self.root_dir, tool_path='jscover.jar',
+                                                 jvm_options=['-Xmx1g'])
+        self.instr.start.assert_called_once_with()
+        self.instr.stop.assert_called_once_with()
+
+        # Expect that only the sources to instrument were instrumented
+        self.assertTrue(compiled.instrumented())
+        self.assertEqual(self._read('suite/test-suite/include/src/src.js'), 'instrumented src/src.js')
+        self.assertEqual(self._read('suite/test-suite/include/src/vendor.js'), 'vendor')
+
+        # Expect that the uninstrumented sources are served to raw pages
+        self.assertEqual(compiled.file_path('suite/test-suite', raw_src=True),
+                         os.path.join(self.output_dir, 'suite/test-suite/raw.html'))
+        self.assertEqual(self._read('suite/test-suite/raw.html'), u'page \u0236 raw_src=1'.encode('utf-8'))
+        self.assertEqual(compiled.file_path('suite/test-suite/include/src/src.js', raw_src=True),
+                         os.path.join(self.output_dir, 'suite/test-suite/raw_src/src/src.js'))
+        self.assertEqual(self._read('suite/test-suite/raw_src/src/src.js'), 'src')
+
+        desc, = compiled.descriptions()
+        self.assertTrue(desc.should_instrument('src/src.js'))
+        self.assertFalse(desc.should_instrument('src/vendor.js'))
+
+    def test_instrument_fails(self):
+        self.instr.instrumented_src.side_effect = ValueError('JSCover failed')
+        compiler = SuiteCompiler(self.renderer, jscover_path='jscover.jar',
+                                 instrumenter_class=self.instr_class)
+
+        with self.assertRaises(CompileError):
+            compiler.compile([self.desc], self.output_dir)
+
+        self.instr.stop.assert_called_once_with()
+
+    def test_hardlink(self):
+        SuiteCompiler(self.renderer).compile([self.desc], self.output_dir, hardlink=True)
+
+        src_stat = os.stat(os.path.join(self.root_dir, 'lib/lib.js'))
+        dest_stat = os.stat(os.path.join(self.output_dir, 'suite/test-suite/include/lib/lib.js'))
+        self.assertEqual(src_stat.st_ino, dest_stat.st_ino)
+
+    def test_recompile(self):
+        compiler = SuiteCompiler(self.renderer)
+        compiler.compile([self.desc], self.output_dir)
+
+        # Expect that files from the last compile are removed
+        self.desc.fixture_paths.return_value = []
+        compiler.compile([self.desc], self.output_dir)
+
+        self.assertFalse(os.path.exists(
+            os.path.join(self.output_dir, 'suite/test-suite/include/fixtures/fixture.html')
+        ))
+
+    def test_output_dir_not_empty(self):
+        os.makedirs(self.output_dir)
+        with open(os.path.join(self.output_dir, 'important.txt'), 'w') as other_file:
+            other_file.write('do not delete')
+
+        with self.assertRaises(CompileError):
+            SuiteCompiler(self.renderer).compile([self.desc], self.output_dir)
+
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'important.txt')))
+
+    def test_recompile_keeps_other_files(self):
+        compiler = SuiteCompiler(self.renderer)
+        compiler.compile([self.desc], self.output_dir)
+
+        with open(os.path.join(self.output_dir, 'notes.txt'), 'w') as other_file:
+            other_file.write('keep me')
+
+        # Expect that only the files listed in the manifest are replaced
+        compiler.compile([self.desc], self.output_dir)
+        self.assertEqual(self._read('notes.txt'), 'keep me')
+        self.assertEqual(self._read('suite/test-suite/include/lib/lib.js'), 'lib')
+
+    def test_foreign_manifest(self):
+
+        # Create a build directory with another tool's manifest.json
+        os.makedirs(self.output_dir)
+        for rel_path, contents in [(MANIFEST_NAME, json.dumps({'main.js': 'main.1234.js'})),
+                                   ('main.1234.js', 'bundle')]:
+            with open(os.path.join(self.output_dir, rel_path), 'w') as output_file:
+                output_file.write(contents)
+
+        with self.assertRaises(CompileError):
+            SuiteCompiler(self.renderer).compile([self.desc], self.output_dir)
+
+        # Expect that nothing was removed
+        self.assertEqual(sorted(os.listdir(self.output_dir)), ['main.1234.js', MANIFEST_NAME])
+
+        # A manifest listing files outside the directory is not ours either
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), 'w') as manifest_file:
+            json.dump({'version': 1, 'suites': [], 'raw_files': {},
+                       'files': {'x': '../outside.js'}}, manifest_file)
+
+        with self.assertRaises(CompileError):
+            SuiteCompiler(self.renderer).compile([self.desc], self.output_dir)
+
+    def test_missing_manifest(self):
+        with self.assertRaises(CompileError):
+            CompiledSuites(self.output_dir)
+
+    def test_manifest_version(self):
+        os.makedirs(self.output_dir)
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), 'w') as manifest_file:
+            json.dump({'version': 0}, manifest_file)
+
+        with self.assertRaises(CompileError):
+            CompiledSuites(self.output_dir)
+
+    def _read(self, rel_path):
+        """
+        Return the contents of the file at `rel_path` in the output directory.
+        """
+        with open(os.path.join(self.output_dir, rel_path), 'rb') as output_file:
+            return output_file.read()
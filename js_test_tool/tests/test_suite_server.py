@@ -10,16 +10,28 @@ import requests
 import os
 import pkg_resources
 import json
+import socket
+import threading
+import time
 from js_test_tool.suite import SuiteDescription, SuiteRenderer
 from js_test_tool.suite_server import SuitePageServer, SuitePageHandler, \
-    TimeoutError, DuplicateSuiteNameError
+    TimeoutError, DuplicateSuiteNameError, BUSY_RESPONSE, PageCache, LibAssetIndex
 from js_test_tool.coverage import SrcInstrumenter, SrcInstrumenterError
+from js_test_tool.suite_compiler import SuiteCompiler
+from js_test_tool.assets import file_digest, runner_digest, ASSET_CACHE_CONTROL
 
 
 class SuitePageServerTest(TempWorkspaceTestCase):
 
     NUM_SUITE_DESC = 2
 
+    # Request headers for pages that are not compressed,
+    # to check their lengths
+    IDENTITY_HEADERS = {'Accept-Encoding': 'identity'}
+
+    # Number of worker threads (None for a thread per connection)
+    WORKERS = None
+
     def setUp(self):
 
         # Call the superclass implementation to create the temp workspace
@@ -39,6 +51,7 @@ class SuitePageServerTest(TempWorkspaceTestCase):
             suite.src_paths.return_value = []
             suite.spec_paths.return_value = []
             suite.fixture_paths.return_value = []
+            suite.preload_fixtures.return_value = False
             suite.root_dir.return_value = os.getcwd()
             suite_num += 1
 
@@ -49,7 +62,8 @@ class SuitePageServerTest(TempWorkspaceTestCase):
 
         # Create the server
         self.server = SuitePageServer(
-            self.suite_desc_list, self.suite_renderer, port=self.port
+            self.suite_desc_list, self.suite_renderer, port=self.port,
+            workers=self.WORKERS
         )
 
         # Start the server
@@ -82,6 +96,27 @@ class SuitePageServerTest(TempWorkspaceTestCase):
             expected_url = self.server.root_url() + u'suite/test-suite-{}'.format(suite_num)
             self.assertIn(expected_url, url_list)
 
+    def test_raw_src_suite_url_list(self):
+
+        url_list = self.server.suite_url_list(raw_src=True)
+
+        for suite_num in range(self.NUM_SUITE_DESC):
+            expected_url = (self.server.root_url() +
+                            u'suite/test-suite-{}?raw_src=1'.format(suite_num))
+            self.assertIn(expected_url, url_list)
+
+    def test_serve_raw_src_suite_pages(self):
+
+        expected_page = u'test suite mock'
+        self.suite_renderer.render_to_string.return_value = expected_page
+
+        url = self.server.suite_url_list(raw_src=True)[0]
+        self._assert_page_equals(url, expected_page)
+
+        # Expect that the renderer was asked for raw source URLs
+        _, kwargs = self.suite_renderer.render_to_string.call_args
+        self.assertEqual(kwargs.get('src_url_args'), 'raw_src=1')
+
     def test_enforce_unique_suite_names(self):
 
         # Try to create a suite server in which two suites have the same name
@@ -121,6 +156,50 @@ class SuitePageServerTest(TempWorkspaceTestCase):
             url = url + "?param=12345"
             self._assert_page_equals(url, expected_page)
 
+    def test_packed_suite_url_list(self):
+
+        # Suites are packed only if they use a runner that supports it
+        self.assertEqual(sorted(self.server.packed_suite_url_list(2)),
+                         sorted(self.server.suite_url_list()))
+
+        for suite in self.suite_desc_list:
+            suite.test_runner.return_value = 'jasmine'
+
+        url_list = self.server.packed_suite_url_list(2, raw_src=True)
+        self.assertEqual(len(url_list), 1)
+
+        url_regex = re.compile(r'^{}pack/(.+)\?raw_src=1$'.format(re.escape(self.server.root_url())))
+        result = url_regex.match(url_list[0])
+        self.assertIsNot(result, None, msg="URL has incorrect format: '{}'".format(url_list[0]))
+        self.assertEqual(sorted(result.group(1).split(',')), ['test-suite-0', 'test-suite-1'])
+
+        # Expect that packs are no larger than the maximum size
+        self.assertEqual(sorted(self.server.packed_suite_url_list(1)),
+                         sorted(self.server.suite_url_list()))
+
+    def test_serve_pack_pages(self):
+
+        expected_page = u'test pack mock'
+        self.suite_renderer.render_pack_to_string.return_value = expected_page
+
+        url = self.server.root_url() + u'pack/test-suite-1,test-suite-0'
+        self._assert_page_equals(url, expected_page)
+
+        # Expect that the suites are rendered in the order of the URL
+        self.suite_renderer.render_pack_to_string.assert_called_once_with(
+            [('test-suite-1', self.suite_desc_list[1]),
+             ('test-suite-0', self.suite_desc_list[0])]
+        )
+
+        # Expect that raw source pages are rendered with raw source URLs
+        self._assert_page_equals(url + '?raw_src=1', expected_page)
+        _, kwargs = self.suite_renderer.render_pack_to_string.call_args
+        self.assertEqual(kwargs.get('src_url_args'), 'raw_src=1')
+
+        # Expect that packs including unknown suites are not found
+        response = requests.get(self.server.root_url() + u'pack/test-suite-0,missing')
+        self.assertEqual(response.status_code, requests.codes.not_found)
+
     def test_serve_runners(self):
 
         for path in ['jasmine/jasmine.css',
@@ -131,7 +210,7 @@ class SuitePageServerTest(TempWorkspaceTestCase):
             pkg_path = 'runner/' + path
             expected_page = pkg_resources.resource_string('js_test_tool', pkg_path)
             url = self.server.root_url() + pkg_path
-            self._assert_page_equals(url, expected_page)
+            self._assert_page_equals(url, expected_page, headers=self.IDENTITY_HEADERS)
 
     def test_ignore_runner_get_params(self):
 
@@ -147,7 +226,40 @@ class SuitePageServerTest(TempWorkspaceTestCase):
             url = self.server.root_url() + pkg_path + "?param=abc.123&another=87"
 
             # Should still be able to load the page
-            self._assert_page_equals(url, expected_page)
+            self._assert_page_equals(url, expected_page, headers=self.IDENTITY_HEADERS)
+
+    def test_runner_etags(self):
+
+        url = self.server.root_url() + 'runner/jasmine/jasmine.js'
+        etag = requests.get(url).headers.get('etag')
+        self.assertEqual(etag, '"{}"'.format(runner_digest('jasmine/jasmine.js')))
+
+        # Expect that the runner is not sent again if the client has it
+        response = requests.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, requests.codes.not_modified)
+        self.assertEqual(response.content, '')
+        self.assertEqual(response.headers.get('etag'), etag)
+
+        response = requests.get(url, headers={'If-None-Match': '"other"'})
+        self.assertEqual(response.status_code, requests.codes.ok)
+
+    def test_gzip_runners(self):
+
+        url = self.server.root_url() + 'runner/jasmine/jasmine.js'
+        expected_page = pkg_resources.resource_string('js_test_tool', 'runner/jasmine/jasmine.js')
+
+        # Expect that the runner is compressed if the client accepts it
+        response = requests.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers.get('content-encoding'), 'gzip')
+        self.assertEqual(response.headers.get('vary'), 'Accept-Encoding')
+        self.assertLess(int(response.headers.get('content-length')), len(expected_page))
+        self.assertEqual(response.content, expected_page)
+
+        # Expect that the runner is not compressed otherwise
+        for accept_encoding in ['identity', 'gzip;q=0']:
+            response = requests.get(url, headers={'Accept-Encoding': accept_encoding})
+            self.assertNotIn('content-encoding', response.headers)
+            self.assertEqual(response.content, expected_page)
 
     def test_serve_lib_js(self):
 
@@ -165,6 +277,83 @@ class SuitePageServerTest(TempWorkspaceTestCase):
             url = self.server.root_url() + 'suite/test-suite-0/include/' + path
             self._assert_page_equals(url, expected_page)
 
+    def test_serve_assets(self):
+
+        # Configure the suite description to contain a library
+        self.suite_desc_list[0].lib_paths.return_value = ['lib/1.js']
+        self.suite_desc_list[0].spec_paths.return_value = ['spec.js']
+
+        # The server found the libraries when it started,
+        # so find them again
+        self.server.lib_asset_index = LibAssetIndex(self.server.desc_dict)
+
+        os.makedirs('lib')
+        expected_page = u'\u0236est \u023Dib file'
+        self._create_fake_files(['lib/1.js', 'spec.js'], expected_page)
+
+        lib_digest = file_digest(os.path.abspath('lib/1.js'))
+        jasmine_digest = runner_digest('jasmine/jasmine.js')
+
+        # Expect that libraries and runner assets are served at
+        # their asset URLs, and that browsers may cache them
+        asset_url = self.server.root_url() + 'asset/{}/lib/1.js'.format(lib_digest)
+        self._assert_page_equals(asset_url, expected_page)
+        self.assertEqual(requests.get(asset_url).headers.get('cache-control'),
+                         ASSET_CACHE_CONTROL)
+
+        runner_url = self.server.root_url() + 'asset/{}/jasmine/jasmine.js'.format(jasmine_digest)
+        expected_runner = pkg_resources.resource_string('js_test_tool', 'runner/jasmine/jasmine.js')
+        self._assert_page_equals(runner_url, expected_runner, encoding=None,
+                                 headers=self.IDENTITY_HEADERS)
+
+        # Expect that other pages are not cached indefinitely
+        lib_url = self.server.root_url() + 'suite/test-suite-0/include/lib/1.js'
+        self.assertNotIn('cache-control', requests.get(lib_url).headers)
+
+        # Expect that files are not served if the digest does not
+        # match, or if they are not libraries
+        for path in ['asset/0123456789abcdef/lib/1.js',
+                     'asset/{}/lib/1.js'.format(jasmine_digest),
+                     'asset/{}/spec.js'.format(file_digest(os.path.abspath('spec.js')))]:
+            response = requests.get(self.server.root_url() + path)
+            self.assertEqual(response.status_code, requests.codes.not_found, msg=path)
+            self.assertNotIn('cache-control', response.headers)
+
+    def test_lib_asset_index(self):
+
+        # Configure the suite descriptions to contain libraries
+        os.makedirs('lib')
+        self._create_fake_files(['lib/1.js', 'lib/2.js'], u'lib')
+
+        self.suite_desc_list[0].lib_paths.return_value = ['lib/1.js']
+        self.suite_desc_list[1].lib_paths.return_value = ['lib/2.js']
+
+        for suite_desc in self.suite_desc_list:
+            suite_desc.lib_paths.reset_mock()
+
+        index = LibAssetIndex(self.server.desc_dict)
+        index.load()
+
+        # Expect that each library is found by its contents,
+        # without searching the suites' library paths again
+        for _ in range(3):
+            for path in ['lib/1.js', 'lib/2.js']:
+                full_path = os.path.abspath(path)
+                self.assertEqual(index.lib_path(file_digest(full_path), path), full_path)
+
+        self.assertIsNone(index.lib_path('0123456789abcdef', 'lib/1.js'))
+        self.assertIsNone(index.lib_path(file_digest(os.path.abspath('lib/1.js')), 'lib/3.js'))
+
+        for suite_desc in self.suite_desc_list:
+            self.assertEqual(suite_desc.lib_paths.call_count, 1)
+
+        # Expect that a library that changed is served at its new digest
+        with open('lib/1.js', 'w') as lib_file:
+            lib_file.write('changed')
+
+        full_path = os.path.abspath('lib/1.js')
+        self.assertEqual(index.lib_path(file_digest(full_path), 'lib/1.js'), full_path)
+
     def test_serve_src_js(self):
 
         # Configure the suite description to contain JS source files
@@ -213,6 +402,56 @@ class SuitePageServerTest(TempWorkspaceTestCase):
             url = self.server.root_url() + 'suite/test-suite-0/include/' + path
             self._assert_page_equals(url, expected_page)
 
+    def test_serve_fixture_bundle(self):
+
+        fixture_paths = ['fixtures/1.html', 'fixtures/subdir/2.html']
+        self.suite_desc_list[0].fixture_paths.return_value = fixture_paths
+        self.suite_desc_list[0].preload_fixtures.return_value = True
+
+        os.makedirs('fixtures/subdir')
+        self._create_fake_files(fixture_paths, u'test fi\u039Eture')
+
+        # Expect that the server sends all the fixtures at once
+        response = requests.get(self.server.root_url() + 'suite/test-suite-0/fixtures.json')
+        self.assertEqual(response.status_code, requests.codes.ok)
+        self.assertEqual(response.json(), {'fixtures/1.html': u'test fi\u039Eture',
+                                           'fixtures/subdir/2.html': u'test fi\u039Eture'})
+
+        # Expect that suites that do not preload fixtures have no bundle
+        response = requests.get(self.server.root_url() + 'suite/test-suite-1/fixtures.json')
+        self.assertEqual(response.status_code, requests.codes.not_found)
+
+    def test_serve_module_manifest(self):
+
+        self.suite_desc_list[0].test_runner.return_value = 'jasmine_requirejs'
+        self.suite_desc_list[0].requirejs_baseUrl.return_value = ''
+        self.suite_desc_list[0].requirejs_path_map.return_value = {}
+        self.suite_desc_list[0].spec_paths.return_value = ['main.js', 'unused.js']
+        self._create_fake_files(['main.js'], u'require(["spec"]);')
+        self._create_fake_files(['spec.js', 'unused.js'], u'define([], function() {});')
+
+        # Expect that the server reports the modules reachable from main
+        response = requests.get(self.server.root_url() + 'suite/test-suite-0/modules.json')
+        self.assertEqual(response.status_code, requests.codes.ok)
+        self.assertEqual(response.json()['modules'], {'main': 'main.js', 'spec': 'spec.js'})
+        self.assertEqual(response.json()['unreachable'], ['unused.js'])
+
+        # Expect that suites that do not use RequireJS have no manifest
+        self.suite_desc_list[1].test_runner.return_value = 'jasmine'
+        response = requests.get(self.server.root_url() + 'suite/test-suite-1/modules.json')
+        self.assertEqual(response.status_code, requests.codes.not_found)
+
+    def test_serve_shard_durations(self):
+
+        url = self.server.root_url() + 'shard-durations.json'
+        self.assertEqual(requests.get(url).json(), {})
+
+        # Expect that pages requested later see the new durations
+        self.server.set_shard_durations({'Adder tests': 1.5})
+        response = requests.get(url + '?param=12345')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'Adder tests': 1.5})
+
     def test_serve_binary_fixtures(self):
 
         # Configure the suite description to contain binary fixture files
@@ -435,7 +674,7 @@ class SuitePageServerTest(TempWorkspaceTestCase):
         response = requests.get(self.server.root_url() + 'not_found.txt')
         self.assertEqual(response.status_code, requests.codes.not_found)
 
-    def _assert_page_equals(self, url, expected_content, encoding='utf-8'):
+    def _assert_page_equals(self, url, expected_content, encoding='utf-8', headers=None):
         """
         Assert that the page at `url` contains `expected_content`.
         Uses a GET HTTP request to retrieve the page and expects
@@ -443,10 +682,12 @@ class SuitePageServerTest(TempWorkspaceTestCase):
 
         `encoding` is the expected encoding.  If None, expect
         an unencoded byte string.
+
+        `headers` is an optional dict of headers to send with the request.
         """
 
         # HTTP GET request for the page
-        response = requests.get(url)
+        response = requests.get(url, headers=headers)
 
         # Expect that we get a success result code
         self.assertEqual(response.status_code, requests.codes.ok, msg=url)
@@ -495,6 +736,25 @@ class SuitePageServerTest(TempWorkspaceTestCase):
                 fake_file.write(encoded_contents)
 
 
+class PooledSuitePageServerTest(SuitePageServerTest):
+    """
+    Serve the same pages using worker pools.
+    """
+
+    WORKERS = 2
+
+    def test_reject_when_busy(self):
+
+        # Simulate a full queue
+        request = mock.MagicMock(socket.socket)
+        with mock.patch.object(self.server._fast_pool, 'submit', return_value=False):
+            self.server.process_request(request, ('127.0.0.1', 1234))
+
+        # Expect that the client is told to retry
+        request.sendall.assert_called_once_with(BUSY_RESPONSE)
+        self.assertTrue(request.close.called)
+
+
 class SuiteServerCoverageTest(TempWorkspaceTestCase):
     """
     Test that the suite page server correctly collects
@@ -652,6 +912,306 @@ class SuiteServerCoverageTest(TempWorkspaceTestCase):
         response = requests.get(url, timeout=0.1)
         self.assertEqual(response.text, expected_page)
 
+    @mock.patch('js_test_tool.suite_server.SrcInstrumenter')
+    def test_does_not_instrument_excluded_src_files(self, instrumenter_cls):
+
+        # Configure the instrumenter class to return a mock
+        instr_mock = mock.MagicMock(SrcInstrumenter)
+        instrumenter_cls.return_value = instr_mock
+        instr_mock.instrumented_src.return_value = u"instrumented"
+
+        # Create a description that excludes one source from instrumentation
+        mock_desc = self._mock_suite_desc(
+            'test-suite-0', os.getcwd(), ['src.js', 'vendor.js'],
+            instrument_exclude=['vendor.js']
+        )
+
+        # Create the uninstrumented version of the excluded source
+        expected_page = 'vendor source'
+        with open('vendor.js', 'w') as src_file:
+            src_file.write(expected_page)
+
+        server = SuitePageServer([mock_desc],
+                                 mock.MagicMock(SuiteRenderer),
+                                 jscover_path=self.JSCOVER_PATH)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # Expect that the excluded source is served without instrumentation
+        url = server.root_url() + "suite/test-suite-0/include/vendor.js"
+        response = requests.get(url, timeout=0.1)
+        self.assertEqual(response.text, expected_page)
+        self.assertFalse(instr_mock.instrumented_src.called)
+
+        # Expect that the other source is still instrumented
+        url = server.root_url() + "suite/test-suite-0/include/src.js"
+        response = requests.get(url, timeout=0.1)
+        self.assertEqual(response.text, u"instrumented")
+
+        # Expect that we do not wait for coverage of the excluded source
+        self.assertEqual(server.coverage_data.src_list(),
+                         [os.path.join(os.getcwd(), 'src.js')])
+
+    @mock.patch('js_test_tool.suite_server.SrcInstrumenter')
+    def test_serves_raw_src_when_requested(self, instrumenter_cls):
+
+        # Configure the instrumenter class to return a mock
+        instr_mock = mock.MagicMock(SrcInstrumenter)
+        instrumenter_cls.return_value = instr_mock
+        instr_mock.instrumented_src.return_value = u"instrumented"
+
+        mock_desc = self._mock_suite_desc('test-suite-0', os.getcwd(), ['src.js'])
+
+        expected_page = 'raw source'
+        with open('src.js', 'w') as src_file:
+            src_file.write(expected_page)
+
+        server = SuitePageServer([mock_desc],
+                                 mock.MagicMock(SuiteRenderer),
+                                 jscover_path=self.JSCOVER_PATH)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # Expect that the flag bypasses the instrumenter
+        url = server.root_url() + "suite/test-suite-0/include/src.js?raw_src=1"
+        response = requests.get(url, timeout=0.1)
+        self.assertEqual(response.text, expected_page)
+        self.assertFalse(instr_mock.instrumented_src.called)
+
+    @mock.patch('js_test_tool.suite_server.SrcInstrumenter')
+    def test_serves_instrumented_source_files_from_pool(self, instrumenter_cls):
+
+        instr_mock = mock.MagicMock(SrcInstrumenter)
+        instrumenter_cls.return_value = instr_mock
+        instr_mock.instrumented_src.return_value = u"instrumented"
+
+        mock_desc = self._mock_suite_desc('test-suite-0', os.getcwd(), ['src.js'],
+                                          lib_paths=['lib.js'])
+        with open('lib.js', 'w') as lib_file:
+            lib_file.write('lib')
+
+        server = SuitePageServer([mock_desc], mock.MagicMock(SuiteRenderer),
+                                 jscover_path=self.JSCOVER_PATH, workers=2)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # Expect that sources and libraries are both served
+        include_url = server.root_url() + "suite/test-suite-0/include/"
+        self.assertEqual(requests.get(include_url + 'src.js', timeout=1.0).text, u'instrumented')
+        self.assertEqual(requests.get(include_url + 'lib.js', timeout=1.0).text, u'lib')
+
+    @mock.patch('js_test_tool.suite_server.SrcInstrumenter')
+    @mock.patch.object(SuitePageServer, 'POOL_QUEUE_SIZE', 1)
+    def test_saturated_slow_pool(self, instrumenter_cls):
+
+        # Block the instrumenter until released, so the slow pool fills up
+        release = threading.Event()
+        instr_mock = mock.MagicMock(SrcInstrumenter)
+        instr_mock.instrumented_src.side_effect = lambda path: (release.wait(5.0), u'instrumented')[1]
+        instrumenter_cls.return_value = instr_mock
+
+        server = SuitePageServer([self._mock_suite_desc('test-suite-0', '/root', ['src.js'])],
+                                 mock.MagicMock(SuiteRenderer),
+                                 jscover_path=self.JSCOVER_PATH, workers=2)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # Request more sources than the slow pool can hold,
+        # and post coverage behind them
+        responses = []
+        src_url = server.root_url() + 'suite/test-suite-0/include/src.js'
+        post_url = server.root_url() + 'jscoverage-store/test-suite-0'
+        coverage_data = json.dumps({'/src.js': {'lineData': [1, 0]}})
+
+        threads = [threading.Thread(target=lambda: responses.append(
+                       requests.get(src_url, timeout=10.0)))
+                   for _ in range(6)]
+        threads.append(threading.Thread(target=lambda: responses.append(
+            requests.post(post_url, data=coverage_data, timeout=10.0))))
+
+        for thread in threads:
+            thread.start()
+
+        time.sleep(0.5)
+        release.set()
+
+        for thread in threads:
+            thread.join()
+
+        # Expect that every request waited rather than being rejected,
+        # and that the coverage arrived
+        self.assertEqual([response.status_code for response in responses], [200] * 7)
+        self.assertEqual(server.coverage_data.line_dict_for_src('/root/src.js'),
+                         {0: True, 1: False})
+
+    @mock.patch('js_test_tool.suite_server.SrcInstrumenter')
+    def test_slow_requests(self, _):
+
+        mock_desc = self._mock_suite_desc('test-suite-0', '/root', ['src.js', 'vendor.js'],
+                                          instrument_exclude=['vendor.js'])
+        server = SuitePageServer([mock_desc], mock.MagicMock(SuiteRenderer),
+                                 jscover_path=self.JSCOVER_PATH, workers=2)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # Instrumented sources and coverage reports wait on JSCover
+        self.assertTrue(server.is_slow_request('GET', '/suite/test-suite-0/include/src.js'))
+        self.assertTrue(server.is_slow_request('POST', '/jscoverage-store/test-suite-0'))
+
+        # Everything else can be served right away
+        self.assertFalse(server.is_slow_request('GET', '/suite/test-suite-0/include/src.js?raw_src=1'))
+        self.assertFalse(server.is_slow_request('GET', '/suite/test-suite-0/include/vendor.js'))
+        self.assertFalse(server.is_slow_request('GET', '/suite/test-suite-1/include/src.js'))
+        self.assertFalse(server.is_slow_request('GET', '/suite/test-suite-0'))
+        self.assertFalse(server.is_slow_request(None, None))
+
+    @mock.patch('js_test_tool.suite_server.SrcInstrumenter')
+    def test_reset_coverage(self, _):
+
+        server = SuitePageServer([self._mock_suite_desc('test-suite-0', '/root', ['src.js'])],
+                                 mock.MagicMock(SuiteRenderer),
+                                 jscover_path=self.JSCOVER_PATH)
+        server.start()
+        self.addCleanup(server.stop)
+
+        server.coverage_data.add_suite_name('test-suite-0')
+        server.reset_coverage()
+
+        # Expect that the sources are still expected,
+        # but the coverage received is discarded
+        self.assertEqual(server.coverage_data.src_list(), ['/root/src.js'])
+        self.assertEqual(server.coverage_data.suite_name_list(), [])
+
+    @mock.patch('js_test_tool.suite_server.SrcInstrumenter')
+    def test_worker_processes(self, _):
+
+        # Create a dependency to serve
+        with open(os.path.join(self.temp_dir, 'lib.js'), 'w') as lib_file:
+            lib_file.write('lib')
+
+        mock_desc = self._mock_suite_desc('test-suite-0', self.temp_dir, ['src.js'],
+                                          lib_paths=['lib.js'])
+        mock_desc.prepend_path.return_value = ''
+        renderer = mock.MagicMock(SuiteRenderer)
+        renderer.render_to_string.return_value = u'suite page'
+
+        server = SuitePageServer([mock_desc], renderer,
+                                 jscover_path=self.JSCOVER_PATH, processes=2)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # Expect that the workers serve the pages rendered before forking
+        suite_url = server.suite_url_list()[0]
+        self.assertEqual(requests.get(suite_url, timeout=1.0).text, u'suite page')
+
+        include_url = server.root_url() + "suite/test-suite-0/include/lib.js"
+        self.assertEqual(requests.get(include_url, timeout=1.0).text, u'lib')
+
+        # Expect that coverage POSTed to a worker is merged in this process
+        coverage_data = {'src.js': {'lineData': [1, 0]}}
+        requests.post(server.root_url() + "jscoverage-store/test-suite-0",
+                      data=json.dumps(coverage_data),
+                      timeout=1.0)
+
+        with mock.patch.object(SuitePageServer, 'COVERAGE_TIMEOUT', 5.0):
+            result_data = server.all_coverage_data()
+
+        src_path = os.path.join(self.temp_dir, 'src.js')
+        self.assertEqual(result_data.suite_name_list(), ['test-suite-0'])
+        self.assertEqual(result_data.src_list(), [src_path])
+        self.assertEqual(result_data.line_dict_for_src(src_path), {0: True, 1: False})
+
+    def test_serve_compiled_suites(self):
+
+        with open(os.path.join(self.temp_dir, 'src.js'), 'w') as src_file:
+            src_file.write('src')
+
+        mock_desc = self._mock_suite_desc('test-suite-0', self.temp_dir, ['src.js'])
+        mock_desc.prepend_path.return_value = ''
+        mock_desc.test_runner.return_value = 'jasmine'
+
+        renderer = mock.MagicMock(SuiteRenderer)
+        renderer.render_to_string.return_value = u'suite page'
+
+        instr = mock.MagicMock(SrcInstrumenter)
+        instr.instrumented_src.return_value = u'instrumented'
+
+        compiler = SuiteCompiler(renderer, jscover_path=self.JSCOVER_PATH,
+                                 instrumenter_class=mock.MagicMock(return_value=instr))
+        compiled = compiler.compile([mock_desc], os.path.join(self.temp_dir, 'compiled'))
+
+        # Serve the compiled suites, without rendering or instrumenting
+        server = SuitePageServer(compiled.descriptions(), None, compiled=compiled)
+        server.start()
+        self.addCleanup(server.stop)
+        renderer.reset_mock()
+        instr.reset_mock()
+
+        self._assert_response(server.suite_url_list()[0], u'suite page')
+        self._assert_response(server.root_url() + "suite/test-suite-0/include/src.js", u'instrumented')
+        self._assert_response(server.root_url() + "suite/test-suite-0/include/src.js?raw_src=1", u'src')
+        self._assert_response(server.root_url() + "runner/jasmine/jasmine.js",
+                              pkg_resources.resource_string('js_test_tool', 'runner/jasmine/jasmine.js'))
+
+        self.assertEqual(requests.get(server.root_url() + "suite/test-suite-0/include/other.js",
+                                      timeout=1.0).status_code, 404)
+        self.assertFalse(renderer.render_to_string.called)
+        self.assertFalse(instr.instrumented_src.called)
+
+        # Expect that coverage from the instrumented sources is stored
+        coverage_data = {'src.js': {'lineData': [1]}}
+        requests.post(server.root_url() + "jscoverage-store/test-suite-0",
+                      data=json.dumps(coverage_data),
+                      timeout=1.0)
+
+        result_data = server.all_coverage_data()
+        self.assertEqual(result_data.src_list(), [os.path.join(self.temp_dir, 'src.js')])
+
+    def test_page_cache(self):
+
+        mock_desc = self._mock_suite_desc('test-suite-0', '/root', ['src.js', 'vendor.js'],
+                                          lib_paths=['lib.js'], spec_paths=['spec.js'])
+        renderer = mock.MagicMock(SuiteRenderer)
+        renderer.render_to_string.side_effect = \
+            lambda name, desc, src_url_args=u'': u'page \u1234 ' + src_url_args
+
+        cache = PageCache({'test-suite-0': mock_desc}, renderer,
+                          {'test-suite-0': set(['src.js'])})
+
+        # Expect that pages are stored as byte strings
+        self.assertEqual(cache.suite_page('test-suite-0', False), u'page \u1234 '.encode('utf-8'))
+        self.assertEqual(cache.suite_page('test-suite-0', True), u'page \u1234 raw_src=1'.encode('utf-8'))
+        self.assertIs(cache.suite_page('other-suite', False), None)
+
+        self.assertEqual(cache.dependency_paths('test-suite-0'),
+                         frozenset(['lib.js', 'src.js', 'vendor.js', 'spec.js']))
+        self.assertEqual(cache.instrumented_src_paths('test-suite-0'), frozenset(['src.js']))
+        self.assertEqual(cache.dependency_paths('other-suite'), frozenset())
+
+    @mock.patch('js_test_tool.suite_server.SrcInstrumenter')
+    def test_no_coverage_expected_without_instrumented_src(self, _):
+
+        # Neither source in the second suite is instrumented
+        mock_desc_list = [
+            self._mock_suite_desc('test-suite-0', '/root_1', ['src.js']),
+            self._mock_suite_desc('test-suite-1', '/root_2', ['vendor.js'],
+                                  instrument_exclude=['vendor.js'])
+        ]
+
+        server = SuitePageServer(mock_desc_list, mock.MagicMock(SuiteRenderer),
+                                 jscover_path=self.JSCOVER_PATH)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # Expect that coverage from the first suite is enough
+        coverage_data = {'src.js': {'lineData': [1]}}
+        requests.post(server.root_url() + "jscoverage-store/test-suite-0",
+                      data=json.dumps(coverage_data),
+                      timeout=1.0)
+
+        result_data = server.all_coverage_data()
+        self.assertEqual(result_data.src_list(), ['/root_1/src.js'])
+
     def test_collects_POST_coverage_info(self):
 
         # Start the page server
@@ -681,6 +1241,34 @@ class SuiteServerCoverageTest(TempWorkspaceTestCase):
         self.assertEqual(result_data.line_dict_for_src('/root/src.js'),
                          {0: True, 1: False, 3: True, 4: True, 6: False})
 
+    @mock.patch('js_test_tool.suite_server.SrcInstrumenter')
+    def test_collects_packed_coverage_info(self, _):
+
+        # Start the page server with two suites sharing a root directory
+        mock_desc_list = [self._mock_suite_desc('test-suite-0', '/root', ['src0.js']),
+                          self._mock_suite_desc('test-suite-1', '/root', ['src1.js'])]
+
+        server = SuitePageServer(mock_desc_list, mock.MagicMock(SuiteRenderer),
+                                 jscover_path=self.JSCOVER_PATH)
+        server.start()
+        self.addCleanup(server.stop)
+
+        # A packed page posts the coverage of every suite in the page
+        # once for each suite
+        coverage_data = {'/src0.js': {'lineData': [1, 0]},
+                         '/src1.js': {'lineData': [0, 1]}}
+
+        for suite_name in ['test-suite-0', 'test-suite-1']:
+            requests.post(server.root_url() + "jscoverage-store/{}/pack".format(suite_name),
+                          data=json.dumps(coverage_data),
+                          timeout=0.1)
+
+        # Expect that each suite kept only the coverage of its own sources
+        result_data = server.all_coverage_data()
+        self.assertEqual(sorted(result_data.src_list()), ['/root/src0.js', '/root/src1.js'])
+        self.assertEqual(result_data.line_dict_for_src('/root/src0.js'), {0: True, 1: False})
+        self.assertEqual(result_data.line_dict_for_src('/root/src1.js'), {0: False, 1: True})
+
     def test_uncovered_src(self):
 
         # Create the source file -- we need to do this
@@ -743,9 +1331,23 @@ class SuiteServerCoverageTest(TempWorkspaceTestCase):
         with self.assertRaises(TimeoutError):
             server.all_coverage_data()
 
+    def _assert_response(self, url, expected_content):
+        """
+        Assert that the page at `url` has `expected_content`
+        (a unicode or byte string).
+        """
+        response = requests.get(url, timeout=1.0)
+        self.assertEqual(response.status_code, 200)
+
+        if isinstance(expected_content, unicode):
+            self.assertEqual(response.text, expected_content)
+        else:
+            self.assertEqual(response.content, expected_content)
+
     @staticmethod
     def _mock_suite_desc(suite_name, root_dir, src_paths,
-                         lib_paths=None, spec_paths=None):
+                         lib_paths=None, spec_paths=None,
+                         instrument_exclude=None):
         """
         Configure a mock `SuiteDescription` to have `root_dir` as its
         base directory and to list `src_paths` as its JavaScript
@@ -756,6 +1358,8 @@ class SuiteServerCoverageTest(TempWorkspaceTestCase):
 
         If `lib_paths` or `spec_paths` (lists of paths) are used,
         configure the description to use those lib and spec file paths.
+
+        Sources listed in `instrument_exclude` are not instrumented.
         """
         mock_desc = mock.MagicMock(SuiteDescription)
         mock_desc.suite_name.return_value = suite_name
@@ -774,6 +1378,9 @@ class SuiteServerCoverageTest(TempWorkspaceTestCase):
 
         mock_desc.fixture_paths.return_value = []
 
+        excluded = instrument_exclude or []
+        mock_desc.should_instrument.side_effect = lambda path: path not in excluded
+
         return mock_desc
 
 
@@ -0,0 +1,111 @@
+import threading
+import time
+import unittest
+from Queue import Empty
+from js_test_tool.worker_pool import WorkerPool
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def test_handle_items(self):
+        pool = WorkerPool('test', 2, self.handled.append, 10)
+        pool.start()
+
+        for item in range(5):
+            self.assertTrue(pool.submit(item))
+
+        self._wait_for_handled(5)
+        self.assertEqual(pool.stop(), [])
+        self.assertEqual(sorted(self.handled), range(5))
+
+    def test_full_queue(self):
+        pool = self._blocked_pool(max_queued=2)
+
+        # One item is being handled, and two are waiting
+        self.assertTrue(pool.submit('queued 1'))
+        self.assertTrue(pool.submit('queued 2'))
+
+        # Expect that further items are rejected
+        self.assertFalse(pool.submit('rejected'))
+        self.assertFalse(pool.submit('rejected', timeout=0.01))
+        self.assertEqual(pool.num_queued(), 2)
+
+        self.release.set()
+        pool.stop()
+
+    def test_stop_returns_unhandled(self):
+        pool = self._blocked_pool(max_queued=2)
+        pool.submit('queued')
+
+        # Signal when `stop()` has taken every item from the queue
+        drained = threading.Event()
+        get_nowait = pool._queue.get_nowait
+
+        def _get_nowait():
+            try:
+                return get_nowait()
+            except Empty:
+                drained.set()
+                raise
+
+        pool._queue.get_nowait = _get_nowait
+
+        # Stop the pool in another thread, since it waits
+        # for the blocked item to finish.  Release the worker only
+        # once the queue is drained, so it cannot take the queued item.
+        result = []
+        stop_thread = threading.Thread(target=lambda: result.extend(pool.stop()))
+        stop_thread.start()
+
+        drained.wait()
+        self.release.set()
+        stop_thread.join()
+
+        self.assertEqual(result, ['queued'])
+        self.assertEqual(self.handled, ['blocking'])
+
+    def test_handler_error(self):
+
+        def _handle(item):
+            if item == 'bad':
+                raise ValueError('Bad item')
+            self.handled.append(item)
+
+        pool = WorkerPool('test', 1, _handle, 10)
+        pool.start()
+        pool.submit('bad')
+        pool.submit('good')
+        self._wait_for_handled(1)
+        pool.stop()
+
+        # Expect that the worker survived the error
+        self.assertEqual(self.handled, ['good'])
+
+    def _wait_for_handled(self, num_items):
+        """
+        Wait until `num_items` items have been handled.
+        """
+        deadline = time.time() + 5
+        while len(self.handled) < num_items and time.time() < deadline:
+            time.sleep(0.01)
+
+    def _blocked_pool(self, max_queued):
+        """
+        Return a started pool with one worker, which is
+        handling an item until `self.release` is set.
+        """
+        def _handle(item):
+            self.started.set()
+            self.release.wait()
+            self.handled.append(item)
+
+        pool = WorkerPool('test', 1, _handle, max_queued)
+        pool.start()
+        pool.submit('blocking')
+        self.started.wait()
+        return pool
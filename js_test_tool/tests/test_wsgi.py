@@ -0,0 +1,167 @@
+import os
+import json
+import gzip
+import mock
+import pkg_resources
+from StringIO import StringIO
+from wsgiref import util as wsgi_util
+from js_test_tool.tests.helpers import TempWorkspaceTestCase
+from js_test_tool.suite import SuiteDescription, SuiteRenderer
+from js_test_tool.suite_server import DuplicateSuiteNameError
+from js_test_tool.coverage import SrcInstrumenter, CoverageData
+from js_test_tool.wsgi import SuitePageApp
+from js_test_tool.assets import runner_digest, ASSET_CACHE_CONTROL
+
+
+class SuitePageAppTest(TempWorkspaceTestCase):
+
+    def setUp(self):
+        super(SuitePageAppTest, self).setUp()
+
+        self.suite_desc = mock.MagicMock(SuiteDescription)
+        self.suite_desc.suite_name.return_value = 'test-suite'
+        self.suite_desc.root_dir.return_value = self.temp_dir
+        self.suite_desc.prepend_path.return_value = ''
+        self.suite_desc.lib_paths.return_value = ['lib/lib.js']
+        self.suite_desc.src_paths.return_value = ['src.js']
+        self.suite_desc.spec_paths.return_value = []
+        self.suite_desc.fixture_paths.return_value = []
+        self.suite_desc.should_instrument.return_value = True
+
+        os.makedirs('lib')
+        with open('lib/lib.js', 'w') as lib_file:
+            lib_file.write('0123456789')
+
+        self.renderer = mock.MagicMock(SuiteRenderer)
+        self.renderer.render_to_string.return_value = u'suite \u0236age'
+
+        self.app = SuitePageApp([self.suite_desc], self.renderer)
+
+    def test_serve_suite_page(self):
+        status, headers, body = self._request('/suite/test-suite')
+
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, u'suite \u0236age'.encode('utf-8'))
+        self.assertEqual(headers['Content-Type'], 'text/html; charset=utf-8')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+
+    def test_raw_src_suite_page(self):
+        self._request('/suite/test-suite', query='raw_src=1')
+
+        _, kwargs = self.renderer.render_to_string.call_args
+        self.assertEqual(kwargs.get('src_url_args'), 'raw_src=1')
+
+    def test_serve_runner(self):
+        status, _, body = self._request('/runner/jasmine/jasmine.js')
+
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, pkg_resources.resource_string('js_test_tool',
+                                                             'runner/jasmine/jasmine.js'))
+
+    def test_serve_asset(self):
+        digest = runner_digest('jasmine/jasmine.js')
+        status, headers, body = self._request('/asset/{}/jasmine/jasmine.js'.format(digest))
+
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, pkg_resources.resource_string('js_test_tool',
+                                                             'runner/jasmine/jasmine.js'))
+        self.assertEqual(headers['Cache-Control'], ASSET_CACHE_CONTROL)
+
+    def test_runner_not_modified(self):
+        _, headers, _ = self._request('/runner/jasmine/jasmine.js')
+
+        status, _, body = self._request('/runner/jasmine/jasmine.js',
+                                        HTTP_IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(body, '')
+
+    def test_gzip_runner(self):
+        status, headers, body = self._request('/runner/jasmine/jasmine.js',
+                                              HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(body)).read(),
+                         pkg_resources.resource_string('js_test_tool',
+                                                       'runner/jasmine/jasmine.js'))
+
+    def test_serve_dependency(self):
+        status, headers, body = self._request('/suite/test-suite/include/lib/lib.js')
+
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, '0123456789')
+        self.assertEqual(headers['Accept-Ranges'], 'bytes')
+
+    def test_byte_range(self):
+        status, headers, body = self._request('/suite/test-suite/include/lib/lib.js',
+                                              HTTP_RANGE='bytes=2-5')
+
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(body, '2345')
+        self.assertEqual(headers['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(headers['Content-Length'], '4')
+
+    def test_invalid_byte_range(self):
+        status, _, body = self._request('/suite/test-suite/include/lib/lib.js',
+                                        HTTP_RANGE='bytes=5-2')
+
+        self.assertEqual(status, '406 Not Acceptable')
+        self.assertEqual(body, '')
+
+    def test_not_found(self):
+        for path in ['/suite/other-suite', '/suite/test-suite/include/missing.js', '/']:
+            status, _, _ = self._request(path)
+            self.assertEqual(status, '404 Not Found')
+
+    def test_unsupported_method(self):
+        status, _, _ = self._request('/suite/test-suite', method='DELETE')
+        self.assertEqual(status, '501 Not Implemented')
+
+    def test_duplicate_suite_names(self):
+        with self.assertRaises(DuplicateSuiteNameError):
+            SuitePageApp([self.suite_desc, self.suite_desc], self.renderer)
+
+    def test_coverage(self):
+        instr = mock.MagicMock(SrcInstrumenter)
+        instr.instrumented_src.return_value = u'instrumented'
+        coverage_data = CoverageData()
+
+        app = SuitePageApp([self.suite_desc], self.renderer,
+                           src_instr_dict={'test-suite': instr},
+                           coverage_data=coverage_data)
+
+        # Expect that sources are instrumented
+        _, _, body = self._request('/suite/test-suite/include/src.js', app=app)
+        self.assertEqual(body, 'instrumented')
+
+        # Expect that coverage reports are stored
+        report = json.dumps({'src.js': {'lineData': [None, 1, 0]}})
+        status, _, _ = self._request('/jscoverage-store/test-suite', app=app,
+                                     method='POST', body=report)
+
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(coverage_data.suite_name_list(), ['test-suite'])
+        self.assertEqual(coverage_data.line_dict_for_src(os.path.join(self.temp_dir, 'src.js')),
+                         {1: True, 2: False})
+
+    def _request(self, path, query='', method='GET', body='', app=None, **environ_args):
+        """
+        Send a request to `app` (defaults to the app under test).
+        Returns a `(status, headers_dict, body)` tuple.
+        """
+        environ = {'PATH_INFO': path, 'QUERY_STRING': query,
+                   'REQUEST_METHOD': method,
+                   'CONTENT_LENGTH': str(len(body)),
+                   'wsgi.input': StringIO(body)}
+        environ.update(environ_args)
+        wsgi_util.setup_testing_defaults(environ)
+
+        response = {}
+
+        def _start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        body = ''.join((app or self.app)(environ, _start_response))
+        return response['status'], response['headers'], body
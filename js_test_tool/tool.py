@@ -3,28 +3,73 @@ Implement the command-line tool interface.
 """
 
 import argparse
+import re
 import sys
 from textwrap import dedent
 import pkg_resources
 import os.path
 from js_test_tool.runner import SuiteRunnerFactory
 from js_test_tool.dev_runner import SuiteDevRunnerFactory
+from js_test_tool.combine import combine_snapshots
+from js_test_tool.coverage import CoverageData
+from js_test_tool.daemon import SuiteDaemon, DaemonError, run_with_daemon
+from js_test_tool.suite_compiler import CompileError
+from js_test_tool.diff_coverage import ChangedLines, diff_coverage, \
+    format_diff_coverage, git_diff
 
 import logging
 LOGGER = logging.getLogger(__name__)
 
-VALID_COMMANDS = ['init', 'run', 'dev']
+VALID_COMMANDS = ['init', 'run', 'dev', 'combine', 'diff', 'daemon', 'compile']
 
 DESCRIPTION = "Run JavaScript test suites and collect coverage information."
 COMMAND_HELP = dedent("""
         init: Create a default suite description in the current directory.
         run: Run the test suites provided.
         dev: Run the test suite in the default browser.
+        combine: Merge coverage snapshots and write coverage reports.
+        diff: Report coverage of changed lines, using a coverage snapshot.
+        daemon: Keep servers and browsers running for runs using --daemon.
+        compile: Build the suite pages once, for runs using --compiled.
         """).strip()
-TEST_SUITE_HELP = "Test suite description file."
+TEST_SUITE_HELP = "Test suite description file (or coverage snapshot for combine and diff)."
 XUNIT_REPORT_HELP = "Generated XUnit test result report (XML)."
 COVERAGE_XML_HELP = "Generated XML coverage report."
 COVERAGE_HTML_HELP = "Generated HTML coverage report."
+COVERAGE_HTML_DIR_HELP = "Directory in which to generate an HTML coverage page per source file."
+COVERAGE_LCOV_HELP = "Generated LCOV coverage report."
+COVERAGE_SUMMARY_JSON_HELP = "Generated JSON summary of total and per-file coverage."
+COVERAGE_FAIL_UNDER_HELP = "Exit with a non-zero status if total coverage is below this percentage."
+COVERAGE_FILE_FAIL_UNDER_HELP = ("Exit with a non-zero status if any source file's "
+                                 "coverage is below this percentage.")
+COVERAGE_DB_HELP = "SQLite database in which to record coverage for each run."
+COVERAGE_SNAPSHOT_HELP = "Generated coverage snapshot, which can be merged using combine."
+NUM_PROCESSES_HELP = "Number of processes used to merge snapshots (combine only)."
+DIFF_FILE_HELP = "Unified diff of the changed lines (diff only)."
+GIT_RANGE_HELP = "Git revision range of the changed lines, e.g. origin/master...HEAD (diff only)."
+COVERAGE_BROWSER_HELP = ("Collect coverage only from this browser (e.g. chrome); "
+                         "other browsers load sources without instrumentation.")
+COVERAGE_BACKEND_HELP = ("How to collect coverage: 'jscover' instruments the sources, "
+                         "'native' uses Chrome's built-in profiler.")
+JSCOVER_HEAP_HELP = "Maximum heap size of each JSCover JVM, e.g. 1g (passed as -Xmx)."
+SERVER_WORKERS_HELP = ("Handle page requests using this many threads, "
+                       "rather than a thread per connection.")
+SERVER_PROCESSES_HELP = ("Serve pages from this many worker processes "
+                         "sharing the same port.")
+DAEMON_HELP = "Submit the run to a running js-test-tool daemon (run only)."
+SOCKET_HELP = "Local socket used to communicate with the daemon."
+OUTPUT_DIR_HELP = "Directory in which to write the compiled suites (compile only)."
+INSTRUMENT_HELP = "Instrument the compiled sources for coverage using JSCover (compile only)."
+HARDLINK_HELP = "Hard-link dependencies into the output rather than copying them (compile only)."
+COMPILED_HELP = "Run the suites compiled to this directory (run only)."
+PACK_HELP = ("Run up to this many suites that include the same libraries "
+             "in each page load (run only; jasmine runner only).")
+SHARDS_HELP = ("Split the specs of each suite between this many instances "
+               "of each browser, running at once (run only).")
+SHARD_DURATIONS_HELP = ("JSON file recording how long each test group took, "
+                        "used to balance the shards of the next run (run only).")
+TABS_HELP = ("Load up to this many suite pages at once in each browser, "
+             "each in its own tab (run only; Chrome and Firefox only).")
 PORT_HELP = "The port to run the server on (dev only)."
 PHANTOMJS_HELP = "Run the tests using the PhantomJS browser."
 CHROME_HELP = "Run the tests using the Chrome browser."
@@ -43,29 +88,117 @@ def parse_args(argv):
     Parse command line arguments, returning a dict of valid options.
 
         {
-            'command': 'init' | 'run',
+            'command': 'init' | 'run' | 'dev' | 'combine' | 'diff' | 'daemon' | 'compile',
             'test_suite_paths': TEST_SUITE_PATHS,
             'xunit_report': XUNIT_REPORT,
             'coverage_xml': COVERAGE_XML,
             'coverage_html': COVERAGE_HTML,
+            'coverage_html_dir': COVERAGE_HTML_DIR,
+            'coverage_lcov': COVERAGE_LCOV,
+            'coverage_summary_json': COVERAGE_SUMMARY_JSON,
+            'coverage_fail_under': COVERAGE_FAIL_UNDER,
+            'coverage_file_fail_under': COVERAGE_FILE_FAIL_UNDER,
+            'coverage_db': COVERAGE_DB,
+            'coverage_snapshot': COVERAGE_SNAPSHOT,
+            'coverage_browser': COVERAGE_BROWSER,
+            'coverage_backend': COVERAGE_BACKEND,
+            'jscover_heap': JSCOVER_HEAP,
+            'server_workers': SERVER_WORKERS,
+            'server_processes': SERVER_PROCESSES,
+            'daemon': DAEMON,
+            'socket': SOCKET,
+            'output_dir': OUTPUT_DIR,
+            'instrument': INSTRUMENT,
+            'hardlink': HARDLINK,
+            'compiled': COMPILED,
+            'pack': PACK,
+            'shards': SHARDS,
+            'shard_durations': SHARD_DURATIONS,
+            'tabs': TABS,
+            'num_processes': NUM_PROCESSES,
+            'diff_file': DIFF_FILE,
+            'git_range': GIT_RANGE,
             'port': PORT,
             'browser_names': BROWSER_NAMES,
             'timeout_sec': TIMEOUT_SEC
         }
 
-    The command indicates whether to `init` (create a default suite description)
-    or `run` the suite.
+    The command indicates whether to `init` (create a default suite description),
+    `run` the suite, `combine` coverage snapshots, report coverage
+    of the lines changed by a `diff`, start a `daemon` to handle runs,
+    or `compile` the suites' pages and dependencies to a directory.
 
     `TEST_SUITE_PATHS` is a list of paths to files describing the test
     suite to run (source files, spec files, dependencies, browser to use, etc.)
+    For `combine`, these are the paths to the coverage snapshots to merge.
+    For `diff`, this is the path to the baseline coverage snapshot.
 
     `XUNIT_REPORT` is the location to write the XUnit test results (XML).
 
     `COVERAGE_XML` is the name of the coverage XML report to generate.
     `COVERAGE_HTML` is the name of the coverage HTML report to generate.
+    `COVERAGE_HTML_DIR` is the directory in which to generate the
+    per-file HTML coverage report.
+    `COVERAGE_LCOV` is the name of the coverage LCOV report to generate.
+    `COVERAGE_SUMMARY_JSON` is the name of the JSON coverage summary to generate.
 
-    `coverage_xml` and `coverage_html` are optional; if not specified,
-    the dictionary will not contain those keys.
+    `COVERAGE_DB` is the SQLite database in which to record the run's coverage.
+    `COVERAGE_SNAPSHOT` is the coverage snapshot to write.
+
+    `COVERAGE_BROWSER` is the name of the only browser from which
+    to collect coverage (or None to collect from every browser).
+
+    `COVERAGE_BACKEND` is "jscover" (the default) or "native".
+
+    `JSCOVER_HEAP` is the maximum heap size of the JSCover JVMs
+    (e.g. "1g"), or None to use the JVM's default.
+
+    `SERVER_WORKERS` is the number of threads the page server uses
+    to handle requests (None for a thread per connection).
+
+    `SERVER_PROCESSES` is the number of worker processes
+    the page server forks (None to serve from this process).
+
+    `DAEMON` is True if the run should be submitted to a daemon
+    listening on `SOCKET` (the default socket if None).
+    The `daemon` command listens on `SOCKET`, and takes no
+    test suite paths.
+
+    The following keys are used only by the `compile` command,
+    which compiles the suites described by `TEST_SUITE_PATHS`:
+
+    * `OUTPUT_DIR` is the directory to write the compiled suites to
+      (required).
+    * `INSTRUMENT` is True to instrument the sources for coverage.
+    * `HARDLINK` is True to hard-link dependencies into the output
+      rather than copying them.
+
+    `COMPILED` is the directory of compiled suites to run,
+    in which case `run` takes no test suite paths.
+
+    `PACK` is the maximum number of suites to run in one page
+    load, or None to run each suite in its own page.
+
+    `SHARDS` is the number of browser instances between which
+    the specs of each suite are split (None to run them in one).
+    `SHARD_DURATIONS` is the JSON file in which test group
+    durations are recorded to balance the shards (or None).
+
+    `TABS` is the number of pages each browser loads at once,
+    or None to load one page at a time.
+
+    `coverage_xml`, `coverage_html`, `coverage_html_dir`, `coverage_lcov`,
+    `coverage_summary_json`, `coverage_db` and `coverage_snapshot`
+    are optional; if not specified, their values will be None.
+
+    `COVERAGE_FAIL_UNDER` and `COVERAGE_FILE_FAIL_UNDER` are the minimum
+    total and per-file coverage percentages (or None).
+
+    `NUM_PROCESSES` is the number of processes used to combine
+    snapshots (None means one per CPU).
+
+    `DIFF_FILE` is the path to a unified diff, and `GIT_RANGE` is a git
+    revision range; `diff` requires exactly one of them.
 
     `BROWSER_NAMES` is the list of browsers under which to run the tests.
 
@@ -84,7 +217,7 @@ def parse_args(argv):
     parser.add_argument('command', type=str, help=COMMAND_HELP)
 
     # Test suite description files
-    parser.add_argument('test_suite_paths', type=str, nargs='+',
+    parser.add_argument('test_suite_paths', type=str, nargs='*',
                         help=TEST_SUITE_HELP)
 
     # XUnit report path
@@ -93,6 +226,60 @@ def parse_args(argv):
     # Coverage output files
     parser.add_argument('--coverage-xml', type=str, help=COVERAGE_XML_HELP)
     parser.add_argument('--coverage-html', type=str, help=COVERAGE_HTML_HELP)
+    parser.add_argument('--coverage-html-dir', type=str, help=COVERAGE_HTML_DIR_HELP)
+    parser.add_argument('--coverage-lcov', type=str, help=COVERAGE_LCOV_HELP)
+    parser.add_argument('--coverage-summary-json', type=str, help=COVERAGE_SUMMARY_JSON_HELP)
+    parser.add_argument('--coverage-db', type=str, help=COVERAGE_DB_HELP)
+    parser.add_argument('--coverage-snapshot', type=str, help=COVERAGE_SNAPSHOT_HELP)
+
+    # Coverage thresholds
+    parser.add_argument('--coverage-fail-under', type=float, help=COVERAGE_FAIL_UNDER_HELP)
+    parser.add_argument('--coverage-file-fail-under', type=float,
+                        help=COVERAGE_FILE_FAIL_UNDER_HELP)
+
+    # Browser from which to collect coverage
+    parser.add_argument('--coverage-browser', type=str,
+                        choices=[name for (_, name, _) in BROWSER_ARGS],
+                        help=COVERAGE_BROWSER_HELP)
+
+    # Coverage backend
+    parser.add_argument('--coverage-backend', type=str, default='jscover',
+                        choices=['jscover', 'native'],
+                        help=COVERAGE_BACKEND_HELP)
+
+    # JSCover memory limit
+    parser.add_argument('--jscover-heap', type=str, help=JSCOVER_HEAP_HELP)
+
+    # Number of processes used to combine snapshots
+    parser.add_argument('--num-processes', type=int, help=NUM_PROCESSES_HELP)
+
+    # Changed lines for diff coverage
+    parser.add_argument('--diff-file', type=str, help=DIFF_FILE_HELP)
+    parser.add_argument('--git-range', type=str, help=GIT_RANGE_HELP)
+
+    # Page server threads
+    parser.add_argument('--server-workers', type=int, help=SERVER_WORKERS_HELP)
+    parser.add_argument('--server-processes', type=int, help=SERVER_PROCESSES_HELP)
+
+    # Daemon mode
+    parser.add_argument('--daemon', action='store_true', help=DAEMON_HELP)
+    parser.add_argument('--socket', type=str, help=SOCKET_HELP)
+
+    # Compiled suites
+    parser.add_argument('--output-dir', type=str, help=OUTPUT_DIR_HELP)
+    parser.add_argument('--instrument', action='store_true', help=INSTRUMENT_HELP)
+    parser.add_argument('--hardlink', action='store_true', help=HARDLINK_HELP)
+    parser.add_argument('--compiled', type=str, help=COMPILED_HELP)
+
+    # Suite packing
+    parser.add_argument('--pack', type=int, help=PACK_HELP)
+
+    # Spec sharding
+    parser.add_argument('--shards', type=int, help=SHARDS_HELP)
+    parser.add_argument('--shard-durations', type=str, help=SHARD_DURATIONS_HELP)
+
+    # Browser tabs
+    parser.add_argument('--tabs', type=int, help=TABS_HELP)
 
     # Server port; default of 0 indicates an arbitrary unused port
     parser.add_argument('-p', '--port', type=int, default=0, help=PORT_HELP)
@@ -114,16 +301,86 @@ def parse_args(argv):
     if not arg_dict.get('command') in VALID_COMMANDS:
         raise SystemExit('Invalid command.')
 
+    # Check that we have suite descriptions (or snapshots) to work with
+    if arg_dict.get('compiled') is not None:
+        if arg_dict.get('command') != 'run':
+            raise SystemExit('--compiled can only be used with the run command.')
+
+        if arg_dict.get('test_suite_paths'):
+            raise SystemExit('Specify either test suite descriptions or --compiled, not both.')
+
+    elif arg_dict.get('command') != 'daemon' and not arg_dict.get('test_suite_paths'):
+        raise SystemExit('You must specify at least one test suite description.')
+
+    # Check that packs hold at least one suite, and can be packed
+    pack = arg_dict.get('pack')
+    if pack is not None:
+        if pack < 1:
+            raise SystemExit('The number of suites per page must be at least 1.')
+
+        if arg_dict.get('compiled') is not None:
+            raise SystemExit('Compiled suites cannot be packed.')
+
+    # Check that each suite has at least one shard
+    shards = arg_dict.get('shards')
+    if shards is not None and shards < 1:
+        raise SystemExit('The number of shards must be at least 1.')
+
+    # Check that each browser has at least one tab
+    tabs = arg_dict.get('tabs')
+    if tabs is not None and tabs < 1:
+        raise SystemExit('The number of tabs must be at least 1.')
+
+    # Check that we know where to write compiled suites
+    if arg_dict.get('command') == 'compile' and arg_dict.get('output_dir') is None:
+        raise SystemExit('You must specify --output-dir.')
+
+    # Check that the heap size is one the JVM understands
+    jscover_heap = arg_dict.get('jscover_heap')
+    if jscover_heap is not None and not re.match(r'^[0-9]+[kKmMgG]?$', jscover_heap):
+        raise SystemExit('The JSCover heap size must be a number with an optional k, m or g suffix.')
+
+    # Check that the server has threads to handle requests
+    server_workers = arg_dict.get('server_workers')
+    if server_workers is not None and server_workers < 1:
+        raise SystemExit('The number of server workers must be at least 1.')
+
+    server_processes = arg_dict.get('server_processes')
+    if server_processes is not None and server_processes < 1:
+        raise SystemExit('The number of server processes must be at least 1.')
+
     # Check that we have at least one browser specified
     # if running the test suite
     if arg_dict.get('command') == 'run' and not arg_dict.get('browser_names'):
         raise SystemExit('You must specify at least one browser.')
 
+    # Check that we collect coverage from a browser we run
+    coverage_browser = arg_dict.get('coverage_browser')
+    if arg_dict.get('command') == 'run' and coverage_browser is not None:
+        if coverage_browser not in arg_dict.get('browser_names'):
+            raise SystemExit('The coverage browser must be one of the browsers used.')
+
+    # Check that native coverage runs in a browser that supports it
+    if arg_dict.get('command') == 'run' and arg_dict.get('coverage_backend') == 'native':
+        if 'chrome' not in arg_dict.get('browser_names'):
+            raise SystemExit('Native coverage requires --use-chrome.')
+
+        if coverage_browser not in (None, 'chrome'):
+            raise SystemExit('Native coverage can only be collected from chrome.')
+
     # Check that if we're running in dev mode, we're
     # only using one test suite
     if arg_dict.get('command') == 'dev' and len(arg_dict.get('test_suite_paths')) > 1:
         raise SystemExit('You cannot run multiple test suites in dev mode')
 
+    # Check that diff coverage has a single snapshot and one source of changes
+    if arg_dict.get('command') == 'diff':
+        if len(arg_dict.get('test_suite_paths')) > 1:
+            raise SystemExit('You must specify exactly one coverage snapshot.')
+
+        if (arg_dict.get('diff_file') is None) == (arg_dict.get('git_range') is None):
+            raise SystemExit('You must specify either --diff-file or --git-range.')
+
     return arg_dict
 
 
@@ -147,6 +404,206 @@ def generate_reports(suite_runner):
     return result_data.all_passed()
 
 
+def run_suites(args_dict, factory=None, stream=None, keep_alive=False):
+    """
+    Run the test suites and write the reports configured
+    in `args_dict` (see `parse_args()`).
+
+    `factory` is the `SuiteRunnerFactory` used to configure the
+    runner, and `stream` is where the console report is written
+    (defaults to stdout).
+
+    If `keep_alive` is True, the browsers and server are left
+    running so they can be reused (see `SuiteDaemon`).
+
+    Returns a boolean indicating whether all the tests passed
+    and coverage met the configured thresholds.
+    """
+    if factory is None:
+        factory = SuiteRunnerFactory()
+
+    # Configure a test suite runner
+    suite_runner, browser_list = \
+        factory.build_runner(
+            args_dict.get('test_suite_paths'),
+            args_dict.get('browser_names'),
+            args_dict.get('xunit_report'),
+            args_dict.get('coverage_xml'),
+            args_dict.get('coverage_html'),
+            args_dict.get('timeout_sec'),
+            coverage_db_path=args_dict.get('coverage_db'),
+            coverage_snapshot_path=args_dict.get('coverage_snapshot'),
+            coverage_html_dir_path=args_dict.get('coverage_html_dir'),
+            coverage_lcov_path=args_dict.get('coverage_lcov'),
+            coverage_summary_path=args_dict.get('coverage_summary_json'),
+            collect_coverage=uses_coverage_thresholds(args_dict),
+            coverage_browser=args_dict.get('coverage_browser'),
+            coverage_backend=args_dict.get('coverage_backend', 'jscover'),
+            jscover_heap=args_dict.get('jscover_heap'),
+            server_workers=args_dict.get('server_workers'),
+            server_processes=args_dict.get('server_processes'),
+            compiled_dir=args_dict.get('compiled'),
+            pack_size=args_dict.get('pack'),
+            shard_count=args_dict.get('shards'),
+            shard_durations_path=args_dict.get('shard_durations'),
+            tab_count=args_dict.get('tabs'),
+            console_stream=stream,
+            keep_server=keep_alive
+        )
+
+    try:
+        # Generate the reports and write test results
+        all_passed = generate_reports(suite_runner)
+
+    finally:
+
+        # Quit out of the browsers we created
+        if not keep_alive:
+            for browser in browser_list:
+                browser.quit()
+
+    # Check coverage against the configured thresholds
+    coverage_passed = check_coverage_thresholds(suite_runner.coverage_data(), args_dict)
+
+    return all_passed and coverage_passed
+
+
+def check_coverage_thresholds(coverage_data, args_dict):
+    """
+    Check `coverage_data` (a `CoverageData` instance, or None if
+    coverage was not collected) against the thresholds configured
+    in `args_dict` (see `parse_args()`), logging each failure.
+
+    Uses only the in-memory line counts.
+
+    Returns a boolean indicating whether coverage is acceptable.
+    """
+    fail_under = args_dict.get('coverage_fail_under')
+    file_fail_under = args_dict.get('coverage_file_fail_under')
+
+    if fail_under is None and file_fail_under is None:
+        return True
+
+    if coverage_data is None:
+        LOGGER.error("No coverage data was collected, so coverage thresholds cannot be checked.")
+        return False
+
+    summary = coverage_data.summary_dict()
+    passed = True
+
+    if fail_under is not None:
+        total_percent = 100.0 * (summary['total_coverage'] or 0.0)
+
+        if total_percent < fail_under:
+            LOGGER.error("Total coverage {:.1f}% is below {:.1f}%".format(
+                total_percent, fail_under))
+            passed = False
+
+    if file_fail_under is not None:
+        for rel_path, file_summary in sorted(summary['files'].items()):
+
+            # Files with no executable lines cannot fail
+            if file_summary['src_coverage'] is None:
+                continue
+
+            file_percent = 100.0 * file_summary['src_coverage']
+
+            if file_percent < file_fail_under:
+                LOGGER.error("Coverage of '{}' {:.1f}% is below {:.1f}%".format(
+                    rel_path, file_percent, file_fail_under))
+                passed = False
+
+    return passed
+
+
+def uses_coverage_thresholds(args_dict):
+    """
+    Return True if `args_dict` (see `parse_args()`)
+    configures a coverage threshold.
+    """
+    return (args_dict.get('coverage_fail_under') is not None or
+            args_dict.get('coverage_file_fail_under') is not None)
+
+
+def compile_suites(args_dict, factory=None):
+    """
+    Compile the test suites as configured in `args_dict`
+    (see `parse_args()`), using `factory` (a `SuiteRunnerFactory`).
+
+    Returns the `CompiledSuites` written.
+    """
+    if factory is None:
+        factory = SuiteRunnerFactory()
+
+    compiled = factory.compile_suites(
+        args_dict.get('test_suite_paths'),
+        args_dict.get('output_dir'),
+        instrument=args_dict.get('instrument', False),
+        jscover_heap=args_dict.get('jscover_heap'),
+        hardlink=args_dict.get('hardlink', False)
+    )
+
+    print "Compiled {} suite(s) to '{}'".format(len(compiled.descriptions()),
+                                                compiled.output_dir())
+    return compiled
+
+
+def combine_coverage(snapshot_path_list, args_dict):
+    """
+    Merge the coverage snapshots at `snapshot_path_list`
+    and write the coverage reports configured in `args_dict`
+    (see `parse_args()`).
+
+    Returns the merged `CoverageData` instance.
+    """
+    coverage_data = combine_snapshots(snapshot_path_list,
+                                      num_processes=args_dict.get('num_processes'))
+
+    reporters = SuiteRunnerFactory().build_coverage_reporters(
+        coverage_xml_path=args_dict.get('coverage_xml'),
+        coverage_html_path=args_dict.get('coverage_html'),
+        coverage_html_dir_path=args_dict.get('coverage_html_dir'),
+        coverage_lcov_path=args_dict.get('coverage_lcov'),
+        coverage_summary_path=args_dict.get('coverage_summary_json'),
+        coverage_db_path=args_dict.get('coverage_db'),
+        coverage_snapshot_path=args_dict.get('coverage_snapshot'),
+        metadata={'snapshot_paths': snapshot_path_list}
+    )
+
+    if len(reporters) == 0 and not uses_coverage_thresholds(args_dict):
+        LOGGER.warning("No coverage report paths specified.")
+
+    for reporter in reporters:
+        reporter.write_report(coverage_data)
+
+    return coverage_data
+
+
+def report_diff_coverage(snapshot_path, args_dict):
+    """
+    Print the coverage of the lines changed by the diff configured
+    in `args_dict` (see `parse_args()`), using the coverage snapshot
+    at `snapshot_path` as the baseline.
+
+    Returns the report dict (see `diff_coverage.diff_coverage()`).
+    """
+    coverage_data = CoverageData.load_snapshot(snapshot_path)
+
+    if args_dict.get('diff_file') is not None:
+        with open(args_dict['diff_file']) as diff_file:
+            diff_text = diff_file.read()
+        root_dir = os.getcwd()
+
+    else:
+        diff_text, root_dir = git_diff(args_dict['git_range'])
+
+    changed_lines = ChangedLines.from_unified_diff(diff_text)
+    report_dict = diff_coverage(coverage_data, changed_lines, root_dir)
+
+    print format_diff_coverage(report_dict).encode('utf8')
+    return report_dict
+
+
 def create_default_suite(*file_name_list):
     """
     Create a default suite description at each file name
@@ -194,32 +651,52 @@ def main():
 
     elif command == 'run':
 
-        # Configure a test suite runner
-        factory = SuiteRunnerFactory()
-        suite_runner, browser_list = \
-            factory.build_runner(
-                args_dict.get('test_suite_paths'),
-                args_dict.get('browser_names'),
-                args_dict.get('xunit_report'),
-                args_dict.get('coverage_xml'),
-                args_dict.get('coverage_html'),
-                args_dict.get('timeout_sec')
-            )
+        # Submit the run to a daemon that is already warmed up
+        if args_dict.get('daemon'):
+            try:
+                passed = run_with_daemon(args_dict, socket_path=args_dict.get('socket'))
+            except DaemonError as err:
+                raise SystemExit(str(err))
+
+        else:
+            try:
+                passed = run_suites(args_dict)
+            except CompileError as err:
+                raise SystemExit(str(err))
+
+        # If any test failed (or coverage is too low),
+        # exit with non-zero status code
+        if not passed:
+            sys.exit(1)
+
+    elif command == 'daemon':
 
+        # Serve runs until the user terminates the daemon
         try:
-            # Generate the reports and write test results
-            all_passed = generate_reports(suite_runner)
+            daemon = SuiteDaemon(run_suites, socket_path=args_dict.get('socket'))
+        except DaemonError as err:
+            raise SystemExit(str(err))
 
-        finally:
+        print "Listening on '{}' (press Ctrl-C to stop)".format(daemon.socket_path())
+        daemon.serve()
 
-            # Quit out of the browsers we created
-            for browser in browser_list:
-                browser.quit()
+    elif command == 'compile':
+        try:
+            compile_suites(args_dict)
+        except CompileError as err:
+            raise SystemExit(str(err))
+
+    elif command == 'combine':
+        coverage_data = combine_coverage(args_dict.get('test_suite_paths'), args_dict)
 
-        # If any test failed, exit with non-zero status code
-        if not all_passed:
+        if not check_coverage_thresholds(coverage_data, args_dict):
             sys.exit(1)
 
+    elif command == 'diff':
+
+        # Arg validation guarantees that there is exactly 1 path
+        report_diff_coverage(args_dict.get('test_suite_paths')[0], args_dict)
+
     # Shouldn't get here because we validate the args,
     # but it never hurts to check.
     else:
@@ -0,0 +1,115 @@
+"""
+Fixed-size pools of threads that handle work items from a bounded queue.
+"""
+
+import threading
+from Queue import Queue, Full, Empty
+
+import logging
+LOGGER = logging.getLogger(__name__)
+
+
+# Placed in the queue to tell a worker thread to exit
+_STOP = object()
+
+
+class WorkerPool(object):
+    """
+    Handle items using a fixed number of threads.
+    Items wait in a bounded queue until a thread is free.
+
+    This class is thread safe.
+    """
+
+    def __init__(self, name, num_workers, handle_func, max_queued):
+        """
+        Create a pool of `num_workers` threads, identified as `name`
+        in log messages, that call `handle_func(item)` for each item
+        submitted.  At most `max_queued` items wait for a thread.
+        """
+        self._name = name
+        self._num_workers = num_workers
+        self._handle_func = handle_func
+
+        # Leave room for a stop signal for each worker
+        self._queue = Queue(maxsize=max(max_queued, num_workers))
+        self._threads = []
+
+    def start(self):
+        """
+        Start the worker threads.
+        """
+        for index in range(self._num_workers):
+            thread = threading.Thread(target=self._work,
+                                      name='{}-{}'.format(self._name, index))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, item, timeout=None):
+        """
+        Queue `item` to be handled by the next free thread.
+
+        If the queue is full, wait up to `timeout` seconds
+        (or not at all if `timeout` is None) for space.
+
+        Returns True if the item was queued, or False if the
+        queue is full (the caller should reject the work).
+        """
+        try:
+            if timeout is None:
+                self._queue.put_nowait(item)
+            else:
+                self._queue.put(item, timeout=timeout)
+
+        except Full:
+            return False
+
+        return True
+
+    def num_queued(self):
+        """
+        Return the approximate number of items waiting for a thread.
+        """
+        return self._queue.qsize()
+
+    def stop(self):
+        """
+        Wait for the threads to finish the items they are handling,
+        then stop them.
+
+        Returns the list of items that were still queued,
+        which will never be handled.
+        """
+        unhandled = []
+
+        while True:
+            try:
+                unhandled.append(self._queue.get_nowait())
+            except Empty:
+                break
+
+        for _ in self._threads:
+            self._queue.put(_STOP)
+
+        for thread in self._threads:
+            thread.join()
+
+        self._threads = []
+        return unhandled
+
+    def _work(self):
+        """
+        Handle items until told to stop.
+        """
+        while True:
+            item = self._queue.get()
+
+            if item is _STOP:
+                return
+
+            try:
+                self._handle_func(item)
+
+            except Exception:
+                LOGGER.exception("Unhandled error in worker pool '{}'".format(self._name))
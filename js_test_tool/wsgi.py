@@ -0,0 +1,140 @@
+"""
+Serve the suite pages from a WSGI server.
+
+`SuitePageServer` runs its own HTTP server, which is the default.
+To host the same pages under another WSGI server, create
+a `SuitePageApp`, for example in `suite_app.py`:
+
+    from js_test_tool.suite import SuiteDescription
+    from js_test_tool.wsgi import SuitePageApp
+
+    with open('js_test.yml') as desc_file:
+        application = SuitePageApp([SuiteDescription(desc_file, '/path/to/repo')])
+
+then serve `suite_app:application` as usual.
+"""
+
+import urllib
+from BaseHTTPServer import BaseHTTPRequestHandler
+from js_test_tool.suite import SuiteRenderer
+from js_test_tool.assets import runner_assets
+from js_test_tool.fixtures import FixtureCache
+from js_test_tool.requirejs import DependencyScanner
+from js_test_tool.suite_server import build_page_handlers, find_page, \
+    response_headers, suite_dict_from_list, LibAssetIndex
+
+
+class SuitePageApp(object):
+    """
+    WSGI application that serves the same pages as `SuitePageServer`:
+    suite runner pages, runner dependencies (e.g. jasmine.js),
+    suite dependencies and (if configured) instrumented sources
+    and coverage reports.
+
+    This class is thread safe.
+    """
+
+    # HTTP methods the page handlers understand
+    HTTP_METHODS = ['GET', 'POST']
+
+    # Number of bytes to read at a time when sending a page
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, suite_desc_list, suite_renderer=None,
+                 src_instr_dict=None, coverage_data=None):
+        """
+        Serve the suites in `suite_desc_list` (a list of
+        `SuiteDescription` instances), rendering runner pages
+        with `suite_renderer` (defaults to a new `SuiteRenderer`).
+
+        To collect coverage, provide `src_instr_dict` (a dict mapping
+        suite names to started `SrcInstrumenter` instances) and
+        `coverage_data` (a `CoverageData` instance in which to store
+        the coverage POSTed by the runner pages).  The caller is
+        responsible for stopping the instrumenters.
+
+        Raises a `DuplicateSuiteNameError` if two suites have the same name.
+        """
+        self.desc_dict = suite_dict_from_list(suite_desc_list)
+        self.coverage_data = coverage_data
+
+        # Load the runner assets before serving any requests
+        runner_assets()
+
+        self._page_handlers = build_page_handlers(
+            suite_renderer or SuiteRenderer(), self.desc_dict,
+            src_instr_dict=src_instr_dict, coverage_data=coverage_data,
+            fixture_cache=FixtureCache(self.desc_dict),
+            module_scanner=DependencyScanner(),
+            lib_asset_index=LibAssetIndex(self.desc_dict)
+        )
+
+    def __call__(self, environ, start_response):
+        """
+        Handle a request as described by PEP 333.
+        """
+        method = environ.get('REQUEST_METHOD', 'GET')
+
+        if method not in self.HTTP_METHODS:
+            start_response(self._status(501), [('Content-Type', 'text/plain; charset=utf-8'),
+                                               ('Content-Length', '0')])
+            return []
+
+        # The page handlers expect the path as it appeared in the request
+        path = urllib.quote(environ.get('PATH_INFO') or '/')
+
+        query = environ.get('QUERY_STRING')
+        if query:
+            path += '?' + query
+
+        status_code, content, mime_type, byte_range = find_page(
+            self._page_handlers, path, method,
+            self._request_content(environ), environ.get('HTTP_RANGE'),
+            if_none_match=environ.get('HTTP_IF_NONE_MATCH'),
+            accept_encoding=environ.get('HTTP_ACCEPT_ENCODING')
+        )
+
+        start_response(self._status(status_code),
+                       response_headers(content, mime_type,
+                                        byte_range=byte_range, path=path))
+
+        if content is None:
+            return []
+
+        # If no byte range specified, send the whole file,
+        # using the server's optimized file sending if available
+        if byte_range is None:
+            file_wrapper = environ.get('wsgi.file_wrapper')
+
+            if file_wrapper is not None:
+                return file_wrapper(content, self.CHUNK_SIZE)
+
+            return iter(lambda: content.read(self.CHUNK_SIZE), '')
+
+        # Otherwise, send just the range requested
+        else:
+            start_pos, end_pos = byte_range
+            content.seek(start_pos)
+            return [content.read(end_pos - start_pos + 1)]
+
+    @staticmethod
+    def _request_content(environ):
+        """
+        Retrieve the content of the request described by `environ`.
+        """
+        try:
+            length = int(environ.get('CONTENT_LENGTH'))
+
+        except (TypeError, ValueError):
+            return ""
+
+        else:
+            return environ['wsgi.input'].read(length)
+
+    @staticmethod
+    def _status(status_code):
+        """
+        Return the WSGI status line for `status_code` (e.g. "200 OK").
+        """
+        reason, _ = BaseHTTPRequestHandler.responses.get(status_code, ('', ''))
+        return '{} {}'.format(status_code, reason)